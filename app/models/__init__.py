@@ -1,18 +1,26 @@
 # Modelos do banco de dados
 
 # Importar todos os modelos para garantir que os relacionamentos funcionem
-from .equipment import Equipment, HorimeterLog
+from .equipment import Equipment, HorimeterLog, WeeklyHours, WeeklyHoursDay
 from .maintenance import WorkOrder, MaintenancePlan, MaintenancePlanMaterial, MaintenancePlanAction, MaintenanceAlert, WorkOrderMaterial, TimeLog, WorkOrderChecklist, Technician
 from .warehouse import Material, Supplier, StockMovement, PurchaseRequest, PurchaseRequestItem, Fueling
 from .hr import Employee
 from .construction import MacroStage, SubStage, Task, TaskMeasurement
+from .event_outbox import OutboxEvent
+from .table_version import TableVersion
+from .email_outbox import EmailOutbox
+from .manual_file import ManualFile
+from .cause_stats import WorkOrderTerms, CauseTermStat
+from .cnpj_cache import CnpjCache
 
 # Exportar todos os modelos
 __all__ = [
-    "Equipment", "HorimeterLog",
+    "Equipment", "HorimeterLog", "WeeklyHours", "WeeklyHoursDay",
     "WorkOrder", "MaintenancePlan", "MaintenancePlanMaterial", "MaintenancePlanAction", 
     "MaintenanceAlert", "WorkOrderMaterial", "TimeLog", "WorkOrderChecklist", "Technician",
     "Material", "Supplier", "StockMovement", "PurchaseRequest", "PurchaseRequestItem", "Fueling",
     "Employee",
-    "MacroStage", "SubStage", "Task", "TaskMeasurement"
+    "MacroStage", "SubStage", "Task", "TaskMeasurement",
+    "OutboxEvent", "TableVersion", "EmailOutbox", "ManualFile",
+    "WorkOrderTerms", "CauseTermStat", "CnpjCache"
 ]
\ No newline at end of file
@@ -65,9 +65,10 @@ class SessionToken(Base):
     __tablename__ = "session_tokens"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String(255), unique=True, index=True, nullable=False)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256 do token; o token em claro não é gravado
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=False)
+    last_used_at = Column(DateTime, nullable=True)  # última renovação da expiração deslizante
+    expires_at = Column(DateTime, nullable=False, index=True)
     is_revoked = Column(Boolean, default=False)
 
     user = relationship("User", back_populates="tokens")
@@ -127,4 +128,5 @@ class ErrorLog(Base):
     stack = Column(Text, nullable=True)
     context = Column(Text, nullable=True)         # JSON serializado (texto)
     status = Column(String(20), default='open')   # open/resolved
+    occurrences = Column(Integer, default=1)      # erros idênticos agrupados no mesmo lote
     created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Modelos das estatísticas de termos das OS corretivas (análise de causas de falha)
+"""
+
+from sqlalchemy import Column, Integer, String, Float, Date, Text, Index
+from app.database import Base
+
+class WorkOrderTerms(Base):
+    """Termos (radicais) de cada OS corretiva fechada, tokenizada uma vez.
+    Guarda a contribuição da OS em cause_term_stats, para desfazê-la quando a OS muda.
+    """
+    __tablename__ = "work_order_terms"
+
+    # Sem FK: a linha sai no mesmo flush que remove a OS
+    work_order_id = Column(Integer, primary_key=True)
+    category = Column(String(100), nullable=False)
+    month = Column(Date, nullable=False)  # primeiro dia do mês de fechamento
+    cost = Column(Float, nullable=False, default=0.0)
+    terms = Column(Text, nullable=False)  # separados por espaço (inclui "causa:<chave>")
+
+
+class CauseTermStat(Base):
+    """OS corretivas fechadas e custo por categoria de equipamento, mês e termo.
+    O termo "" guarda o total de OS da categoria no mês.
+    """
+    __tablename__ = "cause_term_stats"
+    __table_args__ = (Index("ix_cause_term_stats_month", "month", "term", "orders", "cost"),)
+
+    category = Column(String(100), primary_key=True)
+    month = Column(Date, primary_key=True)
+    term = Column(String(60), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0.0)
@@ -0,0 +1,22 @@
+"""
+Modelo do cache local de CNPJs (cadastro de fornecedores e consultas à BrasilAPI)
+"""
+
+from sqlalchemy import Column, String, Text, DateTime
+from app.database import Base
+
+class CnpjCache(Base):
+    """Razão social conhecida de cada CNPJ (só dígitos).
+    status: active (encontrado na consulta externa), not_found (404 da consulta) ou
+    local (semeado do cadastro de fornecedores, ainda não confirmado).
+    Vencido (expires_at no passado) continua servindo e entra na atualização em segundo plano.
+    """
+    __tablename__ = "cnpj_cache"
+
+    cnpj = Column(String(14), primary_key=True)
+    company_name = Column(String(200), nullable=True)
+    status = Column(String(20), nullable=False, default="local")
+    source = Column(String(20), nullable=False, default="supplier")  # supplier | brasilapi
+    raw = Column(Text, nullable=True)                               # JSON da última consulta externa
+    fetched_at = Column(DateTime, nullable=True)                    # última consulta externa
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,29 @@
+"""
+Modelo da caixa de saída de e-mails (envio em segundo plano)
+"""
+
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+class EmailOutbox(Base):
+    """E-mail enfileirado pela requisição e enviado pelo remetente em segundo plano.
+    Status: pending -> sending -> sent | dead (esgotou as tentativas ou template inválido).
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=True)
+    to_address = Column(String(200), nullable=False)
+    subject = Column(String(300), nullable=False)
+    template = Column(String(100), nullable=True)   # arquivo em templates/email; sem template usa body
+    context = Column(Text, nullable=True)           # JSON do template; apagado após o envio
+    body = Column(Text, nullable=True)
+    status = Column(String(20), default="pending", index=True)
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=func.now(), index=True)
+    claim_token = Column(String(32), nullable=True, index=True)
+    claimed_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
@@ -2,7 +2,7 @@
 Modelos relacionados a equipamentos
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Date, Float, Text, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -73,6 +73,8 @@ class WeeklyHours(Base):
     id = Column(Integer, primary_key=True, index=True)
     equipment_id = Column(Integer, ForeignKey("equipments.id"), nullable=False)
     week = Column(String(8), nullable=False)  # Formato: 2024-W01
+    week_start = Column(Date, nullable=True)  # Segunda-feira da semana ISO
+    week_end = Column(Date, nullable=True)  # Domingo da semana ISO
     monday = Column(Float, default=0.0)
     tuesday = Column(Float, default=0.0)
     wednesday = Column(Float, default=0.0)
@@ -86,6 +88,34 @@ class WeeklyHours(Base):
     
     # Relacionamentos
     equipment = relationship("Equipment")
+    days = relationship(
+        "WeeklyHoursDay",
+        back_populates="weekly_hours",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+    __table_args__ = (
+        Index("ix_weekly_hours_equipment_week_start", "equipment_id", "week_start"),
+    )
+
+class WeeklyHoursDay(Base):
+    """Horas diárias derivadas de WeeklyHours (uma linha por dia com horas).
+    Permite somar horas por intervalo de datas, repartindo semanas que cruzam meses."""
+    __tablename__ = "weekly_hours_days"
+
+    id = Column(Integer, primary_key=True, index=True)
+    weekly_hours_id = Column(Integer, ForeignKey("weekly_hours.id", ondelete="CASCADE"), nullable=False, index=True)
+    equipment_id = Column(Integer, ForeignKey("equipments.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    hours = Column(Float, default=0.0)
+
+    # Relacionamentos
+    weekly_hours = relationship("WeeklyHours", back_populates="days")
+
+    __table_args__ = (
+        Index("ix_weekly_hours_days_equipment_day", "equipment_id", "day"),
+    )
 
 class EquipmentTechnicalProfile(Base):
     """Perfil técnico gerado automaticamente para o equipamento"""
@@ -0,0 +1,19 @@
+"""
+Modelo da caixa de saída de eventos (feed SSE do dashboard)
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+class OutboxEvent(Base):
+    """Evento de alteração gravado na mesma transação da entidade.
+    Cada worker lê a tabela a partir do último id visto e repassa aos clientes SSE.
+    """
+    __tablename__ = "event_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String(50), nullable=False)
+    action = Column(String(20), nullable=False)  # created, updated, deleted
+    entity_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=func.now(), index=True)
@@ -0,0 +1,23 @@
+"""
+Modelo dos manuais de fabricante anexados aos equipamentos
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ManualFile(Base):
+    """Vínculo equipamento -> arquivo armazenado por conteúdo (SHA-256).
+    O mesmo manual anexado a vários equipamentos do mesmo modelo é gravado uma vez só.
+    """
+    __tablename__ = "manual_files"
+    __table_args__ = (UniqueConstraint("equipment_id", "sha256", name="uq_manual_files_equipment_sha256"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    equipment_id = Column(Integer, ForeignKey("equipments.id"), nullable=False, index=True)
+    sha256 = Column(String(64), nullable=False, index=True)
+    extension = Column(String(10), nullable=False)    # faz parte do nome do arquivo armazenado
+    filename = Column(String(255), nullable=False)    # nome original enviado
+    content_type = Column(String(100), nullable=True)
+    size_bytes = Column(Integer, nullable=False)
+    uploaded_at = Column(DateTime, default=func.now(), index=True)
@@ -0,0 +1,15 @@
+"""
+Modelo dos contadores de alteração por tabela (ETag / GET condicional)
+"""
+
+from sqlalchemy import Column, Integer, String
+from app.database import Base
+
+class TableVersion(Base):
+    """Versão de cada tabela, incrementada a cada flush que a altera.
+    A linha "*" é incrementada em qualquer alteração.
+    """
+    __tablename__ = "table_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -2,7 +2,7 @@
 Modelos relacionados ao almoxarifado
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from typing import Optional
@@ -62,6 +62,11 @@ class StockMovement(Base):
     material = relationship("Material", back_populates="stock_movements")
     equipment = relationship("Equipment")
 
+    # Índice de cobertura para os relatórios agregados (saídas por período e material)
+    __table_args__ = (
+        Index("ix_stock_movements_type_date_material", "type", "date", "material_id"),
+    )
+
 class Supplier(Base):
     """Fornecedores"""
     __tablename__ = "suppliers"
@@ -15,19 +15,25 @@ from app.models.hr import Employee
 from datetime import datetime, timedelta
 import secrets
 import hashlib
-import smtplib
-from email.message import EmailMessage
 import os
 from app.models.admin import User, Role, Permission, UserRole, RolePermission, SessionToken
 from app.models.admin import Module, License
 from starlette.responses import RedirectResponse
-from typing import Optional
+from typing import Optional, Tuple
 from app.version import APP_VERSION
+from app.services import password_hashing
+from app.services.login_throttle import login_throttle
+from app.services.log_writer import log_writer
+from app.services import session_tokens
+from app.services.email_outbox import enqueue_email
+from app.services.rate_limit import rate_limiter
+from app.services import llm_provider
+import math
 
 router = APIRouter()
 
 # Utilitários de autenticação
-HASH_ITERATIONS = 130_000
+HASH_ITERATIONS = password_hashing.HASH_ITERATIONS
 TOKEN_TTL_HOURS = 24
 
 # Helpers: configurações, política de senha e auditoria
@@ -60,47 +66,14 @@ def validate_password_policy(password: str) -> Optional[str]:
     return None
 
 def log_audit(db: Session, user_id: Optional[int], action: str, entity: Optional[str] = None, entity_id: Optional[int] = None, changes: Optional[str] = None):
+    # Fila do gravador em lote; fora do lifespan ou com a fila cheia grava na sessão da requisição
+    if log_writer.log_audit(user_id, action, entity=entity, entity_id=entity_id, changes=changes):
+        return
     db.add(AuditLog(user_id=user_id, action=action, entity=entity, entity_id=entity_id, changes=changes))
     db.commit()
 
-def send_email_stub(db: Session, to: Optional[str], subject: str, body: str, user_id: Optional[int] = None):
-    # Simula envio e registra log
-    log_audit(db, user_id, "email_sent", entity="email", changes=f"to={to}; subject={subject}; body={body[:200]}")
-
-# Envio real via SMTP; se faltar configuração, faz fallback para stub
-def send_email_smtp(db: Session, to: Optional[str], subject: str, body: str, user_id: Optional[int] = None) -> bool:
-    server = os.getenv("SMTP_SERVER")
-    port = int(os.getenv("SMTP_PORT", "587"))
-    username = os.getenv("SMTP_USERNAME")
-    password = os.getenv("SMTP_PASSWORD")
-    email_from = os.getenv("EMAIL_FROM") or username
-    if not (server and username and password and email_from and to):
-        # Sem configuração completa: registra via stub
-        send_email_stub(db, to, subject, body, user_id)
-        return False
-    try:
-        msg = EmailMessage()
-        msg["From"] = email_from
-        msg["To"] = to
-        msg["Subject"] = subject
-        msg.set_content(body)
-        with smtplib.SMTP(server, port, timeout=10) as smtp:
-            smtp.starttls()
-            smtp.login(username, password)
-            smtp.send_message(msg)
-        log_audit(db, user_id, "email_sent", entity="email", changes=f"to={to}; subject={subject}; via=smtp")
-        return True
-    except Exception as e:
-        try:
-            db.add(ErrorLog(module="admin", error_type="email_send_failure", message=str(e), context=f"to={to}; subject={subject}"))
-            db.commit()
-        except Exception:
-            pass
-        send_email_stub(db, to, subject, body, user_id)
-        return False
-
 def generate_salt() -> str:
-    return secrets.token_hex(16)
+    return password_hashing.generate_salt()
 
 # Senha temporária simples e memorizável
 def generate_simple_temp_password() -> str:
@@ -126,26 +99,18 @@ def normalize_company_code(code: Optional[str]) -> Optional[str]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Código de Obra/Empresa deve ser de 001 a 999")
     return str(n).zfill(3)
 
+# Versões síncronas (scripts e inicialização). Nos endpoints usar
+# password_hashing.hash_password/verify_password, que rodam fora do event loop.
 def hash_password(password: str, salt_hex: str) -> str:
-    return hashlib.pbkdf2_hmac(
-        'sha256',
-        password.encode('utf-8'),
-        bytes.fromhex(salt_hex),
-        HASH_ITERATIONS
-    ).hex()
+    return password_hashing.hash_password_sync(password, salt_hex)
 
 def verify_password(password: str, salt_hex: str, stored_hash_hex: str) -> bool:
-    return hash_password(password, salt_hex) == stored_hash_hex
+    return password_hashing.verify_password_sync(password, salt_hex, stored_hash_hex)
 
-def create_session_token(user_id: int, db: Session, ttl_hours: Optional[int] = None) -> SessionToken:
+def create_session_token(user_id: int, db: Session, ttl_hours: Optional[int] = None) -> Tuple[SessionToken, str]:
+    """Cria a sessão e retorna (registro, token em claro); só o hash do token é gravado."""
     ttl = ttl_hours if ttl_hours is not None else get_setting_int(db, "token_ttl_hours", TOKEN_TTL_HOURS)
-    token = secrets.token_urlsafe(32)
-    expires = datetime.utcnow() + timedelta(hours=ttl)
-    session = SessionToken(user_id=user_id, token=token, expires_at=expires)
-    db.add(session)
-    db.commit()
-    db.refresh(session)
-    return session
+    return session_tokens.issue_token(db, user_id, ttl)
 
 # Página inicial do Painel Admin (protegida abaixo)
 # Removida definição duplicada não protegida
@@ -205,7 +170,7 @@ async def admin_register(request: Request, db: Session = Depends(get_db)):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=policy_error)
 
     salt = generate_salt()
-    pwd_hash = hash_password(raw_password, salt)
+    pwd_hash = await password_hashing.hash_password(raw_password, salt)
 
     user = User(
         username=username,
@@ -262,9 +227,11 @@ async def admin_register(request: Request, db: Session = Depends(get_db)):
 
     # Enviar e-mail com senha temporária, se aplicável
     if generate_temp_password and email:
-        send_email_smtp(db, to=email, subject="Credenciais de acesso temporárias", body=f"Login: {username}\nSenha: {raw_password}\nLink: /admin/login", user_id=user.id)
+        # Só enfileira; o envio SMTP acontece em segundo plano (app/services/email_outbox.py)
+        enqueue_email(db, to=email, subject="Credenciais de acesso temporárias", template="temp_credentials.txt",
+                      context={"username": username, "password": raw_password, "link": "/admin/login"}, user_id=user.id)
 
-    session = create_session_token(user.id, db)
+    session, token = create_session_token(user.id, db)
 
     return {
         "status": "ok",
@@ -277,7 +244,7 @@ async def admin_register(request: Request, db: Session = Depends(get_db)):
             "is_admin": user.is_admin,
             "must_change_password": user.must_change_password,
         },
-        "token": session.token,
+        "token": token,
         "temp_password": raw_password if generate_temp_password else None,
     }
 
@@ -291,21 +258,43 @@ async def admin_login(request: Request, db: Session = Depends(get_db)):
     if not username or not password:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Credenciais inválidas")
 
+    client_ip = request.client.host if request.client else None
+    retry_after = await login_throttle.acquire_async(username, client_ip)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Muitas tentativas de login. Tente novamente em instantes.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
     user = db.query(User).filter(User.username == username).first()
     if not user:
+        await login_throttle.record_failure_async(username, client_ip)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuário ou senha incorretos")
 
-    if not verify_password(password, user.password_salt, user.password_hash):
+    stored_salt, stored_hash = user.password_salt, user.password_hash
+    # Devolver a conexão ao pool enquanto o hash roda em outro processo
+    db.rollback()
+    if not await password_hashing.verify_password(password, stored_salt, stored_hash):
+        await login_throttle.record_failure_async(username, client_ip)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuário ou senha incorretos")
+    await login_throttle.record_success_async(username, client_ip)
+
+    # Hash antigo ou com menos iterações que a configuração atual: regravar
+    if password_hashing.needs_rehash(stored_hash):
+        new_salt = generate_salt()
+        user.password_hash = await password_hashing.hash_password(password, new_salt)
+        user.password_salt = new_salt
+        db.commit()
 
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Usuário inativo")
 
-    session = create_session_token(user.id, db)
+    session, token = create_session_token(user.id, db)
 
     return {
         "status": "ok",
-        "token": session.token,
+        "token": token,
         "expires_at": session.expires_at.isoformat(),
         "user": {
             "id": user.id,
@@ -338,11 +327,8 @@ async def admin_me(request: Request, db: Session = Depends(get_db)):
     if not token_value:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token ausente")
 
-    session = db.query(SessionToken).filter(
-        SessionToken.token == token_value,
-        SessionToken.is_revoked == False,
-    ).first()
-    if not session or session.expires_at < datetime.utcnow():
+    session = session_tokens.resolve_token(db, token_value)
+    if not session:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido ou expirado")
 
     user = db.query(User).get(session.user_id)
@@ -372,7 +358,7 @@ async def admin_logout(request: Request, response: Response, db: Session = Depen
     if not token_value:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Token obrigatório")
 
-    session = db.query(SessionToken).filter(SessionToken.token == token_value).first()
+    session = session_tokens.find_token(db, token_value)
     if not session:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sessão não encontrada")
 
@@ -405,11 +391,8 @@ def get_user_from_request_token(request: Request, db: Session) -> Optional[User]
             token_value = payload.get("token")
     if not token_value:
         return None
-    session = db.query(SessionToken).filter(
-        SessionToken.token == token_value,
-        SessionToken.is_revoked == False,
-    ).first()
-    if not session or session.expires_at < datetime.utcnow():
+    session = session_tokens.resolve_token(db, token_value)
+    if not session:
         return None
     return db.query(User).get(session.user_id)
 
@@ -444,11 +427,8 @@ async def admin_change_password(request: Request, db: Session = Depends(get_db))
     if not token_value:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token ausente")
 
-    session = db.query(SessionToken).filter(
-        SessionToken.token == token_value,
-        SessionToken.is_revoked == False,
-    ).first()
-    if not session or session.expires_at < datetime.utcnow():
+    session = session_tokens.resolve_token(db, token_value)
+    if not session:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido ou expirado")
 
     user = db.query(User).get(session.user_id)
@@ -464,13 +444,17 @@ async def admin_change_password(request: Request, db: Session = Depends(get_db))
     if policy_error:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=policy_error)
 
+    # Devolver a conexão ao pool enquanto o hash roda em outro processo
+    must_change, stored_salt, stored_hash = user.must_change_password, user.password_salt, user.password_hash
+    db.rollback()
+
     # Se não exigir troca obrigatória, valida senha antiga
-    if not user.must_change_password:
-        if not old_password or not verify_password(old_password, user.password_salt, user.password_hash):
+    if not must_change:
+        if not old_password or not await password_hashing.verify_password(old_password, stored_salt, stored_hash):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Senha atual incorreta")
 
     new_salt = generate_salt()
-    new_hash = hash_password(new_password, new_salt)
+    new_hash = await password_hashing.hash_password(new_password, new_salt)
     user.password_salt = new_salt
     user.password_hash = new_hash
     user.must_change_password = False
@@ -640,6 +624,86 @@ async def delete_user(user_id: int, request: Request, db: Session = Depends(get_
 
     return {"status": "ok"}
 
+# API: sessões ativas de um usuário
+@router.get("/users/{user_id}/sessions")
+async def list_user_sessions(user_id: int, request: Request, db: Session = Depends(get_db)):
+    current = get_user_from_request_token(request, db)
+    if not current or not current.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito ao perfil Admin")
+    if not db.query(User).get(user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+
+    sessions = db.query(SessionToken).filter(
+        SessionToken.user_id == user_id,
+        SessionToken.is_revoked == False,
+        SessionToken.expires_at >= datetime.utcnow(),
+    ).order_by(SessionToken.created_at.desc()).all()
+    return {
+        "status": "ok",
+        "items": [
+            {
+                "id": s.id,
+                "created_at": s.created_at.isoformat() if s.created_at else None,
+                "last_used_at": s.last_used_at.isoformat() if s.last_used_at else None,
+                "expires_at": s.expires_at.isoformat() if s.expires_at else None,
+            } for s in sessions
+        ],
+        "total": len(sessions),
+    }
+
+# API: revogar sessões (todas do usuário ou apenas uma, via session_id no corpo)
+@router.post("/users/{user_id}/sessions/revoke")
+async def revoke_user_sessions(user_id: int, request: Request, db: Session = Depends(get_db)):
+    current = get_user_from_request_token(request, db)
+    if not current or not current.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito ao perfil Admin")
+    if not db.query(User).get(user_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usuário não encontrado")
+    try:
+        payload = await request.json()
+    except Exception:
+        payload = {}
+    session_id = payload.get("session_id") if isinstance(payload, dict) else None
+
+    if session_id is not None:
+        session = db.query(SessionToken).filter(SessionToken.id == session_id, SessionToken.user_id == user_id).first()
+        if not session:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sessão não encontrada")
+        revoked = 0 if session.is_revoked else 1
+        session.is_revoked = True
+        db.commit()
+        changes = f"session_id={session_id}"
+    else:
+        revoked = session_tokens.revoke_user_sessions(db, user_id)
+        changes = f"todas as sessões ({revoked})"
+
+    log_audit(db, user_id=current.id, action="revoke_sessions", entity="users", entity_id=user_id, changes=changes)
+    return {"status": "ok", "revoked": revoked}
+
+# API: políticas de limite de requisições e contadores deste worker
+@router.get("/rate-limits")
+async def rate_limit_metrics(request: Request, db: Session = Depends(get_db)):
+    current = get_user_from_request_token(request, db)
+    if not current or not current.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito ao perfil Admin")
+    return {
+        "enabled": rate_limiter.enabled,
+        "store": type(rate_limiter.store).__name__,
+        "policies": rate_limiter.snapshot(),
+    }
+
+# API: contadores e latência (tempo até o 1º trecho, total) do provedor de IA neste worker
+@router.get("/ai-metrics")
+async def ai_metrics(request: Request, db: Session = Depends(get_db)):
+    current = get_user_from_request_token(request, db)
+    if not current or not current.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito ao perfil Admin")
+    return {
+        "provider": (os.getenv("AI_PROVIDER") or "").strip().lower() or None,
+        "counters": dict(llm_provider.stats),
+        "latency": llm_provider.latency.snapshot(),
+    }
+
 # Página: Gestão de Usuários
 @router.get("/users-page")
 async def admin_users_page(request: Request, db: Session = Depends(get_db)):
@@ -713,7 +777,7 @@ async def list_error_logs(request: Request, db: Session = Depends(get_db)):
         from io import StringIO
         sio = StringIO()
         writer = csv.writer(sio)
-        writer.writerow(["ID","Data","Módulo","Tipo","Mensagem","Status"]) 
+        writer.writerow(["ID","Data","Módulo","Tipo","Mensagem","Status","Ocorrências"]) 
         for l in logs:
             writer.writerow([
                 l.id,
@@ -721,7 +785,8 @@ async def list_error_logs(request: Request, db: Session = Depends(get_db)):
                 l.module or "",
                 l.error_type or "",
                 (l.message or "").replace("\n"," ")[:500],
-                l.status or "open"
+                l.status or "open",
+                l.occurrences or 1,
             ])
         return Response(content=sio.getvalue(), media_type="text/csv")
 
@@ -736,6 +801,7 @@ async def list_error_logs(request: Request, db: Session = Depends(get_db)):
                 "message": l.message,
                 "stack": l.stack,
                 "status": l.status,
+                "occurrences": l.occurrences or 1,
             } for l in logs
         ],
         "total": len(logs),
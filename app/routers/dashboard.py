@@ -11,7 +11,9 @@ from app.models.maintenance import WorkOrder
 from app.models.equipment import Equipment
 from app.models.warehouse import Material, StockMovement
 from app.templates_config import templates
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, StreamingResponse
+from typing import Optional
+from app.services import event_bus, session_tokens
 
 router = APIRouter()
 
@@ -19,7 +21,6 @@ router = APIRouter()
 async def dashboard_page(request: Request, db: Session = Depends(get_db)):
     """Página principal do dashboard"""
     # Redirecionar para login se não autenticado
-    from app.models.admin import SessionToken
     auth_header = request.headers.get("Authorization") or ""
     token_value = None
     if auth_header.lower().startswith("bearer "):
@@ -30,11 +31,7 @@ async def dashboard_page(request: Request, db: Session = Depends(get_db)):
         token_value = request.query_params.get("token")
     if not token_value:
         return RedirectResponse(url="/admin/login", status_code=302)
-    session = db.query(SessionToken).filter(
-        SessionToken.token == token_value,
-        SessionToken.is_revoked == False,
-    ).first()
-    if not session or session.expires_at < datetime.utcnow():
+    if not session_tokens.resolve_token(db, token_value):
         return RedirectResponse(url="/admin/login", status_code=302)
 
     # Obter métricas básicas
@@ -447,4 +444,18 @@ async def get_performance_data(db: Session = Depends(get_db)):
     return {
         'success': True,
         'data': performance_data
-    }
\ No newline at end of file
+    }
+
+@router.get("/events")
+async def events_stream(request: Request, last_event_id: Optional[str] = None):
+    """Feed SSE com deltas de OS, estoque, abastecimentos, horímetros e alertas preventivos.
+    Retoma a partir do cabeçalho Last-Event-ID (ou ?last_event_id= na primeira conexão)."""
+    cursor = event_bus.parse_last_event_id(request.headers.get("last-event-id") or last_event_id)
+    return StreamingResponse(
+        event_bus.event_stream(event_bus.bus, cursor, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
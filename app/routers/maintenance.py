@@ -3,18 +3,12 @@ Router para módulo de manutenção
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Body, Form
-import httpx
 from fastapi.responses import Response, FileResponse
 from sqlalchemy.orm import Session, joinedload, load_only
 from sqlalchemy import and_, or_, func
 from typing import List, Optional
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+import asyncio
 import io
 import os
 import json
@@ -22,12 +16,16 @@ import shutil
 from app.database import get_db
 from app.models.maintenance import WorkOrder, MaintenancePlan, TimeLog, Technician, MaintenancePlanAction, MaintenancePlanMaterial
 from sqlalchemy import and_, or_
-from app.models.equipment import Equipment, WeeklyHours, HorimeterLog, EquipmentTechnicalProfile
+from app.models.equipment import Equipment, WeeklyHours, WeeklyHoursDay, HorimeterLog, EquipmentTechnicalProfile
+from app.services.weekly_hours import sync_weekly_hours_calendar, serialize_weekly_hours
 from app.models.warehouse import Fueling, StockNotification, StockNotificationItem, Material
 from app.schemas.maintenance import WorkOrderCreate, WorkOrderUpdate, TimeLogCreate, TechnicianCreate, TechnicianUpdate, TechnicianResponse
 from app.templates_config import templates
 from starlette.responses import RedirectResponse
 from app.routers.admin import get_user_from_request_token, get_user_modules
+from app.services.http_cache import etag_guard
+from app.services.rate_limit import rate_limit
+from app.services import cnpj_registry, manual_storage
 
 router = APIRouter()
 
@@ -84,7 +82,7 @@ async def equipment(
         except Exception as e:
             return {"error": str(e), "equipment": []}
 
-@router.get("/equipment/list")
+@router.get("/equipment/list", dependencies=[Depends(etag_guard("equipments"))])
 async def equipment_list(db: Session = Depends(get_db)):
     """API para listar equipamentos"""
     equipment = db.query(Equipment).options(load_only(
@@ -114,13 +112,13 @@ async def equipment_list(db: Session = Depends(get_db)):
         "created_at": eq.created_at.isoformat() if eq.created_at else None
     } for eq in equipment]
 
-@router.get("/list")
+@router.get("/list", dependencies=[Depends(etag_guard("equipments"))])
 async def equipment_list_simple(db: Session = Depends(get_db)):
     """API para listar equipamentos (para uso com prefixo /equipment)"""
     equipment = db.query(Equipment).all()
     return [{"id": eq.id, "name": eq.name, "status": eq.status, "category": eq.__dict__.get("category", None)} for eq in equipment]
 
-@router.get("/plans")
+@router.get("/plans", dependencies=[Depends(etag_guard("maintenance_plans", "equipments"))])
 async def maintenance_plans(
     request: Request,
     skip: int = 0,
@@ -515,7 +513,7 @@ async def delete_work_order(work_order_id: int, db: Session = Depends(get_db)):
     
     return {"message": "Ordem de serviço excluída com sucesso"}
 
-@router.get("/api/work-orders/{work_order_id}/print")
+@router.get("/api/work-orders/{work_order_id}/print", dependencies=[Depends(rate_limit("pdf"))])
 async def print_work_order(work_order_id: int, db: Session = Depends(get_db)):
     """Gerar PDF da ordem de serviço para impressão"""
     # Buscar a ordem de serviço com equipamento e técnico relacionados
@@ -531,8 +529,15 @@ async def print_work_order(work_order_id: int, db: Session = Depends(get_db)):
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
     
-    # Gerar PDF usando ReportLab
+    # Gerar PDF usando ReportLab (importado sob demanda)
     try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import cm
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, 
                               topMargin=2*cm, bottomMargin=2*cm)
@@ -833,47 +838,43 @@ async def create_equipment(equipment_data: dict, db: Session = Depends(get_db)):
 @router.post("/equipment/{equipment_id}/manual/upload")
 async def upload_equipment_manual(
     equipment_id: int,
-    files: List[UploadFile] = File(None),
-    file: Optional[UploadFile] = File(None),
+    request: Request,
     db: Session = Depends(get_db),
 ):
+    """Anexa manuais ('files' múltiplos ou 'file' único) gravados por conteúdo (SHA-256).
+
+    O corpo multipart é lido pela própria rota, em blocos: envios grandes demais
+    são recusados pelo Content-Length, ou no meio do fluxo quando chegam sem ele
+    (chunked); cada arquivo é gravado uma vez, direto no armazenamento, e
+    conteúdo repetido reaproveita o arquivo já armazenado.
+    """
     # Validar equipamento
     equipment = db.query(Equipment).filter(Equipment.id == equipment_id).first()
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
 
-    # Unificar parâmetro para compatibilidade retroativa (aceita 'file' único ou 'files')
-    upload_list: List[UploadFile] = []
-    if files:
-        upload_list.extend([f for f in files if f is not None])
-    if file is not None:
-        upload_list.append(file)
-    if not upload_list:
-        raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
-
-    # Criar diretório de armazenamento
-    base_dir = os.path.join("data", "manuals", str(equipment_id))
+    manual_storage.check_content_length(request.headers.get("content-length"))
     try:
-        os.makedirs(base_dir, exist_ok=True)
+        uploads = await manual_storage.store_multipart(request.headers.get("content-type"), request.stream())
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Falha ao preparar diretório de armazenamento: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Falha ao salvar arquivos enviados: {str(e)}")
+    if not uploads:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo enviado")
 
     saved_files: List[dict] = []
-    for uf in upload_list:
-        safe_filename = (uf.filename or "").replace("\r", "").replace("\n", "").strip()
-        if not safe_filename:
-            continue
-        saved_path = os.path.join(base_dir, safe_filename)
-        try:
-            content = await uf.read()
-            with open(saved_path, "wb") as f:
-                f.write(content)
-            saved_files.append({"filename": safe_filename, "path": saved_path})
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Falha ao salvar arquivo '{safe_filename}': {str(e)}")
-
-    if not saved_files:
-        raise HTTPException(status_code=400, detail="Falha ao salvar arquivos enviados")
+    for upload in uploads:
+        stored = upload.stored
+        manual_storage.link_manual(db, equipment_id, stored, upload.filename, upload.content_type)
+        saved_files.append({
+            "filename": upload.filename,
+            "path": stored.path,
+            "sha256": stored.sha256,
+            "size": stored.size_bytes,
+            "deduplicated": stored.deduplicated,
+        })
+    db.commit()
 
     return {"message": "Arquivo(s) anexado(s) com sucesso", "files": saved_files}
 
@@ -898,17 +899,13 @@ async def generate_equipment_plans(
 
     if mode == "manual":
         # Encontrar arquivo de manual mais recente
-        base_dir = os.path.join("data", "manuals", str(equipment_id))
-        if not os.path.isdir(base_dir):
+        latest_file = manual_storage.latest_manual_path(db, equipment_id)
+        if not latest_file:
             raise HTTPException(status_code=400, detail="Nenhum manual anexado para este equipamento")
 
-        files = [os.path.join(base_dir, f) for f in os.listdir(base_dir) if os.path.isfile(os.path.join(base_dir, f))]
-        if not files:
-            raise HTTPException(status_code=400, detail="Nenhum manual disponível no diretório")
-        latest_file = max(files, key=lambda p: os.path.getmtime(p))
-
         try:
-            plan_specs = generate_plans_from_manual(equipment, latest_file)
+            # Extração do PDF fora do event loop (pool de processos + cache em pdf_text)
+            plan_specs = await asyncio.to_thread(generate_plans_from_manual, equipment, latest_file)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Erro ao gerar planos a partir do manual: {str(e)}")
 
@@ -1041,44 +1038,73 @@ async def generate_equipment_plans(
 
     return {"message": "Planos gerados com sucesso", "plans_created": created_count, "plan_ids": created_plan_ids}
 
-@router.get("/equipment/validate-cnpj")
-async def validate_cnpj(cnpj: str):
-    """Validar CNPJ via serviço externo e retornar nome da empresa.
-    Usa BrasilAPI: https://brasilapi.com.br/api/cnpj/v1/{cnpj}
+# Geração de planos em lote para a frota: um modelo de planos por fabricante/modelo/categoria
+@router.post("/equipment/plans/generate-batch")
+async def generate_fleet_plans(
+    payload: dict = Body(...),
+    db: Session = Depends(get_db),
+):
+    """Gerar planos para vários equipamentos (ex.: 80 escavadeiras iguais de uma obra nova).
+
+    payload: {"equipment_ids": [...], "mode": "manual"|"internet", "dry_run": bool}.
+    Em dry_run nada é gravado e a resposta traz a prévia (planos a criar, já
+    existentes, perfis técnicos e materiais não cadastrados); senão tudo é
+    inserido numa única transação.
     """
-    # Sanitizar CNPJ para conter apenas dígitos
-    digits = "".join(ch for ch in cnpj if ch.isdigit())
-    if len(digits) != 14:
-        raise HTTPException(status_code=400, detail="CNPJ inválido. Informe 14 dígitos.")
+    from app.services import fleet_plans
 
-    url = f"https://brasilapi.com.br/api/cnpj/v1/{digits}"
+    mode = str(payload.get("mode", "")).lower()
+    if mode not in fleet_plans.MODES:
+        raise HTTPException(status_code=400, detail="Modo inválido. Use 'manual' ou 'internet'.")
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get(url)
-        if resp.status_code == 200:
-            data = resp.json()
-            company_name = (
-                data.get("razao_social")
-                or data.get("nome_fantasia")
-                or data.get("nome")
-            )
-            return {
-                "valid": True,
-                "cnpj": digits,
-                "company_name": company_name,
-                "raw": data,
-            }
-        elif resp.status_code == 404:
-            return {"valid": False, "cnpj": digits, "error": "CNPJ não encontrado"}
-        else:
-            # Resposta inesperada do provedor
-            return {
-                "valid": False,
-                "cnpj": digits,
-                "error": f"Erro do provedor (status {resp.status_code})"
-            }
+        equipment_ids = [int(i) for i in payload.get("equipment_ids") or []]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="equipment_ids deve ser uma lista de ids")
+    if not equipment_ids:
+        raise HTTPException(status_code=400, detail="Informe os equipamentos (equipment_ids)")
+    dry_run = bool(payload.get("dry_run", False))
+
+    groups, not_found = fleet_plans.load_groups(db, equipment_ids)
+    if not groups:
+        raise HTTPException(status_code=404, detail="Nenhum equipamento encontrado")
+    if mode == "manual":
+        fleet_plans.attach_manuals(db, groups)
+
+    try:
+        # Extração dos manuais (uma por grupo) fora do event loop
+        await asyncio.to_thread(fleet_plans.build_templates, groups, mode)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao gerar planos em lote: {str(e)}")
+
+    batch = fleet_plans.prepare(db, groups, profile_builder=build_technical_profile_for_equipment)
+    result = {"mode": mode, "dry_run": dry_run, "not_found": not_found, **batch.preview()}
+    if dry_run:
+        return result
+
+    try:
+        created = fleet_plans.apply(db, batch)
+        db.commit()
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"Erro ao consultar serviço externo: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Erro ao salvar planos em lote: {str(e)}")
+
+    for entry in result["equipments"]:
+        entry["plan_ids"] = created.get(entry["id"], [])
+    result["plans_created"] = sum(len(ids) for ids in created.values())
+    result["message"] = "Planos gerados com sucesso" if result["plans_created"] else "Nenhum plano gerado"
+    return result
+
+@router.get("/equipment/validate-cnpj", dependencies=[Depends(rate_limit("cnpj"))])
+async def validate_cnpj(cnpj: str, db: Session = Depends(get_db)):
+    """Validar CNPJ e retornar nome da empresa.
+    Dígitos verificadores conferidos localmente; razão social do cache (fornecedores e consultas
+    anteriores). Só CNPJ fora do cache consulta a BrasilAPI, e apenas se habilitada e acessível.
+    """
+    # Sanitizar CNPJ para conter apenas dígitos
+    digits = cnpj_registry.only_digits(cnpj)
+    if len(digits) != 14:
+        raise HTTPException(status_code=400, detail="CNPJ inválido. Informe 14 dígitos.")
+    return await cnpj_registry.validate(db, digits)
 
 @router.put("/equipment/{equipment_id}")
 async def update_equipment(equipment_id: int, equipment_data: dict, db: Session = Depends(get_db)):
@@ -2173,13 +2199,14 @@ async def save_weekly_hours(request_data: dict, db: Session = Depends(get_db)):
             setattr(existing, day, float(request_data.get(day, 0)))
         existing.total_hours = total_hours
         existing.updated_at = datetime.now()
+        sync_weekly_hours_calendar(existing)
         
         db.commit()
         db.refresh(existing)
         
         return {
             "message": "Horas semanais atualizadas com sucesso",
-            "weekly_hours": existing
+            "weekly_hours": serialize_weekly_hours(existing)
         }
     else:
         # Criar novo registro
@@ -2193,13 +2220,14 @@ async def save_weekly_hours(request_data: dict, db: Session = Depends(get_db)):
             weekly_hours_data[day] = float(request_data.get(day, 0))
         
         weekly_hours = WeeklyHours(**weekly_hours_data)
+        sync_weekly_hours_calendar(weekly_hours)
         db.add(weekly_hours)
         db.commit()
         db.refresh(weekly_hours)
         
         return {
             "message": "Horas semanais salvas com sucesso",
-            "weekly_hours": weekly_hours
+            "weekly_hours": serialize_weekly_hours(weekly_hours)
         }
 
 @router.post("/api/equipment/{equipment_id}/update-horimeter")
@@ -2558,7 +2586,8 @@ async def delete_equipment(equipment_id: int, db: Session = Depends(get_db)):
             db.delete(profile)
             db.flush()
 
-        # Remover horas semanais
+        # Remover horas semanais (e o calendário diário derivado)
+        db.query(WeeklyHoursDay).filter(WeeklyHoursDay.equipment_id == equipment_id).delete()
         db.query(WeeklyHours).filter(WeeklyHours.equipment_id == equipment_id).delete()
 
         # Excluir o equipamento
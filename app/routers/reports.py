@@ -2,10 +2,10 @@
 Router para relatórios e KPIs
 """
 
-from fastapi import APIRouter, Depends, Request
-import httpx
+from fastapi import APIRouter, Depends, Request, HTTPException
+from app.services.lazy_imports import lazy_module
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract
+from sqlalchemy import func, and_, extract, literal
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from app.database import get_db
@@ -24,11 +24,28 @@ from app.models.warehouse import (
 from app.templates_config import templates
 from app.models.construction import MacroStage, SubStage, Task, TaskMeasurement
 from pydantic import BaseModel
+import asyncio
 import os
-from app.services.llm_provider import llm_generate
+import time
+from app.services.llm_provider import latency as llm_latency, llm_generate, llm_stream, split_chunks
+from app.services.event_bus import format_sse
+from starlette.responses import StreamingResponse
+from app.services import warehouse_reports as warehouse_reports_service
+from app.services.http_cache import etag_guard
+from app.services.rate_limit import rate_limit
+from app.services.chat_pipeline import ChatSource, gather_sources, memoized, run_report
+from app.services import knowledge_index, cause_analytics
+
+httpx = lazy_module("httpx")  # carregado só na primeira chamada externa
 
 router = APIRouter()
 
+# ETag dos relatórios JSON: qualquer alteração de dados invalida; o balde de 60s
+# cobre os períodos padrão calculados a partir do relógio ("últimos N dias")
+REPORT_ETAG = Depends(etag_guard(bucket_seconds=60))
+# Depois do ETag: respostas 304 não consomem o limite
+REPORT_LIMIT = Depends(rate_limit("reports"))
+
 # Helper para abreviar nomes de categorias nos gráficos
 def abbreviate_category(name: Optional[str]) -> str:
     """Converte nomes de categoria longos em abreviações amigáveis para eixo de gráfico.
@@ -190,7 +207,7 @@ async def inventory_reports_alias(
     return await warehouse_reports(request, start_date, end_date, db)
 
 # KPIs de Manutenção
-@router.get("/kpis/mttr")
+@router.get("/kpis/mttr", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_mttr(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -228,7 +245,7 @@ async def get_mttr(
         "period": f"{start_date or 'início'} até {end_date or 'hoje'}"
     }
 
-@router.get("/kpis/mtbf")
+@router.get("/kpis/mtbf", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_mtbf(
     equipment_id: Optional[int] = None,
     start_date: Optional[str] = None,
@@ -269,7 +286,7 @@ async def get_mtbf(
         "equipment_id": equipment_id
     }
 
-@router.get("/maintenance-costs")
+@router.get("/maintenance-costs", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_maintenance_costs(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -318,7 +335,7 @@ async def get_maintenance_costs(
             for row in result
         ]
 
-@router.get("/maintenance-costs/breakdown")
+@router.get("/maintenance-costs/breakdown", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_maintenance_costs_breakdown(
     equipment: str,
     year: Optional[int] = None,
@@ -539,7 +556,7 @@ async def get_maintenance_costs_breakdown(
         }
     }
 
-@router.get("/technician-productivity")
+@router.get("/technician-productivity", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_technician_productivity(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -571,109 +588,44 @@ async def get_technician_productivity(
     ]
 
 # Relatórios de Almoxarifado
-@router.get("/abc-analysis")
-async def get_abc_analysis(db: Session = Depends(get_db)):
-    """Análise ABC do estoque"""
-    # Buscar materiais com valor de estoque
-    materials = db.query(Material).filter(Material.is_active == True).all()
-    
-    # Calcular valor de cada material
-    material_values = []
-    for material in materials:
-        value = material.current_stock * material.average_cost
-        material_values.append({
-            "id": material.id,
-            "code": material.code,
-            "name": material.name,
-            "stock_value": value,
-            "current_stock": material.current_stock,
-            "average_cost": material.average_cost
-        })
-    
-    # Ordenar por valor decrescente
-    material_values.sort(key=lambda x: x["stock_value"], reverse=True)
-    
-    # Calcular percentuais acumulados
-    total_value = sum(item["stock_value"] for item in material_values)
-    accumulated_percentage = 0
-    
-    for item in material_values:
-        percentage = (item["stock_value"] / total_value * 100) if total_value > 0 else 0
-        accumulated_percentage += percentage
-        
-        # Classificar ABC
-        if accumulated_percentage <= 80:
-            classification = "A"
-        elif accumulated_percentage <= 95:
-            classification = "B"
-        else:
-            classification = "C"
-        
-        item["percentage"] = round(percentage, 2)
-        item["accumulated_percentage"] = round(accumulated_percentage, 2)
-        item["classification"] = classification
-    
-    return {
-        "total_value": total_value,
-        "materials": material_values
-    }
+@router.get("/abc-analysis", dependencies=[REPORT_ETAG, REPORT_LIMIT])
+async def get_abc_analysis(
+    a_threshold: float = 80.0,
+    b_threshold: float = 95.0,
+    basis: str = "stock",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Análise ABC do estoque.
+    basis: "stock" (valor em estoque) ou "consumption" (consumo valorizado no período).
+    a_threshold/b_threshold: limites do percentual acumulado das classes A e B.
+    """
+    if not (0 < a_threshold <= b_threshold <= 100):
+        raise HTTPException(status_code=400, detail="Limites inválidos: use 0 < a_threshold <= b_threshold <= 100")
+    if basis not in ("stock", "consumption"):
+        raise HTTPException(status_code=400, detail="basis inválido: use 'stock' ou 'consumption'")
+    return warehouse_reports_service.abc_analysis(
+        db,
+        a_threshold=a_threshold,
+        b_threshold=b_threshold,
+        basis=basis,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
 
-@router.get("/stock-turnover")
+@router.get("/stock-turnover", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_stock_turnover(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Relatório de giro de estoque"""
-    # Período padrão: últimos 12 meses
-    if not start_date:
-        start_date = (datetime.now() - timedelta(days=365)).isoformat()
-    if not end_date:
-        end_date = datetime.now().isoformat()
-    
-    # Buscar saídas no período
-    movements = db.query(StockMovement).filter(
-        and_(
-            StockMovement.type == "Saída",
-            StockMovement.date >= datetime.fromisoformat(start_date),
-            StockMovement.date <= datetime.fromisoformat(end_date)
-        )
-    ).all()
-    
-    # Agrupar por material
-    material_consumption = {}
-    for movement in movements:
-        material_id = movement.material_id
-        if material_id not in material_consumption:
-            material_consumption[material_id] = 0
-        material_consumption[material_id] += movement.quantity
-    
-    # Calcular giro para cada material
-    turnover_data = []
-    for material_id, consumption in material_consumption.items():
-        material = db.query(Material).filter(Material.id == material_id).first()
-        if material and material.current_stock > 0:
-            # Giro = Consumo / Estoque Médio (aproximado pelo estoque atual)
-            turnover = consumption / material.current_stock
-            
-            turnover_data.append({
-                "material_code": material.code,
-                "material_name": material.name,
-                "consumption": consumption,
-                "current_stock": material.current_stock,
-                "turnover": round(turnover, 2),
-                "unit": material.unit
-            })
-    
-    # Ordenar por giro decrescente
-    turnover_data.sort(key=lambda x: x["turnover"], reverse=True)
-    
-    return {
-        "period": f"{start_date} até {end_date}",
-        "materials": turnover_data
-    }
+    """Relatório de giro de estoque (padrão: últimos 12 meses)"""
+    return warehouse_reports_service.stock_turnover(db, start_date, end_date)
+
 
-@router.get("/supplier-performance")
+@router.get("/supplier-performance", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_supplier_performance(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -712,55 +664,88 @@ async def get_supplier_performance(
 # Relatórios de Manutenção - KPIs Avançados e Gráficos
 # ------------------------------
 
-@router.get("/availability")
+def _equipment_rows(db: Session):
+    """Cadastro de equipamentos (colunas usadas pelos relatórios), memoizado no chat de IA."""
+    return memoized("equipment_rows", lambda: db.query(
+        Equipment.id, Equipment.prefix, Equipment.name, Equipment.model,
+        Equipment.category, Equipment.equipment_class
+    ).all())
+
+
+def _closed_work_orders(db: Session, start_date: Optional[str], end_date: Optional[str]):
+    """OS fechadas no período (só as colunas dos KPIs), compartilhadas por MTTR e MTBF no chat de IA."""
+    def load():
+        query = db.query(
+            WorkOrder.equipment_id, WorkOrder.type, WorkOrder.started_at, WorkOrder.completed_at
+        ).filter(WorkOrder.status == "Fechada")
+        if start_date:
+            query = query.filter(WorkOrder.completed_at >= datetime.fromisoformat(start_date))
+        if end_date:
+            query = query.filter(WorkOrder.completed_at <= datetime.fromisoformat(end_date))
+        return query.order_by(WorkOrder.completed_at).all()
+    return memoized(("closed_work_orders", start_date, end_date), load)
+
+
+def _availability_report(
+    db: Session,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    shift_ids: Optional[str],
+    working_days: Optional[str],
+    granularity: Optional[str]
+):
+    """Executa o motor de disponibilidade para todos os equipamentos no período."""
+    from app.models.equipment import Equipment
+    from app.services import availability as availability_engine
+
+    if granularity and granularity not in availability_engine.GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity inválida: use 'day', 'week' ou 'month'")
+    try:
+        calendar = availability_engine.load_calendar(db, shift_ids, working_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Calendário inválido: {e}")
+
+    start, end = availability_engine.report_window(start_date, end_date)
+    rows = availability_engine.load_downtime_rows(db, start, end)
+    equipments = _equipment_rows(db)
+    result = availability_engine.compute_availability(
+        rows,
+        [eq.id for eq in equipments],
+        start,
+        end,
+        calendar=calendar,
+        granularity=granularity,
+        open_until=min(end, datetime.now())
+    )
+    result["work_orders_count"] = len(rows)
+    result["calendar"] = calendar.describe()
+    return equipments, result
+
+@router.get("/availability", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_availability(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     group_by: str = "category",
+    shift_ids: Optional[str] = None,
+    working_days: Optional[str] = None,
+    granularity: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Disponibilidade por classe/categoria e média geral.
-    Fórmula utilizada: disponibilidade = 1 - (horas de parada / horas totais possíveis no período).
-    Horas de parada são aproximadas pela duração das OS corretivas fechadas no período.
-    Horas totais possíveis = dias no período * 24."""
-    from datetime import date
-    from app.models.equipment import Equipment
-    
-    # Período padrão: últimos 30 dias
-    end_dt = datetime.fromisoformat(end_date) if end_date else datetime.now()
-    start_dt = datetime.fromisoformat(start_date) if start_date else (end_dt - timedelta(days=30))
-    
-    total_hours_possible = max(1, ((end_dt.date() - start_dt.date()).days + 1) * 24)
-    
-    # Downtime por equipamento (OS corretivas fechadas)
-    wo_query = db.query(WorkOrder).filter(
-        and_(
-            WorkOrder.type == "Corretiva",
-            WorkOrder.status == "Fechada",
-            WorkOrder.started_at.isnot(None),
-            WorkOrder.completed_at.isnot(None),
-            WorkOrder.completed_at >= start_dt,
-            WorkOrder.completed_at <= end_dt
-        )
-    )
-    # Carregar OS e derivar flags/contagem
-    work_orders = wo_query.all()
-    work_orders_count = len(work_orders)
-    has_data = work_orders_count > 0
-
-    equipment_downtime = {}
-    for wo in work_orders:
-        duration_h = max(0.0, (wo.completed_at - wo.started_at).total_seconds() / 3600)
-        equipment_downtime[wo.equipment_id] = equipment_downtime.get(wo.equipment_id, 0.0) + duration_h
+    Fórmula utilizada: disponibilidade = 1 - (horas de parada / horas de operação no período).
+    Paradas: OS corretivas (fechadas ou em andamento), unidas quando se sobrepõem e recortadas no período.
+    Horas de operação: 24h por dia, ou os turnos do RH (shift_ids="all" ou "1,2") nos dias
+    working_days ("0,1,2,3,4", 0=segunda). granularity=day|week|month inclui a série temporal."""
+    equipments, result = _availability_report(db, start_date, end_date, shift_ids, working_days, granularity)
+    per_equipment = result["equipments"]
+    work_orders_count = result["work_orders_count"]
     
     # Agrupar por classe/categoria
-    equipments = db.query(Equipment).all()
     grouped = {}
     availabilities = []
     
     for eq in equipments:
-        downtime = equipment_downtime.get(eq.id, 0.0)
-        availability = max(0.0, 1.0 - (downtime / total_hours_possible)) * 100
+        availability = per_equipment[eq.id]["availability_percent"]
         availabilities.append(availability)
         label = None
         if group_by == "class":
@@ -780,51 +765,37 @@ async def get_availability(
     ]
     overall = round(sum(availabilities)/len(availabilities), 2) if availabilities else 0
     
-    return {"grouped": grouped_result, "overall": overall, "period_hours": total_hours_possible, "has_data": has_data, "work_orders_count": work_orders_count}
+    response = {
+        "grouped": grouped_result,
+        "overall": overall,
+        "period_hours": round(result["operating_hours"], 2),
+        "has_data": work_orders_count > 0,
+        "work_orders_count": work_orders_count,
+        "calendar": result["calendar"]
+    }
+    if granularity:
+        response["series"] = result["series"]
+    return response
 
-@router.get("/availability/details")
+@router.get("/availability/details", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_availability_details(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     group_by: str = "class",
     label: Optional[str] = None,
+    shift_ids: Optional[str] = None,
+    working_days: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
     """Detalhamento de disponibilidade por equipamento para uma classe/categoria específica.
-    Fórmula: disponibilidade = 1 - (horas de parada / horas totais possíveis no período).
-    Horas de parada aproximadas pela duração das OS corretivas fechadas no período.
+    Mesmo cálculo de /availability (paradas unidas e recortadas, calendário de operação).
     """
-    from app.models.equipment import Equipment
-
-    # Período padrão: últimos 30 dias
-    end_dt = datetime.fromisoformat(end_date) if end_date else datetime.now()
-    start_dt = datetime.fromisoformat(start_date) if start_date else (end_dt - timedelta(days=30))
-    total_hours_possible = max(1, ((end_dt.date() - start_dt.date()).days + 1) * 24)
-
-    # Downtime por equipamento (OS corretivas fechadas)
-    wo_query = db.query(WorkOrder).filter(
-        and_(
-            WorkOrder.type == "Corretiva",
-            WorkOrder.status == "Fechada",
-            WorkOrder.started_at.isnot(None),
-            WorkOrder.completed_at.isnot(None),
-            WorkOrder.completed_at >= start_dt,
-            WorkOrder.completed_at <= end_dt
-        )
-    )
-    # Carregar OS e derivar flags/contagem
-    work_orders = wo_query.all()
-    work_orders_count = len(work_orders)
-    has_data = work_orders_count > 0
-
-    equipment_downtime: dict[int, float] = {}
-    for wo in work_orders:
-        duration_h = max(0.0, (wo.completed_at - wo.started_at).total_seconds() / 3600)
-        equipment_downtime[wo.equipment_id] = equipment_downtime.get(wo.equipment_id, 0.0) + duration_h
+    equipments, result = _availability_report(db, start_date, end_date, shift_ids, working_days, None)
+    per_equipment = result["equipments"]
+    work_orders_count = result["work_orders_count"]
 
     # Preparar lista por equipamento e filtrar pelo agrupamento/label solicitado
     items = []
-    equipments = db.query(Equipment).all()
     for eq in equipments:
         # Determinar rótulo de agrupamento
         if group_by == "class":
@@ -838,15 +809,16 @@ async def get_availability_details(
         if label and grp_label != label:
             continue
 
-        downtime = equipment_downtime.get(eq.id, 0.0)
-        availability = max(0.0, 1.0 - (downtime / total_hours_possible)) * 100.0
+        stats = per_equipment[eq.id]
         items.append({
             "equipment_id": eq.id,
             "equipment": f"{eq.name}" if getattr(eq, "name", None) else (getattr(eq, "prefix", None) or f"Eq #{eq.id}"),
             "prefix": getattr(eq, "prefix", None),
             "class": getattr(eq, "equipment_class", None),
             "category": getattr(eq, "category", None),
-            "availability_percent": round(float(availability), 2)
+            "availability_percent": round(float(stats["availability_percent"]), 2),
+            "downtime_hours": stats["downtime_hours"],
+            "operating_hours": stats["operating_hours"]
         })
 
     # Ordenar por disponibilidade decrescente para facilitar leitura
@@ -855,14 +827,15 @@ async def get_availability_details(
     return {
         "group_by": group_by,
         "label": label or "",
-        "period_hours": total_hours_possible,
+        "period_hours": round(result["operating_hours"], 2),
         "count": len(items),
         "items": items,
-        "has_data": has_data,
-        "work_orders_count": work_orders_count
+        "has_data": work_orders_count > 0,
+        "work_orders_count": work_orders_count,
+        "calendar": result["calendar"]
     }
 
-@router.get("/utilization")
+@router.get("/utilization", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_utilization(
     year: Optional[int] = None,
     month: Optional[int] = None,
@@ -872,45 +845,44 @@ async def get_utilization(
 ):
     """Utilização por classe/categoria e média geral.
     Utilização = horas operacionais / capacidade (franquia mensal*meses ou 160h*meses se franquia ausente).
-    Horas operacionais obtidas de WeeklyHours."""
+    Horas operacionais obtidas das horas diárias de WeeklyHours no intervalo (semana ISO, mês ou ano)."""
     from datetime import date
-    from app.models.equipment import Equipment, WeeklyHours
+    from app.models.equipment import Equipment
+    from app.services.weekly_hours import iso_week_bounds, month_bounds, hours_by_equipment
     
-    # Carregar horas semanais
-    hours_query = db.query(WeeklyHours)
+    # Intervalo de datas do filtro (semanas que cruzam o mês são repartidas por dia)
+    start = end = None
+    valid_range = True
     if week:
-        hours_query = hours_query.filter(WeeklyHours.week == week)
-    if year:
-        hours_query = hours_query.filter(WeeklyHours.week.like(f"{year}-%"))
-    hours = hours_query.all()
-    has_data = len(hours) > 0
-    
-    # Filtrar por mês via cálculo do primeiro dia da semana ISO
-    def week_month(wh):
-        try:
-            parts = wh.week.split("-W")
-            y = int(parts[0]); w = int(parts[1])
-            d = date.fromisocalendar(y, w, 1)
-            return d.month
-        except:
-            return None
-    
-    if month:
-        hours = [h for h in hours if week_month(h) == month]
-    
-    # Agregar horas por equipamento
-    equipment_hours = {}
-    for h in hours:
-        equipment_hours[h.equipment_id] = equipment_hours.get(h.equipment_id, 0.0) + (h.total_hours or 0.0)
+        bounds = iso_week_bounds(week)
+        if bounds:
+            start, end = bounds
+        else:
+            valid_range = False
+    elif month:
+        start, end = month_bounds(year or date.today().year, month)
+    elif year:
+        start, end = date(year, 1, 1), date(year, 12, 31)
+    
+    hours_sq = hours_by_equipment(db, start, end)
+    hours_col = func.coalesce(hours_sq.c.hours, 0.0) if valid_range else literal(0.0)
+    rows = db.query(
+        Equipment.id,
+        Equipment.monthly_quota,
+        Equipment.category,
+        Equipment.equipment_class,
+        hours_col.label("hours"),
+        hours_sq.c.equipment_id.label("hours_equipment_id")
+    ).outerjoin(hours_sq, hours_sq.c.equipment_id == Equipment.id).all()
+    has_data = valid_range and any(r.hours_equipment_id is not None for r in rows)
     
-    equipments = db.query(Equipment).all()
     grouped = {}
     utilizations = []
     months_count = 1 if month else (12 if year and not week else (0.25 if week else 1))
     base_month_hours = 160.0  # fallback quando não há franquia
     
-    for eq in equipments:
-        oper_hours = equipment_hours.get(eq.id, 0.0)
+    for eq in rows:
+        oper_hours = float(eq.hours or 0.0)
         capacity = (eq.monthly_quota or base_month_hours) * months_count
         util = 0.0
         if capacity > 0:
@@ -920,7 +892,7 @@ async def get_utilization(
         if group_by == "class":
             label = eq.equipment_class or "Sem classe"
         elif group_by == "category":
-            label = abbreviate_category(eq.category) if (eq and eq.category) else "Sem categoria"
+            label = abbreviate_category(eq.category) if eq.category else "Sem categoria"
         else:
             label = "Geral"
         if label not in grouped:
@@ -935,7 +907,7 @@ async def get_utilization(
     
     return {"grouped": grouped_result, "overall": overall, "has_data": has_data}
 
-@router.get("/kpis/mttr-grouped")
+@router.get("/kpis/mttr-grouped", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_mttr_grouped(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -943,37 +915,27 @@ async def get_mttr_grouped(
     db: Session = Depends(get_db)
 ):
     """MTTR agrupado por equipamento ou categoria."""
-    from app.models.equipment import Equipment
-    query = db.query(WorkOrder).filter(
-        and_(
-            WorkOrder.status == "Fechada",
-            WorkOrder.completed_at.isnot(None),
-            WorkOrder.started_at.isnot(None)
-        )
-    )
-    if start_date:
-        query = query.filter(WorkOrder.completed_at >= datetime.fromisoformat(start_date))
-    if end_date:
-        query = query.filter(WorkOrder.completed_at <= datetime.fromisoformat(end_date))
-    
-    wos = query.all()
+    wos = [wo for wo in _closed_work_orders(db, start_date, end_date)
+           if wo.completed_at is not None and wo.started_at is not None]
     if not wos:
         return {"grouped": [], "overall": 0}
     
     # Mapear equipamento
-    equipments_map = {eq.id: eq for eq in db.query(Equipment).all()}
+    equipments_map = {eq.id: eq for eq in _equipment_rows(db)}
     grouped = {}
     mttrs = []
+    labels = {}  # rótulo calculado uma vez por equipamento
     for wo in wos:
         mttr_h = max(0.0, (wo.completed_at - wo.started_at).total_seconds() / 3600)
         mttrs.append(mttr_h)
-        label = None
-        if group_by == "equipment":
+        label = labels.get(wo.equipment_id)
+        if label is None:
             eq = equipments_map.get(wo.equipment_id)
-            label = (eq.prefix if eq else f"Eq {wo.equipment_id}")
-        else:
-            eq = equipments_map.get(wo.equipment_id)
-            label = abbreviate_category(eq.category) if (eq and eq.category) else "Sem categoria"
+            if group_by == "equipment":
+                label = (eq.prefix if eq else f"Eq {wo.equipment_id}")
+            else:
+                label = abbreviate_category(eq.category) if (eq and eq.category) else "Sem categoria"
+            labels[wo.equipment_id] = label
         grouped.setdefault(label, []).append(mttr_h)
     
     grouped_result = [
@@ -982,7 +944,7 @@ async def get_mttr_grouped(
     overall = round(sum(mttrs)/len(mttrs), 2)
     return {"grouped": grouped_result, "overall": overall}
 
-@router.get("/kpis/mtbf-grouped")
+@router.get("/kpis/mtbf-grouped", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_mtbf_grouped(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -990,20 +952,11 @@ async def get_mtbf_grouped(
     db: Session = Depends(get_db)
 ):
     """MTBF agrupado por equipamento ou categoria (apenas OS corretivas fechadas)."""
-    from app.models.equipment import Equipment
-    query = db.query(WorkOrder).filter(
-        and_(WorkOrder.type == "Corretiva", WorkOrder.status == "Fechada")
-    )
-    if start_date:
-        query = query.filter(WorkOrder.completed_at >= datetime.fromisoformat(start_date))
-    if end_date:
-        query = query.filter(WorkOrder.completed_at <= datetime.fromisoformat(end_date))
-    
-    wos = query.order_by(WorkOrder.completed_at).all()
+    wos = [wo for wo in _closed_work_orders(db, start_date, end_date) if wo.type == "Corretiva"]
     if not wos:
         return {"grouped": [], "overall": 0}
     
-    equipments_map = {eq.id: eq for eq in db.query(Equipment).all()}
+    equipments_map = {eq.id: eq for eq in _equipment_rows(db)}
     grouped = {}
     intervals_all = []
     # Agrupar por equipamento primeiro
@@ -1033,7 +986,26 @@ async def get_mtbf_grouped(
     overall = round(sum(intervals_all)/len(intervals_all), 2) if intervals_all else 0
     return {"grouped": grouped_result, "overall": overall}
 
-@router.get("/backlog")
+@router.get("/kpis/failure-causes", dependencies=[REPORT_ETAG, REPORT_LIMIT])
+async def get_failure_causes(
+    category: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: int = 20,
+    min_orders: int = 2,
+    db: Session = Depends(get_db)
+):
+    """Causas de falha e termos mais característicos das OS corretivas fechadas da categoria
+    (TF-IDF e lift contra as demais categorias), com contagem e custo. Período em meses completos;
+    padrão: últimos 12 meses."""
+    end = datetime.fromisoformat(end_date) if end_date else datetime.now()
+    start = datetime.fromisoformat(start_date) if start_date else end - timedelta(days=365)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date deve ser anterior a end_date")
+    return cause_analytics.rank_causes(db, category or None, start, end,
+                                       limit=max(1, min(limit, 200)), min_orders=max(1, min_orders))
+
+@router.get("/backlog", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_backlog(
     year: Optional[int] = None,
     group_by: str = "month",
@@ -1061,7 +1033,7 @@ async def get_backlog(
     evolution = [{"month": int(r.month), "count": int(r.count)} for r in result]
     return {"current_backlog": current_backlog, "evolution": evolution, "year": year}
 
-@router.get("/fuel-consumption")
+@router.get("/fuel-consumption", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_fuel_consumption(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1072,23 +1044,27 @@ async def get_fuel_consumption(
     from app.models.warehouse import Fueling
     from app.models.equipment import Equipment
     
-    query = db.query(Fueling)
+    query = db.query(Fueling.equipment_id, Fueling.quantity, Fueling.total_cost)
     if start_date:
         query = query.filter(Fueling.date >= datetime.fromisoformat(start_date))
     if end_date:
         query = query.filter(Fueling.date <= datetime.fromisoformat(end_date))
     fuelings = query.all()
     
-    equipments_map = {eq.id: eq for eq in db.query(Equipment).all()}
+    equipments_map = {eq.id: eq for eq in _equipment_rows(db)}
     grouped = {}
+    labels = {}  # rótulo calculado uma vez por equipamento
     for f in fuelings:
-        eq = equipments_map.get(f.equipment_id)
-        if group_by == "model":
-            label = (eq.model if eq else None) or "Sem modelo"
-        elif group_by == "category":
-            label = abbreviate_category(eq.category) if (eq and eq.category) else "Sem categoria"
-        else:
-            label = (eq.prefix if eq else f"Eq {f.equipment_id}")
+        label = labels.get(f.equipment_id)
+        if label is None:
+            eq = equipments_map.get(f.equipment_id)
+            if group_by == "model":
+                label = (eq.model if eq else None) or "Sem modelo"
+            elif group_by == "category":
+                label = abbreviate_category(eq.category) if (eq and eq.category) else "Sem categoria"
+            else:
+                label = (eq.prefix if eq else f"Eq {f.equipment_id}")
+            labels[f.equipment_id] = label
         grouped.setdefault(label, {"total_quantity": 0.0, "events": 0, "total_cost": 0.0})
         grouped[label]["total_quantity"] += (f.quantity or 0.0)
         grouped[label]["events"] += 1
@@ -1105,54 +1081,41 @@ async def get_fuel_consumption(
         })
     return {"grouped": result}
 
-@router.get("/exceeded-quota")
+@router.get("/exceeded-quota", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_exceeded_quota(
     year: int,
     month: int,
     category: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Equipamentos que ultrapassaram a franquia mensal de horas."""
-    from datetime import date
-    from app.models.equipment import Equipment, WeeklyHours
-    
-    hours = db.query(WeeklyHours).filter(WeeklyHours.week.like(f"{year}-%")).all()
-    # Filtrar por mês pela data de segunda-feira da semana ISO
-    def week_month(wh):
-        try:
-            parts = wh.week.split("-W")
-            y = int(parts[0]); w = int(parts[1])
-            d = date.fromisocalendar(y, w, 1)
-            return d.month
-        except:
-            return None
-    hours = [h for h in hours if week_month(h) == month]
+    """Equipamentos que ultrapassaram a franquia mensal de horas.
+    Considera apenas os dias do mês (semanas na virada do mês são repartidas)."""
+    from app.models.equipment import Equipment
+    from app.services.weekly_hours import month_bounds, hours_by_equipment
     
-    equipments = db.query(Equipment).all()
-    eq_map = {e.id: e for e in equipments}
+    start, end = month_bounds(year, month)
+    hours_sq = hours_by_equipment(db, start, end)
+    query = db.query(Equipment, hours_sq.c.hours).join(
+        hours_sq, hours_sq.c.equipment_id == Equipment.id
+    ).filter(
+        Equipment.monthly_quota > 0,
+        hours_sq.c.hours > Equipment.monthly_quota
+    )
     if category:
-        equipments = [e for e in equipments if (e.category or "") == category]
-    
-    # Somar horas por equipamento
-    total_hours = {}
-    for h in hours:
-        if h.equipment_id in eq_map:
-            total_hours[h.equipment_id] = total_hours.get(h.equipment_id, 0.0) + (h.total_hours or 0.0)
+        query = query.filter(func.coalesce(Equipment.category, "") == category)
     
     exceeded = []
-    for eq in equipments:
-        quota = eq.monthly_quota or 0.0
-        used = total_hours.get(eq.id, 0.0)
-        if quota and used > quota:
-            exceeded.append({
-                "equipment": f"{eq.prefix} - {eq.name}",
-                "category": eq.category or "Sem categoria",
-                "class": eq.equipment_class or "Sem classe",
-                "monthly_quota": quota,
-                "used_hours": round(used, 2),
-                "exceeded_hours": round(used - quota, 2),
-                "percentage": round((used / quota) * 100.0, 2)
-            })
+    for eq, used in query.order_by(Equipment.id).all():
+        quota = eq.monthly_quota
+        exceeded.append({
+            "equipment": f"{eq.prefix} - {eq.name}",
+            "category": eq.category or "Sem categoria",
+            "class": eq.equipment_class or "Sem classe",
+            "monthly_quota": quota,
+            "used_hours": round(used, 2),
+            "exceeded_hours": round(used - quota, 2),
+            "percentage": round((used / quota) * 100.0, 2)
+        })
     
     # Comparativo por classe e categoria
     from collections import defaultdict
@@ -1260,117 +1223,187 @@ def _format_top(items, key, n=3, suffix=""):
         return ""
 
 
-@router.post("/maintenance/ai-chat")
-async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_db)):
-    """Gera respostas textuais baseadas nos endpoints existentes, considerando os filtros atuais.
-    Opcionalmente usa provedor externo (Copilot) para melhorar a redação com os mesmos dados.
-    """
-    # Extrair última pergunta do usuário
-    user_msg = ""
-    for m in (payload.messages or [])[::-1]:
-        if (m.role or "").lower() == "user":
-            user_msg = m.content or ""
-            break
-    intent = _detect_intent_pt(user_msg)
+# Prazo total da coleta de dados + refino do chat (segundos); o que não chegar a tempo fica de fora
+AI_CHAT_DEADLINE = float(os.getenv("AI_CHAT_DEADLINE", "12"))
+
+# Fontes de dados por intenção (ordem das frases na resposta)
+_CHAT_PLAN = {
+    "overview": ("availability", "utilization", "mttr", "mtbf", "costs", "backlog", "fuel"),
+    "availability": ("availability",),
+    "utilization": ("utilization",),
+    "mttr": ("mttr",),
+    "mtbf": ("mtbf",),
+    "costs": ("costs",),
+    "backlog": ("backlog",),
+    "fuel": ("fuel",),
+    "quota": ("quota",),
+    "equipment_count": ("equipment_count",),
+}
 
-    start_date, end_date, period_label = _resolve_period_from_filters(payload.filters or {})
-    replies = []
-    sources = []
+_CHAT_SOURCE_LABELS = {
+    "availability": "disponibilidade", "utilization": "utilização", "mttr": "MTTR", "mtbf": "MTBF",
+    "costs": "custos", "backlog": "backlog", "fuel": "combustível", "quota": "franquia",
+    "equipment_count": "cadastro de equipamentos", "web": "busca na web", "causes": "histórico de OS",
+}
+
+# Base interna (índice local) como fonte principal; a web só sem resultado interno (e se permitida)
+AI_CHAT_WEB_SEARCH = os.getenv("AI_CHAT_WEB_SEARCH", "1").lower() not in ("0", "false", "no")
+_KNOWLEDGE_INTENTS = ("parts_lookup", "fluid_spec", "troubleshoot")
+_KNOWLEDGE_LIMIT = 5
 
-    # Disponibilidade
-    if intent in ("availability", "overview"):
-        data_cat = await get_availability(start_date=start_date, end_date=end_date, group_by="category", db=db)
-        overall = data_cat.get("overall", 0)
-        top_low = _format_top(data_cat.get("grouped", []), "availability_percent", 3, "%")
-        replies.append(f"Disponibilidade média: {overall:.2f}%. Categorias com menor disponibilidade: {top_low or '—'}.")
-        sources.append("/api/reports/availability?group_by=category")
+def _rank_causes_by_internal_data(session: Session, category: Optional[str], lookback_days: int = 365) -> List[Dict[str, Any]]:
+    """Causas ordenadas pelo TF-IDF nas OS corretivas fechadas no período (estatísticas de cause_analytics)."""
+    now = datetime.now()
+    ranking = cause_analytics.rank_causes(session, category, now - timedelta(days=lookback_days), now)
+    found = {c["cause"]: c for c in ranking["causes"]}
+    ranked = []
+    for key in cause_analytics.CAUSE_KEYWORDS:
+        item = found.get(key, {})
+        ranked.append({"key": key, "score": item.get("score", 0), "orders": item.get("orders", 0),
+                       "cost": item.get("cost", 0.0)})
+    return sorted(ranked, key=lambda x: (x["score"], x["orders"]), reverse=True)
 
-    # Utilização
-    if intent in ("utilization", "overview"):
+
+def _render_knowledge(hits: List[knowledge_index.Hit]) -> List[str]:
+    lines = ["Na base interna (OS, planos, checklists e manuais):"]
+    for idx, hit in enumerate(hits, 1):
+        lines.append(f"{idx}. {hit.title} — {hit.snippet}")
+    return lines
+
+
+def _chat_sources(filters: Dict[str, Any], start_date, end_date) -> Dict[str, ChatSource]:
+    """Fontes de dados do chat: cada uma busca numa thread (sessão própria) e gera uma frase."""
+
+    def utilization(db):
         # Utilização usa ano/semana. Quando período não especificado, tenta derivar de start/end -> ano
         year = None
-        if payload.filters and payload.filters.get("year"):
-            try: year = int(payload.filters.get("year"))
+        if filters.get("year"):
+            try: year = int(filters.get("year"))
             except: year = None
-        util = await get_utilization(year=year, week=payload.filters.get("week") if (payload.filters) else None, group_by="category", db=db)
-        util_overall = util.get("overall", 0)
-        top_util = _format_top(util.get("grouped", []), "utilization_percent", 3, "%")
-        replies.append(f"Utilização média: {util_overall:.2f}%. Maiores utilizações por categoria: {top_util or '—'}.")
-        sources.append("/api/reports/utilization?group_by=category")
-
-    # MTTR
-    if intent in ("mttr", "overview"):
-        mttr_g = await get_mttr_grouped(start_date=start_date, end_date=end_date, group_by="category", db=db)
-        mttr_overall = mttr_g.get("overall", 0)
-        worst_mttr = _format_top(mttr_g.get("grouped", []), "mttr_hours", 3, "h")
-        replies.append(f"MTTR médio: {mttr_overall:.2f} h. Maiores MTTR por categoria: {worst_mttr or '—'}.")
-        sources.append("/api/reports/kpis/mttr-grouped?group_by=category")
-
-    # MTBF
-    if intent in ("mtbf", "overview"):
-        mtbf_g = await get_mtbf_grouped(start_date=start_date, end_date=end_date, group_by="category", db=db)
-        mtbf_overall = mtbf_g.get("overall", 0)
-        best_mtbf = _format_top(mtbf_g.get("grouped", []), "mtbf_hours", 3, "h")
-        replies.append(f"MTBF médio: {mtbf_overall:.2f} h. Maiores MTBF por categoria: {best_mtbf or '—'}.")
-        sources.append("/api/reports/kpis/mtbf-grouped?group_by=category")
-
-    # Custos
-    if intent in ("costs", "overview"):
-        costs_eq = await get_maintenance_costs(start_date=start_date, end_date=end_date, group_by="equipment", db=db)
-        # Top 3 por custo
-        try:
-            top_costs = sorted(costs_eq, key=lambda x: x.get("total_cost", 0), reverse=True)[:3]
-            top_costs_str = ", ".join([f"{c['equipment']} (R$ {float(c['total_cost']):,.2f})" for c in top_costs])
-        except Exception:
-            top_costs_str = ""
-        replies.append(f"Custos por equipamento (top 3): {top_costs_str or '—'}.")
-        sources.append("/api/reports/maintenance-costs?group_by=equipment")
+        return run_report(get_utilization(year=year, week=filters.get("week"), group_by="category", db=db))
 
-    # Backlog
-    if intent in ("backlog", "overview"):
+    def backlog(db):
         from datetime import datetime as _dt
         year = None
         try:
-            if payload.filters and payload.filters.get("year"):
-                year = int(payload.filters.get("year"))
+            if filters.get("year"):
+                year = int(filters.get("year"))
         except:
             year = _dt.now().year
-        backlog = await get_backlog(year=year, group_by="month", db=db)
-        replies.append(f"Backlog atual (OS abertas): {backlog.get('current_backlog', 0)}.")
-        sources.append("/api/reports/backlog")
+        return run_report(get_backlog(year=year, group_by="month", db=db))
 
-    # Combustível
-    if intent in ("fuel", "overview"):
-        fuel = await get_fuel_consumption(start_date=start_date, end_date=end_date, group_by="category", db=db)
+    def quota(db):
+        # Requer ano/mês
         try:
-            top_fuel = sorted(fuel.get("grouped", []), key=lambda x: x.get("avg_consumption", 0), reverse=True)[:3]
-            top_fuel_str = ", ".join([f"{c['label']} ({c['avg_consumption']} L/evento)" for c in top_fuel])
+            y = int(filters.get("year")) if filters.get("year") else datetime.now().year
+            m = int(filters.get("month")) if filters.get("month") else datetime.now().month
         except Exception:
-            top_fuel_str = ""
-        replies.append(f"Consumo médio de combustível (top categorias): {top_fuel_str or '—'}.")
-        sources.append("/api/reports/fuel-consumption?group_by=category")
+            y = datetime.now().year; m = datetime.now().month
+        data = run_report(get_exceeded_quota(year=y, month=m, category=filters.get("category"), db=db))
+        return y, m, data
 
-    # Excedentes de franquia
-    if intent in ("quota",):
-        # Requer ano/mês
+    def equipment_count(db):
         try:
-            y = int(payload.filters.get("year")) if payload.filters and payload.filters.get("year") else datetime.now().year
-            m = int(payload.filters.get("month")) if payload.filters and payload.filters.get("month") else datetime.now().month
+            return db.query(Equipment).count()
         except Exception:
-            y = datetime.now().year; m = datetime.now().month
-        quota = await get_exceeded_quota(year=y, month=m, category=payload.filters.get("category") if payload.filters else None, db=db)
-        qtd = len(quota.get("list", []))
-        replies.append(f"Equipamentos que excederam a franquia em {y}-{m:02d}: {qtd}.")
-        sources.append("/api/reports/exceeded-quota")
+            return 0
 
-    # Contagem de equipamentos cadastrados
-    if intent in ("equipment_count",):
+    def render_costs(costs_eq):
+        # Top 3 por custo
         try:
-            total = db.query(Equipment).count()
+            top_costs = sorted(costs_eq, key=lambda x: x.get("total_cost", 0), reverse=True)[:3]
+            top_costs_str = ", ".join([f"{c['equipment']} (R$ {float(c['total_cost']):,.2f})" for c in top_costs])
         except Exception:
-            total = 0
-        replies.append(f"Há {total} equipamentos cadastrados no sistema.")
-        sources.append("/api/maintenance/equipment/list")
+            top_costs_str = ""
+        return f"Custos por equipamento (top 3): {top_costs_str or '—'}."
+
+    def render_fuel(fuel):
+        try:
+            top_fuel = sorted(fuel.get("grouped", []), key=lambda x: x.get("avg_consumption", 0), reverse=True)[:3]
+            top_fuel_str = ", ".join([f"{c['label']} ({c['avg_consumption']} L/evento)" for c in top_fuel])
+        except Exception:
+            top_fuel_str = ""
+        return f"Consumo médio de combustível (top categorias): {top_fuel_str or '—'}."
+
+    def render_quota(result):
+        y, m, data = result
+        return f"Equipamentos que excederam a franquia em {y}-{m:02d}: {len(data.get('list', []))}."
+
+    return {
+        "availability": ChatSource(
+            "/api/reports/availability?group_by=category",
+            lambda db: run_report(get_availability(start_date=start_date, end_date=end_date, group_by="category", db=db)),
+            lambda d: (f"Disponibilidade média: {d.get('overall', 0):.2f}%. Categorias com menor disponibilidade: "
+                       f"{_format_top(d.get('grouped', []), 'availability_percent', 3, '%') or '—'}."),
+        ),
+        "utilization": ChatSource(
+            "/api/reports/utilization?group_by=category",
+            utilization,
+            lambda d: (f"Utilização média: {d.get('overall', 0):.2f}%. Maiores utilizações por categoria: "
+                       f"{_format_top(d.get('grouped', []), 'utilization_percent', 3, '%') or '—'}."),
+        ),
+        "mttr": ChatSource(
+            "/api/reports/kpis/mttr-grouped?group_by=category",
+            lambda db: run_report(get_mttr_grouped(start_date=start_date, end_date=end_date, group_by="category", db=db)),
+            lambda d: (f"MTTR médio: {d.get('overall', 0):.2f} h. Maiores MTTR por categoria: "
+                       f"{_format_top(d.get('grouped', []), 'mttr_hours', 3, 'h') or '—'}."),
+        ),
+        "mtbf": ChatSource(
+            "/api/reports/kpis/mtbf-grouped?group_by=category",
+            lambda db: run_report(get_mtbf_grouped(start_date=start_date, end_date=end_date, group_by="category", db=db)),
+            lambda d: (f"MTBF médio: {d.get('overall', 0):.2f} h. Maiores MTBF por categoria: "
+                       f"{_format_top(d.get('grouped', []), 'mtbf_hours', 3, 'h') or '—'}."),
+        ),
+        "costs": ChatSource(
+            "/api/reports/maintenance-costs?group_by=equipment",
+            lambda db: run_report(get_maintenance_costs(start_date=start_date, end_date=end_date, group_by="equipment", db=db)),
+            render_costs,
+        ),
+        "backlog": ChatSource(
+            "/api/reports/backlog",
+            backlog,
+            lambda d: f"Backlog atual (OS abertas): {d.get('current_backlog', 0)}.",
+        ),
+        "fuel": ChatSource(
+            "/api/reports/fuel-consumption?group_by=category",
+            lambda db: run_report(get_fuel_consumption(start_date=start_date, end_date=end_date, group_by="category", db=db)),
+            render_fuel,
+        ),
+        "quota": ChatSource("/api/reports/exceeded-quota", quota, render_quota),
+        "equipment_count": ChatSource(
+            "/api/maintenance/equipment/list",
+            equipment_count,
+            lambda total: f"Há {total} equipamentos cadastrados no sistema.",
+        ),
+    }
+
+
+AI_CHAT_SYSTEM_PROMPT = (
+    "Você é um copiloto de manutenção industrial. Responda em português do Brasil. "
+    "Use somente os dados fornecidos no contexto do sistema e não invente valores. "
+    "Se não houver dados, diga objetivamente que não há dados no período. "
+    "Seja direto e claro."
+)
+
+
+async def _compose_ai_chat(payload: AIChatRequest, db: Session) -> Dict[str, Any]:
+    """Intenção, coleta de dados e texto-base da resposta do chat (sem o refino do provedor de IA).
+    As fontes da intenção são buscadas ao mesmo tempo (chat_pipeline) dentro de AI_CHAT_DEADLINE;
+    as que não chegarem a tempo ficam de fora e a resposta vem marcada como parcial.
+    """
+    # Extrair última pergunta do usuário
+    user_msg = ""
+    for m in (payload.messages or [])[::-1]:
+        if (m.role or "").lower() == "user":
+            user_msg = m.content or ""
+            break
+    intent = _detect_intent_pt(user_msg)
+
+    start_date, end_date, period_label = _resolve_period_from_filters(payload.filters or {})
+    filters = payload.filters or {}
+    deadline = time.monotonic() + AI_CHAT_DEADLINE
+    replies = []
+    sources = []
 
     # ===== Integração simples com web para perguntas fora do escopo dos relatórios =====
     async def _search_web_duckduckgo(query: str, max_results: int = 3):
@@ -1415,40 +1448,6 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
         except Exception:
             return []
 
-    # Ranquear causas por dados internos (OS fechadas no período)
-    def _rank_causes_by_internal_data(category: Optional[str], lookback_days: int = 365) -> List[Dict[str, Any]]:
-        keywords = {
-            "admissao": ["filtro de ar", "admiss", "entrada de ar", "restrição ar"],
-            "combustivel": ["filtro de combustível", "baixa pressão", "ar no sistema", "diesel contamin"],
-            "turbo_pressurizacao": ["mangueira", "intercooler", "vazamento", "wastegate", "turbo"],
-            "injecao_combustao": ["bico", "bomba", "injeç", "compressão", "combustão"],
-            "pos_tratamento": ["dpf", "egr", "regener", "derate"],
-            "hidraulico": ["válvula", "bomba", "cavitação", "vazamento interno", "pressão hidráulica"],
-            "transmissao_pto": ["embreagem", "pto", "conversor", "patinação", "atrito"],
-            "eletrica_sensores": ["sensor", "map", "maf", "temperatura", "pressão", "chicote"],
-            "superaquecimento": ["superaquec", "alta temperatura", "arrefecimento", "radiador", "ventoinha"],
-        }
-        cutoff = datetime.now() - timedelta(days=lookback_days)
-        counts = {k: 0 for k in keywords.keys()}
-        try:
-            q = db.query(WorkOrder).join(Equipment, Equipment.id == WorkOrder.equipment_id).filter(
-                WorkOrder.status == "Fechada",
-                WorkOrder.completed_at.isnot(None),
-                WorkOrder.completed_at >= cutoff
-            )
-            if category:
-                q = q.filter(Equipment.category == category)
-            rows = q.limit(500).all()
-            for wo in rows:
-                text = f"{wo.title or ''} {wo.description or ''}".lower()
-                for k, kws in keywords.items():
-                    if any(kw in text for kw in kws):
-                        counts[k] += 1
-        except Exception:
-            pass
-        ranked = sorted([{"key": k, "score": v} for k, v in counts.items()], key=lambda x: x["score"], reverse=True)
-        return ranked
-
     async def _extract_specifics_from_urls(urls: List[str], max_items: int = 3) -> List[str]:
         if not urls:
             return []
@@ -1456,10 +1455,11 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
         terms = ["causa", "sintoma", "diagn", "verificar", "checagem", "falha", "perda de potência", "hidrául", "diesel", "elétric"]
         try:
             async with httpx.AsyncClient(timeout=6.0, headers={"User-Agent": "MTDL-PCM/1.0"}) as client:
-                for url in urls[:2]:
+                # Páginas baixadas ao mesmo tempo; trechos extraídos na ordem das fontes
+                pages = await asyncio.gather(*(client.get(url) for url in urls[:2]), return_exceptions=True)
+                for r in pages:
                     try:
-                        r = await client.get(url)
-                        if r.status_code != 200:
+                        if isinstance(r, Exception) or r.status_code != 200:
                             continue
                         txt = r.text
                         import re
@@ -1480,10 +1480,44 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
             return []
         return snippets
 
+    # Base interna primeiro (índice local: milissegundos, funciona sem internet)
+    knowledge: List[knowledge_index.Hit] = []
+    index = knowledge_index.index_for(db.get_bind())
+    if index is not None and intent in _KNOWLEDGE_INTENTS and user_msg.strip():
+        try:
+            knowledge = await asyncio.to_thread(index.search, user_msg, limit=_KNOWLEDGE_LIMIT)
+        except Exception as e:
+            print(f"⚠️ Busca no índice de conhecimento falhou: {e}")
+    web_search = AI_CHAT_WEB_SEARCH and not knowledge
+
+    # Plano da intenção: relatórios (threads com sessão própria) e busca na web, ao mesmo tempo
+    chat_sources = _chat_sources(filters, start_date, end_date)
+    plan = [(key, chat_sources[key]) for key in _CHAT_PLAN.get(intent, ())]
+    extra = {}
+    cat = filters.get("category") or None
+    if intent == "parts_lookup" and web_search:
+        extra["web"] = _search_web_duckduckgo(
+            user_msg.strip() or "retrovisor esquerdo escavadeira 320D part number", max_results=3)
+    elif intent == "fluid_spec" and web_search:
+        extra["web"] = _search_web_duckduckgo("SAE J300 15W-30 viscosidade tabela", max_results=2)
+    elif intent == "troubleshoot":
+        if web_search:
+            extra["web"] = _search_web_duckduckgo((user_msg or "").strip() or "perda de potência causas", max_results=3)
+        plan.append(("causes", ChatSource("", lambda session: _rank_causes_by_internal_data(session, cat), None)))
+
+    results, missing, _ = await gather_sources(db, plan, deadline, extra)
+    for key, source in plan:
+        if key in results and source.render is not None:
+            replies.append(source.render(results[key]))
+            sources.append(source.source)
+
     if intent == "parts_lookup":
-        q = user_msg.strip() or "retrovisor esquerdo escavadeira 320D part number"
-        web = await _search_web_duckduckgo(q, max_results=3)
-        if web:
+        web = results.get("web") or []
+        if knowledge:
+            replies = _render_knowledge(knowledge)
+            replies.append("Confirme o part number no catálogo do fabricante antes da compra.")
+            sources.extend(hit.title for hit in knowledge)
+        elif web:
             replies = [
                 "Não tenho acesso ao catálogo oficial. Consultei fontes públicas na web; valide no fornecedor/SIS:",
             ]
@@ -1506,8 +1540,11 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
             "• '30' — alta temperatura: viscosidade cinemática a 100°C entre 9,3 e <12,5 cSt; HTHS ≥ 2,9 mPa·s.",
             "Observação: consulte a ficha técnica (TDS) do fabricante para valores exatos.",
         ]
-        refs = await _search_web_duckduckgo("SAE J300 15W-30 viscosidade tabela", max_results=2)
-        if refs:
+        refs = results.get("web") or []
+        if knowledge:
+            replies.extend(_render_knowledge(knowledge))
+            sources.extend(hit.title for hit in knowledge)
+        elif refs:
             replies.append("Fontes:")
             for i, r in enumerate(refs, 1):
                 replies.append(f"{i}. {r.get('title') or 'Referência'} — {r.get('url')}")
@@ -1516,11 +1553,8 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
 
     if intent == "troubleshoot":
         # Diagnóstico refinado por tipo de equipamento + dados internos
-        q = (user_msg or "").strip() or "perda de potência causas"
-        web_refs = await _search_web_duckduckgo(q, max_results=3)
-        for w in web_refs:
-            if w.get("url"):
-                sources.append(w.get("url"))
+        web_urls = [w.get("url") for w in results.get("web") or [] if w.get("url")]
+        sources.extend(web_urls)
 
         # Tipagem por texto e filtros
         eq_type = "geral"
@@ -1531,8 +1565,7 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
             eq_type = "eletrico"
         elif any(k in t for k in ["diesel", "motor"]):
             eq_type = "diesel"
-        cat = (payload.filters.get("category") if payload.filters else None) or None
-        ranked = _rank_causes_by_internal_data(cat)
+        ranked = results.get("causes") or []
 
         def base_order(eq: str) -> List[str]:
             if eq == "hidraulico":
@@ -1562,6 +1595,13 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
         }
         for k in order_sorted[:6]:
             replies.append(f"• {causes_text.get(k)}")
+        history = [x for x in ranked if x.get("orders")][:3]
+        if history:
+            replies.append("Histórico de OS corretivas (12 meses): " + "; ".join(
+                f"{x['key']} — {x['orders']} OS, R$ {x['cost']:,.2f}" for x in history) + ".")
+        if knowledge:
+            replies.extend(_render_knowledge(knowledge))
+            sources.extend(hit.title for hit in knowledge)
 
         replies.append("Checklist (seguir manual OEM e segurança):")
         replies.extend([
@@ -1572,12 +1612,24 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
             "9) Testar sensores críticos e chicotes.",
         ])
 
-        specifics = await _extract_specifics_from_urls(sources, max_items=3)
+        specifics = []
+        remaining = deadline - time.monotonic()
+        if remaining > 0 and web_urls:
+            fetch = asyncio.ensure_future(_extract_specifics_from_urls(web_urls, max_items=3))
+            done, _ = await asyncio.wait({fetch}, timeout=remaining)
+            if fetch in done and fetch.exception() is None:
+                specifics = fetch.result()
+            else:
+                fetch.cancel()
         if specifics:
             replies.append("Pontos específicos encontrados:")
             for s in specifics:
                 replies.append(f"- {s[:240]}")
 
+    # Resposta parcial: fontes que falharam ou não chegaram dentro do prazo
+    if missing:
+        replies.append("Dados não obtidos a tempo: " + ", ".join(_CHAT_SOURCE_LABELS.get(k, k) for k in missing) + ".")
+
     # Montagem da resposta
     if not replies:
         replies.append("Posso explicar disponibilidade, utilização, MTTR/MTBF, custos, backlog e franquia a partir dos dados do sistema. Tente algo como: 'Quais categorias tiveram menor disponibilidade este mês?'")
@@ -1585,100 +1637,157 @@ async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_
     summary = " ".join([r for r in replies if r])
     period_txt = f"Período: {period_label}"
 
+    context = (
+        f"Pergunta: {(user_msg or '').strip()}\n"
+        f"{period_txt}\n"
+        f"Dados:\n- " + ("\n- ".join([r for r in replies if r])) + "\n"
+        f"Fontes: " + (", ".join(sources) if sources else "—")
+    )
+    return {
+        "text": f"{summary} {period_txt}.",
+        "intent": intent,
+        "period": period_label,
+        "period_txt": period_txt,
+        "sources": sources,
+        "missing": missing,
+        "deadline": deadline,
+        "llm_messages": [{"role": "user", "content": context}],
+    }
+
+
+def _with_period(text: str, draft: Dict[str, Any]) -> str:
+    if draft["period"] and draft["period"] not in text:
+        return f"{text} {draft['period_txt']}."
+    return text
+
+
+def _chat_response(draft: Dict[str, Any], reply: str) -> Dict[str, Any]:
+    return {
+        "reply": reply,
+        "intent": draft["intent"],
+        "period": draft["period"],
+        "sources": draft["sources"],
+        "partial": bool(draft["missing"]),
+        "missing": draft["missing"],
+    }
+
+
+@router.post("/maintenance/ai-chat", dependencies=[Depends(rate_limit("ai_chat"))])
+async def maintenance_ai_chat(payload: AIChatRequest, db: Session = Depends(get_db)):
+    """Gera respostas textuais baseadas nos endpoints existentes, considerando os filtros atuais.
+    Opcionalmente usa provedor de IA (OpenAI/Azure ou local) para melhorar a redação com os mesmos dados.
+    """
+    draft = await _compose_ai_chat(payload, db)
+
     # Copilot opcional para refino textual (não altera os números)
-    final_text = f"{summary} {period_txt}."
+    final_text = draft["text"]
     if os.getenv("AI_PROVIDER"):
-        system_prompt = (
-            "Você é um copiloto de manutenção industrial. Responda em português do Brasil. "
-            "Use somente os dados fornecidos no contexto do sistema e não invente valores. "
-            "Se não houver dados, diga objetivamente que não há dados no período. "
-            "Seja direto e claro."
-        )
-        context = (
-            f"Pergunta: {(user_msg or '').strip()}\n"
-            f"{period_txt}\n"
-            f"Dados:\n- " + ("\n- ".join([r for r in replies if r])) + "\n"
-            f"Fontes: " + (", ".join(sources) if sources else "—")
-        )
         try:
-            llm_out = await llm_generate([{"role": "user", "content": context}], system_prompt=system_prompt)
+            # Refino só com o tempo que sobrou do prazo total
+            llm_out = None
+            remaining = draft["deadline"] - time.monotonic()
+            if remaining > 0:
+                llm_task = asyncio.ensure_future(
+                    llm_generate(draft["llm_messages"], system_prompt=AI_CHAT_SYSTEM_PROMPT))
+                done, _ = await asyncio.wait({llm_task}, timeout=remaining)
+                if llm_task in done:
+                    llm_out = llm_task.result()
+                else:
+                    llm_task.cancel()
             if llm_out:
-                final_text = llm_out.strip()
-                if period_label and (period_label not in final_text):
-                    final_text = f"{final_text} {period_txt}."
+                final_text = _with_period(llm_out.strip(), draft)
         except Exception:
             pass
 
-    return {
-        "reply": final_text,
-        "intent": intent,
-        "period": period_label,
-        "sources": sources
-    }
+    return _chat_response(draft, final_text)
+
+
+async def _ai_chat_events(draft: Dict[str, Any], started: float):
+    """meta (intenção, fontes), token (trechos do texto) e done (resposta completa e tempo até o 1º trecho)."""
+    yield format_sse("meta", {"intent": draft["intent"], "period": draft["period"], "sources": draft["sources"],
+                              "partial": bool(draft["missing"]), "missing": draft["missing"]})
+    first_token_at = None
+    parts: List[str] = []
+    refined = False
+
+    if os.getenv("AI_PROVIDER"):
+        # 1º trecho dentro do que sobrou do prazo total; depois, até o fim da resposta do provedor
+        stream = llm_stream(draft["llm_messages"], system_prompt=AI_CHAT_SYSTEM_PROMPT)
+        try:
+            remaining = draft["deadline"] - time.monotonic()
+            if remaining > 0:
+                chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                while True:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                    parts.append(chunk)
+                    yield format_sse("token", {"text": chunk})
+                    chunk = await stream.__anext__()
+        except (StopAsyncIteration, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            print(f"⚠️ Streaming do provedor de IA falhou: {e}")
+        finally:
+            await stream.aclose()
+        refined = bool("".join(parts).strip())
+
+    if refined:
+        text = "".join(parts).strip()
+        final_text = _with_period(text, draft)
+        chunks = split_chunks(final_text[len(text):])
+    else:
+        # Sem provedor (ou sem resposta a tempo): o texto-base, no mesmo formato
+        final_text = draft["text"]
+        chunks = split_chunks(("\n" if parts else "") + final_text)
+    for chunk in chunks:
+        if first_token_at is None:
+            first_token_at = time.monotonic()
+        yield format_sse("token", {"text": chunk})
+
+    ttft = (first_token_at or time.monotonic()) - started
+    llm_latency.record("ai_chat_stream", "first_chunk", ttft)
+    llm_latency.record("ai_chat_stream", "total", time.monotonic() - started)
+    yield format_sse("done", {**_chat_response(draft, final_text), "refined": refined,
+                              "ttft_ms": round(ttft * 1000, 1)})
+
+
+@router.post("/maintenance/ai-chat/stream", dependencies=[Depends(rate_limit("ai_chat"))])
+async def maintenance_ai_chat_stream(payload: AIChatRequest, db: Session = Depends(get_db)):
+    """Mesma resposta do /maintenance/ai-chat em text/event-stream: o texto chega em trechos
+    à medida que o provedor de IA gera (eventos meta, token e done)."""
+    started = time.monotonic()
+    # Dados coletados antes de abrir o fluxo: o gerador não usa a sessão do banco
+    draft = await _compose_ai_chat(payload, db)
+    return StreamingResponse(
+        _ai_chat_events(draft, started),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
 
 # ==================== RELATÓRIOS DE ALMOXARIFADO (AGRUPADOS POR CATEGORIA) ====================
 
-@router.get("/warehouse/stock-turnover-grouped")
+def _validate_warehouse_group_by(group_by: str) -> None:
+    if group_by not in warehouse_reports_service.GROUP_BY_OPTIONS:
+        raise HTTPException(status_code=400, detail="group_by inválido: use 'category' ou 'cost_center'")
+
+@router.get("/warehouse/stock-turnover-grouped", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_stock_turnover_grouped(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     group_by: str = "category",
     db: Session = Depends(get_db)
 ):
-    """Giro de estoque agrupado (padrão por categoria).
+    """Giro de estoque agrupado por categoria ou centro de custo (group_by=cost_center).
     Fórmula: Giro = Consumo no período / Estoque médio (aprox. estoque atual).
     """
-    if not start_date:
-        start_date = (datetime.now() - timedelta(days=365)).isoformat()
-    if not end_date:
-        end_date = datetime.now().isoformat()
-
-    movements = db.query(StockMovement).filter(
-        and_(
-            StockMovement.type == "Saída",
-            StockMovement.date >= datetime.fromisoformat(start_date),
-            StockMovement.date <= datetime.fromisoformat(end_date)
-        )
-    ).all()
+    _validate_warehouse_group_by(group_by)
+    return warehouse_reports_service.stock_turnover_grouped(db, start_date, end_date, group_by)
 
-    # Consumo por material
-    material_consumption = {}
-    for mv in movements:
-        material_consumption[mv.material_id] = material_consumption.get(mv.material_id, 0.0) + (mv.quantity or 0.0)
-
-    # Calcular giro por material
-    per_material = []
-    for mid, cons in material_consumption.items():
-        m = db.query(Material).filter(Material.id == mid).first()
-        if not m:
-            continue
-        stock = m.current_stock or 0.0
-        if stock <= 0:
-            continue
-        turnover = cons / stock
-        per_material.append({
-            "category": (m.category or "Sem categoria"),
-            "label": f"{m.code} - {m.name}",
-            "turnover": round(turnover, 2)
-        })
 
-    # Agrupado por categoria
-    grouped = {}
-    for row in per_material:
-        key = row["category"] if group_by == "category" else row["category"]
-        grouped.setdefault(key, []).append(row["turnover"])
-
-    grouped_result = [{"label": k, "turnover": round(sum(v) / len(v), 2)} for k, v in grouped.items()]
-    overall = round(sum([r["turnover"] for r in per_material]) / len(per_material), 2) if per_material else 0.0
-
-    return {
-        "period": f"{start_date} até {end_date}",
-        "grouped": grouped_result,
-        "materials": per_material,
-        "overall": overall
-    }
-
-@router.get("/warehouse/stock-coverage")
+@router.get("/warehouse/stock-coverage", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_stock_coverage(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1686,61 +1795,11 @@ async def get_stock_coverage(
     db: Session = Depends(get_db)
 ):
     """Cobertura de estoque (dias) = Estoque Atual / Consumo Diário Médio."""
-    if not start_date:
-        start_date = (datetime.now() - timedelta(days=90)).isoformat()
-    if not end_date:
-        end_date = datetime.now().isoformat()
+    _validate_warehouse_group_by(group_by)
+    return warehouse_reports_service.stock_coverage(db, start_date, end_date, group_by)
 
-    start_dt = datetime.fromisoformat(start_date)
-    end_dt = datetime.fromisoformat(end_date)
-    days = max(1, (end_dt - start_dt).days)
 
-    movements = db.query(StockMovement).filter(
-        and_(
-            StockMovement.type == "Saída",
-            StockMovement.date >= start_dt,
-            StockMovement.date <= end_dt
-        )
-    ).all()
-
-    # Consumo por material
-    material_consumption = {}
-    for mv in movements:
-        material_consumption[mv.material_id] = material_consumption.get(mv.material_id, 0.0) + (mv.quantity or 0.0)
-
-    per_material = []
-    for mid, cons in material_consumption.items():
-        m = db.query(Material).filter(Material.id == mid).first()
-        if not m:
-            continue
-        daily = cons / days if days else 0.0
-        coverage = (m.current_stock or 0.0) / daily if daily > 0 else None
-        if coverage is None:
-            continue
-        # Limitar cobertura excessiva para visualização
-        coverage = min(coverage, 365.0)
-        per_material.append({
-            "category": (m.category or "Sem categoria"),
-            "label": f"{m.code} - {m.name}",
-            "coverage_days": round(coverage, 2)
-        })
-
-    grouped = {}
-    for row in per_material:
-        key = row["category"] if group_by == "category" else row["category"]
-        grouped.setdefault(key, []).append(row["coverage_days"])
-
-    grouped_result = [{"label": k, "coverage_days": round(sum(v) / len(v), 2)} for k, v in grouped.items()]
-    overall = round(sum([r["coverage_days"] for r in per_material]) / len(per_material), 2) if per_material else 0.0
-
-    return {
-        "period": f"{start_date} até {end_date}",
-        "grouped": grouped_result,
-        "materials": per_material,
-        "overall": overall
-    }
-
-@router.get("/warehouse/stockout-rate")
+@router.get("/warehouse/stockout-rate", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_stockout_rate(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1750,56 +1809,11 @@ async def get_stockout_rate(
     """Taxa de Ruptura: Pedidos não atendidos / Total de pedidos × 100.
     Aproximação baseada em requisições de compra não atendidas (sem pedidos entregues).
     """
-    # Buscar requisições no período
-    pr_query = db.query(PurchaseRequest)
-    if start_date:
-        pr_query = pr_query.filter(PurchaseRequest.requested_date >= datetime.fromisoformat(start_date))
-    if end_date:
-        pr_query = pr_query.filter(PurchaseRequest.requested_date <= datetime.fromisoformat(end_date))
-    prs = pr_query.all()
-
-    # Mapear categorias por requisição (via itens)
-    from collections import defaultdict
-    pr_categories = defaultdict(set)
-    for pr in prs:
-        items = db.query(PurchaseRequestItem).filter(PurchaseRequestItem.purchase_request_id == pr.id).all()
-        for it in items:
-            mat = db.query(Material).filter(Material.id == it.material_id).first()
-            pr_categories[pr.id].add((mat.category if mat and mat.category else "Sem categoria"))
-
-    # Determinar se requisição foi atendida (algum pedido com status Entregue)
-    pr_attended = {}
-    for pr in prs:
-        delivered = False
-        orders = db.query(PurchaseOrder).filter(PurchaseOrder.purchase_request_id == pr.id).all()
-        for po in orders:
-            if (po.status or "").lower() == "entregue":
-                delivered = True
-                break
-        pr_attended[pr.id] = delivered
-
-    # Contabilizar por categoria
-    totals = defaultdict(int)
-    not_attended = defaultdict(int)
-    for pr in prs:
-        cats = pr_categories.get(pr.id, {"Sem categoria"})
-        for c in cats:
-            totals[c] += 1
-            if not pr_attended.get(pr.id, False) or (pr.status or "").lower() in ["rejeitada"]:
-                not_attended[c] += 1
-
-    grouped_result = []
-    overall_total = sum(totals.values())
-    overall_not = sum(not_attended.values())
-    for c, tot in totals.items():
-        na = not_attended.get(c, 0)
-        rate = (na / tot) * 100.0 if tot else 0.0
-        grouped_result.append({"label": c, "stockout_rate": round(rate, 2), "total": tot, "not_attended": na})
+    _validate_warehouse_group_by(group_by)
+    return warehouse_reports_service.stockout_rate(db, start_date, end_date, group_by)
 
-    overall = (overall_not / overall_total) * 100.0 if overall_total else 0.0
-    return {"grouped": grouped_result, "overall": round(overall, 2)}
 
-@router.get("/warehouse/inventory-accuracy-grouped")
+@router.get("/warehouse/inventory-accuracy-grouped", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_inventory_accuracy_grouped(
     inventory_id: Optional[int] = None,
     group_by: str = "category",
@@ -1840,7 +1854,7 @@ async def get_inventory_accuracy_grouped(
     overall = (overall_correct / overall_total) * 100.0 if overall_total else 0.0
     return {"grouped": grouped_result, "overall": round(overall, 2), "inventory_id": inv.id}
 
-@router.get("/warehouse/request-service-time")
+@router.get("/warehouse/request-service-time", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_request_service_time(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1875,7 +1889,7 @@ async def get_request_service_time(
     overall = round(sum([sum(v) for v in times_by_cat.values()]) / (sum([len(v) for v in times_by_cat.values()]) or 1), 2) if times_by_cat else 0.0
     return {"grouped": grouped_result, "overall": overall}
 
-@router.get("/warehouse/storage-cost")
+@router.get("/warehouse/storage-cost", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def get_storage_cost(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1969,7 +1983,7 @@ async def construction_reports_page(request: Request, db: Session = Depends(get_
         return templates.TemplateResponse("reports/construction.html", {"request": request, "macros": macro_items})
     return {"message": "Esta rota serve a página HTML; use Accept: text/html."}
 
-@router.get("/construction/progress-by-substage")
+@router.get("/construction/progress-by-substage", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def construction_progress_by_substage(macro_id: int, db: Session = Depends(get_db)):
     """Progresso médio (%) por subetapa dentro da macroetapa informada"""
     subs = (
@@ -1992,7 +2006,7 @@ async def construction_progress_by_substage(macro_id: int, db: Session = Depends
     macro = db.query(MacroStage).filter(MacroStage.id == macro_id).first()
     return {"macro_id": macro_id, "macro_name": (macro.name if macro else None), "grouped": grouped}
 
-@router.get("/construction/planned-cost-by-substage")
+@router.get("/construction/planned-cost-by-substage", dependencies=[REPORT_ETAG, REPORT_LIMIT])
 async def construction_planned_cost_by_substage(macro_id: int, db: Session = Depends(get_db)):
     """Custo previsto total (R$) por subetapa dentro da macroetapa informada"""
     subs = (
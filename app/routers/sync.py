@@ -2,12 +2,15 @@
 Router para sincronização em lote de operações offline
 """
 
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Depends, Request, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import json
 import secrets
-import httpx
+from app.services.lazy_imports import lazy_module
+from app.services.rate_limit import rate_limit
+
+httpx = lazy_module("httpx")  # carregado só na primeira chamada externa
 
 router = APIRouter()
 
@@ -20,7 +23,7 @@ class SyncItem(BaseModel):
 class BulkPayload(BaseModel):
     requests: List[SyncItem]
 
-@router.post("/bulk")
+@router.post("/bulk", dependencies=[Depends(rate_limit("bulk_sync"))])
 async def bulk_sync(payload: BulkPayload, request: Request):
     """
     Processa requisições em lote de forma sequencial, respeitando idempotência.
@@ -11,18 +11,15 @@ from datetime import datetime, timedelta
 # from weasyprint import HTML, CSS
 # from weasyprint.text.fonts import FontConfiguration
 import io
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from app.database import get_db
 from app.models.warehouse import Material, StockMovement, Supplier, PurchaseRequest, PurchaseRequestItem, InventoryHistory, InventoryHistoryItem, Fueling, PurchaseOrder, PurchaseOrderQuotation
 from app.schemas import warehouse as schemas
 from app.templates_config import templates
 from starlette.responses import RedirectResponse
 from app.routers.admin import get_user_from_request_token, get_user_modules
+from app.services.http_cache import etag_guard
+from app.services.rate_limit import rate_limit
+from app.services import cnpj_registry
 
 router = APIRouter()
 
@@ -93,7 +90,7 @@ def calculate_average_consumption(material_id: int, db: Session) -> float:
         return 0.0
 
 # Páginas HTML
-@router.get("/materials")
+@router.get("/materials", dependencies=[Depends(etag_guard("materials"))])
 async def materials(
     request: Request,
     skip: int = 0,
@@ -241,7 +238,7 @@ async def inventory_page(request: Request, db: Session = Depends(get_db)):
     return templates.TemplateResponse("warehouse/inventory.html", {"request": request})
 
 # Inventory API Endpoints (for compatibility)
-@router.get("/inventory/materials")
+@router.get("/inventory/materials", dependencies=[Depends(etag_guard("materials"))])
 async def inventory_materials(db: Session = Depends(get_db)):
     """API para materiais do inventário com dados completos"""
     materials = db.query(Material).filter(Material.is_active == True).all()
@@ -266,19 +263,19 @@ async def inventory_materials(db: Session = Depends(get_db)):
     
     return result
 
-@router.get("/inventory/stock")
+@router.get("/inventory/stock", dependencies=[Depends(etag_guard("materials"))])
 async def inventory_stock(db: Session = Depends(get_db)):
     """API para estoque do inventário"""
     materials = db.query(Material).filter(Material.current_stock > 0).all()
     return [{"id": m.id, "name": m.name, "current_stock": m.current_stock, "minimum_stock": m.minimum_stock} for m in materials]
 
-@router.get("/inventory/suppliers")
+@router.get("/inventory/suppliers", dependencies=[Depends(etag_guard("suppliers"))])
 async def inventory_suppliers(db: Session = Depends(get_db)):
     """API para fornecedores do inventário"""
     suppliers = db.query(Supplier).filter(Supplier.active == True).all()
     return [{"id": s.id, "name": s.name, "contact": s.contact, "email": s.email} for s in suppliers]
 
-@router.get("/materials/all")
+@router.get("/materials/all", dependencies=[Depends(etag_guard("materials"))])
 async def get_all_materials(db: Session = Depends(get_db)):
     """API para obter todos os materiais com dados completos para a tabela"""
     materials = db.query(Material).filter(Material.is_active == True).all()
@@ -690,10 +687,34 @@ async def create_supplier(supplier_data: dict, db: Session = Depends(get_db)):
     """Criar novo fornecedor"""
     db_supplier = Supplier(**supplier_data)
     db.add(db_supplier)
+    # Razão social no cache de CNPJ (validação offline)
+    cnpj_registry.seed(db, [(db_supplier.cnpj, db_supplier.name)])
     db.commit()
     db.refresh(db_supplier)
     return db_supplier
 
+@router.post("/api/suppliers/validate-cnpj")
+async def validate_supplier_cnpjs(payload: dict, db: Session = Depends(get_db)):
+    """Validar em lote os CNPJs de uma importação de fornecedores (sem consulta externa).
+    Dígitos verificadores e cache local; os que não estão no cache voltam "não verificados"
+    e são consultados em segundo plano.
+    """
+    values = payload.get("cnpjs")
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=400, detail="Informe a lista de CNPJs em 'cnpjs'")
+    if len(values) > cnpj_registry.BULK_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Máximo de {cnpj_registry.BULK_LIMIT} CNPJs por validação")
+    results = cnpj_registry.validate_many(db, [v if isinstance(v, str) else str(v or "") for v in values])
+    summary = {"valid": 0, "invalid": 0, "not_found": 0, "unverified": 0}
+    for item in results:
+        if item["status"] in ("invalid", "not_found"):
+            summary[item["status"]] += 1
+        elif item["verified"]:
+            summary["valid"] += 1
+        else:
+            summary["unverified"] += 1
+    return {"results": results, "summary": summary}
+
 @router.get("/api/suppliers/{supplier_id}")
 async def get_supplier(supplier_id: int, db: Session = Depends(get_db)):
     """Obter fornecedor específico"""
@@ -2155,7 +2176,7 @@ async def delete_quotation(quotation_id: int, db: Session = Depends(get_db)):
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro ao excluir cotação: {str(e)}")
 
-@router.get("/purchase-orders/{order_id}/pdf")
+@router.get("/purchase-orders/{order_id}/pdf", dependencies=[Depends(rate_limit("pdf"))])
 async def generate_purchase_order_pdf(order_id: int, db: Session = Depends(get_db)):
     """Gerar PDF do pedido de compra"""
     try:
@@ -2167,6 +2188,14 @@ async def generate_purchase_order_pdf(order_id: int, db: Session = Depends(get_d
         supplier = purchase_order.supplier
         req = purchase_order.purchase_request
 
+        # ReportLab importado sob demanda
+        from reportlab.lib.pagesizes import A4
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import cm
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER, TA_LEFT
+
         # Buffer para PDF
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(
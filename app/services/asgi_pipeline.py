@@ -0,0 +1,201 @@
+"""
+Pipeline ASGI único do app (substitui as camadas BaseHTTPMiddleware).
+
+Cada BaseHTTPMiddleware (cabeçalhos de segurança, idempotência, GET
+condicional e o @app.middleware de log de exceções) criava um grupo de tarefas
+e um stream de memória por requisição e reempacotava o corpo da resposta, o
+que custava ~1 ms por requisição e quebrava respostas em streaming. Aqui:
+
+- ASGIPipeline aplica os cabeçalhos de segurança no início da resposta,
+  captura exceções não tratadas (on_error) e, opcionalmente, acrescenta
+  Server-Timing, sem tocar no corpo;
+- os ganchos (hooks) são middlewares ASGI puros compostos por dentro do
+  pipeline, na ordem da lista (o primeiro é o mais externo): compressão,
+  CORS, idempotência e GET condicional;
+- IdempotencyMiddleware repassa o corpo da resposta enquanto o copia para o
+  registro; só o GET condicional precisa juntar o corpo (JSON) para o hash.
+"""
+
+import asyncio
+import hashlib
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+from app.models.idempotency import IdempotencyRecord
+
+SECURITY_HEADERS: Dict[str, str] = {
+    "Content-Security-Policy": (
+        "default-src 'self'; "
+        "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
+        "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
+        "img-src 'self' data: https:; "
+        "font-src 'self' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
+        "connect-src 'self' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
+        "frame-ancestors 'none'; "
+        "base-uri 'self'; "
+        "form-action 'self'"
+    ),
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "geolocation=(), microphone=(), camera=()",
+}
+
+MUTATING_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+def header_value(headers, name: bytes) -> Optional[str]:
+    for key, value in headers or []:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ASGIPipeline:
+    """Cabeçalhos de segurança, captura de exceções, Server-Timing e ganchos."""
+
+    def __init__(
+        self,
+        app,
+        hooks: Sequence[Callable] = (),
+        security_headers: Dict[str, str] = SECURITY_HEADERS,
+        on_error: Optional[Callable] = None,
+        server_timing: bool = False,
+    ):
+        for hook in reversed(hooks):
+            app = hook(app)
+        self.app = app
+        self.headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in security_headers.items()]
+        self._names = {name for name, _ in self.headers}
+        self.on_error = on_error
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [(k, v) for k, v in message.get("headers") or [] if k.lower() not in self._names]
+                headers.extend(self.headers)
+                if self.server_timing:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    headers.append((b"server-timing", f"app;dur={elapsed:.1f}".encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            if self.on_error is not None:
+                self.on_error(scope, exc)
+            raise
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """Idempotência em rotas de API mutáveis.
+
+    Usa o header 'X-Idempotency-Key' para devolver a mesma resposta quando a
+    operação já foi realizada com o mesmo payload.
+    """
+
+    def __init__(self, app, session_factory: Optional[Callable] = None):
+        self.app = app
+        self._session_factory = session_factory
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from app.database import SessionLocal
+            return SessionLocal
+        return self._session_factory
+
+    def _find(self, key: str, method: str, path: str, body_hash: str):
+        db = self._sessions()()
+        try:
+            existing = db.query(IdempotencyRecord).filter_by(
+                key=key, method=method, path=path, body_hash=body_hash
+            ).first()
+            return (existing.status_code, existing.response_body or "") if existing else None
+        finally:
+            db.close()
+
+    def _store(self, key: str, method: str, path: str, body_hash: str, status: int, body: bytes):
+        db = self._sessions()()
+        try:
+            db.add(IdempotencyRecord(
+                key=key,
+                method=method,
+                path=path,
+                body_hash=body_hash,
+                status_code=status,
+                response_body=body.decode("utf-8", errors="ignore"),
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print("⚠️ Falha ao salvar idempotência:", e)
+        finally:
+            db.close()
+
+    async def __call__(self, scope, receive, send):
+        method = scope.get("method", "").upper()
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/api/") or method not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+        key = header_value(scope.get("headers"), b"x-idempotency-key")
+        if not key:
+            await self.app(scope, receive, send)
+            return
+
+        body = await read_body(receive)
+        body_hash = hashlib.sha256(body).hexdigest()
+        existing = await asyncio.to_thread(self._find, key, method, path, body_hash)
+        if existing:
+            status, stored = existing
+            content = stored.encode("utf-8")
+            await send({"type": "http.response.start", "status": status,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(content)).encode())]})
+            await send({"type": "http.response.body", "body": content})
+            return
+
+        # Reentrega o corpo já lido; depois disso, repassa (desconexão do cliente)
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = {"status": None, "chunks": [], "complete": False}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["chunks"].append(message.get("body", b""))
+                response["complete"] = not message.get("more_body", False)
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        if response["complete"]:
+            await asyncio.to_thread(self._store, key, method, path, body_hash,
+                                    response["status"], b"".join(response["chunks"]))
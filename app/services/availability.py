@@ -0,0 +1,280 @@
+"""
+Motor de disponibilidade de equipamentos baseado em intervalos.
+
+A disponibilidade era aproximada somando a duração das OS corretivas contra
+dias × 24h: OS sobrepostas eram contadas duas vezes e horas fora de turno
+contavam como disponíveis. Aqui as paradas de cada equipamento são unidas
+(varredura ordenada), recortadas na janela do relatório e intersectadas com
+o calendário de operação (turnos do RH ou 24x7).
+"""
+
+from datetime import datetime, time, timedelta
+from typing import Optional, List, Dict, Tuple, Iterable, Sequence, Any
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.models.maintenance import WorkOrder
+from app.models.hr import Shift
+
+Interval = Tuple[Any, Any]
+
+MINUTES_PER_DAY = 24 * 60
+GRANULARITIES = ("day", "week", "month")
+
+
+# -------------------------
+# Álgebra de intervalos [início, fim)
+# -------------------------
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Unir intervalos sobrepostos ou contíguos (varredura após ordenação por início).
+    Intervalos vazios ou invertidos são descartados."""
+    merged: List[Interval] = []
+    for start, end in sorted((s, e) for s, e in intervals if e > s):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def clip_intervals(intervals: Iterable[Interval], start, end) -> List[Interval]:
+    """Recortar intervalos na janela [start, end)."""
+    return [(max(s, start), min(e, end)) for s, e in intervals if s < end and e > start]
+
+
+def intersect_intervals(a: Sequence[Interval], b: Sequence[Interval]) -> List[Interval]:
+    """Interseção de duas listas ordenadas e disjuntas (dois ponteiros)."""
+    out: List[Interval] = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            out.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return out
+
+
+def interval_hours(intervals: Iterable[Interval]) -> float:
+    """Duração total em horas de intervalos de datetime."""
+    return sum(((e - s).total_seconds() for s, e in intervals), 0.0) / 3600.0
+
+
+# -------------------------
+# Calendário de operação
+# -------------------------
+
+def _parse_hhmm(value: Optional[str]) -> Optional[int]:
+    try:
+        hours, minutes = (value or "").split(":")
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def _format_hhmm(minutes: int, end: bool = False) -> str:
+    if end and minutes == MINUTES_PER_DAY:
+        return "24:00"
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+
+class OperatingCalendar:
+    """Janelas diárias de operação (minutos desde 00:00) e dias da semana trabalhados.
+    Sem janelas, o equipamento opera 24h; sem dias informados, todos os dias (0=segunda)."""
+
+    def __init__(self, windows: Optional[List[Tuple[int, int]]] = None, working_days: Optional[Iterable[int]] = None):
+        self.windows = merge_intervals(windows or [(0, MINUTES_PER_DAY)])
+        self.working_days = set(working_days) if working_days is not None else set(range(7))
+
+    @classmethod
+    def from_shifts(cls, shifts: Iterable[Shift], working_days: Optional[Iterable[int]] = None) -> "OperatingCalendar":
+        """Montar o calendário a partir dos turnos do RH (turnos noturnos atravessam a meia-noite)."""
+        windows = []
+        for shift in shifts:
+            start = _parse_hhmm(shift.start_time)
+            end = _parse_hhmm(shift.end_time)
+            if start is None or end is None:
+                continue
+            if end <= start:
+                end += MINUTES_PER_DAY
+            windows.append((start, end))
+        return cls(windows or None, working_days)
+
+    @property
+    def is_continuous(self) -> bool:
+        return self.windows == [(0, MINUTES_PER_DAY)] and self.working_days == set(range(7))
+
+    def operating_intervals(self, start: datetime, end: datetime) -> List[Interval]:
+        """Intervalos de operação dentro de [start, end)."""
+        if self.is_continuous:
+            return [(start, end)] if end > start else []
+        intervals = []
+        # Começa no dia anterior para incluir turnos que atravessam a meia-noite
+        day = start.date() - timedelta(days=1)
+        while day <= end.date():
+            if day.weekday() in self.working_days:
+                base = datetime.combine(day, time())
+                for ws, we in self.windows:
+                    intervals.append((base + timedelta(minutes=ws), base + timedelta(minutes=we)))
+            day += timedelta(days=1)
+        return clip_intervals(merge_intervals(intervals), start, end)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "windows": [f"{_format_hhmm(ws)}-{_format_hhmm(we, end=True)}" for ws, we in self.windows],
+            "working_days": sorted(self.working_days),
+        }
+
+
+def parse_working_days(value: Optional[str]) -> Optional[List[int]]:
+    """Converter "0,1,2,3,4" (0=segunda) em lista de dias."""
+    if not value:
+        return None
+    days = sorted({int(v) for v in value.split(",") if v.strip() != ""})
+    if any(d < 0 or d > 6 for d in days):
+        raise ValueError("working_days deve conter valores de 0 (segunda) a 6 (domingo)")
+    return days
+
+
+def load_calendar(db: Session, shift_ids: Optional[str] = None, working_days: Optional[str] = None) -> OperatingCalendar:
+    """Calendário a partir dos turnos do RH ("all" ou ids separados por vírgula); 24h se não informado."""
+    days = parse_working_days(working_days)
+    if not shift_ids:
+        return OperatingCalendar(working_days=days)
+    query = db.query(Shift)
+    if shift_ids.strip().lower() != "all":
+        ids = [int(v) for v in shift_ids.split(",") if v.strip()]
+        query = query.filter(Shift.id.in_(ids))
+    return OperatingCalendar.from_shifts(query.all(), days)
+
+
+# -------------------------
+# Períodos da série temporal
+# -------------------------
+
+def period_buckets(start: datetime, end: datetime, granularity: str) -> List[Tuple[str, datetime, datetime]]:
+    """Dividir [start, end) em dias, semanas ISO (segunda) ou meses, recortados na janela."""
+    buckets = []
+    cursor = datetime.combine(start.date(), time())
+    if granularity == "week":
+        cursor -= timedelta(days=cursor.weekday())
+    elif granularity == "month":
+        cursor = cursor.replace(day=1)
+    while cursor < end:
+        if granularity == "day":
+            nxt = cursor + timedelta(days=1)
+        elif granularity == "week":
+            nxt = cursor + timedelta(days=7)
+        else:
+            nxt = (cursor.replace(day=28) + timedelta(days=4)).replace(day=1)
+        buckets.append((cursor.date().isoformat(), max(cursor, start), min(nxt, end)))
+        cursor = nxt
+    return buckets
+
+
+def _distribute_hours(intervals: Sequence[Interval], buckets: Sequence[Tuple[str, datetime, datetime]], totals: List[float]) -> None:
+    """Somar em totals[i] as horas de intervals que caem em cada bucket (ambos ordenados)."""
+    i = j = 0
+    while i < len(intervals) and j < len(buckets):
+        start = max(intervals[i][0], buckets[j][1])
+        end = min(intervals[i][1], buckets[j][2])
+        if start < end:
+            totals[j] += (end - start).total_seconds() / 3600.0
+        if intervals[i][1] < buckets[j][2]:
+            i += 1
+        else:
+            j += 1
+
+
+# -------------------------
+# Cálculo
+# -------------------------
+
+def compute_availability(
+    downtime_rows: Iterable[Tuple[int, Optional[datetime], Optional[datetime]]],
+    equipment_ids: Sequence[int],
+    start: datetime,
+    end: datetime,
+    calendar: Optional[OperatingCalendar] = None,
+    granularity: Optional[str] = None,
+    open_until: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Disponibilidade por equipamento (e série temporal opcional da frota).
+
+    downtime_rows: (equipment_id, início, fim); fim nulo = parada ainda em aberto,
+    considerada até open_until (padrão: fim da janela).
+    Disponibilidade = 1 - parada em horário de operação / horas de operação.
+    """
+    calendar = calendar or OperatingCalendar()
+    open_until = open_until or end
+    operating = calendar.operating_intervals(start, end)
+    operating_hours = interval_hours(operating)
+
+    by_equipment: Dict[int, List[Interval]] = {}
+    for equipment_id, started_at, completed_at in downtime_rows:
+        if started_at is None:
+            continue
+        by_equipment.setdefault(equipment_id, []).append((started_at, completed_at or open_until))
+
+    buckets = period_buckets(start, end, granularity) if granularity else []
+    downtime_by_bucket = [0.0] * len(buckets)
+
+    equipments = {}
+    for equipment_id in equipment_ids:
+        downtime = merge_intervals(clip_intervals(by_equipment.get(equipment_id, ()), start, end))
+        if not calendar.is_continuous:
+            downtime = intersect_intervals(downtime, operating)
+        downtime_hours = interval_hours(downtime)
+        availability = (1.0 - downtime_hours / operating_hours) * 100.0 if operating_hours > 0 else 100.0
+        equipments[equipment_id] = {
+            "downtime_hours": round(downtime_hours, 2),
+            "operating_hours": round(operating_hours, 2),
+            "availability_percent": max(0.0, availability),
+        }
+        if buckets:
+            _distribute_hours(downtime, buckets, downtime_by_bucket)
+
+    series = []
+    if buckets:
+        operating_by_bucket = [0.0] * len(buckets)
+        _distribute_hours(operating, buckets, operating_by_bucket)
+        fleet_size = len(equipment_ids)
+        for (label, _, _), op_hours, down_hours in zip(buckets, operating_by_bucket, downtime_by_bucket):
+            capacity = op_hours * fleet_size
+            availability = (1.0 - down_hours / capacity) * 100.0 if capacity > 0 else 100.0
+            series.append({
+                "period": label,
+                "operating_hours": round(capacity, 2),
+                "downtime_hours": round(down_hours, 2),
+                "availability_percent": round(max(0.0, availability), 2),
+            })
+
+    return {"equipments": equipments, "operating_hours": operating_hours, "series": series}
+
+
+def load_downtime_rows(db: Session, start: datetime, end: datetime):
+    """Paradas corretivas que tocam a janela: OS fechadas (início/fim) e OS iniciadas ainda abertas."""
+    return db.query(WorkOrder.equipment_id, WorkOrder.started_at, WorkOrder.completed_at).filter(
+        WorkOrder.type == "Corretiva",
+        WorkOrder.started_at.isnot(None),
+        WorkOrder.started_at < end,
+        or_(
+            and_(WorkOrder.completed_at.isnot(None), WorkOrder.completed_at > start),
+            and_(WorkOrder.completed_at.is_(None), WorkOrder.status != "Fechada"),
+        ),
+    ).all()
+
+
+def report_window(start_date: Optional[str], end_date: Optional[str], default_days: int = 30) -> Tuple[datetime, datetime]:
+    """Janela do relatório em dias inteiros: [início 00:00, dia seguinte ao fim 00:00)."""
+    end_dt = datetime.fromisoformat(end_date) if end_date else datetime.now()
+    start_dt = datetime.fromisoformat(start_date) if start_date else (end_dt - timedelta(days=default_days))
+    start = datetime.combine(start_dt.date(), time())
+    end = datetime.combine(end_dt.date() + timedelta(days=1), time())
+    return start, end
@@ -0,0 +1,85 @@
+"""
+Base das tarefas de fundo acordáveis (leitor do SSE, gravação de logs, envio
+de e-mails, atualização do cache de CNPJ, limpeza de sessões).
+
+Todas seguem o mesmo ciclo: executar um passo, esperar um aviso (notify,
+seguro a partir de qualquer thread) ou o fim do intervalo, e repetir até
+stop(). A espera usa asyncio.wait em vez de wait_for: antes do Python 3.12 o
+wait_for engole o cancelamento que chega junto com o aviso, e stop() ficaria
+esperando a tarefa para sempre.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class BackgroundWorker(ABC):
+    """Ciclo passo/espera numa tarefa do loop em execução.
+    Subclasses definem step() e interval(); error_message prefixa as falhas do passo."""
+
+    error_message = "Falha na tarefa de fundo"
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    @abstractmethod
+    def interval(self) -> float:
+        """Espera máxima (segundos) entre dois passos sem aviso."""
+
+    @abstractmethod
+    async def step(self) -> None:
+        """Um passo do ciclo; exceções são registradas e o ciclo continua."""
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def notify(self) -> None:
+        """Antecipar o próximo passo (seguro a partir de qualquer thread)."""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ {self.error_message}: {e}")
+            waiter = asyncio.ensure_future(self._wake.wait())
+            try:
+                await asyncio.wait({waiter}, timeout=self.interval())
+            finally:
+                waiter.cancel()
+            self._wake.clear()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+
+    def cancel(self) -> Optional[asyncio.Task]:
+        """Cancelar sem esperar (contexto síncrono). Retorna a tarefa cancelada."""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+        return task
+
+    async def stop(self) -> None:
+        task = self.cancel()
+        if task:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,310 @@
+"""
+Análise de causas de falha a partir do texto das OS corretivas.
+
+O chat de IA ranqueava as causas carregando as últimas OS e procurando
+palavras-chave fixas em Python a cada pergunta. Aqui cada OS corretiva
+fechada é tokenizada uma vez (minúsculas, sem acentos e palavras vazias,
+radical aproximado do português) e a sua contribuição é somada na tabela
+cause_term_stats: OS e custo por categoria de equipamento, mês de fechamento
+e termo. Além das palavras, cada OS conta para as causas de CAUSE_KEYWORDS
+que cita (termos "causa:<chave>").
+
+Atualização incremental: o hook after_flush da sessão (e query.update()/
+delete() em OS) relê as OS alteradas, desfaz a contribuição anterior
+(guardada em work_order_terms) e soma a nova, na mesma transação. OS
+fechadas antes desta tabela existir entram pelo backfill() do startup.
+
+Ranking de uma categoria num período (meses completos):
+- share = OS da categoria com o termo / OS da categoria;
+- idf = ln(OS / OS com o termo), sobre todas as categorias;
+- score = share * idf (TF-IDF), lift = share / fração geral de OS com o termo.
+"""
+
+import math
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app.models.cause_stats import CauseTermStat, WorkOrderTerms
+from app.models.equipment import Equipment
+from app.models.maintenance import WorkOrder
+from app.services.knowledge_index import STOPWORDS, normalize
+
+BATCH_SIZE = 1000
+BACKFILL_BATCH = 10_000  # OS por transação na carga inicial
+MAX_TERM_LENGTH = 60
+CAUSE_PREFIX = "causa:"
+TOTAL = ""  # termo da linha de totais (OS da categoria no mês)
+NO_CATEGORY = "Sem categoria"
+
+# Causas de falha e palavras-chave (trechos, sem diferença de acentos) procuradas nas OS
+CAUSE_KEYWORDS = {
+    "admissao": ["filtro de ar", "admiss", "entrada de ar", "restrição ar"],
+    "combustivel": ["filtro de combustível", "baixa pressão", "ar no sistema", "diesel contamin"],
+    "turbo_pressurizacao": ["mangueira", "intercooler", "vazamento", "wastegate", "turbo"],
+    "injecao_combustao": ["bico", "bomba", "injeç", "compressão", "combustão"],
+    "pos_tratamento": ["dpf", "egr", "regener", "derate"],
+    "hidraulico": ["válvula", "bomba", "cavitação", "vazamento interno", "pressão hidráulica"],
+    "transmissao_pto": ["embreagem", "pto", "conversor", "patinação", "atrito"],
+    "eletrica_sensores": ["sensor", "map", "maf", "temperatura", "pressão", "chicote"],
+    "superaquecimento": ["superaquec", "alta temperatura", "arrefecimento", "radiador", "ventoinha"],
+}
+
+_CAUSE_PATTERNS = {cause: [normalize(kw) for kw in kws] for cause, kws in CAUSE_KEYWORDS.items()}
+_TOKEN = re.compile(r"[0-9a-z]+")
+_stats = CauseTermStat.__table__
+_snapshots = WorkOrderTerms.__table__
+
+
+# -------------------------
+# Tokenização
+# -------------------------
+
+def stem(token: str) -> str:
+    """Radical aproximado: plural e as duas últimas letras das palavras longas
+    (vazamentos/vazamento, hidraulica/hidraulico, injecoes/injecao)."""
+    if token.endswith("oes") and len(token) > 5:
+        token = token[:-3] + "ao"
+    elif token.endswith(("res", "zes", "les")) and len(token) > 5:
+        token = token[:-2]
+    elif token.endswith("s") and not token.endswith(("ss", "us", "is")) and len(token) > 3:
+        token = token[:-1]
+    if token.isalpha() and len(token) >= 6:
+        token = token[:-2]
+    return token
+
+
+def classify_causes(text: str) -> List[str]:
+    low = normalize(text)
+    return [cause for cause, patterns in _CAUSE_PATTERNS.items() if any(p in low for p in patterns)]
+
+
+def tokenize(text: str) -> Set[str]:
+    """Radicais distintos do texto; números puros (OS, horímetro) ficam de fora."""
+    terms = set()
+    for token in _TOKEN.findall(normalize(text)):
+        if token in STOPWORDS or token.isdigit() or len(token) < 3:
+            continue
+        terms.add(stem(token)[:MAX_TERM_LENGTH])
+    return terms
+
+
+def order_terms(*parts: Optional[str]) -> List[str]:
+    """Termos de uma OS: radicais do texto e as causas citadas (ordenados)."""
+    text = "\n".join(p for p in parts if p)
+    return sorted(tokenize(text)) + [CAUSE_PREFIX + cause for cause in classify_causes(text)]
+
+
+def month_of(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+# -------------------------
+# Atualização incremental
+# -------------------------
+
+def _qualifying():
+    return (WorkOrder.status == "Fechada", WorkOrder.type == "Corretiva", WorkOrder.completed_at.isnot(None))
+
+
+def _chunks(values: Sequence, size: int = BATCH_SIZE):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def refresh_orders(connection, ids: Iterable[int]) -> int:
+    """Reprocessar as OS (gravadas, alteradas ou removidas) na conexão/transação dada.
+    Retorna quantas contribuições mudaram."""
+    ids = list(dict.fromkeys(i for i in ids if i is not None))
+    deltas: Dict[Tuple[str, date, str], List[float]] = defaultdict(lambda: [0, 0.0])
+    changed = 0
+    for chunk in _chunks(ids):
+        old = {row.work_order_id: (row.category, row.month, row.cost, row.terms)
+               for row in connection.execute(select(_snapshots).where(_snapshots.c.work_order_id.in_(chunk)))}
+        rows = connection.execute(
+            select(WorkOrder.id, WorkOrder.title, WorkOrder.description, WorkOrder.notes,
+                   WorkOrder.maintenance_cause, WorkOrder.cost, WorkOrder.completed_at, Equipment.category)
+            .outerjoin(Equipment, Equipment.id == WorkOrder.equipment_id)
+            .where(WorkOrder.id.in_(chunk), *_qualifying())
+        ).all()
+        new = {row.id: (row.category or NO_CATEGORY, month_of(row.completed_at), float(row.cost or 0.0),
+                        " ".join(order_terms(row.title, row.description, row.notes, row.maintenance_cause)))
+               for row in rows}
+
+        stale = [i for i in old if old[i] != new.get(i)]
+        fresh = [i for i in new if new[i] != old.get(i)]
+        for sign, contributions in ((-1, [old[i] for i in stale]), (1, [new[i] for i in fresh])):
+            for category, month, cost, terms in contributions:
+                for term in [TOTAL] + terms.split():
+                    delta = deltas[(category, month, term)]
+                    delta[0] += sign
+                    delta[1] += sign * cost
+
+        if stale:
+            connection.execute(delete(_snapshots).where(_snapshots.c.work_order_id.in_(stale)))
+        if fresh:
+            connection.execute(insert(_snapshots), [
+                {"work_order_id": i, "category": new[i][0], "month": new[i][1], "cost": new[i][2], "terms": new[i][3]}
+                for i in fresh
+            ])
+        changed += len(set(stale) | set(fresh))
+    _apply_deltas(connection, deltas)
+    return changed
+
+
+def _apply_deltas(connection, deltas: Dict[Tuple[str, date, str], List[float]]) -> None:
+    """Somar as variações: UPDATE nas linhas existentes, INSERT nas novas, e remover as zeradas."""
+    deltas = {key: d for key, d in deltas.items() if d[0] or d[1]}
+    if not deltas:
+        return
+    cells = sorted({(category, month) for category, month, _ in deltas})
+    existing = set()
+    for chunk in _chunks(cells, 200):
+        existing.update(connection.execute(
+            select(_stats.c.category, _stats.c.month, _stats.c.term)
+            .where(tuple_(_stats.c.category, _stats.c.month).in_(chunk))
+        ).all())
+    updates = [{"k_category": c, "k_month": m, "k_term": t, "d_orders": d[0], "d_cost": d[1]}
+               for (c, m, t), d in deltas.items() if (c, m, t) in existing]
+    inserts = [{"category": c, "month": m, "term": t, "orders": d[0], "cost": d[1]}
+               for (c, m, t), d in deltas.items() if (c, m, t) not in existing]
+    if updates:
+        connection.execute(
+            update(_stats)
+            .where(_stats.c.category == bindparam("k_category"), _stats.c.month == bindparam("k_month"),
+                   _stats.c.term == bindparam("k_term"))
+            .values(orders=_stats.c.orders + bindparam("d_orders"), cost=_stats.c.cost + bindparam("d_cost")),
+            updates,
+        )
+        for chunk in _chunks(cells, 200):
+            connection.execute(delete(_stats).where(tuple_(_stats.c.category, _stats.c.month).in_(chunk),
+                                                    _stats.c.orders <= 0))
+    if inserts:
+        connection.execute(insert(_stats), inserts)
+
+
+def backfill(engine) -> int:
+    """Processar as OS corretivas fechadas que ainda não têm contribuição gravada
+    (primeira carga; idempotente, em lotes de uma transação cada). Retorna quantas.
+    Em ordem de fechamento: cada lote soma em poucos meses (menos linhas a atualizar)."""
+    with engine.connect() as connection:
+        ids = list(connection.execute(
+            select(WorkOrder.id)
+            .where(*_qualifying(), WorkOrder.id.notin_(select(_snapshots.c.work_order_id)))
+            .order_by(WorkOrder.completed_at, WorkOrder.id)
+        ).scalars())
+    for chunk in _chunks(ids, BACKFILL_BATCH):
+        with engine.begin() as connection:
+            refresh_orders(connection, chunk)
+    return len(ids)
+
+
+def ensure_backfilled() -> None:
+    """Carga inicial das estatísticas no banco da aplicação (startup, em segundo plano)."""
+    from app.database import engine
+    try:
+        count = backfill(engine)
+        if count:
+            print(f"📊 Estatísticas de causas: {count} OS corretivas processadas")
+    except Exception as e:
+        print(f"⚠️ Falha ao processar estatísticas de causas: {e}")
+
+
+# -------------------------
+# Hooks da sessão
+# -------------------------
+
+@event.listens_for(Session, "after_flush")
+def _refresh_after_flush(session, flush_context):
+    """OS gravadas/alteradas/removidas (e troca de categoria de equipamento) neste flush."""
+    ids = set()
+    equipment_ids = []
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, WorkOrder):
+            ids.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, WorkOrder) and session.is_modified(obj, include_collections=False):
+            ids.add(obj.id)
+        elif isinstance(obj, Equipment) and inspect(obj).attrs.category.history.has_changes():
+            equipment_ids.append(obj.id)
+    if not ids and not equipment_ids:
+        return
+    connection = session.connection()
+    if equipment_ids:
+        ids.update(connection.execute(
+            select(WorkOrder.id).where(WorkOrder.equipment_id.in_(equipment_ids))).scalars())
+    refresh_orders(connection, ids)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _refresh_on_bulk_write(orm_execute_state):
+    """query.update()/query.delete() em OS não passam pelo flush: ids antes, reprocessar depois."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not WorkOrder:
+        return
+    connection = orm_execute_state.session.connection()
+    query = select(WorkOrder.id)
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is not None:
+        query = query.where(whereclause)
+    ids = connection.execute(query).scalars().all()
+    result = orm_execute_state.invoke_statement()
+    refresh_orders(connection, ids)
+    return result
+
+
+# -------------------------
+# Ranking
+# -------------------------
+
+def _totals(db: Session, start: date, end: date, category: Optional[str]) -> Dict[str, Tuple[int, float]]:
+    """OS e custo por termo nos meses [start, end] (category None: todas as categorias)."""
+    query = (select(_stats.c.term, func.sum(_stats.c.orders), func.sum(_stats.c.cost))
+             .where(_stats.c.month >= start, _stats.c.month <= end)
+             .group_by(_stats.c.term))
+    if category is not None:
+        query = query.where(_stats.c.category == category)
+    return {term: (int(orders or 0), float(cost or 0.0)) for term, orders, cost in db.execute(query)}
+
+
+def rank_causes(db: Session, category: Optional[str], start: date, end: date,
+                limit: int = 20, min_orders: int = 2) -> Dict[str, Any]:
+    """Causas e termos mais característicos das OS corretivas da categoria (None: todas)
+    fechadas entre os meses de start e end (inclusive)."""
+    start, end = month_of(start), month_of(end)
+    local = _totals(db, start, end, category)
+    overall = {term: v[0] for term, v in (_totals(db, start, end, None) if category is not None else local).items()}
+    total_orders, total_cost = local.get(TOTAL, (0, 0.0))
+    all_orders = overall.get(TOTAL, 0)
+
+    def entry(term: str) -> Dict[str, Any]:
+        orders, cost = local[term]
+        share = orders / total_orders
+        baseline = overall.get(term, orders) / all_orders
+        idf = math.log(all_orders / overall.get(term, orders))
+        return {"orders": orders, "cost": round(cost, 2), "share": round(share, 4),
+                "lift": round(share / baseline, 3), "score": round(share * idf, 4)}
+
+    causes, terms = [], []
+    if total_orders:
+        for term in local:
+            if term.startswith(CAUSE_PREFIX):
+                causes.append({"cause": term[len(CAUSE_PREFIX):], **entry(term)})
+            elif term != TOTAL and local[term][0] >= min_orders:
+                terms.append({"term": term, **entry(term)})
+    causes.sort(key=lambda x: (-x["score"], x["cause"]))
+    terms.sort(key=lambda x: (-x["score"], x["term"]))
+    return {
+        "category": category,
+        "period": {"start": start.isoformat(), "end": end.isoformat()},
+        "orders": total_orders,
+        "cost": round(total_cost, 2),
+        "causes": causes,
+        "terms": terms[:limit],
+    }
@@ -0,0 +1,141 @@
+"""
+Pipeline de coleta de dados do chat de IA da manutenção.
+
+O chat detectava a intenção e chamava os relatórios (MTTR, MTBF, custos,
+disponibilidade, backlog...) um depois do outro, dentro do event loop, cada
+um com a sua varredura completa das tabelas; a busca na web vinha em
+seguida, também em série. Aqui:
+
+- o chamador monta um plano (ChatSource por fonte de dados da intenção);
+- gather_sources roda cada fonte numa thread, com sessão própria do banco,
+  todas ao mesmo tempo, e espera até o prazo total (deadline); o que não
+  chegou a tempo volta em `missing` para a resposta parcial;
+- RequestMemo é o memo da requisição (via ContextVar, herdado pelas
+  threads): subconsultas comuns, como o cadastro de equipamentos, rodam
+  uma vez só mesmo quando várias fontes as pedem ao mesmo tempo.
+
+Com banco SQLite em memória (StaticPool: uma única conexão) as fontes rodam
+em sequência, numa thread, com a sessão da requisição.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import SingletonThreadPool, StaticPool
+
+
+class RequestMemo:
+    """Resultados por chave, calculados uma vez (as demais threads esperam o primeiro)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: Dict[Any, Future] = {}
+        self.hits = 0
+
+    def get(self, key, compute: Callable[[], Any]):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(compute())
+            except BaseException as e:
+                future.set_exception(e)
+        return future.result()
+
+
+_memo: ContextVar[Optional[RequestMemo]] = ContextVar("chat_request_memo", default=None)
+
+
+def memoized(key, compute: Callable[[], Any]):
+    """compute() memoizado na requisição atual; fora do pipeline, só executa."""
+    memo = _memo.get()
+    return compute() if memo is None else memo.get(key, compute)
+
+
+def run_report(coro: Awaitable):
+    """Executar uma rota de relatório (async def sem await) numa thread."""
+    return asyncio.run(coro)
+
+
+class ChatSource(NamedTuple):
+    source: str                          # rota equivalente, citada nas fontes da resposta
+    fetch: Callable[[Session], Any]      # roda numa thread com sessão própria
+    render: Callable[[Any], str]         # texto da resposta a partir do resultado
+
+
+def _shares_single_connection(db: Session) -> bool:
+    return isinstance(db.get_bind().pool, (StaticPool, SingletonThreadPool))
+
+
+async def gather_sources(
+    db: Session,
+    plan: Sequence[Tuple[str, ChatSource]],
+    deadline: float,
+    extra: Optional[Dict[str, Awaitable]] = None,
+) -> Tuple[Dict[str, Any], List[str], RequestMemo]:
+    """Buscar as fontes do plano (e corrotinas extras, como a busca na web) ao mesmo tempo.
+
+    deadline: instante (time.monotonic) limite. Retorna (resultados por chave,
+    chaves que falharam ou não terminaram a tempo, memo usado).
+    """
+    memo = RequestMemo()
+    token = _memo.set(memo)
+    try:
+        tasks: Dict[str, asyncio.Future] = {}
+        if _shares_single_connection(db):
+            def run_all():
+                return {key: _safe(source.fetch, db) for key, source in plan}
+            if plan:
+                tasks["__sequential__"] = asyncio.ensure_future(asyncio.to_thread(run_all))
+        else:
+            factory = sessionmaker(bind=db.get_bind(), autocommit=False, autoflush=False)
+            for key, source in plan:
+                tasks[key] = asyncio.ensure_future(asyncio.to_thread(_fetch_with_session, factory, source.fetch))
+        for key, awaitable in (extra or {}).items():
+            tasks[key] = asyncio.ensure_future(awaitable)
+    finally:
+        _memo.reset(token)
+
+    results: Dict[str, Any] = {}
+    if tasks:
+        timeout = max(0.0, deadline - time.monotonic())
+        done, pending = await asyncio.wait(set(tasks.values()), timeout=timeout)
+        for task in pending:
+            task.cancel()  # threads seguem até o fim, mas a resposta não espera
+        for key, task in tasks.items():
+            if task in done and not task.cancelled() and task.exception() is None:
+                if key == "__sequential__":
+                    results.update({k: v for k, v in task.result().items() if v is not _FAILED})
+                elif task.result() is not _FAILED:
+                    results[key] = task.result()
+    missing = [key for key, _ in plan if key not in results] + [key for key in (extra or {}) if key not in results]
+    return results, missing, memo
+
+
+_FAILED = object()
+
+
+def _safe(fetch: Callable[[Session], Any], db: Session):
+    try:
+        return fetch(db)
+    except Exception as e:
+        print(f"⚠️ Fonte de dados do chat falhou: {e}")
+        return _FAILED
+
+
+def _fetch_with_session(factory, fetch: Callable[[Session], Any]):
+    db = factory()
+    try:
+        return _safe(fetch, db)
+    finally:
+        db.close()
@@ -0,0 +1,409 @@
+"""
+Validação de CNPJ sem depender da rede, com cache local da razão social.
+
+validate_cnpj consultava a BrasilAPI a cada verificação: segundos de espera
+no formulário e erro 502 em obras sem internet. Agora:
+
+- dígitos verificadores conferidos localmente (CNPJ malformado nem sai do
+  processo);
+- a tabela cnpj_cache guarda a razão social de cada CNPJ, semeada com os
+  fornecedores cadastrados e com as consultas externas (validade
+  CNPJ_CACHE_TTL_DAYS; "não encontrado" por CNPJ_NOT_FOUND_TTL_HOURS);
+- entrada vencida continua respondendo na hora e vai para a atualização em
+  segundo plano (CnpjRefresher);
+- a consulta externa só acontece com CNPJ_LOOKUP_ENABLED ligado e enquanto o
+  serviço responde: falha de rede, 429 ou 5xx deixam a consulta desligada por
+  CNPJ_OFFLINE_SECONDS e o CNPJ fica "não verificado" (válido pelos dígitos);
+- validate_many confere uma lista inteira (importação de fornecedores) com
+  uma consulta ao cache e sem rede.
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.cnpj_cache import CnpjCache
+from app.models.warehouse import Supplier
+from app.services.background_worker import BackgroundWorker
+from app.services.lazy_imports import lazy_module
+
+httpx = lazy_module("httpx")  # carregado só na primeira consulta externa
+
+LOOKUP_URL = os.getenv("CNPJ_LOOKUP_URL", "https://brasilapi.com.br/api/cnpj/v1/{cnpj}")
+LOOKUP_TIMEOUT = float(os.getenv("CNPJ_LOOKUP_TIMEOUT", "5"))
+CACHE_TTL_DAYS = float(os.getenv("CNPJ_CACHE_TTL_DAYS", "30"))
+NOT_FOUND_TTL_HOURS = float(os.getenv("CNPJ_NOT_FOUND_TTL_HOURS", "24"))
+OFFLINE_SECONDS = float(os.getenv("CNPJ_OFFLINE_SECONDS", "300"))
+REFRESH_BATCH = int(os.getenv("CNPJ_REFRESH_BATCH", "20"))
+POLL_SECONDS = float(os.getenv("CNPJ_POLL_SECONDS", "600"))
+BULK_LIMIT = 5000
+QUERY_CHUNK = 500
+
+_NON_DIGITS = re.compile(r"[^0-9]")
+_WEIGHTS = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Resultado da consulta externa: (status, razão social, JSON da resposta)
+Lookup = Tuple[str, Optional[str], Optional[Dict[str, Any]]]
+
+stats: Counter = Counter()
+
+
+def lookup_enabled() -> bool:
+    return os.getenv("CNPJ_LOOKUP_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+
+# -------------------------
+# Dígitos verificadores
+# -------------------------
+
+def only_digits(value: Optional[str]) -> str:
+    return _NON_DIGITS.sub("", value or "")
+
+
+def _check_digit(digits: str) -> str:
+    weights = _WEIGHTS[-len(digits):]
+    rest = sum(int(d) * w for d, w in zip(digits, weights)) % 11
+    return "0" if rest < 2 else str(11 - rest)
+
+
+def is_valid_cnpj(digits: str) -> bool:
+    """14 dígitos, não todos iguais, com os dois dígitos verificadores corretos."""
+    if len(digits) != 14 or not digits.isascii() or not digits.isdigit() or digits == digits[0] * 14:
+        return False
+    return digits[12] == _check_digit(digits[:12]) and digits[13] == _check_digit(digits[:13])
+
+
+def format_cnpj(digits: str) -> str:
+    return f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}/{digits[8:12]}-{digits[12:]}" if len(digits) == 14 else digits
+
+
+# -------------------------
+# Consulta externa
+# -------------------------
+
+def _company_name(data: Dict[str, Any]) -> Optional[str]:
+    return data.get("razao_social") or data.get("nome_fantasia") or data.get("nome")
+
+
+class RemoteLookup:
+    """Consulta à BrasilAPI (CNPJ_LOOKUP_URL). Depois de uma falha de rede fica desligada por OFFLINE_SECONDS."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.offline_until = 0.0
+
+    def available(self) -> bool:
+        return lookup_enabled() and self.clock() >= self.offline_until
+
+    def _offline(self) -> None:
+        self.offline_until = self.clock() + OFFLINE_SECONDS
+        stats["offline"] += 1
+
+    def fetch(self, digits: str, client=None) -> Optional[Lookup]:
+        """("active", nome, dados) ou ("not_found", None, None); None quando não deu para consultar."""
+        if not self.available():
+            return None
+        stats["remote_calls"] += 1
+        url = LOOKUP_URL.format(cnpj=digits)
+        try:
+            if client is None:
+                with httpx.Client(timeout=LOOKUP_TIMEOUT) as own:
+                    resp = own.get(url)
+            else:
+                resp = client.get(url)
+        except httpx.HTTPError:
+            self._offline()
+            return None
+        if resp.status_code == 200:
+            try:
+                data = resp.json()
+            except ValueError:
+                stats["remote_errors"] += 1
+                return None
+            return "active", _company_name(data), data
+        if resp.status_code == 404:
+            return "not_found", None, None
+        stats["remote_errors"] += 1
+        if resp.status_code == 429 or resp.status_code >= 500:
+            self._offline()
+        return None
+
+
+remote = RemoteLookup()
+
+
+# -------------------------
+# Cache
+# -------------------------
+
+def _expires(status: str, now: datetime) -> datetime:
+    if status == "not_found":
+        return now + timedelta(hours=NOT_FOUND_TTL_HOURS)
+    return now + timedelta(days=CACHE_TTL_DAYS)
+
+
+def store(db: Session, digits: str, result: Lookup, now: Optional[datetime] = None) -> CnpjCache:
+    """Gravar o resultado da consulta externa (sem commit)."""
+    now = now or datetime.utcnow()
+    status, name, data = result
+    row = db.get(CnpjCache, digits)
+    if row is None:
+        row = CnpjCache(cnpj=digits)
+        db.add(row)
+    row.status = status
+    row.company_name = name
+    row.source = "brasilapi"
+    row.raw = json.dumps(data, ensure_ascii=False) if data is not None else None
+    row.fetched_at = now
+    row.expires_at = _expires(status, now)
+    return row
+
+
+def seed(db: Session, entries: Iterable[Tuple[Optional[str], Optional[str]]], now: Optional[datetime] = None) -> int:
+    """Incluir (CNPJ, nome) do cadastro que ainda não estão no cache, já vencidos para serem
+    confirmados pela consulta externa quando houver rede. Sem commit. Retorna quantos."""
+    now = now or datetime.utcnow()
+    names: Dict[str, Optional[str]] = {}
+    for cnpj, name in entries:
+        digits = only_digits(cnpj)
+        if is_valid_cnpj(digits) and digits not in names:
+            names[digits] = (name or "").strip() or None
+    if not names:
+        return 0
+    pending = list(names)
+    existing: Set[str] = set()
+    for start in range(0, len(pending), QUERY_CHUNK):
+        existing.update(db.execute(
+            select(CnpjCache.cnpj).where(CnpjCache.cnpj.in_(pending[start:start + QUERY_CHUNK]))
+        ).scalars())
+    rows = [{"cnpj": digits, "company_name": name, "status": "local", "source": "supplier", "expires_at": now}
+            for digits, name in names.items() if digits not in existing]
+    if rows:
+        db.execute(insert(CnpjCache), rows)
+    return len(rows)
+
+
+def seed_from_suppliers(db: Session) -> int:
+    """Semear o cache com os fornecedores cadastrados (ativos primeiro). Sem commit."""
+    suppliers = db.execute(
+        select(Supplier.cnpj, Supplier.name).where(Supplier.cnpj.isnot(None))
+        .order_by(Supplier.is_active.desc(), Supplier.id)
+    ).all()
+    return seed(db, suppliers)
+
+
+def ensure_seeded() -> None:
+    """Carga inicial do cache a partir dos fornecedores (startup, em segundo plano)."""
+    db = SessionLocal()
+    try:
+        count = seed_from_suppliers(db)
+        db.commit()
+        if count:
+            print(f"🏢 Cache de CNPJ: {count} fornecedores incluídos")
+            refresher.notify()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Falha ao semear o cache de CNPJ: {e}")
+    finally:
+        db.close()
+
+
+# -------------------------
+# Validação
+# -------------------------
+
+def _invalid(digits: str) -> Dict[str, Any]:
+    return {"valid": False, "cnpj": digits, "status": "invalid", "verified": False, "source": "local",
+            "error": "CNPJ inválido (dígitos verificadores não conferem)"}
+
+
+def _unverified(digits: str) -> Dict[str, Any]:
+    return {"valid": True, "cnpj": digits, "company_name": None, "status": "unverified", "verified": False,
+            "source": "offline", "stale": False}
+
+
+def _from_row(row: CnpjCache, stale: bool, source: str = "cache") -> Dict[str, Any]:
+    if row.status == "not_found":
+        return {"valid": False, "cnpj": row.cnpj, "status": "not_found", "verified": True, "source": source,
+                "stale": stale, "error": "CNPJ não encontrado"}
+    result = {"valid": True, "cnpj": row.cnpj, "company_name": row.company_name, "status": row.status,
+              "verified": row.status == "active", "source": source, "stale": stale}
+    if row.raw:
+        result["raw"] = json.loads(row.raw)
+    return result
+
+
+def _cached(row: CnpjCache, now: datetime) -> Dict[str, Any]:
+    stale = row.expires_at <= now
+    if stale:
+        stats["stale"] += 1
+        refresher.request(row.cnpj)
+    else:
+        stats["hits"] += 1
+    return _from_row(row, stale)
+
+
+def validate_offline(db: Session, digits: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """Dígitos verificadores e cache, sem rede. None quando o CNPJ válido ainda não está no cache."""
+    if not is_valid_cnpj(digits):
+        stats["invalid"] += 1
+        return _invalid(digits)
+    row = db.get(CnpjCache, digits)
+    if row is None:
+        return None
+    return _cached(row, now or datetime.utcnow())
+
+
+async def validate(db: Session, digits: str) -> Dict[str, Any]:
+    """validate_offline; fora do cache, uma consulta externa (se disponível) que já fica gravada."""
+    result = validate_offline(db, digits)
+    if result is not None:
+        return result
+    stats["misses"] += 1
+    fetched = await asyncio.to_thread(remote.fetch, digits) if remote.available() else None
+    if fetched is None:
+        refresher.request(digits)
+        return _unverified(digits)
+    try:
+        row = store(db, digits, fetched)
+        db.commit()
+    except Exception:
+        # Outra requisição gravou o mesmo CNPJ antes: a resposta continua valendo
+        db.rollback()
+        row = CnpjCache(cnpj=digits, status=fetched[0], company_name=fetched[1],
+                        raw=json.dumps(fetched[2], ensure_ascii=False) if fetched[2] is not None else None)
+    return _from_row(row, stale=False, source="remote")
+
+
+def validate_many(db: Session, values: List[Optional[str]], now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Validação em lote sem rede, na ordem recebida (campo "input" com o valor original).
+    Os válidos fora do cache ficam "não verificados" e vão para a atualização em segundo plano."""
+    now = now or datetime.utcnow()
+    digits_list = [only_digits(v) for v in values]
+    wanted = sorted({d for d in digits_list if is_valid_cnpj(d)})
+    rows: Dict[str, CnpjCache] = {}
+    for start in range(0, len(wanted), QUERY_CHUNK):
+        for row in db.execute(
+            select(CnpjCache).where(CnpjCache.cnpj.in_(wanted[start:start + QUERY_CHUNK]))
+        ).scalars():
+            rows[row.cnpj] = row
+    seen: Dict[str, Dict[str, Any]] = {}
+    results = []
+    for value, digits in zip(values, digits_list):
+        if digits not in seen:
+            if not is_valid_cnpj(digits):
+                stats["invalid"] += 1
+                seen[digits] = _invalid(digits)
+            elif digits in rows:
+                seen[digits] = _cached(rows[digits], now)
+            else:
+                stats["misses"] += 1
+                refresher.request(digits)
+                seen[digits] = _unverified(digits)
+        results.append({"input": value, **seen[digits]})
+    return results
+
+
+# -------------------------
+# Atualização em segundo plano
+# -------------------------
+
+class CnpjRefresher(BackgroundWorker):
+    """Consulta externa dos CNPJs pedidos (fora do cache) e das entradas vencidas.
+    refresh_batch é síncrono (roda em thread) e pode ser chamado direto nos testes."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, lookup: Optional[RemoteLookup] = None,
+                 batch_size: int = REFRESH_BATCH, poll_seconds: float = POLL_SECONDS,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        super().__init__()
+        self.session_factory = session_factory
+        self.lookup = lookup
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> Set[str]:
+        with self._lock:
+            return set(self._pending)
+
+    def request(self, digits: str) -> None:
+        if not lookup_enabled():
+            return
+        with self._lock:
+            self._pending.add(digits)
+        self.notify()
+
+    def refresh_batch(self) -> Dict[str, int]:
+        """Consultar um lote. Retorna contadores (checked, refreshed)."""
+        lookup = self.lookup or remote
+        if not lookup.available():
+            return {"checked": 0, "refreshed": 0}
+        db = self.session_factory()
+        try:
+            now = self.clock()
+            with self._lock:
+                requested = sorted(self._pending)[:self.batch_size]
+                self._pending.difference_update(requested)
+            due = list(requested)
+            if len(due) < self.batch_size:
+                due.extend(db.execute(
+                    select(CnpjCache.cnpj).where(CnpjCache.expires_at <= now, CnpjCache.cnpj.notin_(requested))
+                    .order_by(CnpjCache.expires_at).limit(self.batch_size - len(due))
+                ).scalars())
+            refreshed = 0
+            if due:
+                with httpx.Client(timeout=LOOKUP_TIMEOUT) as client:
+                    for i, digits in enumerate(due):
+                        result = lookup.fetch(digits, client)
+                        if result is not None:
+                            store(db, digits, result, now)
+                            refreshed += 1
+                        elif not lookup.available():
+                            # Sem rede: os pedidos que faltaram voltam para a fila
+                            with self._lock:
+                                self._pending.update(d for d in due[i:] if d in requested)
+                            break
+                        else:
+                            # Resposta inesperada: tenta de novo mais tarde, sem repetir a cada lote
+                            row = db.get(CnpjCache, digits)
+                            if row is not None:
+                                row.expires_at = now + timedelta(hours=NOT_FOUND_TTL_HOURS)
+                db.commit()
+            stats["refreshed"] += refreshed
+            return {"checked": len(due), "refreshed": refreshed}
+        finally:
+            db.close()
+
+    def drain(self) -> int:
+        """Consultar lotes até não haver pendentes/vencidos (ou a rede cair). Retorna o total atualizado."""
+        total = 0
+        while True:
+            result = self.refresh_batch()
+            total += result["refreshed"]
+            if result["checked"] < self.batch_size:
+                return total
+
+    # Tarefa de fundo (BackgroundWorker): pedidos novos a acordam via notify()
+    error_message = "Falha na atualização do cache de CNPJ"
+
+    def interval(self) -> float:
+        return self.poll_seconds
+
+    async def step(self) -> None:
+        await asyncio.to_thread(self.drain)
+
+
+refresher = CnpjRefresher()
@@ -0,0 +1,220 @@
+"""
+Compressão das respostas HTTP (middleware ASGI puro).
+
+As listagens JSON (/materials/all, /inventory/materials), os relatórios e as
+páginas HTML saíam sem compressão quando não havia nginx na frente, como na
+instalação desktop (PyInstaller). Este middleware comprime no próprio app:
+
+- brotli quando o módulo estiver instalado e o cliente aceitar "br"; senão gzip;
+- apenas tipos da lista (JSON, HTML, CSS, JS, CSV, SVG, XML), com nível por
+  tipo: respostas dinâmicas usam nível baixo (a maior parte do ganho com pouca
+  CPU), arquivos estáticos um pouco mais alto;
+- respostas menores que COMPRESSION_MIN_SIZE, PDFs, imagens, SSE
+  (text/event-stream), 206/304 e corpos já codificados passam direto;
+- respostas em streaming são comprimidas pedaço a pedaço com flush, sem
+  acumular o corpo inteiro.
+"""
+
+import gzip
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # dependência opcional
+    brotli = None
+
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# tipo -> (nível gzip, qualidade brotli); ver scripts/bench_compression.py.
+# JSON/CSV: gzip 1 já comprime tanto quanto o 4 (listas repetitivas) com metade da CPU
+CONTENT_TYPES: Dict[str, Tuple[int, int]] = {
+    "application/json": (1, 4),
+    "text/csv": (1, 4),
+    "text/html": (4, 4),
+    "text/plain": (4, 4),
+    "application/xml": (4, 4),
+    "text/xml": (4, 4),
+    "text/css": (6, 5),
+    "text/javascript": (6, 5),
+    "application/javascript": (6, 5),
+    "application/manifest+json": (6, 5),
+    "image/svg+xml": (6, 5),
+}
+
+SKIP_STATUS = {204, 206, 304}
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Codificações aceitas com seus pesos q."""
+    accepted = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    accepted = parse_accept_encoding(header)
+    star = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", star) > 0:
+        return "br"
+    if accepted.get("gzip", star) > 0:
+        return "gzip"
+    return None
+
+
+def compression_levels(content_type: str) -> Optional[Tuple[int, int]]:
+    """Níveis para o tipo do conteúdo; None quando o tipo não deve ser comprimido."""
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    return CONTENT_TYPES.get(media_type)
+
+
+class _Encoder:
+    """Compressor incremental (gzip ou brotli) com flush por pedaço."""
+
+    def __init__(self, encoding: str, levels: Tuple[int, int]):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=levels[1])
+        else:
+            self._gz = zlib.compressobj(levels[0], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+
+def compress_body(body: bytes, encoding: str, levels: Tuple[int, int]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=levels[1])
+    return gzip.compress(body, compresslevel=levels[0], mtime=0)
+
+
+def _header(headers, name: bytes) -> Optional[str]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _without(headers, *names: bytes):
+    return [(k, v) for k, v in headers if k.lower() not in names]
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        request_headers = scope.get("headers") or []
+        encoding = choose_encoding(_header(request_headers, b"accept-encoding") or "")
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start = None
+        self.mode = None  # None (decidindo), "plain", "done" (corpo único comprimido), "stream"
+        self.encoder: Optional[_Encoder] = None
+        self.levels: Optional[Tuple[int, int]] = None
+
+    def _compressible(self) -> bool:
+        headers = self.start.get("headers") or []
+        if self.start["status"] in SKIP_STATUS or _header(headers, b"content-encoding"):
+            return False
+        self.levels = compression_levels(_header(headers, b"content-type") or "")
+        if self.levels is None:
+            return False
+        length = _header(headers, b"content-length")
+        if length is not None and length.isdigit() and int(length) < self.minimum_size:
+            return False
+        return True
+
+    def _encoded_headers(self, length: Optional[int]):
+        headers = _without(self.start.get("headers") or [], b"content-length", b"vary")
+        vary = _header(self.start.get("headers") or [], b"vary")
+        vary_values = [v.strip() for v in vary.split(",") if v.strip()] if vary else []
+        if "accept-encoding" not in (v.lower() for v in vary_values):
+            vary_values.append("Accept-Encoding")
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", ", ".join(vary_values).encode()))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        # O corpo comprimido é outra representação: ETag forte vira fraco
+        etag = _header(headers, b"etag")
+        if etag and not etag.startswith("W/"):
+            headers = _without(headers, b"etag") + [(b"etag", f"W/{etag}".encode("latin-1"))]
+        return headers
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or self.start is None:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.mode is None:
+            if not self._compressible():
+                self.mode = "plain"
+                await self._send(self.start)
+            elif not more_body:
+                # Corpo completo numa mensagem só
+                if len(body) < self.minimum_size:
+                    await self._send(self.start)
+                    await self._send(message)
+                    self.mode = "plain"
+                    return
+                compressed = compress_body(body, self.encoding, self.levels)
+                await self._send(dict(self.start, headers=self._encoded_headers(len(compressed))))
+                await self._send({"type": "http.response.body", "body": compressed})
+                self.mode = "done"
+                return
+            else:
+                self.mode = "stream"
+                self.encoder = _Encoder(self.encoding, self.levels)
+                await self._send(dict(self.start, headers=self._encoded_headers(None)))
+
+        if self.mode == "plain":
+            await self._send(message)
+        elif self.mode == "stream":
+            chunk = self.encoder.compress(body) if body else b""
+            if not more_body:
+                chunk += self.encoder.finish()
+            if chunk or not more_body:
+                await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
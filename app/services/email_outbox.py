@@ -0,0 +1,244 @@
+"""
+Caixa de saída de e-mails com envio em lote e novas tentativas.
+
+send_email_smtp abria uma conexão SMTP dentro da requisição (cadastro com
+senha temporária) e só respondia depois que o servidor de e-mail aceitasse a
+mensagem. Agora a requisição apenas grava na tabela email_outbox e um
+remetente em segundo plano:
+
+- reserva um lote de mensagens (claim_token, seguro com vários workers);
+- carrega cada template uma vez por lote e envia tudo numa única conexão SMTP;
+- em falha reagenda com backoff exponencial (EMAIL_RETRY_SECONDS × 2^tentativas)
+  e, esgotadas EMAIL_MAX_ATTEMPTS, marca como "dead" e registra em ErrorLog;
+- apaga o contexto do template (que pode conter senha temporária) após o envio.
+
+Sem SMTP configurado o envio é simulado e registrado na auditoria, como antes.
+"""
+
+import asyncio
+import json
+import os
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Callable, Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, TemplateError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.admin import AuditLog, ErrorLog
+from app.models.email_outbox import EmailOutbox
+from app.services.background_worker import BackgroundWorker
+from app.templates_config import TEMPLATES_DIR
+
+BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "30"))
+RETRY_SECONDS = float(os.getenv("EMAIL_RETRY_SECONDS", "60"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+CLAIM_TIMEOUT_MINUTES = 10
+TEMPLATE_DIR = os.path.join(TEMPLATES_DIR, "email")
+
+
+def smtp_config() -> Optional[Dict[str, Any]]:
+    """Configuração SMTP do ambiente; None quando incompleta (envio simulado)."""
+    server = os.getenv("SMTP_SERVER")
+    username = os.getenv("SMTP_USERNAME")
+    password = os.getenv("SMTP_PASSWORD")
+    email_from = os.getenv("EMAIL_FROM") or username
+    if not (server and username and password and email_from):
+        return None
+    return {
+        "server": server,
+        "port": int(os.getenv("SMTP_PORT", "587")),
+        "username": username,
+        "password": password,
+        "from": email_from,
+        "starttls": os.getenv("SMTP_STARTTLS", "true").lower() not in ("0", "false", "no"),
+    }
+
+
+def enqueue_email(db: Session, to: Optional[str], subject: str, body: Optional[str] = None,
+                  template: Optional[str] = None, context: Optional[Dict[str, Any]] = None,
+                  user_id: Optional[int] = None) -> Optional[EmailOutbox]:
+    """Gravar o e-mail na caixa de saída (commit) e acordar o remetente. Sem destinatário não faz nada."""
+    if not to:
+        return None
+    item = EmailOutbox(
+        user_id=user_id, to_address=to, subject=subject, body=body, template=template,
+        context=json.dumps(context, ensure_ascii=False) if context is not None else None,
+        status="pending", attempts=0, next_attempt_at=datetime.utcnow(),
+    )
+    db.add(item)
+    db.commit()
+    email_sender.notify()
+    return item
+
+
+def backoff_seconds(attempts: int, base: Optional[float] = None) -> float:
+    base = RETRY_SECONDS if base is None else base
+    return base * (2 ** max(0, attempts - 1))
+
+
+class EmailSender(BackgroundWorker):
+    """Remetente em segundo plano. send_batch é síncrono (roda em thread) e pode ser chamado direto nos testes."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, batch_size: int = BATCH_SIZE,
+                 poll_seconds: float = POLL_SECONDS, max_attempts: int = MAX_ATTEMPTS,
+                 retry_seconds: float = RETRY_SECONDS, template_dir: str = TEMPLATE_DIR,
+                 config_provider: Callable[[], Optional[Dict[str, Any]]] = smtp_config,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        super().__init__()
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.template_env = Environment(loader=FileSystemLoader(template_dir), undefined=StrictUndefined,
+                                        autoescape=False, auto_reload=False)
+        self.config_provider = config_provider
+        self.clock = clock
+
+    # Reserva do lote
+    def _claim(self, db: Session, now: datetime) -> List[EmailOutbox]:
+        # Prontas para envio, ou reservadas por um worker que parou no meio do lote
+        stale = now - timedelta(minutes=CLAIM_TIMEOUT_MINUTES)
+        ready = (((EmailOutbox.status == "pending") & (EmailOutbox.next_attempt_at <= now))
+                 | ((EmailOutbox.status == "sending") & (EmailOutbox.claimed_at < stale)))
+        ids = [
+            row.id for row in db.query(EmailOutbox.id).filter(ready)
+            .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id).limit(self.batch_size)
+        ]
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids), ready).update(
+            {EmailOutbox.status: "sending", EmailOutbox.claim_token: token, EmailOutbox.claimed_at: now},
+            synchronize_session=False,
+        )
+        db.commit()
+        return db.query(EmailOutbox).filter(EmailOutbox.claim_token == token).order_by(EmailOutbox.id).all()
+
+    def _render(self, items: List[EmailOutbox]) -> Dict[int, Any]:
+        """Corpo de cada mensagem (str) ou a exceção de renderização. Cada template é carregado uma vez."""
+        compiled: Dict[str, Any] = {}
+        rendered: Dict[int, Any] = {}
+        for item in items:
+            if not item.template:
+                rendered[item.id] = item.body or ""
+                continue
+            try:
+                if item.template not in compiled:
+                    compiled[item.template] = self.template_env.get_template(item.template)
+                rendered[item.id] = compiled[item.template].render(**json.loads(item.context or "{}"))
+            except (TemplateError, ValueError, TypeError) as e:
+                rendered[item.id] = e
+        return rendered
+
+    def _mark_sent(self, db: Session, item: EmailOutbox, now: datetime, body: str, via: str) -> None:
+        item.status = "sent"
+        item.sent_at = now
+        item.context = None
+        item.claim_token = None
+        item.last_error = None
+        changes = f"to={item.to_address}; subject={item.subject}; via={via}"
+        if via == "stub":
+            changes = f"to={item.to_address}; subject={item.subject}; body={body[:200]}"
+        db.add(AuditLog(user_id=item.user_id, action="email_sent", entity="email", changes=changes))
+
+    def _mark_failed(self, db: Session, item: EmailOutbox, now: datetime, error: str, permanent: bool = False) -> None:
+        item.attempts = (item.attempts or 0) + 1
+        item.last_error = error[:1000]
+        item.claim_token = None
+        if permanent or item.attempts >= self.max_attempts:
+            item.status = "dead"
+            item.context = None
+            db.add(ErrorLog(module="admin", error_type="email_send_failure", message=error,
+                            context=f"to={item.to_address}; subject={item.subject}; attempts={item.attempts}"))
+        else:
+            item.status = "pending"
+            item.next_attempt_at = now + timedelta(seconds=backoff_seconds(item.attempts, self.retry_seconds))
+
+    def _deliver(self, db: Session, config: Dict[str, Any], ready: List[tuple], now: datetime) -> int:
+        """Enviar numa única conexão. Falha de conexão reagenda o restante do lote."""
+        sent = 0
+        pending = list(ready)
+        try:
+            with smtplib.SMTP(config["server"], config["port"], timeout=10) as smtp:
+                if config["starttls"]:
+                    smtp.starttls()
+                smtp.login(config["username"], config["password"])
+                while pending:
+                    item, body = pending[0]
+                    msg = EmailMessage()
+                    msg["From"] = config["from"]
+                    msg["To"] = item.to_address
+                    msg["Subject"] = item.subject
+                    msg.set_content(body)
+                    try:
+                        smtp.send_message(msg)
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                        # Rejeição desta mensagem: a conexão continua válida
+                        permanent = isinstance(e, smtplib.SMTPRecipientsRefused) and all(
+                            code >= 500 for code, _ in e.recipients.values())
+                        self._mark_failed(db, item, now, f"{type(e).__name__}: {e}", permanent=permanent)
+                    else:
+                        self._mark_sent(db, item, now, body, via="smtp")
+                        sent += 1
+                    pending.pop(0)
+        except (smtplib.SMTPException, OSError) as e:
+            for item, _ in pending:
+                self._mark_failed(db, item, now, f"{type(e).__name__}: {e}")
+        return sent
+
+    def send_batch(self) -> Dict[str, int]:
+        """Enviar um lote. Retorna contadores (claimed, sent, failed)."""
+        db = self.session_factory()
+        try:
+            now = self.clock()
+            items = self._claim(db, now)
+            if not items:
+                return {"claimed": 0, "sent": 0, "failed": 0}
+            rendered = self._render(items)
+            ready = []
+            for item in items:
+                body = rendered[item.id]
+                if isinstance(body, Exception):
+                    self._mark_failed(db, item, now, f"Template {item.template}: {body}", permanent=True)
+                else:
+                    ready.append((item, body))
+            config = self.config_provider()
+            if config is None:
+                for item, body in ready:
+                    self._mark_sent(db, item, now, body, via="stub")
+                sent = len(ready)
+            elif ready:
+                sent = self._deliver(db, config, ready, now)
+            else:
+                sent = 0
+            db.commit()
+            return {"claimed": len(items), "sent": sent, "failed": len(items) - sent}
+        finally:
+            db.close()
+
+    def drain(self) -> int:
+        """Enviar lotes até não haver mensagens prontas. Retorna o total enviado."""
+        total = 0
+        while True:
+            result = self.send_batch()
+            total += result["sent"]
+            if result["claimed"] < self.batch_size:
+                return total
+
+    # Tarefa de fundo (BackgroundWorker): enqueue_email a acorda via notify()
+    error_message = "Falha no envio da caixa de saída de e-mails"
+
+    def interval(self) -> float:
+        return self.poll_seconds
+
+    async def step(self) -> None:
+        await asyncio.to_thread(self.drain)
+
+
+email_sender = EmailSender()
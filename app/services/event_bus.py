@@ -0,0 +1,309 @@
+"""
+Barramento de eventos para o feed SSE do dashboard e dos alertas.
+
+As telas consultavam /metrics, /alerts, /recent-activities e
+/preventive-alerts por timer, multiplicando a carga do banco pelo número de
+abas abertas. Agora as alterações de OS, movimentações de estoque,
+abastecimentos, horímetros e alertas preventivos são gravadas na tabela
+event_outbox na mesma transação (hook after_flush da sessão). Cada worker lê
+a tabela a partir do último id visto e repassa os eventos aos clientes SSE,
+que recebem deltas agrupados por intervalo, heartbeat e retomada pelo
+cabeçalho Last-Event-ID. Não há broker externo: o próprio SQLite faz o
+fan-out entre workers.
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, Callable, Awaitable, AsyncIterator
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.event_outbox import OutboxEvent
+from app.models.maintenance import WorkOrder, MaintenanceAlert
+from app.models.warehouse import StockMovement, Fueling
+from app.models.equipment import HorimeterLog
+from app.services.background_worker import BackgroundWorker
+
+# Entidades publicadas no feed e seus tópicos
+TOPICS = {
+    WorkOrder: "work_orders",
+    StockMovement: "stock_movements",
+    Fueling: "fuelings",
+    HorimeterLog: "horimeter",
+    MaintenanceAlert: "preventive_alerts",
+}
+
+COALESCE_SECONDS = float(os.getenv("SSE_COALESCE_SECONDS", "2"))
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "1"))
+RETENTION_HOURS = float(os.getenv("SSE_RETENTION_HOURS", "24"))
+RETRY_MS = 5000
+QUEUE_SIZE = 1000
+REPLAY_LIMIT = 1000
+
+
+# -------------------------
+# Publicação (hooks da sessão)
+# -------------------------
+
+@event.listens_for(Session, "after_flush")
+def _record_changes(session, flush_context):
+    """Gravar na caixa de saída as entidades publicadas que mudaram neste flush."""
+    rows = []
+    for action, instances in (("created", session.new), ("updated", session.dirty), ("deleted", session.deleted)):
+        for obj in instances:
+            topic = TOPICS.get(type(obj))
+            if not topic:
+                continue
+            if action == "updated" and not session.is_modified(obj, include_collections=False):
+                continue
+            rows.append({"topic": topic, "action": action, "entity_id": getattr(obj, "id", None)})
+    if rows:
+        session.connection().execute(OutboxEvent.__table__.insert(), rows)
+        session.info["event_outbox_pending"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("event_outbox_pending", False):
+        bus.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop("event_outbox_pending", None)
+
+
+# -------------------------
+# Formatação SSE
+# -------------------------
+
+def format_sse(event_name: Optional[str], data: Any, event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event_name:
+        lines.append(f"event: {event_name}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def coalesce(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Agrupar eventos em {tópico: {ação: [ids]}} sem repetir ids."""
+    topics: Dict[str, Dict[str, List[int]]] = {}
+    for ev in events:
+        ids = topics.setdefault(ev["topic"], {}).setdefault(ev["action"], [])
+        if ev["entity_id"] is not None and ev["entity_id"] not in ids:
+            ids.append(ev["entity_id"])
+    return {"topics": topics, "last_event_id": events[-1]["id"] if events else None}
+
+
+# -------------------------
+# Barramento por processo
+# -------------------------
+
+class Subscription:
+    """Fila de um cliente SSE. Se estourar, o cliente recebe um evento resync."""
+
+    def __init__(self, maxsize: int = QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def put(self, ev: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(ev)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def drain(self) -> List[Dict[str, Any]]:
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+        return items
+
+
+class EventBus(BackgroundWorker):
+    """Lê a caixa de saída (id > cursor) e distribui aos assinantes deste processo.
+    O leitor só roda enquanto houver assinantes; commits locais o acordam na hora,
+    e eventos de outros workers chegam no intervalo de polling."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, poll_seconds: float = POLL_SECONDS,
+                 retention_hours: float = RETENTION_HOURS):
+        super().__init__()
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.retention_hours = retention_hours
+        self.subscribers: List[Subscription] = []
+        self.cursor: Optional[int] = None
+        self._last_prune: Optional[datetime] = None
+        self._cursor_lock: Optional[asyncio.Lock] = None
+
+    # Acesso ao banco (executado em thread)
+    def _latest_id(self) -> int:
+        db = self.session_factory()
+        try:
+            return db.query(func.max(OutboxEvent.id)).scalar() or 0
+        finally:
+            db.close()
+
+    def _fetch(self, after_id: int, limit: int) -> List[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.action, OutboxEvent.entity_id)
+                .filter(OutboxEvent.id > after_id)
+                .order_by(OutboxEvent.id)
+                .limit(limit)
+                .all()
+            )
+            return [{"id": r.id, "topic": r.topic, "action": r.action, "entity_id": r.entity_id} for r in rows]
+        finally:
+            db.close()
+
+    def _prune(self) -> None:
+        db = self.session_factory()
+        try:
+            cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+            db.query(OutboxEvent).filter(OutboxEvent.created_at < cutoff).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def latest_id(self) -> int:
+        return await asyncio.to_thread(self._latest_id)
+
+    async def ensure_cursor(self) -> int:
+        """Fixar o cursor do leitor uma única vez (antes de qualquer replay)."""
+        if self._cursor_lock is None:
+            self._cursor_lock = asyncio.Lock()
+        async with self._cursor_lock:
+            if self.cursor is None:
+                self.cursor = await self.latest_id()
+        return self.cursor
+
+    async def replay(self, after_id: int, limit: Optional[int] = None):
+        """Eventos após after_id. complete=False quando o histórico passa do limite."""
+        limit = REPLAY_LIMIT if limit is None else limit
+        events = await asyncio.to_thread(self._fetch, after_id, limit + 1)
+        return events[:limit], len(events) <= limit
+
+    # Assinaturas
+    def subscribe(self) -> Subscription:
+        sub = Subscription()
+        self.subscribers.append(sub)
+        if not self.running:
+            self._cursor_lock = asyncio.Lock()
+            self.start()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        if sub in self.subscribers:
+            self.subscribers.remove(sub)
+        if not self.subscribers and self.cancel():
+            self.cursor = None
+
+    async def poll_once(self) -> int:
+        """Distribuir os eventos novos. Retorna a quantidade repassada."""
+        await self.ensure_cursor()
+        events = await asyncio.to_thread(self._fetch, self.cursor, REPLAY_LIMIT)
+        for ev in events:
+            for sub in list(self.subscribers):
+                sub.put(ev)
+        if events:
+            self.cursor = events[-1]["id"]
+        now = datetime.utcnow()
+        if self._last_prune is None or now - self._last_prune > timedelta(hours=1):
+            self._last_prune = now
+            await asyncio.to_thread(self._prune)
+        return len(events)
+
+    # Leitor (BackgroundWorker): commits locais o acordam via notify()
+    error_message = "Falha ao ler event_outbox"
+
+    def interval(self) -> float:
+        return self.poll_seconds
+
+    async def step(self) -> None:
+        await self.poll_once()
+
+    async def stop(self) -> None:
+        self.subscribers.clear()
+        self.cursor = None
+        await super().stop()
+
+
+bus = EventBus()
+
+
+# -------------------------
+# Fluxo SSE de um cliente
+# -------------------------
+
+async def event_stream(
+    event_bus: EventBus,
+    last_event_id: Optional[int] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    coalesce_seconds: Optional[float] = None,
+    heartbeat_seconds: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """Gerar o fluxo text/event-stream: ready/resync, deltas agrupados e heartbeats.
+
+    Com last_event_id, reenvia o que foi perdido desde então; se o histórico
+    passou do limite (ou a fila do cliente estourou), envia resync para o
+    cliente recarregar tudo.
+    """
+    coalesce_seconds = COALESCE_SECONDS if coalesce_seconds is None else coalesce_seconds
+    heartbeat_seconds = HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    loop = asyncio.get_running_loop()
+    sub = event_bus.subscribe()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        await event_bus.ensure_cursor()
+        if last_event_id is None:
+            cursor = await event_bus.latest_id()
+            yield format_sse("ready", {"last_event_id": cursor}, cursor)
+        else:
+            events, complete = await event_bus.replay(last_event_id)
+            if not complete:
+                cursor = await event_bus.latest_id()
+                yield format_sse("resync", {"last_event_id": cursor}, cursor)
+            elif events:
+                cursor = events[-1]["id"]
+                yield format_sse("delta", coalesce(events), cursor)
+            else:
+                cursor = last_event_id
+        last_sent = loop.time()
+
+        while True:
+            await asyncio.sleep(coalesce_seconds)
+            if is_disconnected is not None and await is_disconnected():
+                break
+            if sub.overflowed:
+                sub.overflowed = False
+                sub.drain()
+                cursor = await event_bus.latest_id()
+                yield format_sse("resync", {"last_event_id": cursor}, cursor)
+                last_sent = loop.time()
+                continue
+            # Descartar o que já foi enviado no replay
+            events = [ev for ev in sub.drain() if ev["id"] > cursor]
+            if events:
+                cursor = events[-1]["id"]
+                yield format_sse("delta", coalesce(events), cursor)
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= heartbeat_seconds:
+                yield ": heartbeat\n\n"
+                last_sent = loop.time()
+    finally:
+        event_bus.unsubscribe(sub)
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
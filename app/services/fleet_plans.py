@@ -0,0 +1,301 @@
+"""
+Geração de planos preventivos em lote para a frota.
+
+Na mobilização de uma obra chegam dezenas de equipamentos iguais; gerar os
+planos um a um repetia a extração do manual, fazia uma consulta por
+material e um commit por plano. Aqui:
+
+- os equipamentos são agrupados por fabricante, modelo e categoria, e cada
+  grupo gera um único modelo de planos (manual mais recente do grupo ou
+  heurística), aplicado a todos os membros;
+- as referências e nomes de materiais de todos os grupos são resolvidos numa
+  consulta IN; materiais não cadastrados não são criados (como no modo
+  manual da geração individual), apenas listados;
+- planos já existentes do equipamento (mesmo tipo e intervalo, ativos) são
+  mantidos, o que torna a operação repetível;
+- planos, ações, materiais dos planos e perfis técnicos faltantes de todos os
+  membros são inseridos em lote, na transação da sessão (commit na rota).
+
+preview() descreve o que seria gravado (dry-run); apply() grava.
+"""
+
+import os
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.equipment import Equipment, EquipmentTechnicalProfile
+from app.models.maintenance import MaintenancePlan, MaintenancePlanAction, MaintenancePlanMaterial
+from app.models.warehouse import Material
+from app.services import knowledge_index, manual_storage
+from app.services.plan_generator import generate_plans_from_manual, generate_plans_via_internet, plan_label
+
+MODES = ("manual", "internet")
+
+
+def group_key(equipment: Equipment) -> Tuple[str, str, str]:
+    """(fabricante, modelo, categoria) normalizados: equipamentos com o mesmo modelo de planos."""
+    return tuple(" ".join((value or "").split()).casefold()
+                 for value in (equipment.manufacturer, equipment.model, equipment.category))
+
+
+def _plan_key(plan_type: str, interval_type: str, interval_value: int) -> Tuple[str, str, int]:
+    return plan_type, interval_type, int(interval_value)
+
+
+class FleetGroup:
+    """Equipamentos do mesmo fabricante/modelo/categoria e o modelo de planos gerado para eles."""
+
+    def __init__(self, key: Tuple[str, str, str], members: List[Equipment]):
+        self.key = key
+        self.members = members
+        self.manual_path: Optional[str] = None
+        self.template: List[Dict[str, object]] = []
+        self.error: Optional[str] = None
+
+    @property
+    def representative(self) -> Equipment:
+        return self.members[0]
+
+    def describe(self) -> Dict[str, object]:
+        rep = self.representative
+        return {
+            "manufacturer": rep.manufacturer,
+            "model": rep.model,
+            "category": rep.category,
+            "equipment_ids": [eq.id for eq in self.members],
+            "manual": os.path.basename(self.manual_path) if self.manual_path else None,
+            "error": self.error,
+        }
+
+
+def load_groups(db: Session, equipment_ids: Iterable[int]) -> Tuple[List[FleetGroup], List[int]]:
+    """Equipamentos agrupados (uma consulta) e os ids não encontrados."""
+    ids = sorted({int(i) for i in equipment_ids})
+    equipments = db.query(Equipment).filter(Equipment.id.in_(ids)).order_by(Equipment.id).all() if ids else []
+    groups: Dict[Tuple[str, str, str], FleetGroup] = {}
+    for eq in equipments:
+        key = group_key(eq)
+        if key in groups:
+            groups[key].members.append(eq)
+        else:
+            groups[key] = FleetGroup(key, [eq])
+    found = {eq.id for eq in equipments}
+    return list(groups.values()), [i for i in ids if i not in found]
+
+
+def attach_manuals(db: Session, groups: Iterable[FleetGroup]) -> None:
+    """Modo manual: o manual mais recente anexado a qualquer membro vale para o grupo."""
+    for group in groups:
+        group.manual_path = manual_storage.latest_manual_path_for(db, [eq.id for eq in group.members])
+        if not group.manual_path:
+            group.error = "Nenhum manual anexado aos equipamentos deste modelo"
+
+
+def build_templates(groups: Iterable[FleetGroup], mode: str) -> None:
+    """Um modelo de planos por grupo, gerado para o representante (sem acesso ao banco)."""
+    for group in groups:
+        if group.error:
+            continue
+        if mode == "manual":
+            group.template = generate_plans_from_manual(group.representative, group.manual_path)
+        else:
+            group.template = generate_plans_via_internet(group.representative)
+
+
+def _member_name(spec_name: str, template_label: str, member: Equipment) -> str:
+    if spec_name.endswith(template_label):
+        return spec_name[: len(spec_name) - len(template_label)] + plan_label(member)
+    return spec_name
+
+
+class FleetBatch:
+    """Linhas a inserir (planos com suas ações e materiais) e o resumo para a prévia."""
+
+    def __init__(self):
+        self.plans: List[Tuple[Dict[str, object], List[Dict[str, object]], List[Dict[str, object]]]] = []
+        self.profiles: List[Dict[str, object]] = []
+        self.equipments: List[Dict[str, object]] = []
+        self.groups: List[Dict[str, object]] = []
+        self.missing_materials: List[Dict[str, object]] = []
+
+    def preview(self) -> Dict[str, object]:
+        return {
+            "groups": self.groups,
+            "equipments": self.equipments,
+            "missing_materials": self.missing_materials,
+            "totals": {
+                "plans": len(self.plans),
+                "actions": sum(len(actions) for _, actions, _ in self.plans),
+                "materials": sum(len(materials) for _, _, materials in self.plans),
+                "existing_plans": sum(len(e["existing"]) for e in self.equipments),
+                "technical_profiles": len(self.profiles),
+                "missing_materials": len(self.missing_materials),
+            },
+        }
+
+
+def _resolve_materials(db: Session, groups: Iterable[FleetGroup]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Ids por referência e por nome, de todos os materiais dos modelos, numa consulta IN."""
+    refs, names = set(), set()
+    for group in groups:
+        for spec in group.template:
+            for m in spec.get("materials", []) or []:
+                ref = (m.get("reference") or "").strip()
+                name = (m.get("name") or "").strip()
+                if ref:
+                    refs.add(ref)
+                if name:
+                    names.add(name)
+    by_ref: Dict[str, int] = {}
+    by_name: Dict[str, int] = {}
+    if not refs and not names:
+        return by_ref, by_name
+    rows = db.execute(
+        select(Material.id, Material.reference, Material.name)
+        .where(or_(Material.reference.in_(refs), Material.name.in_(names)))
+        .order_by(Material.id)
+    )
+    for material_id, reference, name in rows:
+        if reference in refs:
+            by_ref.setdefault(reference, material_id)
+        if name in names:
+            by_name.setdefault(name, material_id)
+    return by_ref, by_name
+
+
+def prepare(db: Session, groups: List[FleetGroup],
+            profile_builder: Optional[Callable[[Equipment], dict]] = None) -> FleetBatch:
+    """Montar as linhas de todos os membros: materiais, planos existentes e perfis numa consulta cada."""
+    batch = FleetBatch()
+    by_ref, by_name = _resolve_materials(db, groups)
+    member_ids = [eq.id for group in groups for eq in group.members]
+
+    existing: Dict[int, Dict[Tuple[str, str, int], Dict[str, object]]] = {}
+    rows = db.execute(
+        select(MaintenancePlan.id, MaintenancePlan.equipment_id, MaintenancePlan.name, MaintenancePlan.type,
+               MaintenancePlan.interval_type, MaintenancePlan.interval_value)
+        .where(MaintenancePlan.equipment_id.in_(member_ids), MaintenancePlan.is_active.is_(True))
+    ) if member_ids else []
+    for plan_id, equipment_id, name, plan_type, interval_type, interval_value in rows:
+        existing.setdefault(equipment_id, {}).setdefault(
+            _plan_key(plan_type, interval_type, interval_value), {"id": plan_id, "name": name})
+
+    with_profile = set()
+    if profile_builder is not None and member_ids:
+        with_profile = set(db.execute(
+            select(EquipmentTechnicalProfile.equipment_id)
+            .where(EquipmentTechnicalProfile.equipment_id.in_(member_ids))
+        ).scalars())
+
+    missing: Dict[Tuple[str, str], Dict[str, object]] = {}
+    for group in groups:
+        batch.groups.append({**group.describe(), "plans": [
+            {"name": spec.get("name"), "interval_type": spec.get("interval_type") or "Horímetro",
+             "interval_value": int(spec.get("interval_value") or 250),
+             "actions": len(spec.get("actions", []) or []), "materials": len(spec.get("materials", []) or [])}
+            for spec in group.template
+        ]})
+        if group.error:
+            continue  # grupo sem modelo (ex.: sem manual): membros não são alterados
+
+        # Linhas do modelo: iguais para todos os membros, exceto equipamento e nome
+        template_label = plan_label(group.representative)
+        rows_template = []
+        for spec in group.template:
+            plan_row = {
+                "name": spec.get("name"),
+                "type": spec.get("type") or "Preventiva",
+                "interval_type": spec.get("interval_type") or "Horímetro",
+                "interval_value": int(spec.get("interval_value") or 250),
+                "description": spec.get("description"),
+                "checklist_template": spec.get("checklist_template") or {"items": []},
+                "is_active": True,
+                "estimated_hours": float(spec.get("estimated_hours") or 4.0),
+                "priority": spec.get("priority") or "Normal",
+            }
+            actions = [{
+                "description": action.get("description") or "Ação",
+                "action_type": action.get("action_type") or "Inspeção",
+                "sequence_order": action.get("sequence_order") or 1,
+                "estimated_time_minutes": action.get("estimated_time_minutes"),
+                "requires_specialist": bool(action.get("requires_specialist")),
+                "safety_notes": action.get("safety_notes"),
+            } for action in spec.get("actions", []) or []]
+            materials = []
+            for m in spec.get("materials", []) or []:
+                ref = (m.get("reference") or "").strip()
+                name = (m.get("name") or "").strip()
+                material_id = (by_ref.get(ref) if ref else None) or (by_name.get(name) if name else None)
+                if material_id is None:
+                    entry = missing.setdefault((ref, name), {
+                        "name": name or "Material", "reference": ref, "unit": m.get("unit") or "un",
+                        "plans": 0,
+                    })
+                    entry["plans"] += len(group.members)
+                    continue
+                materials.append({
+                    "material_id": material_id,
+                    "quantity": float(m.get("quantity") or 1.0),
+                    "unit": m.get("unit") or "un",
+                    "is_critical": bool(m.get("is_critical") or False),
+                })
+            rows_template.append((plan_row, actions, materials))
+
+        for eq in group.members:
+            current = existing.get(eq.id, {})
+            entry = {"id": eq.id, "prefix": eq.prefix, "create": [], "existing": [],
+                     "technical_profile": None}
+            for plan_row, actions, materials in rows_template:
+                key = _plan_key(plan_row["type"], plan_row["interval_type"], plan_row["interval_value"])
+                if key in current:
+                    entry["existing"].append(current[key])
+                    continue
+                row = {**plan_row, "equipment_id": eq.id,
+                       "name": _member_name(str(plan_row["name"] or f"Plano {eq.prefix}"), template_label, eq)}
+                batch.plans.append((row, actions, materials))
+                entry["create"].append({"name": row["name"], "interval_type": row["interval_type"],
+                                        "interval_value": row["interval_value"]})
+            if profile_builder is not None:
+                if eq.id in with_profile:
+                    entry["technical_profile"] = "existing"
+                else:
+                    batch.profiles.append({"equipment_id": eq.id, "profile_data": profile_builder(eq)})
+                    entry["technical_profile"] = "create"
+            batch.equipments.append(entry)
+
+    batch.missing_materials = list(missing.values())
+    return batch
+
+
+def apply(db: Session, batch: FleetBatch) -> Dict[int, List[int]]:
+    """Inserir tudo em lote (sem commit). Retorna os ids dos planos criados por equipamento."""
+    created: Dict[int, List[int]] = {}
+    if batch.plans:
+        # Sem coluna sentinela o RETURNING em lote não garante a ordem: casar pelos valores
+        pending: Dict[Tuple, List[int]] = {}
+        for index, (row, _, _) in enumerate(batch.plans):
+            pending.setdefault((row["equipment_id"], row["name"], row["interval_value"]), []).append(index)
+        returned = db.execute(
+            insert(MaintenancePlan).returning(MaintenancePlan.id, MaintenancePlan.equipment_id,
+                                              MaintenancePlan.name, MaintenancePlan.interval_value),
+            [row for row, _, _ in batch.plans],
+        ).all()
+        plan_ids: List[int] = [0] * len(batch.plans)
+        for plan_id, equipment_id, name, interval_value in returned:
+            plan_ids[pending[(equipment_id, name, interval_value)].pop(0)] = plan_id
+        action_rows, material_rows = [], []
+        for plan_id, (row, actions, materials) in zip(plan_ids, batch.plans):
+            created.setdefault(row["equipment_id"], []).append(plan_id)
+            action_rows.extend({**a, "plan_id": plan_id} for a in actions)
+            material_rows.extend({**m, "plan_id": plan_id} for m in materials)
+        if action_rows:
+            db.execute(insert(MaintenancePlanAction), action_rows)
+        if material_rows:
+            db.execute(insert(MaintenancePlanMaterial), material_rows)
+        # insert(Model) não passa pelo flush: o índice de busca fica sabendo pelos ids retornados
+        knowledge_index.track(db, (("checklist", plan_id) for plan_id in plan_ids))
+    if batch.profiles:
+        db.execute(insert(EquipmentTechnicalProfile), batch.profiles)
+    return created
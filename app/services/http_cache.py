@@ -0,0 +1,201 @@
+"""
+ETag e GET condicional para listagens e relatórios.
+
+Listas grandes (/materials/all, /inventory/materials, /equipment/list,
+/plans) e os relatórios eram reenviados inteiros a cada atualização. Cada
+flush do SQLAlchemy incrementa um contador por tabela (table_versions, na
+mesma transação, de modo que todos os workers enxergam o mesmo valor).
+O helper etag_guard monta um ETag fraco a partir das versões das tabelas
+lidas pelo endpoint e responde 304 antes de executar o handler quando o
+cliente já tem a versão atual. Para os demais GET JSON, o middleware usa o
+hash do corpo (economiza banda, não CPU).
+"""
+
+import hashlib
+import time
+from typing import Optional, Iterable, Dict, Set
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models.table_version import TableVersion
+from app.services.asgi_pipeline import header_value
+
+ALL_TABLES = "*"
+API_CACHE_CONTROL = "private, no-cache"
+# Tabelas de controle/log: não invalidam as respostas de dados
+IGNORED_TABLES = {"session_tokens", "audit_logs", "error_logs", "idempotency_records", "event_outbox", "email_outbox", "table_versions"}
+
+_versions = TableVersion.__table__
+
+
+# -------------------------
+# Contadores de alteração
+# -------------------------
+
+def bump_versions(connection, names: Iterable[str]) -> None:
+    """Incrementar as versões (e a global "*"), criando as linhas que faltarem."""
+    names = set(names) | {ALL_TABLES}
+    result = connection.execute(
+        update(_versions).where(_versions.c.name.in_(names)).values(version=_versions.c.version + 1)
+    )
+    if result.rowcount < len(names):
+        existing = {row[0] for row in connection.execute(select(_versions.c.name).where(_versions.c.name.in_(names)))}
+        missing = names - existing
+        if missing:
+            connection.execute(insert(_versions), [{"name": n, "version": 1} for n in sorted(missing)])
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session, flush_context):
+    tables: Set[str] = {getattr(obj, "__tablename__", None) for obj in list(session.new) + list(session.deleted)}
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            tables.add(getattr(obj, "__tablename__", None))
+    tables.discard(None)
+    tables -= IGNORED_TABLES
+    if tables:
+        bump_versions(session.connection(), tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bump_on_bulk_write(orm_execute_state):
+    """query.update()/query.delete() e insert(Model) em lote não passam pelo flush."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    tables = {m.local_table.name for m in orm_execute_state.all_mappers} - IGNORED_TABLES
+    if tables:
+        bump_versions(orm_execute_state.session.connection(), tables)
+
+
+def seed_table_versions(connection, table_names: Iterable[str]) -> None:
+    """Criar as linhas das tabelas existentes (evita inserts concorrentes entre workers)."""
+    names = (set(table_names) - IGNORED_TABLES) | {ALL_TABLES}
+    existing = {row[0] for row in connection.execute(select(_versions.c.name))}
+    missing = names - existing
+    if missing:
+        connection.execute(insert(_versions), [{"name": n, "version": 0} for n in sorted(missing)])
+
+
+def current_versions(db: Session, tables: Iterable[str]) -> Dict[str, int]:
+    names = sorted(set(tables))
+    rows = db.execute(select(_versions.c.name, _versions.c.version).where(_versions.c.name.in_(names))).all()
+    found = {name: version for name, version in rows}
+    return {name: found.get(name, 0) for name in names}
+
+
+# -------------------------
+# ETag
+# -------------------------
+
+def _weak(digest: str) -> str:
+    return f'W/"{digest[:20]}"'
+
+
+def build_etag(request: Request, versions: Dict[str, int], bucket_seconds: Optional[int] = None) -> str:
+    """ETag fraco da URL (caminho + query) e das versões das tabelas.
+    bucket_seconds: para respostas que dependem do relógio (períodos padrão "últimos N dias")."""
+    parts = [request.url.path, str(sorted(request.query_params.multi_items()))]
+    parts += [f"{name}={version}" for name, version in sorted(versions.items())]
+    if bucket_seconds:
+        parts.append(str(int(time.time() // bucket_seconds)))
+    return _weak(hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest())
+
+
+def body_etag(body: bytes) -> str:
+    return _weak(hashlib.sha1(body).hexdigest())
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparação fraca de If-None-Match (lista separada por vírgulas ou "*")."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def etag_guard(*tables: str, bucket_seconds: Optional[int] = None, cache_control: str = API_CACHE_CONTROL):
+    """Dependência por endpoint: responde 304 sem executar o handler se nada mudou.
+
+    Uso: @router.get("/materials/all", dependencies=[Depends(etag_guard("materials"))])
+    Sem tabelas, usa a versão global (qualquer alteração invalida). Requisições de
+    página (Accept: text/html) não são afetadas.
+    """
+    names = tables or (ALL_TABLES,)
+
+    def dependency(request: Request, response: Response, db: Session = Depends(get_db)):
+        if "text/html" in request.headers.get("accept", ""):
+            return
+        etag = build_etag(request, current_versions(db, names), bucket_seconds)
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
+
+
+class ConditionalGetMiddleware:
+    """Middleware ASGI de GET condicional para respostas JSON.
+    Endpoints com etag_guard já respondem 304 sem executar o handler; nos demais,
+    o ETag fraco é o hash do corpo e o 304 economiza apenas a transferência.
+    Só as respostas elegíveis (GET 200 JSON sem ETag nem no-store) têm o corpo
+    acumulado; as demais passam direto, inclusive em streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "GET":
+            await self.app(scope, receive, send)
+            return
+        state = {"start": None, "chunks": [], "buffering": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                if message["status"] != 200 or not (header_value(headers, b"content-type") or "").startswith("application/json"):
+                    await send(message)
+                    return
+                cache_control = header_value(headers, b"cache-control")
+                if cache_control is None:
+                    cache_control = API_CACHE_CONTROL
+                    headers.append((b"cache-control", cache_control.encode("latin-1")))
+                    message = dict(message, headers=headers)
+                if header_value(headers, b"etag") is not None or "no-store" in cache_control:
+                    await send(message)
+                    return
+                state.update(start=message, buffering=True, cache_control=cache_control)
+                return
+            if not state["buffering"] or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            state["chunks"].append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(state["chunks"])
+            etag = body_etag(body)
+            if etag_matches(header_value(scope.get("headers"), b"if-none-match"), etag):
+                await send({"type": "http.response.start", "status": 304,
+                            "headers": [(b"etag", etag.encode("latin-1")),
+                                        (b"cache-control", state["cache_control"].encode("latin-1"))]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            headers = [(k, v) for k, v in state["start"].get("headers") or [] if k.lower() != b"content-length"]
+            headers += [(b"content-length", str(len(body)).encode()), (b"etag", etag.encode("latin-1"))]
+            await send(dict(state["start"], headers=headers))
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
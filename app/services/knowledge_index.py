@@ -0,0 +1,586 @@
+"""
+Índice de busca local (SQLite FTS5) da base de conhecimento da manutenção.
+
+O chat de IA dependia da busca na web (DuckDuckGo), que não funciona nas
+obras sem internet. Aqui ficam indexados, num SQLite próprio
+(KNOWLEDGE_INDEX_DB, fora do banco principal, como os demais caches
+descartáveis):
+
+- OS: número, título, descrição, notas e causa (data de fechamento e
+  equipamento para filtrar);
+- ações dos planos de manutenção e checklists (template) dos planos;
+- texto dos manuais, por página (extraído por pdf_text, uma vez por arquivo).
+
+Atualização incremental: os hooks da sessão anotam as chaves (tipo, id) das
+entidades alteradas no flush e em query.update()/delete(); depois do commit os
+documentos são relidos do banco e regravados (ou removidos) no índice. Manuais
+novos são extraídos numa thread à parte. rebuild() refaz tudo (carga inicial
+em segundo plano no startup, enquanto o índice não estiver completo).
+
+A consulta normaliza acentos e usa prefixos (radical aproximado das palavras
+em português). Os termos são combinados em AND, do mais raro ao mais comum
+(frequência pelo fts5vocab); enquanto faltarem resultados, o termo mais comum
+sai da consulta. Palavras que não aparecem no índice são ignoradas. O ranking
+é o BM25 do FTS5, com peso maior no título; com termos muito comuns, só as
+RANK_CANDIDATES ocorrências mais recentes são ranqueadas (latência limitada
+mesmo com milhões de documentos).
+
+KNOWLEDGE_INDEX_ENABLED=0 desliga o índice do banco da aplicação.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.database import engine as app_engine
+from app.models.maintenance import WorkOrder, MaintenancePlan, MaintenancePlanAction
+from app.models.manual_file import ManualFile
+
+INDEX_PATH = os.getenv("KNOWLEDGE_INDEX_DB", os.path.join("data", "knowledge_index.db"))
+ENABLED = os.getenv("KNOWLEDGE_INDEX_ENABLED", "1").lower() not in ("0", "false", "no")
+BATCH_SIZE = 500
+MAX_QUERY_TERMS = 12
+RANK_CANDIDATES = 5000
+
+# Entidade -> tipo de documento (MaintenancePlan: o checklist do plano)
+KINDS = {
+    WorkOrder: "work_order",
+    MaintenancePlanAction: "plan_action",
+    MaintenancePlan: "checklist",
+    ManualFile: "manual",
+}
+
+STOPWORDS = frozenset(
+    "a o e as os de da do das dos em no na nos nas um uma uns umas para pra por com sem que qual quais "
+    "como ou se ao aos ate esta este isso isto ser ter tem sao foi meu minha seu sua sobre mais muito "
+    "quando onde porque qual quero preciso pode".split()
+)
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+_PENDING = "knowledge_index_pending"
+
+
+class Document(NamedTuple):
+    kind: str
+    ref: str
+    equipment_id: Optional[int]
+    closed_at: Optional[str]   # OS fechadas: data de fechamento (ISO)
+    title: str
+    body: str
+
+
+class Hit(NamedTuple):
+    kind: str
+    ref: str
+    equipment_id: Optional[int]
+    title: str
+    snippet: str
+    score: float
+
+
+# -------------------------
+# Consulta
+# -------------------------
+
+def normalize(text: str) -> str:
+    """Minúsculas e sem acentos (o tokenizer do FTS5 faz o mesmo no índice)."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class Term(NamedTuple):
+    text: str
+    prefix: bool
+
+    def expression(self) -> str:
+        return f'"{self.text}"*' if self.prefix else f'"{self.text}"'
+
+
+def query_terms(text: str) -> List[Term]:
+    """Termos da pergunta: sem acentos e palavras vazias; palavras longas viram prefixo
+    (vazamento/vazamentos, hidraulico/hidraulica)."""
+    terms: List[Term] = []
+    for token in _TOKEN.findall(normalize(text)):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if token.isalpha() and len(token) >= 6:
+            term = Term(token[:-2], True)
+        else:
+            term = Term(token, token.isalpha() and len(token) >= 3)
+        if term not in terms:
+            terms.append(term)
+        if len(terms) >= MAX_QUERY_TERMS:
+            break
+    return terms
+
+
+# -------------------------
+# Índice
+# -------------------------
+
+class KnowledgeIndex:
+    """Documentos (tipo, ref) em SQLite com tabela FTS5 de conteúdo externo."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.executescript("""
+                    CREATE TABLE IF NOT EXISTS documents (
+                        id INTEGER PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        ref TEXT NOT NULL,
+                        equipment_id INTEGER,
+                        closed_at TEXT,
+                        title TEXT NOT NULL,
+                        body TEXT NOT NULL,
+                        UNIQUE (kind, ref)
+                    );
+                    CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                        title, body, content='documents', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+                        INSERT INTO documents_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+                        INSERT INTO documents_fts (documents_fts, rowid, title, body)
+                        VALUES ('delete', old.id, old.title, old.body);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+                        INSERT INTO documents_fts (documents_fts, rowid, title, body)
+                        VALUES ('delete', old.id, old.title, old.body);
+                        INSERT INTO documents_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+                    END;
+                    CREATE VIRTUAL TABLE IF NOT EXISTS documents_vocab USING fts5vocab(documents_fts, 'row');
+                    CREATE TABLE IF NOT EXISTS manuals (sha256 TEXT PRIMARY KEY, pages INTEGER NOT NULL);
+                    CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT);
+                """)
+            self._local.conn = conn
+        return conn
+
+    # Gravação
+
+    def upsert(self, docs: Sequence[Document]) -> None:
+        if not docs:
+            return
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO documents (kind, ref, equipment_id, closed_at, title, body) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(kind, ref) DO UPDATE SET equipment_id = excluded.equipment_id, "
+                "closed_at = excluded.closed_at, title = excluded.title, body = excluded.body",
+                docs,
+            )
+
+    def delete(self, keys: Iterable[Tuple[str, str]]) -> None:
+        keys = list(keys)
+        if keys:
+            with self._connection() as conn:
+                conn.executemany("DELETE FROM documents WHERE kind = ? AND ref = ?", keys)
+
+    def refs(self, kind: str) -> Set[str]:
+        return {row[0] for row in self._connection().execute("SELECT ref FROM documents WHERE kind = ?", (kind,))}
+
+    def has_manual(self, sha256: str) -> bool:
+        return self._connection().execute("SELECT 1 FROM manuals WHERE sha256 = ?", (sha256,)).fetchone() is not None
+
+    def add_manual(self, sha256: str, docs: Sequence[Document], pages: int) -> None:
+        self.upsert(docs)
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO manuals (sha256, pages) VALUES (?, ?)", (sha256, pages))
+
+    def is_built(self) -> bool:
+        """Carga completa já feita."""
+        return self._connection().execute("SELECT 1 FROM index_meta WHERE key = 'built_at'").fetchone() is not None
+
+    def mark_built(self) -> None:
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('built_at', ?)",
+                         (datetime.utcnow().isoformat(timespec="seconds"),))
+
+    def document_count(self, kind: Optional[str] = None) -> int:
+        if kind is None:
+            return self._connection().execute("SELECT count(*) FROM documents").fetchone()[0]
+        return self._connection().execute("SELECT count(*) FROM documents WHERE kind = ?", (kind,)).fetchone()[0]
+
+    # Consulta
+
+    @staticmethod
+    def _filters(kinds, equipment_ids, closed_since) -> Tuple[str, List[object]]:
+        sql, params = "", []
+        if kinds:
+            sql += f" AND d.kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        if equipment_ids is not None:
+            sql += f" AND d.equipment_id IN ({','.join('?' * len(equipment_ids)) or 'NULL'})"
+            params.extend(equipment_ids)
+        if closed_since is not None:
+            sql += " AND d.closed_at >= ?"
+            params.append(closed_since.isoformat(sep=" ", timespec="seconds"))
+        return sql, params
+
+    def document_frequency(self, term: Term) -> int:
+        if term.prefix:
+            upper = term.text[:-1] + chr(ord(term.text[-1]) + 1)
+            row = self._connection().execute(
+                "SELECT sum(doc) FROM documents_vocab WHERE term >= ? AND term < ?", (term.text, upper)).fetchone()
+        else:
+            row = self._connection().execute("SELECT doc FROM documents_vocab WHERE term = ?", (term.text,)).fetchone()
+        return (row[0] or 0) if row else 0
+
+    def _ranked(self, expression: str, estimate: int, filters: str, params: List[object], limit: int) -> List[Hit]:
+        conn = self._connection()
+        if estimate > RANK_CANDIDATES:
+            # Termos muito comuns: BM25 só nas RANK_CANDIDATES ocorrências mais recentes (rowid maior)
+            row = conn.execute(
+                "SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (expression, RANK_CANDIDATES - 1),
+            ).fetchone()
+            if row is not None:
+                filters, params = filters + " AND documents_fts.rowid >= ?", [*params, row[0]]
+        # CROSS JOIN: o FTS5 dirige a consulta (senão o MATCH é avaliado por documento)
+        rows = conn.execute(
+            "SELECT d.kind, d.ref, d.equipment_id, d.title, "
+            "snippet(documents_fts, 1, '', '', '…', 24), bm25(documents_fts, 5.0, 1.0) AS score "
+            "FROM documents_fts CROSS JOIN documents d ON d.id = documents_fts.rowid "
+            f"WHERE documents_fts MATCH ?{filters} ORDER BY score LIMIT ?",
+            [expression, *params, limit],
+        ).fetchall()
+        return [Hit(kind, ref, eq, title, snippet, -score) for kind, ref, eq, title, snippet, score in rows]
+
+    def search(self, query: str, kinds: Optional[Sequence[str]] = None,
+               equipment_ids: Optional[Sequence[int]] = None, closed_since: Optional[datetime] = None,
+               limit: int = 10) -> List[Hit]:
+        """Documentos mais relevantes para uma pergunta em texto livre.
+
+        Primeiro os que têm todos os termos; faltando resultados, sai o termo
+        mais comum e a busca se repete (os já encontrados vêm antes).
+        """
+        terms = sorted(((self.document_frequency(t), t) for t in query_terms(query)), key=lambda x: x[0])
+        terms = [(frequency, t) for frequency, t in terms if frequency > 0]
+        filters, params = self._filters(kinds, equipment_ids, closed_since)
+        hits: List[Hit] = []
+        seen = set()
+        while terms and len(hits) < limit:
+            expression = " AND ".join(t.expression() for _, t in terms)
+            for hit in self._ranked(expression, terms[0][0], filters, params, limit):
+                if (hit.kind, hit.ref) not in seen and len(hits) < limit:
+                    seen.add((hit.kind, hit.ref))
+                    hits.append(hit)
+            terms.pop()
+        return hits
+
+
+# Índice por engine: o banco da aplicação usa INDEX_PATH; outros (testes, scripts) só se anexados
+_indexes: Dict[object, KnowledgeIndex] = {}
+
+
+def attach(engine, index: KnowledgeIndex) -> KnowledgeIndex:
+    _indexes[engine] = index
+    return index
+
+
+def detach(engine) -> None:
+    _indexes.pop(engine, None)
+
+
+def index_for(bind) -> Optional[KnowledgeIndex]:
+    engine = getattr(bind, "engine", bind)
+    index = _indexes.get(engine)
+    if index is None and ENABLED and engine is app_engine:
+        index = attach(engine, KnowledgeIndex(INDEX_PATH))
+    return index
+
+
+# -------------------------
+# Documentos a partir do banco
+# -------------------------
+
+def _chunks(values: Sequence, size: int = BATCH_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _text(*parts) -> str:
+    return "\n".join(str(p).strip() for p in parts if p and str(p).strip())
+
+
+def _strings(value) -> List[str]:
+    """Textos de um template de checklist (JSON: listas, dicionários, strings)."""
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, dict):
+        return [s for v in value.values() for s in _strings(v)]
+    if isinstance(value, (list, tuple)):
+        return [s for v in value for s in _strings(v)]
+    return []
+
+
+def _work_order_documents(connection, ids) -> List[Document]:
+    rows = connection.execute(select(
+        WorkOrder.id, WorkOrder.number, WorkOrder.title, WorkOrder.description, WorkOrder.notes,
+        WorkOrder.maintenance_cause, WorkOrder.equipment_id, WorkOrder.status, WorkOrder.completed_at,
+    ).where(WorkOrder.id.in_(ids)))
+    docs = []
+    for wo_id, number, title, description, notes, cause, equipment_id, status, completed_at in rows:
+        closed_at = completed_at.isoformat(sep=" ", timespec="seconds") \
+            if status == "Fechada" and completed_at is not None else None
+        docs.append(Document("work_order", str(wo_id), equipment_id, closed_at,
+                             f"OS {number} - {title or ''}".strip(), _text(description, notes, cause)))
+    return docs
+
+
+def _plan_action_documents(connection, ids) -> List[Document]:
+    rows = connection.execute(select(
+        MaintenancePlanAction.id, MaintenancePlanAction.action_type, MaintenancePlanAction.description,
+        MaintenancePlanAction.safety_notes, MaintenancePlan.name, MaintenancePlan.equipment_id,
+    ).outerjoin(MaintenancePlan, MaintenancePlan.id == MaintenancePlanAction.plan_id)
+        .where(MaintenancePlanAction.id.in_(ids)))
+    return [
+        Document("plan_action", str(action_id), equipment_id, None,
+                 f"{plan_name or 'Plano'} - {action_type or 'Ação'}", _text(description, safety_notes))
+        for action_id, action_type, description, safety_notes, plan_name, equipment_id in rows
+    ]
+
+
+def _checklist_documents(connection, ids) -> List[Document]:
+    rows = connection.execute(select(
+        MaintenancePlan.id, MaintenancePlan.name, MaintenancePlan.equipment_id, MaintenancePlan.checklist_template,
+    ).where(MaintenancePlan.id.in_(ids)))
+    docs = []
+    for plan_id, name, equipment_id, template in rows:
+        items = _strings(template)
+        if items:
+            docs.append(Document("checklist", str(plan_id), equipment_id, None, f"Checklist - {name or 'Plano'}",
+                                 "\n".join(items)))
+    return docs
+
+
+_BUILDERS = {
+    "work_order": _work_order_documents,
+    "plan_action": _plan_action_documents,
+    "checklist": _checklist_documents,
+}
+
+
+def refresh(index: KnowledgeIndex, connection, keys: Iterable[Tuple[str, object]]) -> None:
+    """Regravar os documentos das chaves a partir do banco; o que não existe mais sai do índice."""
+    by_kind: Dict[str, Set[int]] = {}
+    for kind, ref in keys:
+        by_kind.setdefault(kind, set()).add(ref)
+
+    # O nome do plano aparece no título das suas ações
+    plan_ids = sorted(by_kind.get("checklist", ()))
+    for chunk in _chunks(plan_ids):
+        by_kind.setdefault("plan_action", set()).update(connection.execute(
+            select(MaintenancePlanAction.id).where(MaintenancePlanAction.plan_id.in_(chunk))).scalars())
+
+    for kind, builder in _BUILDERS.items():
+        ids = sorted(by_kind.get(kind, ()))
+        for chunk in _chunks(ids):
+            docs = builder(connection, chunk)
+            found = {doc.ref for doc in docs}
+            index.upsert(docs)
+            index.delete((kind, str(i)) for i in chunk if str(i) not in found)
+
+    shas = sorted(by_kind.get("manual", ()))
+    for chunk in _chunks(shas):
+        rows = connection.execute(select(ManualFile.sha256, ManualFile.extension, ManualFile.filename)
+                                  .where(ManualFile.sha256.in_(chunk)).order_by(ManualFile.id))
+        seen = set()
+        for sha256, extension, filename in rows:
+            if sha256 not in seen:
+                seen.add(sha256)
+                submit_manual(index, sha256, extension, filename)
+
+
+# -------------------------
+# Manuais
+# -------------------------
+
+_manual_executor: Optional[ThreadPoolExecutor] = None
+
+
+def index_manual(index: KnowledgeIndex, sha256: str, extension: str, filename: Optional[str]) -> int:
+    """Indexar o texto do manual (uma vez por arquivo); retorna o número de páginas com texto."""
+    if index.has_manual(sha256):
+        return 0
+    from app.services import manual_storage, pdf_text
+
+    path = manual_storage.blob_path(sha256, extension)
+    if not os.path.isfile(path):
+        return 0
+    if extension == ".pdf":
+        pages = pdf_text.extract_pdf_pages(path)
+    elif extension == ".txt":
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            pages = f.read().split("\f")
+    else:
+        pages = []
+    title = filename or f"Manual {sha256[:12]}"
+    docs = [
+        Document("manual", f"{sha256}:{number}", None, None, f"{title} - p. {number}", text.strip())
+        for number, text in enumerate(pages, 1) if text and text.strip()
+    ]
+    index.add_manual(sha256, docs, len(pages))
+    return len(docs)
+
+
+def _index_manual_safely(index, sha256, extension, filename) -> int:
+    try:
+        return index_manual(index, sha256, extension, filename)
+    except Exception as e:
+        print(f"⚠️ Falha ao indexar manual {filename or sha256}: {e}")
+        return 0
+
+
+def submit_manual(index: KnowledgeIndex, sha256: str, extension: str, filename: Optional[str]) -> Future:
+    """Extração e indexação do manual numa thread à parte (uma por vez)."""
+    global _manual_executor
+    if _manual_executor is None:
+        _manual_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="knowledge-manuals")
+    return _manual_executor.submit(_index_manual_safely, index, sha256, extension, filename)
+
+
+def shutdown_executor() -> None:
+    global _manual_executor
+    if _manual_executor is not None:
+        _manual_executor.shutdown(wait=False, cancel_futures=True)
+        _manual_executor = None
+
+
+# -------------------------
+# Carga completa
+# -------------------------
+
+def rebuild(index: KnowledgeIndex, engine) -> Dict[str, int]:
+    """Reindexar tudo do banco (idempotente) e remover documentos órfãos; retorna contagens."""
+    models = {"work_order": WorkOrder, "plan_action": MaintenancePlanAction, "checklist": MaintenancePlan}
+    counts = {}
+    with engine.connect() as connection:
+        for kind, model in models.items():
+            ids = list(connection.execute(select(model.id).order_by(model.id)).scalars())
+            for chunk in _chunks(ids):
+                index.upsert(_BUILDERS[kind](connection, chunk))
+            existing = {str(i) for i in ids}
+            index.delete((kind, ref) for ref in index.refs(kind) if ref not in existing)
+            counts[kind] = index.document_count(kind)
+        manuals = connection.execute(select(ManualFile.sha256, ManualFile.extension, ManualFile.filename)
+                                     .order_by(ManualFile.id)).all()
+    seen = set()
+    for sha256, extension, filename in manuals:
+        if sha256 not in seen:
+            seen.add(sha256)
+            _index_manual_safely(index, sha256, extension, filename)
+    counts["manual"] = index.document_count("manual")
+    index.mark_built()
+    return counts
+
+
+def ensure_built() -> None:
+    """Carga inicial do índice do banco da aplicação (startup, em segundo plano)."""
+    index = index_for(app_engine)
+    try:
+        if index is not None and not index.is_built():
+            counts = rebuild(index, app_engine)
+            print(f"🔎 Índice de conhecimento criado: {counts}")
+    except Exception as e:
+        print(f"⚠️ Falha ao criar índice de conhecimento: {e}")
+
+
+# -------------------------
+# Hooks da sessão
+# -------------------------
+
+def _session_index(session) -> Optional[KnowledgeIndex]:
+    try:
+        return index_for(session.get_bind())
+    except Exception:
+        return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    """Anotar as entidades indexadas que mudaram neste flush (gravadas depois do commit)."""
+    keys = []
+    for obj in session.new:
+        kind = KINDS.get(type(obj))
+        if kind:
+            keys.append((kind, obj.sha256 if kind == "manual" else obj.id))
+    for obj in session.dirty:
+        kind = KINDS.get(type(obj))
+        if kind and kind != "manual" and session.is_modified(obj, include_collections=False):
+            keys.append((kind, obj.id))
+    for obj in session.deleted:
+        kind = KINDS.get(type(obj))
+        if kind and kind != "manual":
+            keys.append((kind, obj.id))
+    if keys and _session_index(session) is not None:
+        session.info.setdefault(_PENDING, set()).update(keys)
+
+
+def track(session: Session, keys: Iterable[Tuple[str, object]]) -> None:
+    """Anotar chaves gravadas por insert(Model) em lote, que não passa pelo flush
+    e cujos ids só quem inseriu conhece (RETURNING). Indexadas depois do commit;
+    uma chave ("checklist", id) traz junto as ações do plano."""
+    keys = list(keys)
+    if keys and _session_index(session) is not None:
+        session.info.setdefault(_PENDING, set()).update(keys)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_writes(orm_execute_state):
+    """query.update()/query.delete() não passam pelo flush: anotar os ids afetados antes."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    kind = KINDS.get(mapper.class_) if mapper is not None else None
+    if not kind or kind == "manual":
+        return
+    session = orm_execute_state.session
+    if _session_index(session) is None:
+        return
+    model = mapper.class_
+    query = select(model.id)
+    whereclause = orm_execute_state.statement.whereclause
+    if whereclause is not None:
+        query = query.where(whereclause)
+    ids = session.connection().execute(query).scalars().all()
+    if ids:
+        session.info.setdefault(_PENDING, set()).update((kind, i) for i in ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_after_commit(session):
+    keys = session.info.pop(_PENDING, None)
+    if not keys:
+        return
+    index = _session_index(session)
+    if index is None:
+        return
+    try:
+        with session.get_bind().engine.connect() as connection:
+            refresh(index, connection, keys)
+    except Exception as e:
+        print(f"⚠️ Falha ao atualizar índice de conhecimento: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,71 @@
+"""
+Importação sob demanda de bibliotecas pesadas.
+
+ReportLab e httpx eram importados no carregamento dos routers, mesmo que o PDF
+ou a chamada externa nunca fossem usados: isso pesa na inicialização do
+executável (PyInstaller) e a cada worker reiniciado. Os PDFs importam o
+ReportLab dentro da própria rota; para módulos usados em vários pontos,
+lazy_module devolve um substituto que só importa no primeiro acesso a um
+atributo.
+
+Em servidores, WARMUP_IMPORTS=1 faz o lifespan importar esses módulos em
+segundo plano logo após a inicialização, para a primeira requisição não
+pagar o custo.
+"""
+
+import importlib
+import os
+import sys
+from types import ModuleType
+from typing import Iterable, List
+
+# Módulos carregados por warmup(); os que não estiverem instalados são ignorados
+WARMUP_MODULES = (
+    "httpx",
+    "reportlab.platypus",
+    "reportlab.lib.styles",
+    "app.services.plan_generator",
+)
+
+
+class LazyModule(ModuleType):
+    """Substituto de módulo que importa o original no primeiro uso."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_target"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_lazy_target"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_target"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name: str) -> ModuleType:
+    """O próprio módulo se já estiver importado; senão um LazyModule."""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def warmup_enabled() -> bool:
+    return os.getenv("WARMUP_IMPORTS", "0").lower() in ("1", "true", "yes")
+
+
+def warmup(modules: Iterable[str] = WARMUP_MODULES) -> List[str]:
+    """Importa os módulos pesados; devolve os que foram carregados."""
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            continue
+    return loaded
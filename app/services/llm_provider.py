@@ -1,6 +1,55 @@
+"""LLM provider client (OpenAI, Azure OpenAI or the built-in local one) shared by the whole process.
+
+- One pooled ``httpx.AsyncClient`` (keep-alive, HTTP connection limits and
+  split connect/read timeouts) created on first use and closed by the app
+  lifespan (``aclose_client``), instead of a new client and TLS handshake per call.
+- Response cache keyed by (provider, model, normalized messages, temperature,
+  max tokens), bounded in size (AI_CACHE_SIZE) and time (AI_CACHE_TTL seconds).
+- Single-flight: identical prompts in flight share one provider request.
+- Retries with exponential backoff on timeouts, 429 and 5xx (AI_MAX_RETRIES),
+  honouring Retry-After, and a per-provider circuit breaker that fails fast
+  after AI_BREAKER_THRESHOLD consecutive failures for AI_BREAKER_COOLDOWN seconds.
+- Streaming (``llm_stream``): an async iterator of text chunks as the provider
+  sends them (server-sent events from chat/completions with ``stream: true``).
+- ``AI_PROVIDER=local``: deterministic templated answer built from the data in
+  the prompt, without network (offline sites and CI).
+- Time-to-first-chunk and total latency per provider over the last
+  AI_METRICS_WINDOW calls (``latency.snapshot()``).
+"""
+
+import asyncio
+import hashlib
+import json
 import os
-import httpx
-from typing import Optional, List, Dict
+import random
+import time
+import re
+from collections import Counter, OrderedDict, deque
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from app.services.lazy_imports import lazy_module
+
+httpx = lazy_module("httpx")
+
+CACHE_TTL = float(os.getenv("AI_CACHE_TTL", "300"))
+CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "256"))
+MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", "2"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+BREAKER_THRESHOLD = int(os.getenv("AI_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))
+
+METRICS_WINDOW = int(os.getenv("AI_METRICS_WINDOW", "200"))
+
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+LOCAL_PROVIDER = "local"
+
+stats: Counter = Counter()
+
+_client = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_transport = None
+_inflight: Dict[str, "asyncio.Task"] = {}
 
 
 def _provider() -> str:
@@ -21,80 +70,549 @@ def _default_max_tokens() -> int:
         return 500
 
 
+def _timeout_seconds() -> float:
+    try:
+        return float(os.getenv("AI_TIMEOUT", "30"))
+    except Exception:
+        return 30.0
+
+
+# -------------------------
+# Pooled client
+# -------------------------
+
+def get_client():
+    """Process-wide AsyncClient, recreated if the running event loop changed."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(_timeout_seconds(), connect=10.0, pool=10.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+            transport=_transport,
+        )
+        _client_loop = loop
+    return _client
+
+
+def set_transport(transport) -> None:
+    """Route provider calls through another httpx transport (tests, proxies)."""
+    global _transport, _client
+    _transport = transport
+    _client = None
+
+
+async def aclose_client() -> None:
+    """Close the pooled client (app shutdown)."""
+    global _client
+    client, _client = _client, None
+    if client is not None and not client.is_closed:
+        try:
+            await client.aclose()
+        except RuntimeError:
+            pass  # created on another (already closed) event loop
+
+
+# -------------------------
+# Response cache
+# -------------------------
+
+class ResponseCache:
+    """LRU cache of replies with a TTL."""
+
+    def __init__(self, max_size: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._items: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= self.clock():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        self._items[key] = (self.clock() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    return [
+        ((m.get("role") or "").strip().lower(), " ".join(str(m.get("content") or "").split()))
+        for m in messages
+    ]
+
+
+def cache_key(provider: str, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    raw = json.dumps([provider, model, normalize_messages(messages), temperature, max_tokens],
+                     ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+response_cache = ResponseCache(CACHE_SIZE, CACHE_TTL)
+
+
+# -------------------------
+# Circuit breaker
+# -------------------------
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> one trial call after `cooldown`."""
+
+    def __init__(self, threshold: int, cooldown: float, clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def release(self) -> None:
+        """The trial call was abandoned without an answer: allow another trial."""
+        self._trial = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = self.clock()
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = breakers.get(provider)
+    if breaker is None:
+        breaker = breakers[provider] = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_COOLDOWN)
+    return breaker
+
+
+# -------------------------
+# Latency metrics
+# -------------------------
+
+class LatencyTracker:
+    """Time to first chunk and total time per provider, over a sliding window of calls."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._counts: Counter = Counter()
+
+    def record(self, provider: str, metric: str, seconds: float) -> None:
+        key = (provider, metric)
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=max(self.window, 1))
+        samples.append(seconds)
+        self._counts[key] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """{provider: {metric: {count, p50_ms, p95_ms, max_ms}}}"""
+        out: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (provider, metric), samples in self._samples.items():
+            ordered = sorted(samples)
+            out.setdefault(provider, {})[metric] = {
+                "count": self._counts[(provider, metric)],
+                "p50_ms": round(ordered[(len(ordered) - 1) // 2] * 1000, 1),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1),
+            }
+        return out
+
+    def clear(self) -> None:
+        self._samples.clear()
+        self._counts.clear()
+
+
+latency = LatencyTracker(METRICS_WINDOW)
+
+
+# -------------------------
+# Local provider
+# -------------------------
+
+_CHUNK = re.compile(r"\S+\s*|\s+")
+
+
+def split_chunks(text: str) -> List[str]:
+    """Word-sized chunks (trailing whitespace kept) used to stream a finished text."""
+    return _CHUNK.findall(text or "")
+
+
+def _context_fields(content: str) -> Tuple[str, str, List[str], str]:
+    """(question, period line, data items, sources) from the chat context layout."""
+    question, period, sources = "", "", ""
+    items: List[str] = []
+    in_data = False
+    for line in content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("Pergunta:"):
+            question = stripped[len("Pergunta:"):].strip()
+        elif stripped.startswith("Período:"):
+            period = stripped
+        elif stripped.startswith("Fontes:"):
+            sources = stripped[len("Fontes:"):].strip()
+            in_data = False
+        elif stripped == "Dados:":
+            in_data = True
+        elif in_data and stripped.startswith("- "):
+            items.append(stripped[2:].strip())
+        elif in_data and stripped and items:
+            items[-1] += " " + stripped
+    return question, period, items, sources
+
+
+def local_reply(msgs: List[Dict[str, str]]) -> str:
+    """Deterministic answer from the data in the last user message (no model, no network)."""
+    content = next((str(m.get("content") or "") for m in reversed(msgs) if m.get("role") == "user"), "")
+    question, period, items, sources = _context_fields(content)
+    if not items:
+        subject = question or " ".join(content.split())[:200]
+        return f"Não há dados do sistema para responder: {subject}" if subject else "Não há dados do sistema para responder."
+    parts = []
+    if question:
+        parts.append(f"Sobre \"{question}\", com base nos dados internos:")
+    else:
+        parts.append("Com base nos dados internos:")
+    parts.extend(items)
+    if sources and sources != "—":
+        parts.append(f"Fontes: {sources}.")
+    if period:
+        parts.append(period.rstrip(".") + ".")
+    return "\n".join(parts)
+
+
+# -------------------------
+# Provider calls
+# -------------------------
+
+def _build_request(prov: str, msgs: List[Dict[str, str]], temperature: float, max_tokens: int):
+    """(url, headers, payload, model) for the configured provider, or None."""
+    if prov in ("openai",):
+        api_key = os.getenv("OPENAI_API_KEY")
+        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        if not api_key:
+            return None
+        url = "https://api.openai.com/v1/chat/completions"
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "model": model,
+            "messages": msgs,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        return url, headers, payload, model
+
+    if prov in ("azure", "azure_openai"):
+        api_key = os.getenv("AZURE_OPENAI_KEY")
+        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+        api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
+        if not (api_key and endpoint and deployment):
+            return None
+        url = f"{endpoint}/openai/deployments/{deployment}/chat/completions?api-version={api_version}"
+        headers = {
+            "api-key": api_key,
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "messages": msgs,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        return url, headers, payload, deployment
+
+    return None
+
+
+def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+async def _post(prov: str, url: str, headers: Dict[str, str], payload: Dict[str, object]) -> Optional[str]:
+    """POST with retries; updates the provider's circuit breaker."""
+    breaker = get_breaker(prov)
+    if not breaker.allow():
+        stats["short_circuited"] += 1
+        return None
+
+    client = get_client()
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            resp = await client.post(url, json=payload, headers=headers)
+        except httpx.TransportError:
+            pass  # timeout / connection error: retry
+        else:
+            if resp.status_code == 200:
+                breaker.record_success()
+                data = resp.json()
+                # Azure returns same schema as OpenAI for chat/completions
+                return (
+                    data.get("choices", [{}])[0]
+                    .get("message", {})
+                    .get("content")
+                )
+            if resp.status_code not in RETRY_STATUSES:
+                # Request problem (auth, payload): provider is healthy, retrying will not help
+                breaker.record_success()
+                stats["rejected"] += 1
+                return None
+            retry_after = resp.headers.get("Retry-After")
+        if attempt < MAX_RETRIES:
+            stats["retries"] += 1
+            await asyncio.sleep(_retry_delay(attempt, retry_after))
+
+    breaker.record_failure()
+    stats["failures"] += 1
+    return None
+
+
 async def llm_generate(messages: List[Dict[str, str]], system_prompt: Optional[str] = None) -> Optional[str]:
-    """Call an external LLM provider (OpenAI or Azure OpenAI) to generate a reply.
+    """Call the configured LLM provider (OpenAI, Azure OpenAI or local) to generate a reply.
 
     messages: list of {role: "user"|"assistant"|"system", content: str}
     system_prompt: optional system instruction to prepend.
 
     Returns text content or None if provider not configured/failed.
+    Replies are cached and identical concurrent prompts share one request.
     """
     prov = _provider()
     temperature = _default_temperature()
     max_tokens = _default_max_tokens()
+    msgs = _with_system(messages, system_prompt)
+    started = time.monotonic()
 
+    try:
+        if prov == LOCAL_PROVIDER:
+            stats["local"] += 1
+            reply = local_reply(msgs)
+            _record_latency(prov, started, started)
+            return reply
+
+        request = _build_request(prov, msgs, temperature, max_tokens)
+        if request is None:
+            return None
+        url, headers, payload, model = request
+
+        key = cache_key(prov, model, msgs, temperature, max_tokens)
+        cached = response_cache.get(key)
+        if cached is not None:
+            stats["cache_hits"] += 1
+            _record_latency(prov, started, started)
+            return cached
+
+        task = _inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            stats["coalesced"] += 1
+        else:
+            stats["cache_misses"] += 1
+            task = asyncio.ensure_future(_post(prov, url, headers, payload))
+            _inflight[key] = task
+
+            def _done(t, key=key):
+                if _inflight.get(key) is t:
+                    del _inflight[key]
+                if not t.cancelled() and t.exception() is None and t.result():
+                    response_cache.set(key, t.result())
+
+            task.add_done_callback(_done)
+        # shield: one caller giving up does not cancel the request for the others
+        reply = await asyncio.shield(task)
+        if reply:
+            done = time.monotonic()
+            _record_latency(prov, started, done)  # whole reply arrives at once: first chunk = total
+        return reply
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        return None
+
+
+def _with_system(messages: List[Dict[str, str]], system_prompt: Optional[str]) -> List[Dict[str, str]]:
     msgs = []
     if system_prompt:
         msgs.append({"role": "system", "content": system_prompt})
     msgs.extend(messages or [])
+    return msgs
 
-    try:
-        if prov in ("openai",):
-            api_key = os.getenv("OPENAI_API_KEY")
-            model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-            if not api_key:
-                return None
-            url = "https://api.openai.com/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            }
-            payload = {
-                "model": model,
-                "messages": msgs,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-            }
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(url, json=payload, headers=headers)
-                if resp.status_code != 200:
-                    return None
-                data = resp.json()
-                return (
-                    data.get("choices", [{}])[0]
-                    .get("message", {})
-                    .get("content")
-                )
 
-        if prov in ("azure", "azure_openai"):
-            api_key = os.getenv("AZURE_OPENAI_KEY")
-            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-            deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
-            api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
-            if not (api_key and endpoint and deployment):
-                return None
-            url = f"{endpoint}/openai/deployments/{deployment}/chat/completions?api-version={api_version}"
-            headers = {
-                "api-key": api_key,
-                "Content-Type": "application/json",
-            }
-            payload = {
-                "messages": msgs,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-            }
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(url, json=payload, headers=headers)
-                if resp.status_code != 200:
-                    return None
-                data = resp.json()
-                # Azure returns same schema as OpenAI for chat/completions
-                return (
-                    data.get("choices", [{}])[0]
-                    .get("message", {})
-                    .get("content")
-                )
-    except Exception:
+def _record_latency(prov: str, started: float, first_chunk_at: float) -> None:
+    now = time.monotonic()
+    latency.record(prov, "first_chunk", first_chunk_at - started)
+    latency.record(prov, "total", now - started)
+
+
+# -------------------------
+# Streaming
+# -------------------------
+
+async def _replay(chunks: Iterable[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+        await asyncio.sleep(0)
+
+
+def _delta_content(line: str) -> Optional[str]:
+    """Text of one ``data: {...}`` line of a chat/completions stream ("" for [DONE])."""
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return ""
+    try:
+        choices = json.loads(data).get("choices") or [{}]
+    except ValueError:
         return None
+    return (choices[0].get("delta") or {}).get("content") or None
+
+
+async def _stream_post(prov: str, url: str, headers: Dict[str, str], payload: Dict[str, object],
+                       key: str) -> AsyncIterator[str]:
+    """Streamed POST. Retries (same policy as _post) only until the first chunk was yielded."""
+    breaker = get_breaker(prov)
+    if not breaker.allow():
+        stats["short_circuited"] += 1
+        return
+
+    client = get_client()
+    parts: List[str] = []
+    settled = False
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            retry_after = None
+            try:
+                async with client.stream("POST", url, json={**payload, "stream": True}, headers=headers) as resp:
+                    if resp.status_code == 200:
+                        async for line in resp.aiter_lines():
+                            text = _delta_content(line)
+                            if text == "":
+                                break
+                            if text:
+                                parts.append(text)
+                                yield text
+                        settled = True
+                        breaker.record_success()
+                        if parts:
+                            response_cache.set(key, "".join(parts))
+                        return
+                    if resp.status_code not in RETRY_STATUSES:
+                        settled = True
+                        breaker.record_success()
+                        stats["rejected"] += 1
+                        return
+                    retry_after = resp.headers.get("Retry-After")
+            except httpx.TransportError:
+                if parts:
+                    # Connection lost mid-answer: what was sent cannot be taken back
+                    settled = True
+                    breaker.record_failure()
+                    stats["stream_errors"] += 1
+                    return
+            if attempt < MAX_RETRIES:
+                stats["retries"] += 1
+                await asyncio.sleep(_retry_delay(attempt, retry_after))
+
+        settled = True
+        breaker.record_failure()
+        stats["failures"] += 1
+    finally:
+        if not settled:
+            # Caller gave up (timeout, disconnect): the provider answered if a chunk arrived;
+            # otherwise the half-open trial is released so the breaker cannot stay stuck
+            if parts:
+                breaker.record_success()
+            else:
+                breaker.release()
+                stats["abandoned"] += 1
+
 
-    return None
\ No newline at end of file
+async def llm_stream(messages: List[Dict[str, str]], system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+    """Async iterator over the reply's text chunks as they arrive.
+
+    Same providers, cache and circuit breaker as ``llm_generate``; a cached reply
+    (or the local provider's answer) is replayed in word-sized chunks. Yields
+    nothing when no provider is configured or the call failed before the first
+    chunk, so callers fall back exactly as with ``llm_generate`` returning None.
+    """
+    prov = _provider()
+    temperature = _default_temperature()
+    max_tokens = _default_max_tokens()
+    msgs = _with_system(messages, system_prompt)
+    started = time.monotonic()
+
+    if prov == LOCAL_PROVIDER:
+        stats["local"] += 1
+        source = _replay(split_chunks(local_reply(msgs)))
+    else:
+        request = _build_request(prov, msgs, temperature, max_tokens)
+        if request is None:
+            return
+        url, headers, payload, model = request
+        key = cache_key(prov, model, msgs, temperature, max_tokens)
+        cached = response_cache.get(key)
+        if cached is not None:
+            stats["cache_hits"] += 1
+            source = _replay(split_chunks(cached))
+        else:
+            stats["cache_misses"] += 1
+            stats["streamed"] += 1
+            source = _stream_post(prov, url, headers, payload, key)
+
+    first_chunk_at = None
+    try:
+        async for chunk in source:
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic()
+            yield chunk
+    finally:
+        await source.aclose()
+        if first_chunk_at is not None:
+            _record_latency(prov, started, first_chunk_at)
@@ -0,0 +1,163 @@
+"""
+Gravação assíncrona em lote de ErrorLog e AuditLog.
+
+O middleware de exceções abria uma sessão e fazia commit do ErrorLog dentro da
+própria requisição que falhou, e log_audit fazia um commit por ação: numa
+rajada de erros cada requisição disputava o lock de escrita do SQLite só para
+registrar a falha. Agora os registros entram numa fila limitada em memória
+(segura entre threads) e uma tarefa de fundo grava em lote a cada
+LOG_FLUSH_MS ou quando a fila atinge LOG_BATCH_SIZE.
+
+- Erros idênticos (módulo, tipo, mensagem e stack) no mesmo lote viram uma
+  única linha com o total em `occurrences`.
+- Fila cheia: erros são descartados e contados; o total vira uma linha
+  "log_queue_overflow" no lote seguinte. Auditoria não é descartada: o
+  chamador grava na própria sessão (log_audit devolve False).
+- No shutdown (lifespan) a fila é esvaziada antes de encerrar.
+"""
+
+import asyncio
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.admin import AuditLog, ErrorLog
+from app.services.background_worker import BackgroundWorker
+
+FLUSH_SECONDS = int(os.getenv("LOG_FLUSH_MS", "500")) / 1000.0
+BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+ERROR = "error"
+AUDIT = "audit"
+
+
+def dedupe_errors(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Agrupar erros idênticos, mantendo a primeira ocorrência e somando o total."""
+    merged: Dict[Tuple, Dict[str, Any]] = {}
+    for row in rows:
+        key = (row.get("module"), row.get("error_type"), row.get("message"), row.get("stack"))
+        first = merged.get(key)
+        if first is None:
+            merged[key] = dict(row, occurrences=row.get("occurrences") or 1)
+        else:
+            first["occurrences"] += row.get("occurrences") or 1
+    return list(merged.values())
+
+
+class LogWriter(BackgroundWorker):
+    """Fila limitada de registros de log drenada por uma tarefa asyncio.
+
+    Enquanto a tarefa não estiver rodando (scripts, testes sem lifespan) os
+    métodos log_* devolvem False e o chamador grava de forma síncrona como antes."""
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, flush_seconds: float = FLUSH_SECONDS,
+                 batch_size: int = BATCH_SIZE, max_queue: int = QUEUE_SIZE):
+        super().__init__()
+        self.session_factory = session_factory
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+
+    def pending(self) -> int:
+        return len(self._queue)
+
+    # Enfileiramento (qualquer thread)
+    def _enqueue(self, kind: str, values: Dict[str, Any]) -> bool:
+        if not self.running:
+            return False
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                if kind == AUDIT:
+                    return False
+                self.dropped += 1
+                return True
+            self._queue.append((kind, values))
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self.notify()
+        return True
+
+    def log_error(self, module: Optional[str], error_type: Optional[str], message: str,
+                  stack: Optional[str] = None, context: Optional[str] = None) -> bool:
+        return self._enqueue(ERROR, {
+            "module": module, "error_type": error_type, "message": message or "",
+            "stack": stack, "context": context, "status": "open", "created_at": datetime.utcnow(),
+        })
+
+    def log_audit(self, user_id: Optional[int], action: str, entity: Optional[str] = None,
+                  entity_id: Optional[int] = None, changes: Optional[str] = None) -> bool:
+        return self._enqueue(AUDIT, {
+            "user_id": user_id, "action": action, "entity": entity, "entity_id": entity_id,
+            "changes": changes, "created_at": datetime.utcnow(),
+        })
+
+    # Gravação (executada em thread)
+    def _take(self) -> Tuple[List[Tuple[str, Dict[str, Any]]], int]:
+        with self._lock:
+            count = min(len(self._queue), self.batch_size)
+            batch = [self._queue.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+        return batch, dropped
+
+    def write_batch(self, batch: List[Tuple[str, Dict[str, Any]]], dropped: int = 0) -> int:
+        """Inserir um lote em uma única transação. Retorna o número de linhas gravadas."""
+        errors = dedupe_errors([values for kind, values in batch if kind == ERROR])
+        audits = [values for kind, values in batch if kind == AUDIT]
+        if dropped:
+            errors.append({
+                "module": "logs", "error_type": "log_queue_overflow",
+                "message": f"{dropped} registro(s) de erro descartado(s): fila de logs cheia",
+                "stack": None, "context": None, "status": "open", "created_at": datetime.utcnow(), "occurrences": 1,
+            })
+        if not errors and not audits:
+            return 0
+        db = self.session_factory()
+        try:
+            if errors:
+                db.execute(insert(ErrorLog), errors)
+            if audits:
+                db.execute(insert(AuditLog), audits)
+            db.commit()
+        finally:
+            db.close()
+        return len(errors) + len(audits)
+
+    def flush(self) -> int:
+        """Gravar tudo o que está na fila (síncrono)."""
+        written = 0
+        while True:
+            batch, dropped = self._take()
+            if not batch and not dropped:
+                return written
+            try:
+                written += self.write_batch(batch, dropped)
+            except Exception as e:
+                print(f"⚠️ Falha ao gravar lote de logs ({len(batch)} registros): {e}")
+
+    # Tarefa de fundo (BackgroundWorker): lote cheio a acorda via notify()
+    error_message = "Falha ao gravar logs"
+
+    def interval(self) -> float:
+        return self.flush_seconds
+
+    async def step(self) -> None:
+        if self._queue or self.dropped:
+            await asyncio.to_thread(self.flush)
+
+    async def stop(self) -> None:
+        """Parar a tarefa e esvaziar a fila."""
+        await super().stop()
+        await asyncio.to_thread(self.flush)
+
+
+log_writer = LogWriter()
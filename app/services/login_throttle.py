@@ -0,0 +1,278 @@
+"""
+Limitação de tentativas de login por usuário e por IP.
+
+Cada tentativa consome uma ficha do balde (token bucket) do usuário e do IP;
+falhas consecutivas geram bloqueio exponencial (base × 2^(falhas - limite),
+até o máximo). Login bem-sucedido zera as falhas do usuário. O relógio é
+injetável para os testes.
+
+Lojas (as mesmas variáveis do rate_limit):
+- memória (padrão): por worker;
+- SQLite (RATE_LIMIT_STORE=sqlite, ligado pelo serve.py quando há mais de um
+  worker): tabela login_throttle no arquivo RATE_LIMIT_DB. Sem ela cada worker
+  teria os próprios baldes: o atacante ganharia uma cota de falhas por worker
+  e o bloqueio num worker não valeria nos outros.
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.rate_limit import connect_shared, shared_store_enabled, shared_store_path
+
+# (fichas, atualizado em, falhas, bloqueado até, ocioso a partir de)
+State = Tuple[float, float, int, float, float]
+# Alteração atômica de várias chaves: estados atuais (None = nova) -> (novos estados, resultado)
+Change = Callable[[Dict[str, Optional[State]]], Tuple[Dict[str, State], float]]
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "failures", "locked_until")
+
+    def __init__(self, tokens: float, updated: float, failures: int = 0, locked_until: float = 0.0):
+        self.tokens = tokens
+        self.updated = updated
+        self.failures = failures
+        self.locked_until = locked_until
+
+
+class ThrottlePolicy:
+    """Parâmetros de um tipo de chave (usuário ou IP)."""
+
+    def __init__(self, capacity: float, refill_per_second: float, max_failures: int,
+                 lockout_seconds: float, max_lockout_seconds: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.max_lockout_seconds = max_lockout_seconds
+
+
+class MemoryThrottleStore:
+    """Estados em memória (um worker)."""
+
+    blocking = False
+    MAX_KEYS = 50_000
+
+    def __init__(self):
+        self._states: Dict[str, State] = {}
+        self._lock = threading.Lock()
+
+    def update(self, keys: List[str], change: Change, now: float) -> float:
+        with self._lock:
+            states, result = change({key: self._states.get(key) for key in keys})
+            if len(self._states) + len(states) > self.MAX_KEYS:
+                self.sweep(now)
+            self._states.update(states)
+            return result
+
+    def sweep(self, now: float) -> int:
+        """Descartar estados ociosos (equivalentes a chaves novas)."""
+        idle = [key for key, state in self._states.items() if state[4] <= now]
+        for key in idle:
+            del self._states[key]
+        return len(idle)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+
+
+class SQLiteThrottleStore:
+    """Estados num arquivo SQLite compartilhado entre os workers."""
+
+    blocking = True
+    SWEEP_EVERY = 1000
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS login_throttle (key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+              "updated REAL NOT NULL, failures INTEGER NOT NULL, locked_until REAL NOT NULL, idle_at REAL NOT NULL)")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._updates = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_shared(self.path, self.SCHEMA)
+        return conn
+
+    def update(self, keys: List[str], change: Change, now: float) -> float:
+        conn = self._connection()
+        # BEGIN IMMEDIATE: usuário e IP lidos e gravados juntos, atômicos entre workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT key, tokens, updated, failures, locked_until, idle_at FROM login_throttle "
+                f"WHERE key IN ({', '.join('?' for _ in keys)})", keys,
+            ).fetchall()
+            current: Dict[str, Optional[State]] = {key: None for key in keys}
+            current.update({row[0]: tuple(row[1:]) for row in rows})
+            states, result = change(current)
+            conn.executemany(
+                "INSERT INTO login_throttle (key, tokens, updated, failures, locked_until, idle_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                "updated = excluded.updated, failures = excluded.failures, "
+                "locked_until = excluded.locked_until, idle_at = excluded.idle_at",
+                [(key, *state) for key, state in states.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._updates += 1
+        if self._updates % self.SWEEP_EVERY == 0:
+            self.sweep(now)
+        return result
+
+    def sweep(self, now: float) -> int:
+        return self._connection().execute("DELETE FROM login_throttle WHERE idle_at <= ?", (now,)).rowcount
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM login_throttle")
+
+
+class LoginThrottle:
+    def __init__(self, user_policy: ThrottlePolicy, ip_policy: ThrottlePolicy,
+                 clock: Callable[[], float] = time.time, store=None):
+        self.policies = {"user": user_policy, "ip": ip_policy}
+        # Relógio de parede (e não monotonic): os instantes gravados valem em todos os workers
+        self.clock = clock
+        self.store = store if store is not None else MemoryThrottleStore()
+
+    def _policy(self, key: str) -> ThrottlePolicy:
+        return self.policies[key.split(":", 1)[0]]
+
+    def _load(self, key: str, state: Optional[State], now: float) -> _Bucket:
+        policy = self._policy(key)
+        if state is None:
+            return _Bucket(policy.capacity, now)
+        tokens, updated, failures, locked_until, _ = state
+        tokens = min(policy.capacity, tokens + max(0.0, now - updated) * policy.refill_per_second)
+        return _Bucket(tokens, now, failures, locked_until)
+
+    def _dump(self, key: str, bucket: _Bucket) -> State:
+        """Estado a gravar; ocioso quando o balde estiver cheio, sem falhas e sem bloqueio."""
+        policy = self._policy(key)
+        if bucket.failures:
+            idle_at = math.inf
+        else:
+            full_at = bucket.updated + (policy.capacity - bucket.tokens) / policy.refill_per_second
+            idle_at = max(full_at, bucket.locked_until)
+        return bucket.tokens, bucket.updated, bucket.failures, bucket.locked_until, idle_at
+
+    def _update(self, username: Optional[str], ip: Optional[str],
+                change: Callable[[Dict[str, _Bucket], float], float]) -> float:
+        keys = []
+        if username:
+            keys.append(f"user:{username.strip().lower()}")
+        if ip:
+            keys.append(f"ip:{ip}")
+        now = self.clock()
+        if not keys:
+            return change({}, now)
+
+        def apply(states: Dict[str, Optional[State]]):
+            buckets = {key: self._load(key, state, now) for key, state in states.items()}
+            result = change(buckets, now)
+            return {key: self._dump(key, bucket) for key, bucket in buckets.items()}, result
+
+        return self.store.update(keys, apply, now)
+
+    def acquire(self, username: Optional[str], ip: Optional[str]) -> float:
+        """Registrar uma tentativa. Retorna 0 se liberada ou os segundos até poder tentar de novo."""
+        def change(buckets: Dict[str, _Bucket], now: float) -> float:
+            wait = 0.0
+            for key, bucket in buckets.items():
+                if bucket.locked_until > now:
+                    wait = max(wait, bucket.locked_until - now)
+                elif bucket.tokens < 1:
+                    wait = max(wait, (1 - bucket.tokens) / self._policy(key).refill_per_second)
+            if wait > 0:
+                return wait
+            for bucket in buckets.values():
+                bucket.tokens -= 1
+            return 0.0
+
+        return self._update(username, ip, change)
+
+    def record_failure(self, username: Optional[str], ip: Optional[str]) -> None:
+        def change(buckets: Dict[str, _Bucket], now: float) -> float:
+            for key, bucket in buckets.items():
+                policy = self._policy(key)
+                bucket.failures += 1
+                excess = bucket.failures - policy.max_failures
+                if excess >= 0:
+                    lockout = min(policy.max_lockout_seconds, policy.lockout_seconds * (2 ** excess))
+                    bucket.locked_until = now + lockout
+            return 0.0
+
+        self._update(username, ip, change)
+
+    def record_success(self, username: Optional[str], ip: Optional[str]) -> None:
+        def change(buckets: Dict[str, _Bucket], now: float) -> float:
+            for key, bucket in buckets.items():
+                if key.startswith("user:"):
+                    bucket.failures = 0
+                    bucket.locked_until = 0.0
+                else:
+                    # Um acerto não apaga um ataque distribuído a partir do mesmo IP, só reduz
+                    bucket.failures = max(0, bucket.failures - 1)
+            return 0.0
+
+        self._update(username, ip, change)
+
+    # Loja em arquivo: fora do event loop
+    async def _off_loop(self, method, username: Optional[str], ip: Optional[str]):
+        if self.store.blocking:
+            return await asyncio.to_thread(method, username, ip)
+        return method(username, ip)
+
+    async def acquire_async(self, username: Optional[str], ip: Optional[str]) -> float:
+        return await self._off_loop(self.acquire, username, ip)
+
+    async def record_failure_async(self, username: Optional[str], ip: Optional[str]) -> None:
+        await self._off_loop(self.record_failure, username, ip)
+
+    async def record_success_async(self, username: Optional[str], ip: Optional[str]) -> None:
+        await self._off_loop(self.record_success, username, ip)
+
+    def reset(self) -> None:
+        self.store.clear()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _store_from_env():
+    if shared_store_enabled():
+        return SQLiteThrottleStore(shared_store_path())
+    return MemoryThrottleStore()
+
+
+login_throttle = LoginThrottle(
+    user_policy=ThrottlePolicy(
+        capacity=_env_float("LOGIN_USER_BURST", 5),
+        refill_per_second=_env_float("LOGIN_USER_PER_MINUTE", 5) / 60.0,
+        max_failures=int(_env_float("LOGIN_USER_MAX_FAILURES", 5)),
+        lockout_seconds=_env_float("LOGIN_LOCKOUT_SECONDS", 30),
+        max_lockout_seconds=_env_float("LOGIN_MAX_LOCKOUT_SECONDS", 900),
+    ),
+    # IP generoso: numa troca de turno muitos usuários entram pelo mesmo NAT
+    ip_policy=ThrottlePolicy(
+        capacity=_env_float("LOGIN_IP_BURST", 600),
+        refill_per_second=_env_float("LOGIN_IP_PER_MINUTE", 600) / 60.0,
+        max_failures=int(_env_float("LOGIN_IP_MAX_FAILURES", 50)),
+        lockout_seconds=_env_float("LOGIN_LOCKOUT_SECONDS", 30),
+        max_lockout_seconds=_env_float("LOGIN_MAX_LOCKOUT_SECONDS", 900),
+    ),
+    store=_store_from_env(),
+)
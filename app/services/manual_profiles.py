@@ -0,0 +1,191 @@
+"""
+Perfis de layout dos manuais de fabricantes (extração de materiais por intervalo).
+
+Cada perfil é um arquivo JSON em vendor_profiles/ (Caterpillar, Komatsu,
+Volvo e o genérico); MANUAL_PROFILES_DIR acrescenta (ou substitui, pelo
+mesmo "name") perfis sem alterar o código. Um perfil descreve:
+
+- xml: tags dos itens de material, tags/atributos que declaram o intervalo
+  (valendo para os itens dentro do elemento) e tags/atributos de cada campo;
+- text: cabeçalhos de intervalo (regex com o número de horas no 1º grupo),
+  palavras de materiais, rótulos de referência (P/N, Código...) e formatos de
+  part number do fabricante.
+
+Os perfis de fabricante herdam as listas do genérico. Na carga, cabeçalhos e
+palavras de materiais viram uma única regex por perfil (scan), aplicada a
+blocos de linhas: cada linha é cabeçalho (precedência) ou linha de material.
+O perfil vem do fabricante do equipamento ou, sem ele, dos marcadores
+encontrados no início do documento.
+"""
+
+import glob
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vendor_profiles")
+GENERIC = "generic"
+SAMPLE_BYTES = 64 * 1024  # início do documento usado para reconhecer o fabricante
+
+NEVER = "(?!)"  # lista vazia no perfil: alternativa que nunca casa
+
+
+
+def fold(text: str) -> str:
+    """Minúsculas e sem acentos (decomposição NFD; caracteres não ASCII restantes caem)."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return unicodedata.normalize("NFD", text).encode("ascii", "ignore").decode("ascii")
+
+
+@lru_cache(maxsize=4096)
+def tag_key(name: str) -> str:
+    """Nome de tag/atributo comparável: sem namespace, minúsculo, sem '-' e '_'."""
+    return fold(name.rsplit("}", 1)[-1]).replace("-", "").replace("_", "")
+
+
+def _alternation(patterns: Iterable[str]) -> str:
+    return "|".join(f"(?:{p})" for p in patterns)
+
+
+class VendorProfile:
+    """Perfil compilado: conjuntos de tags e regex combinadas."""
+
+    def __init__(self, data: Dict, base: Optional["VendorProfile"] = None):
+        self.name: str = data["name"]
+        self.label: str = data.get("label") or self.name
+        self.manufacturers = [fold(m) for m in data.get("manufacturers", [])]
+        self.markers = [fold(m) for m in data.get("markers", [])]
+        self.data = data
+        inherited = base.data if base is not None else {}
+
+        def merged(section: str, key: str) -> List[str]:
+            own = data.get(section, {}).get(key, [])
+            return own + [v for v in inherited.get(section, {}).get(key, []) if v not in own]
+
+        self.item_tags = {tag_key(t) for t in merged("xml", "item_tags")}
+        self.interval_tags = {tag_key(t) for t in merged("xml", "interval_tags")}
+        self.interval_attrs = [tag_key(a) for a in merged("xml", "interval_attrs")]
+        self.field_tags: Dict[str, str] = {}
+        for source in (inherited.get("xml", {}).get("fields", {}), data.get("xml", {}).get("fields", {})):
+            for field, tags in source.items():
+                for tag in tags:
+                    self.field_tags[tag_key(tag)] = field
+
+        # Uma regex para o bloco inteiro: cabeçalho de intervalo ou palavra de material
+        headers = merged("text", "interval_headers")
+        self._header_groups = [f"h{i}" for i in range(len(headers))]
+        header_alts = "|".join(
+            re.sub(r"(?<!\\)\((?!\?)", f"(?P<h{i}>", p, count=1) for i, p in enumerate(headers)
+        ) or NEVER
+        keywords = "|".join(re.escape(fold(k)) for k in merged("text", "material_keywords")) or NEVER
+        self.line_re = re.compile(rf"{header_alts}|(?P<material>{keywords})")
+        labels = merged("text", "reference_labels")
+        label_re = rf"\b(?:{_alternation(labels)})\s*[:\-]?\s*([A-Z0-9\-_/]+)" if labels else None
+        patterns = [p for p in ([label_re] if label_re else []) + merged("text", "reference_patterns")]
+        self.reference_re = re.compile(_alternation(patterns), re.I) if patterns else None
+        self.quantity_re = re.compile(r"(\d+[\.,]?\d*)\s*(un|l|kg|m)\b", re.I)
+
+    def scan(self, folded: str) -> Iterator[Tuple[int, str, Optional[int]]]:
+        """(índice da linha, "interval" ou "material", horas) das linhas de um bloco já em fold().
+        Um único finditer percorre o bloco; cabeçalho na linha tem precedência sobre material.
+        """
+        line, pending = -1, None
+        pos = index = 0
+        for m in self.line_re.finditer(folded):
+            index += folded.count("\n", pos, m.start())
+            pos = m.start()
+            if index != line:
+                if pending is not None:
+                    yield pending
+                line, pending = index, None
+            elif pending is not None and pending[1] == "interval":
+                continue
+            if m.group("material") is None:
+                hours = next(int(v) for v in map(m.group, self._header_groups) if v is not None)
+                pending = (index, "interval", hours)
+            elif pending is None:
+                pending = (index, "material", None)
+        if pending is not None:
+            yield pending
+
+    def classify(self, folded_line: str) -> Tuple[Optional[str], Optional[int]]:
+        """("interval", horas), ("material", None) ou (None, None) para uma linha já em fold()."""
+        for _, kind, hours in self.scan(folded_line):
+            return kind, hours
+        return None, None
+
+    def reference(self, line: str) -> Optional[str]:
+        if self.reference_re is None:
+            return None
+        m = self.reference_re.search(line)
+        if m is None:
+            return None
+        return next((g.strip() for g in m.groups() if g), None)
+
+    def score(self, sample: str) -> int:
+        """Marcadores do fabricante presentes no trecho (já em fold())."""
+        return sum(1 for marker in self.markers if marker in sample)
+
+    def __repr__(self) -> str:
+        return f"VendorProfile({self.name!r})"
+
+
+def _read_profiles(directories: Iterable[str]) -> Dict[str, Dict]:
+    raw: Dict[str, Dict] = {}
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                raw[data["name"]] = data
+            except Exception as e:
+                print(f"⚠️ Perfil de manual inválido ignorado ({path}): {e}")
+    return raw
+
+
+_profiles: Optional[Dict[str, VendorProfile]] = None
+
+
+def load_profiles(extra_dir: Optional[str] = None) -> Dict[str, VendorProfile]:
+    """(Re)carregar os perfis: embutidos + MANUAL_PROFILES_DIR (ou extra_dir)."""
+    global _profiles
+    directories = [PROFILES_DIR]
+    extra_dir = extra_dir if extra_dir is not None else os.getenv("MANUAL_PROFILES_DIR")
+    if extra_dir:
+        directories.append(extra_dir)
+    raw = _read_profiles(directories)
+    generic = VendorProfile(raw.pop(GENERIC, {"name": GENERIC}))
+    profiles = {GENERIC: generic}
+    for name, data in raw.items():
+        try:
+            profiles[name] = VendorProfile(data, base=generic)
+        except (re.error, KeyError, TypeError) as e:
+            print(f"⚠️ Perfil de manual '{name}' ignorado: {e}")
+    _profiles = profiles
+    return profiles
+
+
+def profiles() -> Dict[str, VendorProfile]:
+    return _profiles if _profiles is not None else load_profiles()
+
+
+def select_profile(manufacturer: Optional[str] = None, sample: str = "") -> VendorProfile:
+    """Perfil do fabricante do equipamento; sem ele, o de mais marcadores no trecho; senão o genérico."""
+    registry = profiles()
+    if manufacturer:
+        key = fold(manufacturer).strip()
+        for profile in registry.values():
+            if any(key == m or key.startswith(m + " ") for m in profile.manufacturers):
+                return profile
+    folded = fold(sample)
+    best, best_score = registry[GENERIC], 0
+    for profile in registry.values():
+        score = profile.score(folded)
+        if score > best_score:
+            best, best_score = profile, score
+    return best
@@ -0,0 +1,323 @@
+"""
+Armazenamento de manuais de fabricante por conteúdo (SHA-256).
+
+O upload lia o arquivo inteiro para a memória (await uf.read()) antes de
+gravá-lo em data/manuals/{id}; alguns PDFs escaneados de 100 MB em paralelo
+esgotavam a memória do worker. Aqui:
+
+- o corpo multipart é lido pela rota em blocos (store_multipart, com o
+  python-multipart): cada arquivo vai direto para um temporário no diretório
+  de blobs, calculando o SHA-256 no caminho, numa thread fora do event loop,
+  sem passar antes pelo arquivo de spool do request.form();
+- o total recebido é contado no próprio fluxo, com ou sem Content-Length
+  (envio chunked); tamanho de cada arquivo e tipo (extensão e assinatura do
+  início) são verificados enquanto os blocos chegam;
+- o arquivo final fica em blobs/<2 primeiros hex>/<sha256><ext>: o mesmo
+  manual anexado aos 20 equipamentos de um modelo é gravado (e processado)
+  uma vez só; a tabela manual_files liga cada equipamento ao seu blob.
+
+Limites: MANUAL_MAX_MB por arquivo (padrão 200), MANUAL_UPLOAD_MAX_MB por envio
+(padrão 500); diretório em MANUALS_DIR (padrão data/manuals).
+Uploads antigos em data/manuals/{id} continuam valendo como fallback.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException
+from python_multipart import MultipartParser
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+from sqlalchemy.orm import Session
+
+from app.models.manual_file import ManualFile
+
+MANUALS_DIR = os.getenv("MANUALS_DIR", os.path.join("data", "manuals"))
+MAX_MANUAL_BYTES = int(float(os.getenv("MANUAL_MAX_MB", "200")) * 1024 * 1024)
+MAX_UPLOAD_BYTES = int(float(os.getenv("MANUAL_UPLOAD_MAX_MB", "500")) * 1024 * 1024)
+MAX_FILES_PER_UPLOAD = 20
+UPLOAD_FIELDS = ("files", "file")
+
+# Extensão -> assinaturas aceitas no início do arquivo (None: sem verificação)
+ALLOWED_TYPES = {
+    ".pdf": (b"%PDF-",),
+    ".xml": (b"<", b"\xef\xbb\xbf<"),
+    ".txt": None,
+    ".doc": (b"\xd0\xcf\x11\xe0",),
+    ".xls": (b"\xd0\xcf\x11\xe0",),
+    ".docx": (b"PK\x03\x04",),
+    ".xlsx": (b"PK\x03\x04",),
+    ".png": (b"\x89PNG",),
+    ".jpg": (b"\xff\xd8\xff",),
+    ".jpeg": (b"\xff\xd8\xff",),
+}
+SIGNATURE_BYTES = max(len(sig) for sigs in ALLOWED_TYPES.values() if sigs for sig in sigs)
+
+
+class StoredManual(NamedTuple):
+    sha256: str
+    extension: str
+    size_bytes: int
+    path: str
+    deduplicated: bool
+
+
+class UploadedManual(NamedTuple):
+    filename: str
+    content_type: Optional[str]
+    stored: StoredManual
+
+
+def blob_path(sha256: str, extension: str) -> str:
+    return os.path.join(MANUALS_DIR, "blobs", sha256[:2], f"{sha256}{extension}")
+
+
+def check_content_length(content_length: Optional[str]) -> None:
+    """Recusar (413) antes de ler o corpo quando o tamanho declarado já excede o limite."""
+    try:
+        declared = int(content_length or 0)
+    except ValueError:
+        return
+    if declared > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=_upload_too_large_detail())
+
+
+def _upload_too_large_detail() -> str:
+    return f"Envio excede o limite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+
+
+def _too_large_detail() -> str:
+    return f"Arquivo excede o limite de {MAX_MANUAL_BYTES // (1024 * 1024)} MB"
+
+
+def _extension(filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ALLOWED_TYPES:
+        allowed = ", ".join(sorted(ALLOWED_TYPES))
+        raise HTTPException(status_code=415, detail=f"Tipo de arquivo não suportado: '{filename}'. Aceitos: {allowed}")
+    return ext
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+class _BlobWriter:
+    """Um arquivo do envio: temporário no diretório de blobs, com hash, limite e
+    assinatura verificados a cada bloco; métodos bloqueantes (fora do event loop)."""
+
+    def __init__(self, filename: str, extension: str, content_type: Optional[str]):
+        self.filename = filename
+        self.extension = extension
+        self.content_type = content_type
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+        self.out: Optional[BinaryIO] = None
+        self.tmp_path: Optional[str] = None
+        self.finished = False
+
+    def _check_signature(self) -> None:
+        signatures = ALLOWED_TYPES[self.extension]
+        if signatures and not self.head.startswith(signatures):
+            raise HTTPException(status_code=415,
+                                detail=f"Conteúdo de '{self.filename}' não corresponde a um arquivo {self.extension}")
+
+    def write(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        if len(self.head) < SIGNATURE_BYTES:
+            self.head += chunk[:SIGNATURE_BYTES - len(self.head)]
+            if len(self.head) == SIGNATURE_BYTES:
+                self._check_signature()
+        self.size += len(chunk)
+        if self.size > MAX_MANUAL_BYTES:
+            raise HTTPException(status_code=413, detail=_too_large_detail())
+        if self.out is None:
+            tmp_dir = os.path.join(MANUALS_DIR, "blobs", "tmp")
+            os.makedirs(tmp_dir, exist_ok=True)
+            fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir, suffix=self.extension)
+            self.out = os.fdopen(fd, "wb")
+        self.digest.update(chunk)
+        self.out.write(chunk)
+
+    def finish(self) -> StoredManual:
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail=f"Arquivo '{self.filename}' está vazio")
+        self._check_signature()
+        self.out.close()
+        tmp_path, self.tmp_path = self.tmp_path, None
+        self.finished = True
+
+        sha256 = self.digest.hexdigest()
+        final_path = blob_path(sha256, self.extension)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+            return StoredManual(sha256, self.extension, self.size, final_path, True)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+        return StoredManual(sha256, self.extension, self.size, final_path, False)
+
+    def discard(self) -> None:
+        if self.out is not None:
+            self.out.close()
+        if self.tmp_path is not None and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
+
+
+class _ManualForm:
+    """Callbacks do python-multipart. Partes de arquivo dos campos 'files'/'file' vão
+    para um _BlobWriter; os blocos ficam em pending até flush() (numa thread)."""
+
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.header_name = b""
+        self.header_value = b""
+        self.writer: Optional[_BlobWriter] = None
+        self.writers: List[_BlobWriter] = []
+        # (arquivo, bloco); bloco None = fim do arquivo
+        self.pending: List[Tuple[_BlobWriter, Optional[bytes]]] = []
+        self.uploads: List[UploadedManual] = []
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self) -> None:
+        self.headers = {}
+        self.writer = None
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self.header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self.headers[self.header_name.lower()] = self.header_value
+        self.header_name = self.header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self.headers.get(b"content-disposition", b""))
+        if _decode(options.get(b"name", b"")) not in UPLOAD_FIELDS or b"filename" not in options:
+            return  # campo simples ou de outro nome: ignorado
+        filename = _decode(options[b"filename"]).replace("\r", "").replace("\n", "").strip()
+        if not filename:
+            return  # campo de arquivo deixado vazio no formulário
+        if len(self.writers) >= MAX_FILES_PER_UPLOAD:
+            raise HTTPException(status_code=400, detail=f"Máximo de {MAX_FILES_PER_UPLOAD} arquivos por envio")
+        content_type = self.headers.get(b"content-type")
+        self.writer = _BlobWriter(filename, _extension(filename), _decode(content_type) if content_type else None)
+        self.writers.append(self.writer)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self.writer is not None:
+            self.pending.append((self.writer, data[start:end]))
+
+    def on_part_end(self) -> None:
+        if self.writer is not None:
+            self.pending.append((self.writer, None))
+            self.writer = None
+
+    def flush(self) -> None:
+        pending, self.pending = self.pending, []
+        for writer, chunk in pending:
+            if chunk is None:
+                self.uploads.append(UploadedManual(writer.filename, writer.content_type, writer.finish()))
+            else:
+                writer.write(chunk)
+
+    def discard(self) -> None:
+        for writer in self.writers:
+            writer.discard()
+
+
+async def store_multipart(content_type: Optional[str], stream: AsyncIterator[bytes]) -> List[UploadedManual]:
+    """Gravar os arquivos de um corpo multipart/form-data à medida que chegam.
+
+    Memória limitada a um bloco do fluxo; em caso de erro os temporários são
+    apagados (arquivos já concluídos continuam no armazenamento por conteúdo).
+    """
+    kind, params = parse_options_header(content_type or "")
+    if kind != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Envie os arquivos como multipart/form-data")
+
+    form = _ManualForm()
+    parser = MultipartParser(params[b"boundary"], form.callbacks())
+    received = 0
+    try:
+        async for chunk in stream:
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=_upload_too_large_detail())
+            parser.write(chunk)
+            if form.pending:
+                await asyncio.to_thread(form.flush)
+        parser.finalize()
+        if form.pending:
+            await asyncio.to_thread(form.flush)
+        if not all(writer.finished for writer in form.writers):
+            raise HTTPException(status_code=400, detail="Formulário multipart incompleto")
+    except BaseException as e:
+        form.discard()
+        if isinstance(e, FormParserError):
+            raise HTTPException(status_code=400, detail="Formulário multipart inválido") from e
+        raise
+    return form.uploads
+
+
+def link_manual(db: Session, equipment_id: int, stored: StoredManual, filename: str,
+                content_type: Optional[str] = None) -> ManualFile:
+    """Vincular o blob ao equipamento; reenviar o mesmo arquivo só atualiza nome e data."""
+    record = db.query(ManualFile).filter(
+        ManualFile.equipment_id == equipment_id, ManualFile.sha256 == stored.sha256
+    ).first()
+    if record is None:
+        record = ManualFile(equipment_id=equipment_id, sha256=stored.sha256, extension=stored.extension)
+        db.add(record)
+    record.filename = filename
+    record.content_type = content_type
+    record.size_bytes = stored.size_bytes
+    record.extension = stored.extension
+    record.uploaded_at = datetime.utcnow()
+    return record
+
+
+def latest_manual_path(db: Session, equipment_id: int) -> Optional[str]:
+    """Manual mais recente do equipamento (tabela manual_files; senão o diretório antigo)."""
+    return latest_manual_path_for(db, [equipment_id])
+
+
+def latest_manual_path_for(db: Session, equipment_ids: Iterable[int]) -> Optional[str]:
+    """Manual mais recente entre os equipamentos (ex.: os de um mesmo modelo), numa consulta."""
+    equipment_ids = list(equipment_ids)
+    records = db.query(ManualFile).filter(ManualFile.equipment_id.in_(equipment_ids)).order_by(
+        ManualFile.uploaded_at.desc(), ManualFile.id.desc()
+    ).all()
+    for record in records:
+        path = blob_path(record.sha256, record.extension)
+        if os.path.isfile(path):
+            return path
+
+    files = []
+    for equipment_id in equipment_ids:
+        legacy_dir = os.path.join(MANUALS_DIR, str(equipment_id))
+        if os.path.isdir(legacy_dir):
+            files.extend(os.path.join(legacy_dir, f) for f in os.listdir(legacy_dir)
+                         if os.path.isfile(os.path.join(legacy_dir, f)))
+    return max(files, key=os.path.getmtime) if files else None
@@ -0,0 +1,114 @@
+"""
+Hash de senhas fora do event loop.
+
+O PBKDF2 (130 mil iterações) rodava direto nos endpoints async: cada login
+travava o loop por dezenas de milissegundos e uma rajada de logins (troca de
+turno) parava a aplicação inteira. Aqui o cálculo vai para um pequeno
+ProcessPoolExecutor e o hash gravado carrega os próprios parâmetros
+("pbkdf2_sha256$<iterações>$<hex>"), de modo que as iterações podem ser
+aumentadas depois: o login valida com os parâmetros antigos e regrava o hash
+com os atuais. Hashes antigos (apenas o hex) continuam válidos.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+ALGORITHM = "pbkdf2_sha256"
+LEGACY_ITERATIONS = 130_000
+HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", str(LEGACY_ITERATIONS)))
+POOL_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
+_executor: Optional[Executor] = None
+
+
+def generate_salt() -> str:
+    return secrets.token_hex(16)
+
+
+def _pbkdf2_hex(password: str, salt_hex: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt_hex), iterations).hex()
+
+
+def encode_hash(digest_hex: str, iterations: int) -> str:
+    return f"{ALGORITHM}${iterations}${digest_hex}"
+
+
+def parse_hash(stored: str) -> Tuple[int, str]:
+    """(iterações, hex) do hash gravado; formato antigo = só o hex com LEGACY_ITERATIONS."""
+    parts = (stored or "").split("$")
+    if len(parts) == 3 and parts[0] == ALGORITHM:
+        try:
+            return int(parts[1]), parts[2]
+        except ValueError:
+            pass
+    return LEGACY_ITERATIONS, stored or ""
+
+
+def needs_rehash(stored: str) -> bool:
+    """Hash no formato antigo ou com menos iterações que a configuração atual."""
+    return not (stored or "").startswith(ALGORITHM + "$") or parse_hash(stored)[0] < HASH_ITERATIONS
+
+
+def hash_password_sync(password: str, salt_hex: str, iterations: Optional[int] = None) -> str:
+    iterations = iterations or HASH_ITERATIONS
+    return encode_hash(_pbkdf2_hex(password, salt_hex, iterations), iterations)
+
+
+def verify_password_sync(password: str, salt_hex: str, stored: str) -> bool:
+    iterations, digest = parse_hash(stored)
+    try:
+        candidate = _pbkdf2_hex(password, salt_hex, iterations)
+    except ValueError:
+        return False
+    return hmac.compare_digest(candidate, digest)
+
+
+# -------------------------
+# Pool de processos
+# -------------------------
+
+def get_executor() -> Executor:
+    """Pool criado sob demanda. Em executáveis PyInstaller usa threads
+    (hashlib libera o GIL durante o PBKDF2, então o loop continua livre)."""
+    global _executor
+    if _executor is None:
+        if getattr(sys, "frozen", False):
+            _executor = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="pwhash")
+        else:
+            # spawn: o processo do servidor já tem threads, e fork com threads é inseguro
+            _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _run(fn, *args):
+    global _executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_executor(), fn, *args)
+    except (OSError, RuntimeError) as e:
+        # Pool quebrado (processo filho morto) ou ambiente sem multiprocessing: cair para threads
+        print(f"⚠️ Pool de hash indisponível, usando threads: {e}")
+        _executor = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="pwhash")
+        return await loop.run_in_executor(_executor, fn, *args)
+
+
+async def hash_password(password: str, salt_hex: str, iterations: Optional[int] = None) -> str:
+    return await _run(hash_password_sync, password, salt_hex, iterations)
+
+
+async def verify_password(password: str, salt_hex: str, stored: str) -> bool:
+    return await _run(verify_password_sync, password, salt_hex, stored)
@@ -0,0 +1,241 @@
+"""
+Extração de texto de PDFs de manuais, por página, em paralelo e com cache.
+
+_extract_text_from_pdf percorria todas as páginas do manual com PyPDF2 na
+thread da requisição, a cada geração de planos, e o mesmo manual era
+reprocessado de novo e de novo. Aqui:
+
+- as páginas são divididas em lotes (BATCH_PAGES) entre processos de um
+  ProcessPoolExecutor (spawn), no máximo WORKERS lotes em andamento;
+- os lotes são consumidos na ordem das páginas;
+- o texto de cada página fica num SQLite próprio (PDF_TEXT_CACHE_DB), com
+  chave (SHA-256 do arquivo, EXTRACTOR_VERSION, página): o cache é descartável
+  e fica fora do banco principal. Manuais armazenados por conteúdo já têm o
+  hash no nome do arquivo.
+
+PDF_EXTRACT_WORKERS=1 (ou executável PyInstaller) extrai no próprio processo.
+Sem PyPDF2 instalado, devolve texto vazio como antes.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Mudar quando a forma de extrair o texto mudar (invalida o cache)
+EXTRACTOR_VERSION = "pypdf2-1"
+CACHE_PATH = os.getenv("PDF_TEXT_CACHE_DB", os.path.join("data", "pdf_text_cache.db"))
+WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+BATCH_PAGES = 16
+
+_executor: Optional[Executor] = None
+_cache: Optional["PageTextCache"] = None
+
+# Leitor aberto no processo trabalhador (um arquivo por vez)
+_worker_reader: Tuple[Optional[str], object] = (None, None)
+
+
+class PageTextCache:
+    """Texto por página em SQLite: (file_hash, version, page) -> texto."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_pages (file_hash TEXT NOT NULL, version TEXT NOT NULL, "
+                "page INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (file_hash, version, page))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_files (file_hash TEXT NOT NULL, version TEXT NOT NULL, "
+                "page_count INTEGER NOT NULL, PRIMARY KEY (file_hash, version))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def load(self, file_hash: str, version: str) -> Tuple[Optional[int], Dict[int, str]]:
+        conn = self._connection()
+        row = conn.execute("SELECT page_count FROM pdf_files WHERE file_hash = ? AND version = ?",
+                           (file_hash, version)).fetchone()
+        if row is None:
+            return None, {}
+        pages = conn.execute("SELECT page, text FROM pdf_pages WHERE file_hash = ? AND version = ?",
+                             (file_hash, version)).fetchall()
+        return row[0], dict(pages)
+
+    def save(self, file_hash: str, version: str, page_count: int, pages: Dict[int, str]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO pdf_files (file_hash, version, page_count) VALUES (?, ?, ?)",
+                         (file_hash, version, page_count))
+            conn.executemany(
+                "INSERT OR REPLACE INTO pdf_pages (file_hash, version, page, text) VALUES (?, ?, ?, ?)",
+                [(file_hash, version, page, text) for page, text in pages.items()],
+            )
+
+
+def get_cache() -> PageTextCache:
+    global _cache
+    if _cache is None or _cache.path != CACHE_PATH:
+        _cache = PageTextCache(CACHE_PATH)
+    return _cache
+
+
+def file_sha256(path: str) -> str:
+    """Hash do arquivo; no armazenamento por conteúdo o nome já é o hash."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if re.fullmatch(r"[0-9a-f]{64}", stem):
+        return stem
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# -------------------------
+# Leitura das páginas (roda nos processos trabalhadores)
+# -------------------------
+
+def _reader(path: str):
+    global _worker_reader
+    if _worker_reader[0] != path:
+        import PyPDF2  # type: ignore
+        _worker_reader = (path, PyPDF2.PdfReader(path))
+    return _worker_reader[1]
+
+
+def _release_reader() -> None:
+    """No processo do servidor, não manter o PDF (lido inteiro) em memória."""
+    global _worker_reader
+    _worker_reader = (None, None)
+
+
+def _page_count(path: str) -> int:
+    return len(_reader(path).pages)
+
+
+def _read_pages(path: str, pages: List[int]) -> List[Tuple[int, str]]:
+    reader = _reader(path)
+    result = []
+    for page in pages:
+        try:
+            result.append((page, reader.pages[page].extract_text() or ""))
+        except Exception:
+            result.append((page, ""))
+    return result
+
+
+# -------------------------
+# Pool de processos
+# -------------------------
+
+def get_executor() -> Optional[Executor]:
+    """Pool criado sob demanda; None quando a extração deve rodar no próprio processo."""
+    global _executor
+    if WORKERS <= 1 or getattr(sys, "frozen", False):
+        return None
+    if _executor is None:
+        # spawn: o processo do servidor já tem threads, e fork com threads é inseguro
+        _executor = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _submit(executor: Optional[Executor], path: str, pages: List[int]) -> Future:
+    if executor is not None:
+        try:
+            return executor.submit(_read_pages, path, pages)
+        except RuntimeError:
+            pass  # pool encerrado/quebrado: extrair aqui mesmo
+    future: Future = Future()
+    try:
+        future.set_result(_read_pages(path, pages))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _batches(page_count: int) -> Iterable[List[int]]:
+    for start in range(0, page_count, BATCH_PAGES):
+        yield list(range(start, min(start + BATCH_PAGES, page_count)))
+
+
+def extract_pdf_text(path: str) -> str:
+    """Texto do PDF (páginas separadas por quebra de linha), reaproveitando o cache.
+
+    Retorna "" se o PyPDF2 não estiver disponível ou o arquivo for ilegível.
+    """
+    return "\n".join(extract_pdf_pages(path))
+
+
+def extract_pdf_pages(path: str) -> List[str]:
+    """Texto de cada página, em ordem (mesmo cache e pool de extract_pdf_text)."""
+    try:
+        file_hash = file_sha256(path)
+        cache = get_cache()
+        page_count, cached = cache.load(file_hash, EXTRACTOR_VERSION)
+        if page_count is None:
+            page_count = _page_count(path)
+    except Exception:
+        _release_reader()
+        return []
+
+    missing_total = sum(1 for page in range(page_count) if page not in cached)
+    executor = get_executor() if missing_total > BATCH_PAGES else None
+    texts: List[str] = []
+    extracted: Dict[int, str] = {}
+    pending: deque = deque()
+    batches = iter(_batches(page_count))
+
+    # No próprio processo cada lote é lido ao ser enviado: um por vez
+    window = WORKERS if executor is not None else 1
+
+    def fill_window():
+        while len(pending) < window:
+            batch = next(batches, None)
+            if batch is None:
+                return
+            missing = [page for page in batch if page not in cached]
+            pending.append((batch, _submit(executor, path, missing) if missing else None))
+
+    try:
+        fill_window()
+        while pending:
+            batch, future = pending.popleft()
+            pages = dict(future.result()) if future is not None else {}
+            extracted.update(pages)
+            texts.extend(cached[page] if page in cached else pages.get(page, "") for page in batch)
+            fill_window()
+    except BrokenProcessPool:
+        shutdown_executor()  # recriado na próxima chamada
+        return []
+    except Exception:
+        return []
+    finally:
+        _release_reader()
+        if extracted:
+            try:
+                cache.save(file_hash, EXTRACTOR_VERSION, page_count, extracted)
+            except sqlite3.Error as e:
+                print(f"⚠️ Falha ao gravar cache de texto do PDF: {e}")
+    return texts
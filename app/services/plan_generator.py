@@ -8,175 +8,229 @@ incluindo ações (plan_actions) para criação automática.
 Também pode incluir materiais (materials) para anexar ao plano.
 """
 
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Union
 import os
 import re
 
+from app.services.manual_profiles import GENERIC, SAMPLE_BYTES, VendorProfile, fold, select_profile, tag_key
+from app.services.pdf_text import extract_pdf_text
+
+_INTERVAL_VALUE = re.compile(r"(\d{2,5})")
+_BULLET = re.compile(r"^[\-•\*\d\.\)\s]+")
+TEXT_BLOCK = 64 * 1024  # texto processado em blocos de linhas (memória constante em .txt grandes)
+
 def _extract_text_from_pdf(pdf_path: str) -> str:
     """Extrair texto simples de um PDF, se biblioteca estiver disponível.
-    Retorna string vazia se não for possível.
+    Retorna string vazia se não for possível. Páginas em paralelo e com cache (pdf_text).
     """
+    return extract_pdf_text(pdf_path)
+
+def _interval_from_text(s: str) -> Optional[int]:
+    """Horas de um texto de intervalo ("250h", "500 horas", "250")."""
+    m = _INTERVAL_VALUE.search(s or "")
+    return int(m.group(1)) if m else None
+
+
+def _interval_from_name(name: str) -> Optional[int]:
+    # Sem intervalo declarado: heurística pelo nome do item
+    nm = (name or "").lower()
+    if any(k in nm for k in ["250h", "250 h", "250 horas"]):
+        return 250
+    if any(k in nm for k in ["500h", "500 h", "500 horas"]):
+        return 500
+    return None
+
+
+def _quantity(value: object) -> float:
     try:
-        import PyPDF2  # type: ignore
-        text = []
-        with open(pdf_path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                content = page.extract_text() or ""
-                text.append(content)
-        return "\n".join(text)
+        return float(str(value).replace(",", "."))
     except Exception:
-        return ""
+        return 1.0
+
+
+def _read_sample(path: str) -> str:
+    with open(path, "rb") as f:
+        return f.read(SAMPLE_BYTES).decode("utf-8", errors="ignore")
 
-def _extract_materials_from_xml(xml_path: str) -> Dict[int, List[Dict[str, object]]]:
-    """Extrair materiais de um XML genérico.
-    Heurística: procurar nós com nomes 'material', 'part', 'item' e atributos/filhos
-    como 'name', 'reference', 'code', e associar a intervalos com base em 'interval', 'hours'.
+
+def _xml_item(elem, profile: VendorProfile) -> Tuple[Dict[str, object], Optional[int]]:
+    """Campos do item (atributos e filhos diretos, pelos nomes do perfil) e o intervalo declarado nele."""
+    fields: Dict[str, str] = {}
+    interval = None
+    for key, value in elem.attrib.items():
+        key = tag_key(key)
+        if key in profile.field_tags and value.strip():
+            fields.setdefault(profile.field_tags[key], value.strip())
+        elif key in profile.interval_attrs and interval is None:
+            interval = _interval_from_text(value)
+    for child in elem:
+        key = tag_key(child.tag)
+        text = (child.text or "").strip()
+        if not text:
+            continue
+        if key in profile.field_tags:
+            fields.setdefault(profile.field_tags[key], text)
+        elif key in profile.interval_attrs and interval is None:
+            interval = _interval_from_text(text)
+    data = {
+        "name": fields.get("name", ""),
+        "reference": fields.get("reference", ""),
+        "unit": fields.get("unit") or "un",
+        "quantity": fields.get("quantity") or "1",
+        "category": fields.get("category", ""),
+        "description": fields.get("description", ""),
+    }
+    return data, interval
+
+
+def _extract_materials_from_xml(xml_path: str, profile: Optional[VendorProfile] = None) -> Dict[int, List[Dict[str, object]]]:
+    """Extrair materiais de um XML em streaming (iterparse), sem carregar a árvore.
+    Itens: tags do perfil (material, part, item, PartNumber...). Intervalo: o do próprio
+    item ou o declarado no elemento que o contém (<maintenance interval="250h">,
+    <ServiceInterval value="500">, ou filho <hours>); sem ele, heurística pelo nome.
+    Cada elemento é descartado ao terminar, então a memória não cresce com o arquivo.
     """
-    import xml.etree.ElementTree as ET
+    from xml.etree.ElementTree import iterparse
+
     materials_by_interval: Dict[int, List[Dict[str, object]]] = {}
+    if profile is None:
+        try:
+            profile = select_profile(sample=_read_sample(xml_path))
+        except OSError:
+            return materials_by_interval
+
+    # Pilha: (elemento, intervalo vigente, é item?); itens aninhados contam uma vez
+    stack: List[Tuple[object, Optional[int], bool]] = []
+    item_depth = 0
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
+        for event, elem in iterparse(xml_path, events=("start", "end")):
+            if event == "start":
+                key = tag_key(elem.tag)
+                inherited = stack[-1][1] if stack else None
+                is_item = key in profile.item_tags and item_depth == 0
+                if is_item:
+                    item_depth = 1
+                elif item_depth:
+                    item_depth += 1
+                interval = inherited
+                if key in profile.interval_tags and not item_depth:
+                    declared = next((_interval_from_text(v) for k, v in elem.attrib.items()
+                                     if tag_key(k) in profile.interval_attrs), None)
+                    interval = declared or interval
+                stack.append((elem, interval, is_item))
+                continue
+
+            _, interval, is_item = stack.pop()
+            if is_item:
+                item_depth = 0
+                data, own = _xml_item(elem, profile)
+                iv = own or interval or _interval_from_name(str(data["name"]))
+                if iv:
+                    data["quantity"] = _quantity(data["quantity"])
+                    materials_by_interval.setdefault(iv, []).append(data)
+            elif item_depth:
+                item_depth -= 1
+                continue  # filho de item: lido quando o item terminar
+            elif stack and (elem.text or "").strip() and (
+                    tag_key(elem.tag) in profile.interval_attrs or tag_key(elem.tag) in profile.interval_tags):
+                # <hours>250</hours> dentro do bloco: vale para os itens seguintes do bloco
+                parent, parent_iv, parent_item = stack[-1]
+                stack[-1] = (parent, _interval_from_text(elem.text) or parent_iv, parent_item)
+            elem.clear()
+            if stack and len(stack[-1][0]) and stack[-1][0][-1] is elem:
+                del stack[-1][0][-1]
     except Exception:
         return materials_by_interval
 
-    candidates = []
-    for elem in root.iter():
-        tag = elem.tag.lower().split('}')[-1]
-        if tag in {"material", "part", "item"}:
-            # Capturar campos principais e possíveis informações complementares/descrição
-            description = (
-                elem.attrib.get("description")
-                or (elem.findtext("description") or "").strip()
-                or (elem.findtext("details") or "").strip()
-                or (elem.findtext("info") or "").strip()
-                or (elem.findtext("observations") or "").strip()
-            )
-            data = {
-                "name": elem.attrib.get("name") or (elem.findtext("name") or "").strip(),
-                "reference": elem.attrib.get("reference") or (elem.findtext("reference") or "").strip(),
-                "unit": elem.attrib.get("unit") or (elem.findtext("unit") or "un").strip() or "un",
-                "quantity": elem.attrib.get("quantity") or (elem.findtext("quantity") or "1"),
-                "category": elem.attrib.get("category") or (elem.findtext("category") or "").strip(),
-                "description": description,
-            }
-            # Determinar intervalo próximo ao item
-            interval_text = (
-                elem.attrib.get("interval")
-                or elem.attrib.get("hours")
-                or elem.findtext("interval")
-                or elem.findtext("hours")
-                or ""
-            )
-            candidates.append((data, str(interval_text)))
-
-    def _interval_from_text(s: str) -> Optional[int]:
-        s = s.lower()
-        m = re.search(r"(\d{2,4})\s*h", s)
-        if m:
-            try:
-                return int(m.group(1))
-            except Exception:
-                return None
-        # fallback por palavra
-        if "250" in s:
-            return 250
-        if "500" in s:
-            return 500
-        return None
-
-    for data, int_text in candidates:
-        interval = _interval_from_text(int_text) or 0
-        # Se não conseguir determinar intervalo, tentar heurística por nomes
-        if interval == 0:
-            nm = (data.get("name") or "").lower()
-            if any(k in nm for k in ["250h", "250 h", "250 horas"]):
-                interval = 250
-            elif any(k in nm for k in ["500h", "500 h", "500 horas"]):
-                interval = 500
-
-        if interval:
-            try:
-                data["quantity"] = float(data.get("quantity") or 1)
-            except Exception:
-                data["quantity"] = 1.0
-            materials_by_interval.setdefault(interval, []).append(data)
-
     return materials_by_interval
 
-def _extract_materials_from_text(text: str) -> Dict[int, List[Dict[str, object]]]:
-    """Extrair materiais a partir de texto do manual (PDF convertido em texto).
-    Heurística: procurar cabeçalhos com '250h' e '500h' e, nas linhas subsequentes,
-    itens que contenham palavras-chave de materiais (óleo, filtro, graxa), capturando referências.
+
+def _extract_materials_from_text(text: Union[str, Iterable[str]], profile: Optional[VendorProfile] = None) -> Dict[int, List[Dict[str, object]]]:
+    """Extrair materiais a partir de texto do manual (PDF convertido em texto ou .txt), em blocos de linhas.
+    Uma regex combinada do perfil percorre cada bloco: cabeçalhos de intervalo ("250h",
+    "Every 500 Service Hours"...) e linhas com palavra de material (óleo, filtro, graxa...),
+    das quais se extraem referência (P/N, Código, formato do fabricante) e quantidade.
     """
+    if isinstance(text, str):
+        if profile is None:
+            profile = select_profile(sample=text[:SAMPLE_BYTES])
+        blocks: Iterable[str] = _text_blocks(text)
+    else:
+        profile = profile or select_profile()
+        blocks = text
     materials_by_interval: Dict[int, List[Dict[str, object]]] = {250: [], 500: []}
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
     interval = None
-    for ln in lines:
-        low = ln.lower()
-        if re.search(r"\b250\s*h(oras)?\b", low):
-            interval = 250
-            continue
-        if re.search(r"\b500\s*h(oras)?\b", low):
-            interval = 500
-            continue
-        # Capturar itens com palavras-chave
-        if interval in (250, 500):
-            if any(kw in low for kw in ["óleo", "lubr" , "filtro", "graxa", "hidráulico"]):
-                # Extrair possível referência (P/N, Código, Ref)
-                ref = None
-                m = re.search(r"(P/?N|Part\s*No|Código|Cod\.|Ref\.|Referência)\s*[:\-]?\s*([A-Z0-9\-_/]+)", ln, re.I)
-                if m:
-                    ref = m.group(2).strip()
-                # Quantidade simples
-                qty = 1.0
-                mq = re.search(r"(\d+[\.,]?\d*)\s*(un|l|kg|m)\b", ln, re.I)
-                unit = "un"
-                if mq:
-                    try:
-                        qty = float(mq.group(1).replace(',', '.'))
-                    except Exception:
-                        qty = 1.0
-                    unit = mq.group(2).lower()
-
-                materials_by_interval.setdefault(interval, []).append({
-                    "name": ln,
-                    "reference": ref,
-                    "quantity": qty,
-                    "unit": unit,
-                    "description": ln,
-                })
-
-    # Limpeza dos nomes para serem mais curtos
-    for iv in list(materials_by_interval.keys()):
-        cleaned: List[Dict[str, object]] = []
-        for item in materials_by_interval[iv]:
-            name = str(item.get("name") or "").strip()
-            # Remover marcadores
-            name = re.sub(r"^[\-•\*\d\.\)\s]+", "", name)
-            # Reduzir descrição extensa
-            name = name[:200]
-            item["name"] = name
-            cleaned.append(item)
-        materials_by_interval[iv] = cleaned
-
+    for block in blocks:
+        lines = None
+        for index, kind, hours in profile.scan(fold(block)):
+            if kind == "interval":
+                interval = hours
+                continue
+            if interval is None:
+                continue
+            if lines is None:
+                lines = block.split("\n")
+            ln = lines[index].strip()
+            qty = 1.0
+            unit = "un"
+            mq = profile.quantity_re.search(ln)
+            if mq:
+                qty = _quantity(mq.group(1))
+                unit = mq.group(2).lower()
+            materials_by_interval.setdefault(interval, []).append({
+                # Nome sem marcadores e curto
+                "name": _BULLET.sub("", ln)[:200],
+                "reference": profile.reference(ln),
+                "quantity": qty,
+                "unit": unit,
+                "description": ln,
+            })
     return materials_by_interval
 
-def extract_materials_from_document(manual_path: Optional[str]) -> Dict[int, List[Dict[str, object]]]:
-    """Extrair materiais a partir de documento anexado (PDF ou XML).
+
+def _text_blocks(text: str) -> Iterator[str]:
+    """Blocos de ~TEXT_BLOCK caracteres terminando em fim de linha."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + TEXT_BLOCK)
+        end = len(text) if end < 0 else end + 1
+        yield text[start:end]
+        start = end
+
+
+def _text_file_blocks(path: str) -> Iterator[str]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            lines = f.readlines(TEXT_BLOCK)
+            if not lines:
+                return
+            yield "".join(lines)
+
+
+def extract_materials_from_document(manual_path: Optional[str], manufacturer: Optional[str] = None) -> Dict[int, List[Dict[str, object]]]:
+    """Extrair materiais a partir de documento anexado (PDF, XML ou TXT).
     Retorna um dict mapeando intervalo (e.g., 250, 500) para lista de materiais.
+    O perfil de layout vem do fabricante do equipamento (ou do início do documento).
     """
     if not manual_path:
         return {}
     ext = os.path.splitext(manual_path)[1].lower()
+    profile = select_profile(manufacturer) if manufacturer else None
+    if profile is not None and profile.name == GENERIC:
+        profile = None  # fabricante sem perfil: reconhecer pelo documento
     if ext == ".xml":
-        return _extract_materials_from_xml(manual_path)
+        return _extract_materials_from_xml(manual_path, profile)
     if ext == ".pdf":
         text = _extract_text_from_pdf(manual_path)
         if text:
-            return _extract_materials_from_text(text)
+            return _extract_materials_from_text(text, profile)
         return {}
+    if ext == ".txt":
+        try:
+            profile = profile or select_profile(sample=_read_sample(manual_path))
+            return _extract_materials_from_text(_text_file_blocks(manual_path), profile)
+        except OSError:
+            return {}
     # Outros formatos não suportados neste MVP
     return {}
 
@@ -306,6 +360,13 @@ def _default_actions_for_hours(interval_hours: int) -> List[Dict[str, str]]:
     return actions
 
 
+def plan_label(equipment: object) -> str:
+    """Sufixo dos nomes dos planos: "Nome (PREFIXO)"."""
+    eq_name = getattr(equipment, "name", "Equipamento")
+    prefix = getattr(equipment, "prefix", "")
+    return f"{eq_name}" + (f" ({prefix})" if prefix else "")
+
+
 def _plan_spec(
     equipment_id: int,
     name: str,
@@ -334,14 +395,12 @@ def generate_plans_from_manual(
     Implementação: tenta extrair materiais/peças do documento (PDF/XML). Se nada for encontrado,
     aplica heurística padrão (250h/500h) e materiais genéricos.
     """
-    eq_name = getattr(equipment, "name", "Equipamento")
-    prefix = getattr(equipment, "prefix", "")
-    label = f"{eq_name}" + (f" ({prefix})" if prefix else "")
+    label = plan_label(equipment)
     base_desc = "Planos gerados automaticamente a partir de manual do fabricante anexado."
     if manual_path:
         base_desc += f" Fonte: {os.path.basename(manual_path)}."
 
-    extracted = extract_materials_from_document(manual_path)
+    extracted = extract_materials_from_document(manual_path, getattr(equipment, "manufacturer", None))
 
     plans: List[Dict[str, object]] = []
     for iv in [250, 500]:
@@ -386,9 +445,7 @@ def generate_plans_via_internet(equipment: object) -> List[Dict[str, object]]:
     """Gera planos via heurística/IA (MVP) quando usuário escolhe buscar na internet.
     Caso IA não esteja configurada, retorna conjuntos padrão.
     """
-    eq_name = getattr(equipment, "name", "Equipamento")
-    prefix = getattr(equipment, "prefix", "")
-    label = f"{eq_name}" + (f" ({prefix})" if prefix else "")
+    label = plan_label(equipment)
     base_desc = "Planos gerados automaticamente via heurística/IA (sem garantia de fabricante)."
 
     return [
@@ -0,0 +1,270 @@
+"""
+Limite de requisições por usuário/IP para endpoints caros.
+
+Relatórios, chat de IA da manutenção, impressão de PDF, validação de CNPJ e a
+sincronização em lote podem ocupar uma CPU ou o banco por segundos; nada
+impedia um usuário de repeti-los em sequência. Cada rota declara a sua
+política como dependência:
+
+    @router.get("/kpis/mttr", dependencies=[REPORT_ETAG, Depends(rate_limit("reports"))])
+
+O algoritmo é o GCRA (equivalente a um token bucket, com um único número por
+chave: o "theoretical arrival time"). A chave é o usuário autenticado (token
+no header/cookie/query) ou, sem sessão, o IP do cliente. Acima do limite a
+rota responde 429 com Retry-After.
+
+Lojas:
+- memória (padrão): por worker;
+- SQLite (RATE_LIMIT_STORE=sqlite): arquivo próprio (RATE_LIMIT_DB), fora do
+  banco principal para não disputar o lock de escrita, compartilhado pelos
+  workers do serve.py (ligado por ele quando há mais de um worker). O
+  limitador de login (login_throttle) usa o mesmo arquivo.
+
+Políticas ajustáveis por ambiente: RATE_LIMIT_<NOME>="limite/segundos[/rajada]",
+ex.: RATE_LIMIT_AI_CHAT="10/60/3". RATE_LIMIT_ENABLED=0 desliga tudo.
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.services import session_tokens
+
+
+class RatePolicy:
+    """limit requisições a cada period segundos, com rajada de até burst seguidas."""
+
+    def __init__(self, name: str, limit: int, period: float, burst: Optional[int] = None):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.burst = burst or limit
+
+    @property
+    def interval(self) -> float:
+        """Intervalo de emissão (T): segundos por requisição no ritmo sustentado."""
+        return self.period / self.limit
+
+    @property
+    def tolerance(self) -> float:
+        """Quanto o TAT pode estar à frente do relógio (rajada - 1 intervalos)."""
+        return self.interval * (self.burst - 1)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"limit": self.limit, "period": self.period, "burst": self.burst}
+
+
+class RateDecision(NamedTuple):
+    allowed: bool
+    retry_after: float
+    remaining: int
+
+
+# Decisão a partir do TAT gravado: (novo TAT ou None para não gravar, decisão)
+Decide = Callable[[Optional[float]], Tuple[Optional[float], RateDecision]]
+
+
+class MemoryStore:
+    """TAT por chave em memória (um worker)."""
+
+    blocking = False
+    MAX_KEYS = 50_000
+
+    def __init__(self):
+        self._tats: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, decide: Decide, now: float) -> RateDecision:
+        with self._lock:
+            new_tat, decision = decide(self._tats.get(key))
+            if new_tat is not None:
+                if key not in self._tats and len(self._tats) >= self.MAX_KEYS:
+                    self.sweep(now)
+                self._tats[key] = new_tat
+            return decision
+
+    def sweep(self, now: float) -> int:
+        """Descartar chaves com TAT no passado (equivalentes a chaves novas)."""
+        expired = [key for key, tat in self._tats.items() if tat <= now]
+        for key in expired:
+            del self._tats[key]
+        return len(expired)
+
+
+def shared_store_enabled() -> bool:
+    return os.getenv("RATE_LIMIT_STORE", "memory").lower() == "sqlite"
+
+
+def shared_store_path() -> str:
+    return os.getenv("RATE_LIMIT_DB", os.path.join("data", "rate_limits.db"))
+
+
+def connect_shared(path: str, schema: str) -> sqlite3.Connection:
+    """Conexão em autocommit (WAL) com o arquivo compartilhado, criando a tabela da loja."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(schema)
+    return conn
+
+
+class SQLiteStore:
+    """TAT por chave num arquivo SQLite compartilhado entre processos."""
+
+    blocking = True
+    SWEEP_EVERY = 1000
+    SCHEMA = "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._updates = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect_shared(self.path, self.SCHEMA)
+        return conn
+
+    def update(self, key: str, decide: Decide, now: float) -> RateDecision:
+        conn = self._connection()
+        # BEGIN IMMEDIATE: leitura e gravação do TAT atômicas entre workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            new_tat, decision = decide(row[0] if row else None)
+            if new_tat is not None:
+                conn.execute(
+                    "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                    (key, new_tat),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._updates += 1
+        if self._updates % self.SWEEP_EVERY == 0:
+            self.sweep(now)
+        return decision
+
+    def sweep(self, now: float) -> int:
+        conn = self._connection()
+        return conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,)).rowcount
+
+
+class RateLimiter:
+    def __init__(self, store=None, clock: Callable[[], float] = time.time, enabled: bool = True):
+        self.store = store if store is not None else MemoryStore()
+        self.clock = clock
+        self.enabled = enabled
+        self.policies: Dict[str, RatePolicy] = {}
+        self.metrics: Counter = Counter()
+
+    def register(self, policy: RatePolicy) -> RatePolicy:
+        self.policies[policy.name] = policy
+        return policy
+
+    def hit(self, policy: RatePolicy, identity: str, now: Optional[float] = None) -> RateDecision:
+        """Registrar uma requisição de identity na política (GCRA)."""
+        now = self.clock() if now is None else now
+        interval, tolerance = policy.interval, policy.tolerance
+
+        def decide(tat: Optional[float]):
+            tat = now if tat is None else max(tat, now)
+            allow_at = tat - tolerance
+            if now < allow_at:
+                return None, RateDecision(False, allow_at - now, 0)
+            new_tat = tat + interval
+            remaining = int((now + tolerance + interval - new_tat) / interval + 1e-9)
+            return new_tat, RateDecision(True, 0.0, remaining)
+
+        decision = self.store.update(f"{policy.name}:{identity}", decide, now)
+        self.metrics[(policy.name, "allowed" if decision.allowed else "limited")] += 1
+        return decision
+
+    async def hit_async(self, policy: RatePolicy, identity: str) -> RateDecision:
+        if self.store.blocking:
+            return await asyncio.to_thread(self.hit, policy, identity)
+        return self.hit(policy, identity)
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        return {
+            name: {
+                **policy.to_dict(),
+                "allowed": self.metrics[(name, "allowed")],
+                "limited": self.metrics[(name, "limited")],
+            }
+            for name, policy in self.policies.items()
+        }
+
+
+def request_identity(request: Request, db: Session) -> str:
+    """Usuário do token da sessão (sem renovar a expiração) ou IP do cliente."""
+    auth_header = request.headers.get("Authorization") or ""
+    raw = auth_header.split(" ", 1)[1].strip() if auth_header.lower().startswith("bearer ") else None
+    raw = raw or request.cookies.get("auth_token") or request.query_params.get("token")
+    if raw:
+        session = session_tokens.find_token(db, raw)
+        if session and not session.is_revoked and session.expires_at >= datetime.utcnow():
+            return f"user:{session.user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def rate_limit(name: str, limiter: Optional[RateLimiter] = None):
+    """Dependência da rota para a política registrada com esse nome."""
+
+    async def dependency(request: Request, db: Session = Depends(get_db)):
+        active = limiter or rate_limiter
+        if not active.enabled:
+            return
+        policy = active.policies[name]
+        decision = await active.hit_async(policy, request_identity(request, db))
+        if not decision.allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Muitas requisições. Tente novamente em instantes.",
+                headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))},
+            )
+
+    return dependency
+
+
+def _policy_from_env(name: str, limit: int, period: float, burst: int) -> RatePolicy:
+    value = os.getenv(f"RATE_LIMIT_{name.upper()}")
+    if value:
+        try:
+            parts = [float(p) for p in value.split("/")]
+            return RatePolicy(name, int(parts[0]), parts[1], int(parts[2]) if len(parts) > 2 else None)
+        except (ValueError, IndexError, ZeroDivisionError):
+            print(f"⚠️ RATE_LIMIT_{name.upper()} inválido ({value}); usando {limit}/{period:g}/{burst}")
+    return RatePolicy(name, limit, period, burst)
+
+
+def _store_from_env():
+    if shared_store_enabled():
+        return SQLiteStore(shared_store_path())
+    return MemoryStore()
+
+
+rate_limiter = RateLimiter(
+    store=_store_from_env(),
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "1").lower() not in ("0", "false", "no"),
+)
+# Um dashboard abre vários relatórios de uma vez: rajada generosa, ritmo moderado
+rate_limiter.register(_policy_from_env("reports", 120, 60, 40))
+rate_limiter.register(_policy_from_env("ai_chat", 10, 60, 3))
+rate_limiter.register(_policy_from_env("pdf", 30, 60, 10))
+rate_limiter.register(_policy_from_env("cnpj", 20, 60, 5))
+rate_limiter.register(_policy_from_env("bulk_sync", 10, 60, 5))
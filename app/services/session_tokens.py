@@ -0,0 +1,135 @@
+"""
+Tokens de sessão guardados como hash, com expiração deslizante e limpeza.
+
+A tabela session_tokens guardava o token em texto puro e nunca era limpa:
+quem lesse o banco (ou um backup) tinha sessões válidas, e a tabela crescia a
+cada login. Agora só o SHA-256 do token é gravado (índice único; o token tem
+256 bits aleatórios, então não precisa de salt nem de hash lento) e a consulta
+é sempre por igualdade nesse índice, com custo constante.
+
+A expiração desliza com o uso, mas a renovação grava no máximo uma vez a cada
+SESSION_REFRESH_MINUTES por token, e não a cada requisição. Uma tarefa de
+fundo apaga em lotes os tokens expirados ou revogados.
+"""
+
+import asyncio
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.admin import SessionToken
+from app.services.background_worker import BackgroundWorker
+
+REFRESH_MINUTES = float(os.getenv("SESSION_REFRESH_MINUTES", "10"))
+SWEEP_MINUTES = float(os.getenv("SESSION_SWEEP_MINUTES", "60"))
+SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "1000"))
+
+
+def hash_token(raw: str) -> str:
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def issue_token(db: Session, user_id: int, ttl_hours: float) -> Tuple[SessionToken, str]:
+    """Criar sessão. Retorna (registro, token em claro); o token em claro não é gravado."""
+    raw = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    session = SessionToken(user_id=user_id, token_hash=hash_token(raw), created_at=now,
+                           last_used_at=now, expires_at=now + timedelta(hours=ttl_hours))
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session, raw
+
+
+def find_token(db: Session, raw: Optional[str]) -> Optional[SessionToken]:
+    """Sessão pelo token em claro, sem filtrar revogação/expiração."""
+    if not raw:
+        return None
+    return db.query(SessionToken).filter(SessionToken.token_hash == hash_token(raw)).first()
+
+
+def resolve_token(db: Session, raw: Optional[str], now: Optional[datetime] = None) -> Optional[SessionToken]:
+    """Sessão ativa do token, renovando a expiração se a última renovação passou do intervalo."""
+    session = find_token(db, raw)
+    now = now or datetime.utcnow()
+    if not session or session.is_revoked or session.expires_at < now:
+        return None
+    last_used = session.last_used_at or session.created_at or now
+    if now - last_used >= timedelta(minutes=REFRESH_MINUTES):
+        # Mesma janela da emissão (expires_at - last_used_at), contada a partir de agora.
+        # O UPDATE condicional evita que requisições simultâneas regravem a mesma sessão.
+        window = session.expires_at - last_used
+        result = db.execute(
+            update(SessionToken)
+            .where(SessionToken.id == session.id, SessionToken.last_used_at == session.last_used_at)
+            .values(last_used_at=now, expires_at=now + window)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount:
+            session.last_used_at, session.expires_at = now, now + window
+    return session
+
+
+def revoke_user_sessions(db: Session, user_id: int, except_id: Optional[int] = None) -> int:
+    q = db.query(SessionToken).filter(SessionToken.user_id == user_id, SessionToken.is_revoked == False)  # noqa: E712
+    if except_id is not None:
+        q = q.filter(SessionToken.id != except_id)
+    count = q.update({SessionToken.is_revoked: True}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+# -------------------------
+# Limpeza em segundo plano
+# -------------------------
+
+def sweep_expired(db: Session, batch_size: int = SWEEP_BATCH, now: Optional[datetime] = None) -> int:
+    """Apagar tokens expirados ou revogados em lotes (transações curtas). Retorna o total."""
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        ids = select(SessionToken.id).where(
+            (SessionToken.expires_at < now) | (SessionToken.is_revoked == True)  # noqa: E712
+        ).limit(batch_size)
+        result = db.execute(delete(SessionToken).where(SessionToken.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
+        total += result.rowcount or 0
+        if (result.rowcount or 0) < batch_size:
+            return total
+
+
+def _sweep_once(session_factory: Callable[[], Session]) -> int:
+    db = session_factory()
+    try:
+        return sweep_expired(db)
+    finally:
+        db.close()
+
+
+class SessionSweeper(BackgroundWorker):
+    """Limpeza periódica (a cada SWEEP_MINUTES) dos tokens expirados ou revogados."""
+
+    error_message = "Falha na limpeza de sessões"
+
+    def __init__(self, session_factory: Callable[[], Session] = SessionLocal, interval_minutes: float = SWEEP_MINUTES):
+        super().__init__()
+        self.session_factory = session_factory
+        self.interval_minutes = interval_minutes
+
+    def interval(self) -> float:
+        return self.interval_minutes * 60
+
+    async def step(self) -> None:
+        removed = await asyncio.to_thread(_sweep_once, self.session_factory)
+        if removed:
+            print(f"🧹 Sessões expiradas/revogadas removidas: {removed}")
+
+
+session_sweeper = SessionSweeper()
@@ -0,0 +1,90 @@
+"""
+Execução única das tarefas de inicialização com vários workers.
+
+Com gunicorn/uvicorn em vários processos, cada worker executa o lifespan do
+app; as migrações, a semeadura e a reconciliação preventiva inicial rodariam N
+vezes ao mesmo tempo sobre o mesmo banco. O processo que inicia os workers
+(serve.py) grava um identificador de geração em STARTUP_GENERATION_ENV; o
+primeiro worker a obter o lock de arquivo executa as tarefas e grava a geração
+no arquivo, e os demais (inclusive workers reiniciados depois) apenas
+aguardam o lock e seguem sem repetir o trabalho.
+
+Sem a variável (python main.py, run.py, testes) as tarefas sempre executam.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+STARTUP_GENERATION_ENV = "MTDL_STARTUP_GENERATION"
+
+
+def default_lock_path() -> str:
+    """Arquivo de lock por banco de dados (STARTUP_LOCK_FILE sobrepõe)."""
+    configured = os.getenv("STARTUP_LOCK_FILE")
+    if configured:
+        return configured
+    database_url = os.getenv("DATABASE_URL", "sqlite:///./mtdl_pcm.db")
+    if database_url.startswith("sqlite:///"):
+        database_url = os.path.abspath(database_url[len("sqlite:///"):])
+    digest = hashlib.sha256(database_url.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f"mtdl_pcm_startup_{digest}.lock")
+
+
+def _lock(fh) -> None:
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        return
+    fh.seek(0)
+    while True:
+        try:
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(0.1)
+
+
+def _unlock(fh) -> None:
+    if fcntl is not None:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+        return
+    fh.seek(0)
+    msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def startup_once(generation: Optional[str] = None, lock_path: Optional[str] = None) -> Iterator[bool]:
+    """Entrega True ao worker que deve executar as tarefas desta geração.
+
+    O lock fica retido durante o bloco, então os demais workers esperam o fim
+    das migrações antes de atender requisições. Se o bloco levantar exceção a
+    geração não é gravada e o próximo worker tenta de novo.
+    """
+    if generation is None:
+        generation = os.getenv(STARTUP_GENERATION_ENV)
+    if not generation:
+        yield True
+        return
+
+    with open(lock_path or default_lock_path(), "a+") as fh:
+        _lock(fh)
+        try:
+            fh.seek(0)
+            first = fh.read().strip() != generation
+            yield first
+            if first:
+                fh.seek(0)
+                fh.truncate()
+                fh.write(generation)
+                fh.flush()
+        finally:
+            _unlock(fh)
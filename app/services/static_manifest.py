@@ -0,0 +1,164 @@
+"""
+Manifesto de impressões digitais dos arquivos estáticos.
+
+get_static_url chamava os.path.getmtime a cada uso nos templates: toda
+renderização fazia vários stat no disco só para montar o "?v=". Agora um
+manifesto (caminho relativo -> hash do conteúdo) é montado uma vez na
+inicialização e consultado em memória. Como a URL muda junto com o conteúdo,
+/static responde com "Cache-Control: immutable" quando o ?v= pedido bate com
+o hash atual.
+
+- Executável PyInstaller: usa static/asset-manifest.json gerado no build
+  (scripts/build.ps1 roda python -m app.services.static_manifest antes do
+  PyInstaller); os arquivos do pacote não mudam. Sem o arquivo, os hashes
+  são calculados na inicialização.
+- Desenvolvimento (DEBUG=true): uma thread verifica as datas de modificação
+  e atualiza as entradas alteradas, para a URL mudar sem reiniciar.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+from starlette.staticfiles import StaticFiles
+
+MANIFEST_NAME = "asset-manifest.json"
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+WATCH_SECONDS = 1.0
+
+
+def is_development() -> bool:
+    return os.getenv("DEBUG", "").strip().lower() in ("1", "true", "yes")
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def _walk(static_dir: str):
+    for root, _dirs, files in os.walk(static_dir):
+        for name in files:
+            full = os.path.join(root, name)
+            rel = os.path.relpath(full, static_dir).replace(os.sep, "/")
+            if rel != MANIFEST_NAME:
+                yield rel, full
+
+
+def build_manifest(static_dir: str) -> Dict[str, str]:
+    return {rel: file_hash(full) for rel, full in sorted(_walk(static_dir))}
+
+
+def write_manifest(static_dir: str, manifest: Optional[Dict[str, str]] = None) -> str:
+    manifest = manifest if manifest is not None else build_manifest(static_dir)
+    out = os.path.join(static_dir, MANIFEST_NAME)
+    with open(out, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return out
+
+
+class StaticManifest:
+    """Manifesto em memória. Montado sob demanda na primeira consulta."""
+
+    def __init__(self, static_dir: str, frozen: Optional[bool] = None, watch: Optional[bool] = None):
+        self.static_dir = static_dir
+        self.frozen = getattr(sys, "frozen", False) if frozen is None else frozen
+        self.watch = is_development() if watch is None else watch
+        self.hashes: Dict[str, str] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, str]:
+        with self._lock:
+            if self._loaded:
+                return self.hashes
+            prebuilt = os.path.join(self.static_dir, MANIFEST_NAME)
+            if self.frozen and os.path.exists(prebuilt):
+                with open(prebuilt, encoding="utf-8") as fh:
+                    self.hashes = json.load(fh)
+            else:
+                self.hashes = build_manifest(self.static_dir) if os.path.isdir(self.static_dir) else {}
+            self._loaded = True
+            if self.watch and self._watcher is None:
+                self._mtimes = self._scan_mtimes()
+                self._watcher = threading.Thread(target=self._watch_loop, name="static-manifest", daemon=True)
+                self._watcher.start()
+            return self.hashes
+
+    def get(self, path: str) -> Optional[str]:
+        hashes = self.hashes if self._loaded else self.load()
+        return hashes.get(path.lstrip("/"))
+
+    def url(self, path: str) -> str:
+        version = self.get(path)
+        return f"/static/{path}?v={version}" if version else f"/static/{path}"
+
+    # Observador (apenas desenvolvimento)
+    def _scan_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for rel, full in _walk(self.static_dir):
+            try:
+                mtimes[rel] = os.path.getmtime(full)
+            except OSError:
+                pass
+        return mtimes
+
+    def refresh_changed(self) -> int:
+        """Recalcular o hash dos arquivos novos/alterados e remover os apagados. Retorna o total alterado."""
+        current = self._scan_mtimes()
+        changed = [rel for rel, mtime in current.items() if self._mtimes.get(rel) != mtime]
+        removed = [rel for rel in self._mtimes if rel not in current]
+        hashes = dict(self.hashes)
+        for rel in changed:
+            try:
+                hashes[rel] = file_hash(os.path.join(self.static_dir, rel))
+            except OSError:
+                hashes.pop(rel, None)
+        for rel in removed:
+            hashes.pop(rel, None)
+        self.hashes, self._mtimes = hashes, current
+        return len(changed) + len(removed)
+
+    def _watch_loop(self) -> None:
+        while True:
+            time.sleep(WATCH_SECONDS)
+            try:
+                self.refresh_changed()
+            except Exception as e:
+                print(f"⚠️ Falha ao atualizar manifesto de estáticos: {e}")
+
+
+class FingerprintedStaticFiles(StaticFiles):
+    """StaticFiles que marca como imutável a resposta cujo ?v= bate com o manifesto."""
+
+    def __init__(self, *args, manifest: StaticManifest, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.manifest = manifest
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            requested = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("v")
+            rel = path.replace(os.sep, "/")
+            if requested and requested[0] == self.manifest.get(rel):
+                response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+if __name__ == "__main__":
+    # Gerar static/asset-manifest.json (build do executável / conferência em deploy)
+    from app.templates_config import STATIC_DIR
+    target = sys.argv[1] if len(sys.argv) > 1 else STATIC_DIR
+    out = write_manifest(target)
+    print(f"✅ Manifesto de estáticos gravado em {out}")
@@ -0,0 +1,405 @@
+"""
+Consultas agregadas para os relatórios de almoxarifado.
+
+Os relatórios de análise ABC, giro, cobertura e ruptura eram montados em
+Python: todas as movimentações do período eram carregadas e o Material era
+consultado linha a linha. Aqui o consumo, os percentuais acumulados e os
+agrupamentos (categoria ou centro de custo) são calculados no próprio banco.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, Tuple
+
+from sqlalchemy import func, and_, or_, case, exists
+from sqlalchemy.orm import Session
+
+from app.models.warehouse import (
+    Material,
+    StockMovement,
+    PurchaseRequest,
+    PurchaseRequestItem,
+    PurchaseOrder,
+)
+
+NO_CATEGORY = "Sem categoria"
+NO_COST_CENTER = "Sem centro de custo"
+OUTFLOW_TYPE = "Saída"
+MAX_COVERAGE_DAYS = 365.0
+GROUP_BY_OPTIONS = ("category", "cost_center")
+
+
+def resolve_period(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    default_days: int
+) -> Tuple[str, str, datetime, datetime]:
+    """Aplicar o período padrão (últimos N dias) e converter as datas ISO."""
+    if not start_date:
+        start_date = (datetime.now() - timedelta(days=default_days)).isoformat()
+    if not end_date:
+        end_date = datetime.now().isoformat()
+    return start_date, end_date, datetime.fromisoformat(start_date), datetime.fromisoformat(end_date)
+
+
+def supports_window_functions(db: Session) -> bool:
+    """SQLite só suporta funções de janela a partir da versão 3.25."""
+    if db.get_bind().dialect.name != "sqlite":
+        return True
+    return sqlite3.sqlite_version_info >= (3, 25, 0)
+
+
+def _category_key():
+    return func.coalesce(func.nullif(Material.category, ""), NO_CATEGORY)
+
+
+def _movement_group_key(group_by: str):
+    """Chave de agrupamento para consultas sobre movimentações de saída."""
+    if group_by == "cost_center":
+        return func.coalesce(func.nullif(StockMovement.cost_center, ""), NO_COST_CENTER)
+    return _category_key()
+
+
+def _outflow_filter(start_dt: datetime, end_dt: datetime):
+    return and_(
+        StockMovement.type == OUTFLOW_TYPE,
+        StockMovement.date >= start_dt,
+        StockMovement.date <= end_dt,
+    )
+
+
+def _consumption_query(db: Session, start_dt: datetime, end_dt: datetime, *group_columns):
+    """Consumo (soma das saídas) por material, com junção única em Material."""
+    consumption = func.sum(func.coalesce(StockMovement.quantity, 0.0)).label("consumption")
+    return (
+        db.query(
+            Material.id.label("material_id"),
+            Material.code.label("code"),
+            Material.name.label("name"),
+            Material.unit.label("unit"),
+            _category_key().label("category"),
+            func.coalesce(Material.current_stock, 0.0).label("current_stock"),
+            *group_columns,
+            consumption,
+        )
+        .join(StockMovement, StockMovement.material_id == Material.id)
+        .filter(_outflow_filter(start_dt, end_dt))
+        .group_by(Material.id, *group_columns)
+    )
+
+
+def _average_by_group(db: Session, per_row_subquery, value_column: str) -> List[Dict[str, Any]]:
+    """Média (já arredondada por linha) de uma métrica agrupada por group_key."""
+    value = getattr(per_row_subquery.c, value_column)
+    rows = (
+        db.query(per_row_subquery.c.group_key, func.avg(value).label("avg_value"))
+        .group_by(per_row_subquery.c.group_key)
+        .order_by(per_row_subquery.c.group_key)
+        .all()
+    )
+    return [{"label": row.group_key, value_column: round(float(row.avg_value or 0.0), 2)} for row in rows]
+
+
+def _overall_average(rows: List[Dict[str, Any]], key: str) -> float:
+    return round(sum(r[key] for r in rows) / len(rows), 2) if rows else 0.0
+
+
+# -------------------------
+# Análise ABC
+# -------------------------
+
+def _abc_values_subquery(db: Session, basis: str, start_dt: Optional[datetime], end_dt: Optional[datetime]):
+    """Valor de cada material ativo: estoque atual ou consumo valorizado no período."""
+    if basis == "consumption":
+        value = func.sum(
+            func.coalesce(StockMovement.quantity, 0.0) * func.coalesce(Material.average_cost, 0.0)
+        )
+        query = (
+            db.query(
+                Material.id.label("id"),
+                Material.code.label("code"),
+                Material.name.label("name"),
+                Material.current_stock.label("current_stock"),
+                Material.average_cost.label("average_cost"),
+                value.label("stock_value"),
+            )
+            .join(StockMovement, StockMovement.material_id == Material.id)
+            .filter(Material.is_active == True, _outflow_filter(start_dt, end_dt))
+            .group_by(Material.id)
+        )
+    else:
+        value = func.coalesce(Material.current_stock, 0.0) * func.coalesce(Material.average_cost, 0.0)
+        query = db.query(
+            Material.id.label("id"),
+            Material.code.label("code"),
+            Material.name.label("name"),
+            Material.current_stock.label("current_stock"),
+            Material.average_cost.label("average_cost"),
+            value.label("stock_value"),
+        ).filter(Material.is_active == True)
+    return query.subquery()
+
+
+def abc_analysis(
+    db: Session,
+    a_threshold: float = 80.0,
+    b_threshold: float = 95.0,
+    basis: str = "stock",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Classificação ABC pelo percentual acumulado do valor.
+
+    basis="stock" usa o valor em estoque (estoque atual × custo médio);
+    basis="consumption" usa o consumo valorizado no período (padrão: 12 meses).
+    O acumulado é calculado com SUM() OVER; em SQLite antigo, em Python
+    sobre as linhas já ordenadas pelo banco.
+    """
+    start_dt = end_dt = None
+    period = None
+    if basis == "consumption":
+        start_date, end_date, start_dt, end_dt = resolve_period(start_date, end_date, 365)
+        period = f"{start_date} até {end_date}"
+
+    values = _abc_values_subquery(db, basis, start_dt, end_dt)
+    ordering = (values.c.stock_value.desc(), values.c.id)
+    columns = [
+        values.c.id, values.c.code, values.c.name,
+        values.c.current_stock, values.c.average_cost, values.c.stock_value,
+    ]
+
+    if supports_window_functions(db):
+        rows = (
+            db.query(
+                *columns,
+                func.sum(values.c.stock_value).over(order_by=ordering, rows=(None, 0)).label("cumulative_value"),
+                func.sum(values.c.stock_value).over().label("total_value"),
+            )
+            .order_by(*ordering)
+            .all()
+        )
+        total_value = float(rows[0].total_value or 0.0) if rows else 0.0
+        cumulative = [float(r.cumulative_value or 0.0) for r in rows]
+    else:
+        rows = db.query(*columns).order_by(*ordering).all()
+        cumulative = []
+        running = 0.0
+        for r in rows:
+            running += float(r.stock_value or 0.0)
+            cumulative.append(running)
+        total_value = running
+
+    materials = []
+    for r, acc_value in zip(rows, cumulative):
+        stock_value = float(r.stock_value or 0.0)
+        percentage = (stock_value / total_value * 100) if total_value > 0 else 0
+        accumulated_percentage = (acc_value / total_value * 100) if total_value > 0 else 0
+        if accumulated_percentage <= a_threshold:
+            classification = "A"
+        elif accumulated_percentage <= b_threshold:
+            classification = "B"
+        else:
+            classification = "C"
+        materials.append({
+            "id": r.id,
+            "code": r.code,
+            "name": r.name,
+            "stock_value": stock_value,
+            "current_stock": r.current_stock,
+            "average_cost": r.average_cost,
+            "percentage": round(percentage, 2),
+            "accumulated_percentage": round(accumulated_percentage, 2),
+            "classification": classification,
+        })
+
+    result = {
+        "total_value": total_value,
+        "basis": basis,
+        "thresholds": {"A": a_threshold, "B": b_threshold},
+        "materials": materials,
+    }
+    if period:
+        result["period"] = period
+    return result
+
+
+# -------------------------
+# Giro e cobertura de estoque
+# -------------------------
+
+def stock_turnover(db: Session, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Any]:
+    """Giro por material = consumo no período / estoque atual (somente estoque > 0)."""
+    start_date, end_date, start_dt, end_dt = resolve_period(start_date, end_date, 365)
+    rows = (
+        _consumption_query(db, start_dt, end_dt)
+        .filter(Material.current_stock > 0)
+        .all()
+    )
+    turnover_data = [
+        {
+            "material_code": r.code,
+            "material_name": r.name,
+            "consumption": r.consumption,
+            "current_stock": r.current_stock,
+            "turnover": round(r.consumption / r.current_stock, 2),
+            "unit": r.unit,
+        }
+        for r in rows
+    ]
+    turnover_data.sort(key=lambda x: (-x["turnover"], x["material_code"]))
+    return {"period": f"{start_date} até {end_date}", "materials": turnover_data}
+
+
+def stock_turnover_grouped(
+    db: Session,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    group_by: str = "category",
+) -> Dict[str, Any]:
+    """Giro médio agrupado por categoria do material ou centro de custo da saída."""
+    start_date, end_date, start_dt, end_dt = resolve_period(start_date, end_date, 365)
+
+    per_material = [
+        {
+            "category": r.category,
+            "label": f"{r.code} - {r.name}",
+            "turnover": round(r.consumption / r.current_stock, 2),
+        }
+        for r in _consumption_query(db, start_dt, end_dt).filter(Material.current_stock > 0).all()
+    ]
+
+    group_key = _movement_group_key(group_by).label("group_key")
+    per_group_row = (
+        _consumption_query(db, start_dt, end_dt, group_key)
+        .filter(Material.current_stock > 0)
+        .subquery()
+    )
+    turnover = func.round(per_group_row.c.consumption / per_group_row.c.current_stock, 2).label("turnover")
+    per_group_row = db.query(per_group_row.c.group_key, turnover).subquery()
+
+    return {
+        "period": f"{start_date} até {end_date}",
+        "group_by": group_by,
+        "grouped": _average_by_group(db, per_group_row, "turnover"),
+        "materials": per_material,
+        "overall": _overall_average(per_material, "turnover"),
+    }
+
+
+def _coverage_expression(current_stock, consumption, days: int):
+    daily = consumption / float(days)
+    coverage = current_stock / daily
+    return case((coverage > MAX_COVERAGE_DAYS, MAX_COVERAGE_DAYS), else_=coverage)
+
+
+def stock_coverage(
+    db: Session,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    group_by: str = "category",
+) -> Dict[str, Any]:
+    """Cobertura (dias) = estoque atual / consumo diário médio, limitada a 365 dias."""
+    start_date, end_date, start_dt, end_dt = resolve_period(start_date, end_date, 90)
+    days = max(1, (end_dt - start_dt).days)
+    consumption = func.sum(func.coalesce(StockMovement.quantity, 0.0))
+
+    per_material = []
+    for r in _consumption_query(db, start_dt, end_dt).having(consumption > 0).all():
+        coverage = min(r.current_stock / (r.consumption / days), MAX_COVERAGE_DAYS)
+        per_material.append({
+            "category": r.category,
+            "label": f"{r.code} - {r.name}",
+            "coverage_days": round(coverage, 2),
+        })
+
+    group_key = _movement_group_key(group_by).label("group_key")
+    per_group_row = (
+        _consumption_query(db, start_dt, end_dt, group_key)
+        .having(consumption > 0)
+        .subquery()
+    )
+    coverage = func.round(
+        _coverage_expression(per_group_row.c.current_stock, per_group_row.c.consumption, days), 2
+    ).label("coverage_days")
+    per_group_row = db.query(per_group_row.c.group_key, coverage).subquery()
+
+    return {
+        "period": f"{start_date} até {end_date}",
+        "group_by": group_by,
+        "grouped": _average_by_group(db, per_group_row, "coverage_days"),
+        "materials": per_material,
+        "overall": _overall_average(per_material, "coverage_days"),
+    }
+
+
+# -------------------------
+# Taxa de ruptura
+# -------------------------
+
+def stockout_rate(
+    db: Session,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    group_by: str = "category",
+) -> Dict[str, Any]:
+    """Requisições não atendidas / total de requisições × 100, por grupo.
+
+    Uma requisição é atendida quando possui pedido com status "Entregue" e não
+    foi rejeitada. Com group_by="category" cada requisição conta uma vez por
+    categoria distinta de seus itens; com "cost_center", pelo centro de custo
+    da requisição.
+    """
+    delivered = exists().where(and_(
+        PurchaseOrder.purchase_request_id == PurchaseRequest.id,
+        func.lower(PurchaseOrder.status) == "entregue",
+    ))
+    not_attended = case(
+        (or_(~delivered, func.lower(func.coalesce(PurchaseRequest.status, "")) == "rejeitada"), 1),
+        else_=0,
+    )
+
+    requests = db.query(PurchaseRequest.id.label("pr_id"), not_attended.label("not_attended"))
+    if start_date:
+        requests = requests.filter(PurchaseRequest.requested_date >= datetime.fromisoformat(start_date))
+    if end_date:
+        requests = requests.filter(PurchaseRequest.requested_date <= datetime.fromisoformat(end_date))
+
+    if group_by == "cost_center":
+        label = func.coalesce(func.nullif(PurchaseRequest.cost_center, ""), NO_COST_CENTER)
+        keyed = requests.add_columns(label.label("group_key")).subquery()
+    else:
+        requests = requests.subquery()
+        label = func.coalesce(func.nullif(Material.category, ""), NO_CATEGORY)
+        keyed = (
+            db.query(requests.c.pr_id, requests.c.not_attended, label.label("group_key"))
+            .select_from(requests)
+            .outerjoin(PurchaseRequestItem, PurchaseRequestItem.purchase_request_id == requests.c.pr_id)
+            .outerjoin(Material, Material.id == PurchaseRequestItem.material_id)
+            .distinct()
+            .subquery()
+        )
+
+    rows = (
+        db.query(
+            keyed.c.group_key,
+            func.count().label("total"),
+            func.sum(keyed.c.not_attended).label("not_attended"),
+        )
+        .group_by(keyed.c.group_key)
+        .order_by(keyed.c.group_key)
+        .all()
+    )
+
+    grouped_result = []
+    overall_total = 0
+    overall_not = 0
+    for row in rows:
+        total = int(row.total or 0)
+        na = int(row.not_attended or 0)
+        overall_total += total
+        overall_not += na
+        rate = (na / total) * 100.0 if total else 0.0
+        grouped_result.append({"label": row.group_key, "stockout_rate": round(rate, 2), "total": total, "not_attended": na})
+
+    overall = (overall_not / overall_total) * 100.0 if overall_total else 0.0
+    return {"group_by": group_by, "grouped": grouped_result, "overall": round(overall, 2)}
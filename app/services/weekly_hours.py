@@ -0,0 +1,106 @@
+"""
+Calendário das horas semanais (WeeklyHours).
+
+A semana é gravada como texto ISO ("2024-W01"); aqui ela é normalizada em
+week_start/week_end e em linhas diárias (WeeklyHoursDay), de modo que os
+relatórios somem horas por intervalo de datas diretamente no banco,
+repartindo corretamente as semanas que cruzam a virada do mês.
+"""
+
+import calendar
+from datetime import date, timedelta
+from typing import Optional, Tuple, Dict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.equipment import WeeklyHours, WeeklyHoursDay
+
+WEEK_DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def iso_week_bounds(week: Optional[str]) -> Optional[Tuple[date, date]]:
+    """Converter "2024-W01" em (segunda-feira, domingo). Retorna None se inválido."""
+    try:
+        year, number = (week or "").split("-W")
+        start = date.fromisocalendar(int(year), int(number), 1)
+    except (ValueError, TypeError):
+        return None
+    return start, start + timedelta(days=6)
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """Primeiro e último dia do mês."""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def sync_weekly_hours_calendar(weekly_hours: WeeklyHours) -> None:
+    """Atualizar week_start/week_end e as linhas diárias a partir de week e das colunas por dia."""
+    bounds = iso_week_bounds(weekly_hours.week)
+    if not bounds:
+        weekly_hours.week_start = None
+        weekly_hours.week_end = None
+        weekly_hours.days = []
+        return
+    weekly_hours.week_start, weekly_hours.week_end = bounds
+    days = []
+    for offset, name in enumerate(WEEK_DAYS):
+        hours = float(getattr(weekly_hours, name) or 0.0)
+        if hours:
+            days.append(WeeklyHoursDay(
+                equipment_id=weekly_hours.equipment_id,
+                day=bounds[0] + timedelta(days=offset),
+                hours=hours,
+            ))
+    weekly_hours.days = days
+
+
+def backfill_weekly_hours_calendar(db: Session, batch_size: int = 500) -> int:
+    """Preencher o calendário dos registros antigos (week_start nulo). Retorna a quantidade migrada."""
+    migrated = 0
+    last_id = 0
+    while True:
+        batch = (
+            db.query(WeeklyHours)
+            .filter(WeeklyHours.week_start == None, WeeklyHours.id > last_id)
+            .order_by(WeeklyHours.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            break
+        for weekly_hours in batch:
+            sync_weekly_hours_calendar(weekly_hours)
+            if weekly_hours.week_start:
+                migrated += 1
+        last_id = batch[-1].id
+        db.commit()
+    return migrated
+
+
+def hours_by_equipment(db: Session, start: Optional[date] = None, end: Optional[date] = None):
+    """Subconsulta (equipment_id, hours) com a soma das horas diárias no intervalo [start, end]."""
+    query = db.query(
+        WeeklyHoursDay.equipment_id.label("equipment_id"),
+        func.sum(WeeklyHoursDay.hours).label("hours"),
+    )
+    if start:
+        query = query.filter(WeeklyHoursDay.day >= start)
+    if end:
+        query = query.filter(WeeklyHoursDay.day <= end)
+    return query.group_by(WeeklyHoursDay.equipment_id).subquery()
+
+
+def serialize_weekly_hours(weekly_hours: WeeklyHours) -> Dict[str, object]:
+    """Representação JSON de WeeklyHours (mesmo formato retornado antes da normalização)."""
+    data = {
+        "id": weekly_hours.id,
+        "equipment_id": weekly_hours.equipment_id,
+        "week": weekly_hours.week,
+    }
+    for name in WEEK_DAYS:
+        data[name] = getattr(weekly_hours, name)
+    data["total_hours"] = weekly_hours.total_hours
+    data["created_at"] = weekly_hours.created_at
+    data["updated_at"] = weekly_hours.updated_at
+    return data
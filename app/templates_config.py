@@ -5,6 +5,7 @@ Configuração centralizada de templates
 import os
 import sys
 from fastapi.templating import Jinja2Templates
+from app.services.static_manifest import StaticManifest
 
 # Suporte a PyInstaller: base dir considera _MEIPASS
 BASE_DIR = getattr(sys, '_MEIPASS', os.getcwd())
@@ -14,18 +15,12 @@ STATIC_DIR = os.path.join(BASE_DIR, "static")
 # Instância global de templates
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
+# Hash do conteúdo de cada arquivo em static/ (montado uma vez, sem stat por renderização)
+static_manifest = StaticManifest(STATIC_DIR)
+
 def get_static_url(path: str) -> str:
     """Gerar URL com cache busting para arquivos estáticos"""
-    try:
-        file_path = os.path.join(STATIC_DIR, path.lstrip("/"))
-        if os.path.exists(file_path):
-            # Usar timestamp de modificação do arquivo para cache busting
-            mtime = os.path.getmtime(file_path)
-            return f"/static/{path}?v={int(mtime)}"
-        else:
-            return f"/static/{path}"
-    except:
-        return f"/static/{path}"
+    return static_manifest.url(path)
 
 # Adicionar função ao contexto dos templates
 templates.env.globals["static_url"] = get_static_url
\ No newline at end of file
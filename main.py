@@ -4,18 +4,17 @@ Aplicação principal FastAPI
 """
 
 from fastapi import FastAPI, Request, Depends
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, RedirectResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
+import asyncio
 import uvicorn
 import os
 import sys
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
-from app.models.idempotency import IdempotencyRecord
+from app.services.asgi_pipeline import ASGIPipeline, IdempotencyMiddleware
+from app.services.http_cache import ConditionalGetMiddleware
 
 # Carregar variáveis de ambiente do .env (antes de importar o banco)
 load_dotenv()
@@ -35,42 +34,8 @@ from app.models.hr import Employee
 from app.models.admin import User, Role, Permission, UserRole, RolePermission, SessionToken, Module
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware para adicionar headers de segurança"""
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Content Security Policy
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-            "img-src 'self' data: https:; "
-            "font-src 'self' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-            "connect-src 'self' https://cdn.jsdelivr.net https://cdnjs.cloudflare.com; "
-            "frame-ancestors 'none'; "
-            "base-uri 'self'; "
-            "form-action 'self'"
-        )
-        
-        # Adicionar headers de segurança
-        response.headers["Content-Security-Policy"] = csp
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "geolocation=(), microphone=(), camera=()"
-        
-        return response
-
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Gerenciar ciclo de vida da aplicação"""
-    # Startup
-    print("🚀 Iniciando MTDL-PCM...")
-    
+async def _run_startup_tasks():
+    """Migrações, semeadura e reconciliação preventiva (uma vez por inicialização)"""
     # Criar tabelas do banco de dados
     print("📊 Criando tabelas do banco de dados...")
     Base.metadata.create_all(bind=engine)
@@ -107,6 +72,10 @@ async def lifespan(app: FastAPI):
                     conn.execute(text("ALTER TABLE stock_movements ADD COLUMN equipment_id INTEGER"))
                 if 'application' not in sm_cols:
                     conn.execute(text("ALTER TABLE stock_movements ADD COLUMN application VARCHAR(200)"))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_stock_movements_type_date_material "
+                    "ON stock_movements (type, date, material_id)"
+                ))
             print("🔄 Migração automática aplicada para stock_movements (SQLite).")
             # Migração automática: adicionar colunas em equipments
             with engine.connect() as conn:
@@ -137,9 +106,65 @@ async def lifespan(app: FastAPI):
                 if 'status' not in el_cols:
                     conn.execute(text("ALTER TABLE error_logs ADD COLUMN status VARCHAR(20) DEFAULT 'open'"))
             print("🔄 Migração automática aplicada para error_logs.status (SQLite).")
+            # Migração automática: contador de ocorrências agrupadas em error_logs
+            with engine.begin() as conn:
+                el_cols = {row[1] for row in conn.execute(text("PRAGMA table_info('error_logs')"))}
+                if 'occurrences' not in el_cols:
+                    conn.execute(text("ALTER TABLE error_logs ADD COLUMN occurrences INTEGER DEFAULT 1"))
+                    print("🔄 Migração automática aplicada para error_logs.occurrences (SQLite).")
+            # Migração automática: normalizar semana ISO de weekly_hours em datas
+            with engine.begin() as conn:
+                wh_cols = {row[1] for row in conn.execute(text("PRAGMA table_info('weekly_hours')"))}
+                if 'week_start' not in wh_cols:
+                    conn.execute(text("ALTER TABLE weekly_hours ADD COLUMN week_start DATE"))
+                if 'week_end' not in wh_cols:
+                    conn.execute(text("ALTER TABLE weekly_hours ADD COLUMN week_end DATE"))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_weekly_hours_equipment_week_start "
+                    "ON weekly_hours (equipment_id, week_start)"
+                ))
+            print("🔄 Migração automática aplicada para weekly_hours.week_start/week_end (SQLite).")
+            # Migração automática: session_tokens passa a guardar só o SHA-256 do token.
+            # SQLite não remove coluna UNIQUE: recriar a tabela copiando as sessões ativas
+            with engine.begin() as conn:
+                st_cols = {row[1] for row in conn.execute(text("PRAGMA table_info('session_tokens')"))}
+                if 'token_hash' not in st_cols:
+                    from datetime import datetime as _dt
+                    from app.services.session_tokens import hash_token
+                    conn.connection.dbapi_connection.create_function("sha256_hex", 1, hash_token)
+                    conn.execute(text("ALTER TABLE session_tokens RENAME TO session_tokens_legacy"))
+                    conn.execute(text("DROP INDEX IF EXISTS ix_session_tokens_token"))
+                    SessionToken.__table__.create(bind=conn)
+                    migrated = conn.execute(text(
+                        "INSERT INTO session_tokens (id, user_id, token_hash, created_at, last_used_at, expires_at, is_revoked) "
+                        "SELECT id, user_id, sha256_hex(token), created_at, created_at, expires_at, 0 "
+                        "FROM session_tokens_legacy WHERE is_revoked = 0 AND expires_at >= :now"
+                    ), {"now": _dt.utcnow()}).rowcount
+                    conn.execute(text("DROP TABLE session_tokens_legacy"))
+                    print(f"🔄 Migração automática aplicada para session_tokens.token_hash ({migrated} sessões ativas).")
     except Exception as e:
         print(f"⚠️ Falha ao aplicar migração automática: {e}")
 
+    # Contadores de alteração por tabela (ETag / GET condicional)
+    try:
+        from app.services.http_cache import seed_table_versions
+        with engine.begin() as conn:
+            seed_table_versions(conn, Base.metadata.tables.keys())
+    except Exception as e:
+        print(f"⚠️ Falha ao preparar versões das tabelas: {e}")
+
+    # Preencher calendário diário das horas semanais gravadas antes da normalização
+    try:
+        from app.database import SessionLocal
+        from app.services.weekly_hours import backfill_weekly_hours_calendar
+        db = SessionLocal()
+        migrated = backfill_weekly_hours_calendar(db)
+        db.close()
+        if migrated:
+            print(f"🔄 Horas semanais normalizadas por data: {migrated} registros.")
+    except Exception as e:
+        print(f"⚠️ Falha ao normalizar horas semanais: {e}")
+
     # Reconciliação preventiva inicial com base nos dados existentes
     try:
         from app.database import SessionLocal
@@ -245,10 +270,75 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"⚠️ Falha ao semear módulos padrão: {e}")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Gerenciar ciclo de vida da aplicação"""
+    # Startup
+    print("🚀 Iniciando MTDL-PCM...")
+    
+    # Com vários workers (serve.py) apenas o primeiro executa; os demais aguardam o lock
+    from app.services.startup_lock import startup_once
+    with startup_once() as first:
+        if first:
+            await _run_startup_tasks()
+        else:
+            print("⏭️ Migrações e semeadura já executadas por outro worker.")
+
+    # Hashes dos arquivos estáticos (uma vez; em DEBUG um observador atualiza)
+    from app.templates_config import static_manifest
+    static_manifest.load()
+
+    # Gravação em lote de ErrorLog/AuditLog
+    from app.services.log_writer import log_writer
+    log_writer.start()
+
+    # Limpeza periódica de sessões expiradas/revogadas
+    from app.services.session_tokens import session_sweeper
+    session_sweeper.start()
+
+    # Envio da caixa de saída de e-mails
+    from app.services.email_outbox import email_sender
+    email_sender.start()
+
+    # Atualização do cache de CNPJ (consulta externa só quando habilitada e acessível)
+    from app.services.cnpj_registry import refresher as cnpj_refresher
+    cnpj_refresher.start()
+
+    # Pré-carregar ReportLab/httpx em segundo plano (WARMUP_IMPORTS=1, servidores)
+    from app.services.lazy_imports import warmup, warmup_enabled
+    if warmup_enabled():
+        asyncio.get_running_loop().run_in_executor(None, warmup)
+
+    # Carga inicial do índice de busca do chat (primeiro worker, só enquanto não estiver completo)
+    if first:
+        from app.services import knowledge_index
+        asyncio.get_running_loop().run_in_executor(None, knowledge_index.ensure_built)
+        # Estatísticas de causas das OS fechadas antes da tabela existir
+        from app.services import cause_analytics
+        asyncio.get_running_loop().run_in_executor(None, cause_analytics.ensure_backfilled)
+        # Cache de CNPJ semeado com os fornecedores já cadastrados
+        from app.services import cnpj_registry
+        asyncio.get_running_loop().run_in_executor(None, cnpj_registry.ensure_seeded)
+
     yield
     
     # Shutdown
     print("🛑 Encerrando MTDL-PCM...")
+    await session_sweeper.stop()
+    await email_sender.stop()
+    await cnpj_refresher.stop()
+    await log_writer.stop()
+    from app.services.event_bus import bus as event_bus
+    await event_bus.stop()
+    from app.services.password_hashing import shutdown_executor
+    shutdown_executor()
+    from app.services import pdf_text
+    pdf_text.shutdown_executor()
+    from app.services import knowledge_index
+    knowledge_index.shutdown_executor()
+    from app.services.llm_provider import aclose_client
+    await aclose_client()
 
 
 # Criar instância do FastAPI
@@ -259,91 +349,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-class IdempotencyMiddleware(BaseHTTPMiddleware):
-    """Middleware para idempotência em rotas de API mutáveis.
-    Usa header 'X-Idempotency-Key' para retornar a mesma resposta
-    quando a operação já foi realizada com o mesmo payload.
-    """
-    async def dispatch(self, request: Request, call_next):
-        path = request.url.path
-        method = request.method.upper()
-        # Somente para rotas de API mutáveis
-        if not path.startswith('/api/') or method not in ('POST','PUT','PATCH','DELETE'):
-            return await call_next(request)
-        key = request.headers.get('X-Idempotency-Key')
-        if not key:
-            return await call_next(request)
-        # Ler o corpo da requisição e calcular hash
-        body = await request.body()
-        try:
-            import hashlib
-            body_hash = hashlib.sha256(body or b'').hexdigest()
-        except Exception:
-            body_hash = 'no-body'
-        # Checar registro existente
-        from app.database import SessionLocal
-        db = SessionLocal()
-        try:
-            existing = db.query(IdempotencyRecord).filter_by(
-                key=key, method=method, path=path, body_hash=body_hash
-            ).first()
-        finally:
-            db.close()
-        if existing:
-            # Retornar resposta previamente armazenada
-            return Response(content=existing.response_body or '', status_code=existing.status_code, media_type='application/json')
-        # Repassar a requisição (reconstituindo o corpo)
-        async def receive():
-            return {'type': 'http.request', 'body': body, 'more_body': False}
-        request = Request(request.scope, receive)
-        response = await call_next(request)
-        # Capturar corpo da resposta
-        resp_body = b''
-        async for chunk in response.body_iterator:
-            resp_body += chunk
-        # Armazenar resposta para a chave
-        db2 = SessionLocal()
-        try:
-            rec = IdempotencyRecord(
-                key=key,
-                method=method,
-                path=path,
-                body_hash=body_hash,
-                status_code=response.status_code,
-                response_body=resp_body.decode('utf-8', errors='ignore')
-            )
-            db2.add(rec)
-            db2.commit()
-        except Exception as e:
-            db2.rollback()
-            print('⚠️ Falha ao salvar idempotência:', e)
-        finally:
-            db2.close()
-        # Retornar resposta com corpo reconstruído
-        return Response(content=resp_body, status_code=response.status_code, headers=dict(response.headers), media_type=response.media_type)
-
-# Configurar middlewares de segurança
-app.add_middleware(SecurityHeadersMiddleware)
-app.add_middleware(IdempotencyMiddleware)
-
-# Configurar CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Middlewares: pipeline ASGI único registrado no fim do módulo (após _log_error_to_db)
 
 # Configurar arquivos estáticos e templates com cache busting
 # Suporte a PyInstaller: usar base dir com _MEIPASS quando existir
 BASE_DIR = getattr(sys, '_MEIPASS', os.getcwd())
-app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
+# Importar configuração de templates (manifesto de hashes para o cache busting)
+from app.templates_config import templates, static_manifest
+from app.services.static_manifest import FingerprintedStaticFiles
+app.mount("/static", FingerprintedStaticFiles(directory=os.path.join(BASE_DIR, "static"), manifest=static_manifest), name="static")
 
 # Adicionar função para cache busting
 import time
-# Importar configuração de templates
-from app.templates_config import templates
 # Versão do app para API
 from app.version import APP_VERSION
 
@@ -488,6 +505,7 @@ if __name__ == "__main__":
 # Registrar exceções globais em ErrorLog sem alterar respostas padrão
 from app.database import SessionLocal
 from app.models.admin import ErrorLog
+from app.services.log_writer import log_writer
 import traceback, json
 
 def _extract_module_from_path(path: str) -> str:
@@ -500,7 +518,7 @@ def _extract_module_from_path(path: str) -> str:
     except Exception:
         return 'unknown'
 
-async def _log_error_to_db(request: Request, exc: Exception):
+def _log_error_to_db(request: Request, exc: Exception):
     tb = ''.join(traceback.format_exception(type(exc), exc, exc.__traceback__))
     module = _extract_module_from_path(request.url.path)
     ctx = {
@@ -510,23 +528,44 @@ async def _log_error_to_db(request: Request, exc: Exception):
         'client': getattr(request, 'client', None).host if getattr(request, 'client', None) else None,
         'headers_subset': {k.lower(): request.headers.get(k) for k in ['User-Agent','X-Request-ID']}
     }
+    context = json.dumps(ctx, ensure_ascii=False)
+    # Fila do gravador em lote; sem a tarefa de fundo (fora do lifespan) grava direto
+    if log_writer.log_error(module, type(exc).__name__, str(exc), stack=tb, context=context):
+        return
+    db = None
     try:
         db = SessionLocal()
-        log = ErrorLog(module=module, error_type=type(exc).__name__, message=str(exc), stack=tb, context=json.dumps(ctx, ensure_ascii=False))
+        log = ErrorLog(module=module, error_type=type(exc).__name__, message=str(exc), stack=tb, context=context)
         db.add(log)
         db.commit()
     except Exception as e:
         print('⚠️ Falha ao gravar ErrorLog:', e)
     finally:
-        try:
+        if db is not None:
             db.close()
-        except Exception:
-            pass
 
-@app.middleware("http")
-async def exception_logging_middleware(request: Request, call_next):
-    try:
-        return await call_next(request)
-    except Exception as exc:
-        await _log_error_to_db(request, exc)
-        raise
\ No newline at end of file
+def _log_unhandled_exception(scope, exc: Exception):
+    _log_error_to_db(Request(scope), exc)
+
+# Pipeline ASGI único: cabeçalhos de segurança e log de exceções no nível mais
+# externo; os ganchos, do mais externo ao mais interno, são a compressão
+# gzip/brotli (resposta final, inclusive /static), CORS, idempotência e GET condicional
+from functools import partial
+from app.services.compression import CompressionMiddleware
+app.add_middleware(
+    ASGIPipeline,
+    hooks=[
+        CompressionMiddleware,
+        partial(
+            CORSMiddleware,
+            allow_origins=["*"],
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        ),
+        IdempotencyMiddleware,
+        ConditionalGetMiddleware,
+    ],
+    on_error=_log_unhandled_exception,
+    server_timing=os.getenv("DEBUG", "False").lower() in ("1", "true", "yes"),
+)
\ No newline at end of file
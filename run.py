@@ -9,6 +9,9 @@ BASE_DIR = getattr(sys, '_MEIPASS', os.path.abspath(os.path.dirname(__file__)))
 
 # Inicializa o servidor FastAPI via Uvicorn
 if __name__ == "__main__":
+    # Necessário no executável (PyInstaller) para o pool de processos do hash de senhas
+    import multiprocessing
+    multiprocessing.freeze_support()
     import uvicorn
     from main import app
     uvicorn.run(app, host="0.0.0.0", port=PORT, log_level="info", reload=False)
\ No newline at end of file
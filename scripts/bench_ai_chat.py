@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark do chat de IA da manutenção, por intenção
+- Banco SQLite temporário com dados semeados (equipamentos, OS fechadas e
+  abertas, abastecimentos), sem provedor de IA nem busca na web
+- Para cada intenção: fontes do plano uma depois da outra na mesma sessão
+  (como antes) e pelo pipeline (threads com sessões próprias + memo)
+
+Uso: python scripts/bench_ai_chat.py [equipamentos] [ordens] [repetições]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP_DIR, 'chat_bench.db')}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.equipment import Equipment  # noqa: E402
+from app.models.maintenance import WorkOrder  # noqa: E402
+from app.models.warehouse import Fueling  # noqa: E402
+from app.routers import reports  # noqa: E402
+from app.services.chat_pipeline import gather_sources  # noqa: E402
+
+INTENTS = ("overview", "availability", "mttr", "mtbf", "costs", "backlog", "fuel", "equipment_count")
+CATEGORIES = ["Escavadeira", "Caminhão", "Pá carregadeira", "Trator", "Guindaste"]
+
+
+def seed(equipments: int, orders: int, seed_value: int = 7):
+    rnd = random.Random(seed_value)
+    Base.metadata.create_all(bind=engine)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(Equipment.__table__.insert(), [
+            {"id": i, "prefix": f"EQ{i:04d}", "name": f"Equipamento {i}", "model": f"M{i % 12}",
+             "category": CATEGORIES[i % len(CATEGORIES)], "equipment_class": f"Classe {i % 4}",
+             "monthly_quota": 160.0}
+            for i in range(1, equipments + 1)
+        ])
+        work_orders = []
+        for n in range(orders):
+            started = now - timedelta(minutes=rnd.randint(60, 365 * 24 * 60))
+            closed = rnd.random() < 0.9
+            work_orders.append({
+                "number": f"{n:07d}", "title": "Troca de filtro hidráulico", "equipment_id": rnd.randint(1, equipments),
+                "type": rnd.choice(["Corretiva", "Preventiva"]), "status": "Fechada" if closed else "Aberta",
+                "cost": round(rnd.uniform(100, 5000), 2), "created_at": started, "started_at": started,
+                "completed_at": started + timedelta(minutes=rnd.randint(30, 48 * 60)) if closed else None,
+            })
+        conn.execute(WorkOrder.__table__.insert(), work_orders)
+        conn.execute(Fueling.__table__.insert(), [
+            {"equipment_id": rnd.randint(1, equipments), "material_id": 1, "quantity": rnd.uniform(50, 400),
+             "horimeter": rnd.uniform(0, 10000), "total_cost": rnd.uniform(300, 2500),
+             "date": now - timedelta(days=rnd.randint(0, 365))}
+            for _ in range(orders // 2)
+        ])
+
+
+def sequential(plan):
+    db = SessionLocal()
+    try:
+        return {key: source.fetch(db) for key, source in plan}
+    finally:
+        db.close()
+
+
+async def pipeline(plan):
+    db = SessionLocal()
+    try:
+        results, missing, _ = await gather_sources(db, plan, time.monotonic() + 60)
+        assert not missing, missing
+        return results
+    finally:
+        db.close()
+
+
+def measure(fn, repeats: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) / repeats * 1000
+
+
+def main():
+    equipments = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    t0 = time.perf_counter()
+    seed(equipments, orders)
+    print(f"📊 {equipments} equipamentos, {orders} OS, {orders // 2} abastecimentos "
+          f"(semeado em {time.perf_counter() - t0:.1f} s), {os.cpu_count()} CPUs")
+    end = datetime.now()
+    sources = reports._chat_sources({}, (end - timedelta(days=365)).isoformat(), end.isoformat())
+    print(f"   {'intenção':<16} {'sequencial':>12} {'pipeline':>12}")
+    for intent in INTENTS:
+        plan = [(key, sources[key]) for key in reports._CHAT_PLAN[intent]]
+        seq_ms = measure(lambda: sequential(plan), repeats)
+        pipe_ms = measure(lambda: asyncio.run(pipeline(plan)), repeats)
+        print(f"   {intent:<16} {seq_ms:9.1f} ms {pipe_ms:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
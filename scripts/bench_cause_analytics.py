@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark da análise de causas de falha (app.services.cause_analytics)
+- Gera N OS corretivas fechadas sintéticas (padrão 200.000) em 2 anos,
+  distribuídas por 400 equipamentos de 20 categorias, cada categoria com
+  componentes mais frequentes
+- Mede a carga inicial (backfill: tokenização + estatísticas), o ranking
+  por categoria e período (12 meses e 3 meses), o fechamento de uma OS pela
+  sessão (hook incremental) e, para comparação, a implementação antiga
+  (carregar as 500 OS mais recentes e procurar as palavras-chave em Python)
+  e a mesma varredura sobre todas as OS do último ano
+
+Uso: python scripts/bench_cause_analytics.py [ordens] [arquivo.db]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.equipment import Equipment  # noqa: E402
+from app.models.maintenance import WorkOrder  # noqa: E402
+from app.services import cause_analytics  # noqa: E402
+
+CATEGORIES = ["Escavadeira", "Caminhão Basculante", "Pá Carregadeira", "Retroescavadeira", "Motoniveladora",
+              "Rolo Compactador", "Trator de Esteira", "Guindaste", "Caminhão Pipa", "Caminhão Comboio",
+              "Mini Carregadeira", "Perfuratriz", "Betoneira", "Usina de Asfalto", "Gerador", "Compressor",
+              "Empilhadeira", "Vibroacabadora", "Fresadora", "Caminhão Munck"]
+COMPONENTS = ["bomba hidráulica", "filtro de ar", "filtro de combustível", "turbina", "intercooler", "radiador",
+              "alternador", "motor de partida", "embreagem", "conversor de torque", "bico injetor", "sensor MAP",
+              "chicote elétrico", "válvula de alívio", "cilindro do braço", "mangueira de pressão", "ventoinha",
+              "rolamento da roda", "freio de serviço", "comando final", "esteira", "caçamba", "pino e bucha"]
+SYMPTOMS = ["vazamento", "superaquecimento", "perda de potência", "ruído anormal", "vibração", "desgaste",
+            "travamento", "baixa pressão", "falha intermitente", "trinca", "folga excessiva", "contaminação",
+            "cavitação", "patinação", "fumaça preta", "derate"]
+ACTIONS = ["Substituído", "Reparado", "Ajustado", "Inspecionado", "Limpo", "Reapertado", "Lubrificado", "Calibrado"]
+FILLER = ["conforme manual do fabricante", "equipamento liberado para operação", "aguardando peça do fornecedor",
+          "realizado teste em campo", "verificar novamente na próxima preventiva", "operador relatou no turno",
+          "serviço executado na oficina", "torque conforme especificação"]
+
+
+def seed(engine, total: int, rnd: random.Random) -> None:
+    with engine.begin() as conn:
+        conn.execute(insert(Equipment), [
+            {"id": i, "prefix": f"EQ-{i:03d}", "name": f"Equipamento {i}", "category": CATEGORIES[i % len(CATEGORIES)]}
+            for i in range(1, 401)
+        ])
+    # Cada categoria tem 4 componentes "típicos" (metade das OS)
+    typical = {cat: rnd.sample(COMPONENTS, 4) for cat in CATEGORIES}
+    now = datetime.now()
+    batch = []
+    for n in range(total):
+        eq_id = rnd.randint(1, 400)
+        cat = CATEGORIES[eq_id % len(CATEGORIES)]
+        comp = rnd.choice(typical[cat]) if rnd.random() < 0.5 else rnd.choice(COMPONENTS)
+        symptom = rnd.choice(SYMPTOMS)
+        closed = now - timedelta(days=rnd.randint(0, 730), minutes=rnd.randint(0, 1440))
+        batch.append({
+            "number": str(100000 + n), "title": f"{symptom.capitalize()} {comp}",
+            "description": f"{rnd.choice(ACTIONS)} {comp} por {symptom}. {rnd.choice(FILLER)}.",
+            "notes": rnd.choice(FILLER) if rnd.random() < 0.3 else None,
+            "type": "Corretiva", "status": "Fechada", "equipment_id": eq_id,
+            "cost": round(rnd.uniform(50, 5000), 2), "created_at": closed - timedelta(hours=8),
+            "completed_at": closed,
+        })
+        if len(batch) >= 20_000:
+            with engine.begin() as conn:
+                conn.execute(insert(WorkOrder), batch)  # Core: sem hooks da sessão (como dados legados)
+            batch.clear()
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(insert(WorkOrder), batch)
+
+
+def median_ms(fn, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.mkdtemp(), "bench_causes.db")
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    rnd = random.Random(42)
+
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count(WorkOrder.id))).scalar()
+    if existing < total:
+        t0 = time.perf_counter()
+        seed(engine, total, rnd)
+        print(f"🧪 {total:,} OS geradas em {time.perf_counter() - t0:.0f} s em {path}")
+    else:
+        print(f"🧪 Reaproveitando {existing:,} OS de {path}")
+
+    t0 = time.perf_counter()
+    processed = cause_analytics.backfill(engine)
+    if processed:
+        print(f"   carga inicial (backfill)            {time.perf_counter() - t0:9.1f} s   ({processed:,} OS)")
+
+    db = Session()
+    now = datetime.now()
+    for label, days in (("12 meses", 365), ("3 meses", 90)):
+        start = now - timedelta(days=days)
+        by_category = median_ms(lambda: cause_analytics.rank_causes(db, "Escavadeira", start, now))
+        overall = median_ms(lambda: cause_analytics.rank_causes(db, None, start, now))
+        print(f"   ranking {label:<9} (categoria / todas) {by_category:7.1f} ms / {overall:7.1f} ms")
+    top = cause_analytics.rank_causes(db, "Escavadeira", now - timedelta(days=365), now, limit=3)
+    print("      ex.: Escavadeira -> " + ", ".join(
+        f"{c['cause']} ({c['orders']} OS, lift {c['lift']})" for c in top["causes"][:3]) + " | termos: " + ", ".join(
+        f"{t['term']} (lift {t['lift']})" for t in top["terms"]))
+
+    # Fechar uma OS pela sessão: tokenização + deltas no mesmo commit
+    wo_ids = db.execute(select(WorkOrder.id).order_by(WorkOrder.id.desc()).limit(20)).scalars().all()
+    samples = []
+    for wo_id in wo_ids:
+        wo = db.get(WorkOrder, wo_id)
+        wo.status, wo.completed_at = "Aberta", None
+        db.commit()
+        wo.status, wo.completed_at = "Fechada", now
+        t0 = time.perf_counter()
+        db.commit()
+        samples.append(time.perf_counter() - t0)
+    print(f"   commit ao fechar uma OS (com hook)   {statistics.median(samples) * 1000:7.1f} ms")
+
+    # Implementação antiga: últimas 500 OS e palavras-chave por substring, a cada pergunta
+    cutoff = now - timedelta(days=365)
+
+    def old_scan(limit):
+        query = (select(WorkOrder.title, WorkOrder.description, WorkOrder.notes)
+                 .where(WorkOrder.status == "Fechada", WorkOrder.completed_at >= cutoff)
+                 .order_by(WorkOrder.completed_at.desc()))
+        if limit:
+            query = query.limit(limit)
+        texts = [" ".join(p for p in row if p).lower() for row in db.execute(query)]
+        return {cause: sum(1 for text in texts if any(kw in text for kw in keywords))
+                for cause, keywords in cause_analytics.CAUSE_KEYWORDS.items()}
+
+    print(f"   antigo: 500 OS + palavras-chave      {median_ms(lambda: old_scan(500), 3):7.1f} ms")
+    print(f"   antigo: OS do ano + palavras-chave   {median_ms(lambda: old_scan(None), 1):7.1f} ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
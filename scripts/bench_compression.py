@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark de compressão: CPU x bytes economizados
+- Payloads representativos: JSON de /materials/all (N materiais), página HTML
+  renderizada (warehouse/materials.html), CSS e JS do static/
+- gzip e brotli em vários níveis; * marca o nível configurado para o tipo
+
+Uso: python scripts/bench_compression.py [materiais]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+from app.services.compression import CONTENT_TYPES, brotli, compress_body  # noqa: E402
+from app.templates_config import STATIC_DIR, templates  # noqa: E402
+
+
+def payloads(materials: int):
+    rows = [{"id": i, "code": str(100000 + i), "name": f"Material {i}", "description": "Filtro de óleo do motor",
+             "unit": "UN", "category": "Peças", "current_stock": i % 50, "minimum_stock": 5,
+             "maximum_stock": 100, "average_cost": round(12.5 + i % 7, 2), "location": f"A-{i % 20:02d}"}
+            for i in range(materials)]
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b"",
+                       "server": ("bench", 80), "scheme": "http", "root_path": ""})
+    html = templates.get_template("warehouse/materials.html").render(request=request, current_user=None)
+    with open(os.path.join(STATIC_DIR, "css", "style.css"), "rb") as fh:
+        css = fh.read()
+    with open(os.path.join(STATIC_DIR, "js", "app.js"), "rb") as fh:
+        js = fh.read()
+    return [
+        ("application/json", f"/materials/all ({materials})", json.dumps(rows, ensure_ascii=False).encode()),
+        ("text/html", "warehouse/materials.html", html.encode()),
+        ("text/css", "css/style.css", css),
+        ("application/javascript", "js/app.js", js),
+    ]
+
+
+def measure(body: bytes, encoding: str, level: int, min_seconds: float = 0.3):
+    levels = (level, level)
+    runs, t0 = 0, time.process_time()
+    while True:
+        out = compress_body(body, encoding, levels)
+        runs += 1
+        elapsed = time.process_time() - t0
+        if elapsed >= min_seconds:
+            return len(out), elapsed / runs * 1000
+
+
+def main():
+    materials = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    encodings = [("gzip", (1, 4, 6, 9))]
+    if brotli is not None:
+        encodings.append(("br", (1, 4, 5, 11)))
+    for content_type, label, body in payloads(materials):
+        configured = CONTENT_TYPES[content_type]
+        print(f"📦 {label}: {len(body) / 1024:.1f} KiB ({content_type})")
+        for encoding, levels in encodings:
+            for level in levels:
+                size, ms = measure(body, encoding, level)
+                mark = "*" if level == configured[0 if encoding == "gzip" else 1] else " "
+                print(f"   {mark} {encoding:<4} nível {level:>2}  {size / 1024:8.1f} KiB  "
+                      f"{100 * (1 - size / len(body)):5.1f}% menor  CPU {ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
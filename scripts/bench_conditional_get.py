@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark de GET condicional (ETag)
+- Banco SQLite temporário com N materiais, equipamentos e planos
+- Reproduz atualizações periódicas das listas (/materials/all, /inventory/materials,
+  /equipment/list, /plans) com e sem If-None-Match
+- Mede bytes transferidos e CPU do servidor (process_time) em cada cenário
+
+Uso: python scripts/bench_conditional_get.py [materiais] [repetições]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base, get_db  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.warehouse import Material  # noqa: E402
+from app.models.equipment import Equipment  # noqa: E402
+from app.models.maintenance import MaintenancePlan  # noqa: E402
+from app.routers import warehouse, maintenance  # noqa: E402
+from main import ConditionalGetMiddleware  # noqa: E402
+
+ENDPOINTS = [
+    "/api/warehouse/materials/all",
+    "/api/warehouse/inventory/materials",
+    "/api/maintenance/equipment/list",
+    "/api/maintenance/plans",
+]
+
+
+def build_app(db_path: str, materials: int):
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = Session()
+    db.add_all(Material(code=str(100000 + i), name=f"Material {i}", description="Peça de reposição" * 3, unit="UN",
+                        minimum_stock=1, maximum_stock=100, current_stock=i % 50, category="Peças")
+               for i in range(materials))
+    db.add_all(Equipment(prefix=f"EQ{i:04d}", name=f"Equipamento {i}", status="Ativo") for i in range(materials // 10))
+    db.commit()
+    db.add_all(MaintenancePlan(name=f"Plano {i}", equipment_id=(i % (materials // 10)) + 1, type="Preventiva",
+                               interval_type="Horas", interval_value=250) for i in range(100))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    bench_app = FastAPI()
+    bench_app.add_middleware(ConditionalGetMiddleware)
+    bench_app.include_router(warehouse.router, prefix="/api/warehouse")
+    bench_app.include_router(maintenance.router, prefix="/api/maintenance")
+    bench_app.dependency_overrides[get_db] = override_get_db
+    return bench_app
+
+
+def replay(client: TestClient, repeats: int, conditional: bool):
+    etags = {}
+    transferred = 0
+    not_modified = 0
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    for _ in range(repeats):
+        for path in ENDPOINTS:
+            headers = {"Accept": "application/json"}
+            if conditional and path in etags:
+                headers["If-None-Match"] = etags[path]
+            response = client.get(path, headers=headers)
+            transferred += len(response.content)
+            not_modified += response.status_code == 304
+            if "etag" in response.headers:
+                etags[path] = response.headers["etag"]
+    return transferred, not_modified, time.process_time() - cpu0, time.perf_counter() - wall0
+
+
+def main():
+    materials = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        client = TestClient(build_app(os.path.join(tmp, "bench.db"), materials))
+        print(f"📊 {materials} materiais, {repeats} atualizações de {len(ENDPOINTS)} listas")
+        for label, conditional in (("sem If-None-Match", False), ("com If-None-Match", True)):
+            size, hits, cpu, wall = replay(client, repeats, conditional)
+            print(f"  {label:<20} {size / 1024:10.1f} KiB  304={hits:<4} CPU {cpu * 1000:8.1f} ms  total {wall * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
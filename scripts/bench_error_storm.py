@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de rajada de erros (ErrorLog)
+- Banco SQLite temporário
+- N requisições concorrentes a uma rota que sempre levanta exceção, passando
+  pelo mesmo registro de erros do middleware de main.py
+- Compara o commit por requisição (gravador parado) com a fila em lote
+
+Uso: python scripts/bench_error_storm.py [requisições] [concorrência]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import create_engine, func  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from app.database import Base  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.admin import ErrorLog  # noqa: E402
+import main  # noqa: E402
+from app.services.log_writer import LogWriter  # noqa: E402
+from app.services.asgi_pipeline import ASGIPipeline  # noqa: E402
+
+
+def build_app():
+    bench_app = FastAPI()
+    bench_app.add_middleware(ASGIPipeline, on_error=main._log_unhandled_exception)
+
+    @bench_app.get("/api/maintenance/boom")
+    async def boom():
+        raise RuntimeError("Falha simulada de integração")
+
+    return bench_app
+
+
+async def storm(bench_app, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=bench_app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sem = asyncio.Semaphore(concurrency)
+
+        async def hit():
+            async with sem:
+                await client.get("/api/maintenance/boom")
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(hit() for _ in range(requests)))
+        return time.perf_counter() - t0
+
+
+def main_bench():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f"💥 {requests} requisições com erro, {concurrency} simultâneas")
+    for label, batched in (("commit por requisição", False), ("fila em lote", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                                   connect_args={"check_same_thread": False}, poolclass=NullPool)
+            Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            Base.metadata.create_all(bind=engine)
+            writer = LogWriter(session_factory=Session)
+            main.SessionLocal = Session
+            main.log_writer = writer
+
+            async def scenario():
+                if batched:
+                    writer.start()
+                elapsed = await storm(build_app(), requests, concurrency)
+                t0 = time.perf_counter()
+                await writer.stop()
+                return elapsed, time.perf_counter() - t0
+
+            elapsed, drain = asyncio.run(scenario())
+            db = Session()
+            rows, occurrences = db.query(func.count(ErrorLog.id), func.sum(ErrorLog.occurrences)).one()
+            db.close()
+            engine.dispose()
+            print(f"  {label:<22} {requests / elapsed:8.0f} req/s  total {elapsed:6.2f} s  "
+                  f"descarga {drain * 1000:6.1f} ms  linhas={rows:<5} ocorrências={occurrences or rows}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark da geração de planos em lote (app.services.fleet_plans)
+- Cria N escavadeiras iguais (padrão 80), um manual XML anexado a uma delas
+  (legado: data/manuals/{id}) e o catálogo de materiais do manual
+- Mede a geração individual (POST /equipment/{id}/plans/generate para cada
+  equipamento, com o manual anexado a todos) e a geração em lote
+  (POST /equipment/plans/generate-batch), com tempo e número de comandos SQL
+
+Uso: python scripts/bench_fleet_plans.py [equipamentos]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, event, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base, get_db  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.equipment import Equipment  # noqa: E402
+from app.models.warehouse import Material  # noqa: E402
+from app.routers import maintenance  # noqa: E402
+from app.services import manual_storage  # noqa: E402
+
+MATERIALS = 40
+
+
+def write_manual(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<manual>")
+        for hours in (250, 500):
+            f.write(f'<maintenance interval="{hours}h">')
+            for n in range(MATERIALS):
+                f.write(f"<material><name>Filtro {n}</name><reference>REF-{hours}-{n}</reference>"
+                        f"<quantity>1</quantity></material>")
+            f.write("</maintenance>")
+        f.write("</manual>")
+
+
+def setup(total: int):
+    directory = tempfile.mkdtemp()
+    engine = create_engine(f"sqlite:///{os.path.join(directory, 'fleet.db')}",
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Equipment), [
+            {"id": i, "prefix": f"ESC-{i:03d}", "name": f"Escavadeira {i}", "manufacturer": "Caterpillar",
+             "model": "320", "category": "Escavadeira"} for i in range(1, total + 1)
+        ])
+        conn.execute(insert(Material), [
+            {"code": str(100000 + i), "name": f"Filtro {n}", "reference": f"REF-{hours}-{n}", "unit": "un",
+             "minimum_stock": 0, "maximum_stock": 10}
+            for i, (hours, n) in enumerate((h, n) for h in (250, 500) for n in range(MATERIALS))
+        ])
+    manual_storage.MANUALS_DIR = os.path.join(directory, "manuals")
+    return engine
+
+
+def client_for(engine) -> TestClient:
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    api = FastAPI()
+    api.include_router(maintenance.router, prefix="/api/maintenance")
+    api.dependency_overrides[get_db] = override_get_db
+    return TestClient(api)
+
+
+def measure(label: str, engine, fn) -> None:
+    statements = [0]
+
+    def _count(*args):
+        statements[0] += 1
+
+    event.listen(engine, "before_cursor_execute", _count)
+    t0 = time.perf_counter()
+    created = fn()
+    elapsed = time.perf_counter() - t0
+    event.remove(engine, "before_cursor_execute", _count)
+    print(f"   {label:<32} {elapsed:7.2f} s   {statements[0]:6,} comandos SQL   ({created:,} planos)")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 80
+    print(f"🧪 {total} escavadeiras iguais, manual com {2 * MATERIALS} materiais")
+
+    engine = setup(total)
+    for i in range(1, total + 1):  # individual: cada equipamento precisa do manual
+        os.makedirs(os.path.join(manual_storage.MANUALS_DIR, str(i)))
+        write_manual(os.path.join(manual_storage.MANUALS_DIR, str(i), "manual.xml"))
+    client = client_for(engine)
+    measure("individual (1 por equipamento)", engine, lambda: sum(
+        client.post(f"/api/maintenance/equipment/{i}/plans/generate", json={"mode": "manual"}).json()["plans_created"]
+        for i in range(1, total + 1)))
+
+    engine = setup(total)
+    os.makedirs(os.path.join(manual_storage.MANUALS_DIR, "1"))
+    write_manual(os.path.join(manual_storage.MANUALS_DIR, "1", "manual.xml"))
+    client = client_for(engine)
+    ids = list(range(1, total + 1))
+    measure("lote: prévia (dry-run)", engine, lambda: client.post(
+        "/api/maintenance/equipment/plans/generate-batch",
+        json={"equipment_ids": ids, "mode": "manual", "dry_run": True}).json()["totals"]["plans"])
+    measure("lote", engine, lambda: client.post(
+        "/api/maintenance/equipment/plans/generate-batch",
+        json={"equipment_ids": ids, "mode": "manual"}).json()["plans_created"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark do índice de busca local do chat (app.services.knowledge_index)
+- Gera N documentos sintéticos (padrão 1.000.000): OS, ações de plano,
+  checklists e páginas de manual, com vocabulário de manutenção
+- Mede a latência das buscas em texto livre (p50/p95/máx)
+
+Uso: python scripts/bench_knowledge_index.py [documentos] [arquivo.db]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.knowledge_index import Document, KnowledgeIndex  # noqa: E402
+
+COMPONENTS = ["bomba hidráulica", "filtro de ar", "filtro de combustível", "turbina", "intercooler", "radiador",
+              "alternador", "motor de partida", "embreagem", "conversor de torque", "bico injetor", "sensor MAP",
+              "chicote elétrico", "válvula de alívio", "cilindro do braço", "mangueira de pressão", "ventoinha",
+              "rolamento da roda", "freio de serviço", "comando final", "esteira", "caçamba", "pino e bucha"]
+SYMPTOMS = ["vazamento", "superaquecimento", "perda de potência", "ruído anormal", "vibração", "desgaste",
+            "travamento", "baixa pressão", "falha intermitente", "trinca", "folga excessiva", "contaminação",
+            "cavitação", "patinação", "fumaça preta", "derate"]
+ACTIONS = ["Substituído", "Reparado", "Ajustado", "Inspecionado", "Limpo", "Reapertado", "Lubrificado", "Calibrado"]
+FILLER = ["conforme manual do fabricante", "equipamento liberado para operação", "aguardando peça do fornecedor",
+          "realizado teste em campo", "verificar novamente na próxima preventiva", "operador relatou no turno",
+          "serviço executado na oficina", "torque conforme especificação"]
+QUERIES = ["vazamento na bomba hidráulica", "perda de potência escavadeira", "filtro de combustível entupido",
+           "superaquecimento do motor radiador", "sensor MAP falha intermitente", "troca do alternador",
+           "ruído no comando final", "fumaça preta e derate", "embreagem patinando", "óleo hidráulico 250h",
+           "pino e bucha da caçamba com folga", "turbina com baixa pressão", "torque do parafuso da roda",
+           "código de falha na ECU", "mangueira de pressão rompida"]
+
+
+def synthetic_documents(total: int, rnd: random.Random):
+    now = datetime.now()
+    shares = (("work_order", 0.70), ("plan_action", 0.15), ("checklist", 0.05), ("manual", 0.10))
+    for kind, share in shares:
+        for n in range(int(total * share)):
+            comp, symptom = rnd.choice(COMPONENTS), rnd.choice(SYMPTOMS)
+            body = " ".join([f"{rnd.choice(ACTIONS)} {comp} por {symptom}.", rnd.choice(FILLER) + ".",
+                             f"{rnd.choice(ACTIONS)} {rnd.choice(COMPONENTS)}.", rnd.choice(FILLER) + "."])
+            if kind == "work_order":
+                closed = (now - timedelta(days=rnd.randint(0, 900))).isoformat(sep=" ", timespec="seconds")
+                yield Document(kind, str(n), rnd.randint(1, 400), closed if rnd.random() < 0.8 else None,
+                               f"OS {100000 + n} - {symptom.capitalize()} {comp}", body)
+            elif kind == "manual":
+                yield Document(kind, f"{n // 300:064x}:{n % 300 + 1}", None, None, f"Manual {n // 300} - p. {n % 300 + 1}",
+                               body + " " + " ".join(rnd.choice(FILLER) for _ in range(20)))
+            else:
+                yield Document(kind, str(n), rnd.randint(1, 400), None, f"Plano {n % 50} - {rnd.choice(ACTIONS)}", body)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.95) - 1] * 1000, samples[-1] * 1000)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.mkdtemp(), "knowledge_index.db")
+    rnd = random.Random(42)
+    index = KnowledgeIndex(path)
+
+    if index.document_count() < total:
+        t0 = time.perf_counter()
+        batch = []
+        for doc in synthetic_documents(total, rnd):
+            batch.append(doc)
+            if len(batch) >= 20_000:
+                index.upsert(batch)
+                batch.clear()
+        index.upsert(batch)
+        print(f"🧪 {index.document_count():,} documentos indexados em {time.perf_counter() - t0:.0f} s "
+              f"({os.path.getsize(path) / 1024 / 1024:.0f} MiB) em {path}")
+    else:
+        print(f"🧪 Reaproveitando {index.document_count():,} documentos de {path}")
+
+    index.search("aquecimento")  # abre a conexão e carrega as páginas iniciais
+    samples = []
+    for _ in range(5):
+        for query in QUERIES:
+            t0 = time.perf_counter()
+            index.search(query, limit=5)
+            samples.append(time.perf_counter() - t0)
+    p50, p95, worst = percentiles(samples)
+    print(f"   busca (top 5, {len(samples)} consultas)       p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  máx {worst:7.1f} ms")
+    hits = index.search(QUERIES[0], limit=1)
+    print(f"      ex.: '{QUERIES[0]}' -> {hits[0].title if hits else '—'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark do streaming do provedor de IA (app.services.llm_provider)
+- Provedor simulado (uvicorn em 127.0.0.1, layout Azure OpenAI) que gera N
+  trechos com um intervalo fixo entre eles (padrão 60 trechos a cada 25 ms),
+  como um modelo gerando tokens; servidor real porque o ASGITransport do httpx
+  só entrega a resposta inteira
+- Mede o tempo até o 1º trecho e o tempo total de llm_generate (resposta
+  inteira de uma vez) e de llm_stream, e o provedor local (AI_PROVIDER=local)
+
+Uso: python scripts/bench_llm_stream.py [trechos] [ms_por_trecho]
+"""
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import uvicorn  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from app.services import llm_provider  # noqa: E402
+
+CONTEXT = ("Pergunta: como está a frota?\nPeríodo: 01/09/2026 a 30/09/2026\nDados:\n"
+           "- Disponibilidade média: 91.3%.\n- MTTR médio: 6.20 h.\n- Backlog atual (OS abertas): 14.\n"
+           "Fontes: /api/reports/maintenance/availability, /api/reports/maintenance/mttr")
+
+
+def provider_app(chunks: int, delay: float) -> FastAPI:
+    api = FastAPI()
+
+    @api.post("/openai/deployments/bench/chat/completions")
+    async def completions(request: Request):
+        payload = await request.json()
+
+        async def tokens():
+            for n in range(chunks):
+                await asyncio.sleep(delay)
+                yield f"data: {json.dumps({'choices': [{'delta': {'content': f'palavra{n} '}}]})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        if payload.get("stream"):
+            return StreamingResponse(tokens(), media_type="text/event-stream")
+        text = ""
+        async for line in tokens():
+            text += llm_provider._delta_content(line.strip()) or ""
+        return {"choices": [{"message": {"content": text}}]}
+
+    return api
+
+
+def serve(api: FastAPI) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(api, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def measure(label: str, run) -> None:
+    llm_provider.response_cache.clear()
+    t0 = time.perf_counter()
+    first, count = await run()
+    total = time.perf_counter() - t0
+    print(f"   {label:<28} 1º trecho {(first - t0) * 1000:8.1f} ms   total {total * 1000:8.1f} ms   ({count} trechos)")
+
+
+async def run_generate():
+    reply = await llm_provider.llm_generate([{"role": "user", "content": CONTEXT}])
+    return time.perf_counter(), len(llm_provider.split_chunks(reply))
+
+
+async def run_stream():
+    first, count = None, 0
+    async for _ in llm_provider.llm_stream([{"role": "user", "content": CONTEXT}]):
+        first = first or time.perf_counter()
+        count += 1
+    return first, count
+
+
+async def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 25) / 1000
+    print(f"🧪 Provedor simulado: {chunks} trechos, {delay * 1000:.0f} ms entre eles")
+    os.environ.update(AI_PROVIDER="azure", AZURE_OPENAI_KEY="bench", AZURE_OPENAI_DEPLOYMENT="bench",
+                      AZURE_OPENAI_ENDPOINT=serve(provider_app(chunks, delay)))
+    await measure("azure: llm_generate", run_generate)
+    await measure("azure: llm_stream", run_stream)
+    os.environ["AI_PROVIDER"] = "local"
+    await measure("local: llm_stream", run_stream)
+    await llm_provider.aclose_client()
+    print(f"   latência registrada: {json.dumps(llm_provider.latency.snapshot(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
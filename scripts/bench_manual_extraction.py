@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de materiais dos manuais (app.services.plan_generator)
+- Gera um manual XML (layout Caterpillar, procedimentos entre os itens) e um
+  manual em texto de ~N MB cada (padrão 50)
+- Mede tempo e pico de memória (tracemalloc, numa segunda execução) da
+  extração em streaming (iterparse + regex combinada do perfil) e, para
+  comparação, da implementação antiga: ElementTree.parse do arquivo inteiro
+  e regex separadas por linha sobre o texto completo em memória
+
+Uso: python scripts/bench_manual_extraction.py [MB] [diretório]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.plan_generator import extract_materials_from_document  # noqa: E402
+
+STEP = ("<Procedure><Step>Park the machine on level ground and lower the work tool.</Step>"
+        "<Step>Stop the engine and allow the system to cool before removing the cap.</Step>"
+        "<Warning>Hot fluid under pressure can cause severe burns.</Warning></Procedure>\n")
+PARAGRAPH = "Verifique o aperto das conexões, a ausência de vazamentos e o estado das mangueiras.\n"
+SECTIONS = (10, 50, 250, 500, 1000, 2000)
+
+
+def write_xml(path: str, megabytes: int) -> int:
+    target = megabytes * 1024 * 1024
+    items = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<Manual brand="Caterpillar">\n')
+        per_section = target // len(SECTIONS)
+        for hours in SECTIONS:
+            f.write(f'<MaintenanceInterval SMU="{hours}">\n')
+            start = f.tell()
+            while f.tell() - start < per_section:
+                f.write(STEP * 10)
+                f.write(f"<PartItem><PartNumber>1R-{items % 10000:04d}</PartNumber>"
+                        f"<PartName>Engine Oil Filter {items}</PartName><Qty>1</Qty><UOM>un</UOM></PartItem>\n")
+                items += 1
+            f.write("</MaintenanceInterval>\n")
+        f.write("</Manual>\n")
+    return items
+
+
+def write_text(path: str, megabytes: int) -> int:
+    target = megabytes * 1024 * 1024
+    items = 0
+    with open(path, "w", encoding="utf-8") as f:
+        per_section = target // len(SECTIONS)
+        for hours in SECTIONS:
+            f.write(f"Manutenção preventiva {hours} horas\n")
+            start = f.tell()
+            while f.tell() - start < per_section:
+                f.write(PARAGRAPH * 10)
+                f.write(f"- Filtro de óleo do motor P/N: 600-211-{items % 10000:04d} 1 un\n")
+                items += 1
+    return items
+
+
+def old_xml(path: str) -> int:
+    """Antigo: árvore inteira em memória (ElementTree.parse) e varredura dos itens."""
+    import xml.etree.ElementTree as ET
+    root = ET.parse(path).getroot()
+    return sum(1 for elem in root.iter() if elem.tag.lower() in {"material", "part", "item", "partitem"})
+
+
+def old_text(path: str) -> int:
+    """Antigo: texto completo em memória, lista de linhas e regex separadas por linha."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    sections = {250: re.compile(r"\b250\s*h(oras)?\b"), 500: re.compile(r"\b500\s*h(oras)?\b")}
+    keywords = ("óleo", "lubr", "filtro", "graxa", "hidráulico")
+    found = 0
+    interval = None
+    for ln in [ln.strip() for ln in text.splitlines() if ln.strip()]:
+        low = ln.lower()
+        if sections[250].search(low):
+            interval = 250
+            continue
+        if sections[500].search(low):
+            interval = 500
+            continue
+        if interval and any(kw in low for kw in keywords):
+            re.search(r"(P/?N|Part\s*No|Código|Cod\.|Ref\.|Referência)\s*[:\-]?\s*([A-Z0-9\-_/]+)", ln, re.I)
+            re.search(r"(\d+[\.,]?\d*)\s*(un|l|kg|m)\b", ln, re.I)
+            found += 1
+    return found
+
+
+def measure(label: str, fn) -> None:
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    count = sum(len(v) for v in result.values()) if isinstance(result, dict) else result
+    print(f"   {label:<34} {elapsed:7.2f} s   pico {peak / 1024 / 1024:8.1f} MiB   ({count:,} itens)")
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    directory = sys.argv[2] if len(sys.argv) > 2 else tempfile.mkdtemp()
+    xml_path = os.path.join(directory, "manual_cat.xml")
+    txt_path = os.path.join(directory, "manual.txt")
+    t0 = time.perf_counter()
+    xml_items = write_xml(xml_path, megabytes)
+    txt_items = write_text(txt_path, megabytes)
+    print(f"🧪 Manuais gerados em {time.perf_counter() - t0:.0f} s em {directory}: "
+          f"XML {os.path.getsize(xml_path) / 1024 / 1024:.0f} MiB ({xml_items:,} itens), "
+          f"texto {os.path.getsize(txt_path) / 1024 / 1024:.0f} MiB ({txt_items:,} itens)")
+
+    measure("XML: iterparse + perfil", lambda: extract_materials_from_document(xml_path))
+    measure("XML: ElementTree.parse (antigo)", lambda: old_xml(xml_path))
+    measure("texto: regex combinada, streaming", lambda: extract_materials_from_document(txt_path))
+    measure("texto: regex por linha (antigo)", lambda: old_text(txt_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark da pilha de middlewares do app (main.app)
+- Chama o app ASGI diretamente (sem servidor nem cliente HTTP), de forma
+  sequencial, para medir só o custo dos middlewares + rota
+- /health e uma resposta JSON de ~1 MB, com e sem Accept-Encoding: gzip
+  (rotas do benchmark inseridas no início do roteador)
+- Referência: as mesmas rotas num FastAPI sem middlewares
+
+Uso: python scripts/bench_middleware.py [segundos por cenário]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import main  # noqa: E402
+
+BIG = [{"id": i, "code": str(100000 + i), "name": f"Material {i}", "description": "Filtro de óleo do motor",
+        "unit": "UN", "current_stock": i % 50} for i in range(8500)]
+
+
+async def big_json():
+    return JSONResponse(BIG)
+
+
+async def health():
+    return {"status": "healthy"}
+
+
+def bare_app():
+    bare = FastAPI()
+    bare.add_api_route("/health", health)
+    bare.add_api_route("/bench/big", big_json)
+    return bare
+
+
+async def call(app, path: str, headers):
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+             "headers": headers, "client": ("127.0.0.1", 50000), "server": ("bench", 80)}
+    sent = {"status": None, "bytes": 0}
+    requested = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            sent["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            sent["bytes"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return sent
+
+
+async def measure(app, path: str, headers, seconds: float):
+    for _ in range(20):
+        await call(app, path, headers)
+    count, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        sent = await call(app, path, headers)
+        assert sent["status"] == 200, sent
+        count += 1
+    return count / (time.perf_counter() - t0), sent["bytes"]
+
+
+async def run(seconds: float):
+    # Rotas do benchmark no início da lista: o casamento de rotas do app
+    # (centenas de rotas) não entra na medida, só os middlewares
+    bare = bare_app()
+    main.app.router.routes[:0] = bare.router.routes[-2:]
+    scenarios = [
+        ("/health", []),
+        ("/bench/big", []),
+        ("/bench/big", [(b"accept-encoding", b"gzip")]),
+    ]
+    for label, app in (("sem middlewares", bare), ("main.app", main.app)):
+        print(f"🧪 {label}")
+        for path, headers in scenarios:
+            rps, size = await measure(app, path, headers, seconds)
+            encoding = "gzip" if headers else "identity"
+            print(f"   {path:<12} {encoding:<8} {rps:9.1f} req/s  resposta {size / 1024:8.1f} KiB")
+
+
+def main_bench():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    asyncio.run(run(seconds))
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark da extração de texto de manuais em PDF (app.services.pdf_text)
+- Gera com ReportLab um manual sintético de 500 páginas (seções 250h/500h
+  por volta da página 60, seguidas de apêndices)
+- Compara: leitura sequencial de todas as páginas (implementação antiga),
+  pool de processos e leitura com o cache quente
+
+Uso: python scripts/bench_pdf_extract.py [páginas] [workers]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import pdf_text  # noqa: E402
+
+
+def build_manual(path: str, pages: int) -> None:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(path, pagesize=A4)
+    section_at = min(60, pages // 2)
+    for i in range(pages):
+        y = 800
+        if i == section_at:
+            lines = ["Manutenção preventiva 250h", "Filtro de óleo do motor P/N: 600-211-1340 1 un",
+                     "Filtro de combustível P/N: 600-319-3750 1 un"]
+        elif i == section_at + 1:
+            lines = ["Revisão 500 horas", "Óleo hidráulico 20 l", "Filtro hidráulico Ref. 07063-01100"]
+        else:
+            lines = [f"Capítulo {i // 20} - página {i}"] + [
+                f"Procedimento {i}.{n}: verificar fixação, ruídos e vazamentos do conjunto." for n in range(40)
+            ]
+        for line in lines:
+            c.drawString(40, y, line)
+            y -= 18
+        c.showPage()
+    c.save()
+
+
+def legacy_extract(path: str) -> str:
+    import PyPDF2
+
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def timed(label: str, fn):
+    t0 = time.perf_counter()
+    text = fn()
+    print(f"   {label:<34} {time.perf_counter() - t0:8.2f} s  ({len(text) / 1024:8.1f} KiB de texto)")
+    return text
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else max(2, os.cpu_count() or 1)
+    try:
+        import PyPDF2  # noqa: F401
+    except ImportError:
+        print("❌ PyPDF2 não instalado (pip install PyPDF2)")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "manual.pdf")
+        t0 = time.perf_counter()
+        build_manual(path, pages)
+        print(f"🧪 Manual sintético: {pages} páginas, {os.path.getsize(path) / 1024:.0f} KiB "
+              f"(gerado em {time.perf_counter() - t0:.1f} s), {workers} workers, {os.cpu_count()} CPUs")
+
+        pdf_text.WORKERS = workers
+        pdf_text.CACHE_PATH = os.path.join(tmp, "cache.db")
+        timed("sequencial (antigo)", lambda: legacy_extract(path))
+        try:
+            # Aquece o pool (spawn + import do PyPDF2 nos processos) fora da medida
+            pdf_text.get_executor() and list(pdf_text.get_executor().map(pdf_text._page_count, [path] * workers))
+            text = timed("pool de processos", lambda: pdf_text.extract_pdf_text(path))
+            warm = timed("cache quente", lambda: pdf_text.extract_pdf_text(path))
+            assert warm == text and "07063-01100" in text
+        finally:
+            pdf_text.shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark de consulta de sessão com histórico grande de tokens
+- Banco SQLite temporário; a tabela session_tokens cresce em etapas até N tokens
+  históricos (a maioria expirada ou revogada, como sem a limpeza)
+- Em cada etapa mede a latência de resolve_token (índice único do SHA-256)
+- No final mede a limpeza em lotes (sweep_expired)
+
+Uso: python scripts/bench_session_lookup.py [tokens]
+"""
+import os
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.admin import SessionToken, User  # noqa: E402
+from app.services.session_tokens import hash_token, issue_token, resolve_token, sweep_expired  # noqa: E402
+
+CHUNK = 50_000
+
+
+def fill(db, count: int, now: datetime):
+    """Inserir tokens históricos (90% expirados, 5% revogados, 5% ativos)."""
+    for start in range(0, count, CHUNK):
+        rows = []
+        for i in range(start, min(count, start + CHUNK)):
+            kind = i % 20
+            expires = now - timedelta(days=1) if kind < 18 else now + timedelta(days=1)
+            rows.append({"user_id": 1, "token_hash": hash_token(secrets.token_urlsafe(32)), "created_at": now,
+                         "last_used_at": now, "expires_at": expires, "is_revoked": kind == 18})
+        db.execute(insert(SessionToken), rows)
+        db.commit()
+
+
+def measure(db, tokens, rounds: int = 2000):
+    samples = []
+    for i in range(rounds):
+        raw = tokens[i % len(tokens)]
+        t0 = time.perf_counter()
+        resolve_token(db, raw)
+        samples.append((time.perf_counter() - t0) * 1e6)
+        db.expunge_all()
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    target = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        Base.metadata.create_all(bind=engine)
+        db = Session()
+        db.add(User(id=1, username="operador", password_hash="x", password_salt="00"))
+        db.commit()
+        live = [issue_token(db, 1, ttl_hours=8)[1] for _ in range(100)]
+        now = datetime.utcnow()
+
+        print(f"🔑 resolve_token com histórico crescente de tokens (até {target:,})")
+        size = 0
+        for step in (1_000, 10_000, 100_000, 1_000_000):
+            step = min(step, target)
+            if step > size:
+                fill(db, step - size, now)
+                size = step
+            p50, p99 = measure(db, live)
+            print(f"  {size:>9,} tokens   p50 {p50:7.1f} µs   p99 {p99:7.1f} µs")
+            if size >= target:
+                break
+
+        t0 = time.perf_counter()
+        removed = sweep_expired(db, now=now)
+        print(f"🧹 limpeza em lotes: {removed:,} tokens removidos em {time.perf_counter() - t0:.1f} s")
+        p50, p99 = measure(db, live)
+        print(f"  após limpeza       p50 {p50:7.1f} µs   p99 {p99:7.1f} µs")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark de renderização de templates (cache busting dos estáticos)
+- Renderiza as páginas mais pesadas N vezes
+- Compara o static_url anterior (os.path.exists + getmtime a cada chamada)
+  com o manifesto de hashes em memória
+- Conta as chamadas de stat feitas durante as renderizações
+
+Uso: python scripts/bench_template_render.py [renderizações]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+from app.templates_config import STATIC_DIR, templates, get_static_url, static_manifest  # noqa: E402
+
+PAGES = [
+    "dashboard.html",
+    "maintenance/plans.html",
+    "maintenance/work_orders.html",
+    "warehouse/materials.html",
+    "reports/maintenance.html",
+]
+
+
+def legacy_static_url(path: str) -> str:
+    """Implementação anterior de get_static_url."""
+    try:
+        file_path = os.path.join(STATIC_DIR, path.lstrip("/"))
+        if os.path.exists(file_path):
+            mtime = os.path.getmtime(file_path)
+            return f"/static/{path}?v={int(mtime)}"
+        else:
+            return f"/static/{path}"
+    except Exception:
+        return f"/static/{path}"
+
+
+class StatCounter:
+    def __init__(self):
+        self.count = 0
+        self._stat = os.stat
+
+    def __enter__(self):
+        def counting_stat(*args, **kwargs):
+            self.count += 1
+            return self._stat(*args, **kwargs)
+        os.stat = counting_stat
+        return self
+
+    def __exit__(self, *exc):
+        os.stat = self._stat
+
+
+def render_all(rounds: int):
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b"",
+                       "server": ("bench", 80), "scheme": "http", "root_path": ""})
+    compiled = [templates.get_template(name) for name in PAGES]
+    with StatCounter() as stats:
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            for template in compiled:
+                template.render(request=request, current_user=None)
+        elapsed = time.perf_counter() - t0
+    return elapsed, stats.count
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    static_manifest.load()
+    # Com auto_reload o Jinja também faz stat do template a cada get_template; aqui os
+    # templates são compilados antes para medir só o custo do static_url
+    print(f"🖼️  {len(PAGES)} páginas × {rounds} renderizações")
+    for label, fn in (("getmtime por chamada", legacy_static_url), ("manifesto em memória", get_static_url)):
+        templates.env.globals["static_url"] = fn
+        render_all(10)  # aquecimento
+        elapsed, stats = render_all(rounds)
+        per_page = elapsed / (rounds * len(PAGES)) * 1000
+        print(f"  {label:<22} total {elapsed:6.2f} s  {per_page:6.3f} ms/página  stat={stats}")
+    templates.env.globals["static_url"] = get_static_url
+
+
+if __name__ == "__main__":
+    main()
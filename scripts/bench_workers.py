@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark de vazão com 1, 2 e 4 workers (serve.py)
+- Banco SQLite temporário com N materiais, equipamentos e planos
+- Sobe python serve.py com WEB_CONCURRENCY=1/2/4 e gera carga HTTP no próprio
+  processo (httpx assíncrono, C conexões keep-alive) por alguns segundos
+- Mede req/s, latência p50/p99 e erros por cenário
+
+O gerador de carga divide a CPU com o servidor: em máquinas com poucos
+núcleos o ganho com mais workers é limitado pela CPU disponível.
+
+Uso: python scripts/bench_workers.py [materiais] [segundos] [conexões]
+"""
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.database import Base  # noqa: E402
+import app.models  # noqa: E402,F401
+from app.models.warehouse import Material  # noqa: E402
+from app.models.equipment import Equipment  # noqa: E402
+from app.models.maintenance import MaintenancePlan  # noqa: E402
+
+ENDPOINTS = [
+    "/api/warehouse/materials/all",
+    "/api/maintenance/equipment/list",
+    "/api/maintenance/plans",
+    "/health",
+]
+
+
+def seed(db_path: str, materials: int):
+    engine = create_engine(f"sqlite:///{db_path}")
+    Session = sessionmaker(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = Session()
+    db.add_all(Material(code=str(100000 + i), name=f"Material {i}", description="Peça de reposição", unit="UN",
+                        minimum_stock=1, maximum_stock=100, current_stock=i % 50, category="Peças")
+               for i in range(materials))
+    equipments = max(materials // 10, 1)
+    db.add_all(Equipment(prefix=f"EQ{i:04d}", name=f"Equipamento {i}", status="Ativo") for i in range(equipments))
+    db.commit()
+    db.add_all(MaintenancePlan(name=f"Plano {i}", equipment_id=(i % equipments) + 1, type="Preventiva",
+                               interval_type="Horas", interval_value=250) for i in range(100))
+    db.commit()
+    db.close()
+    engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path: str, workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", HOST="127.0.0.1", PORT=str(port),
+               WEB_CONCURRENCY=str(workers), ACCESS_LOG="0", LOG_LEVEL="warning")
+    proc = subprocess.Popen([sys.executable, "serve.py"], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                time.sleep(1)  # demais workers terminando o lifespan
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("servidor não respondeu em 60 s")
+
+
+def stop_server(proc: subprocess.Popen):
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def load(port: int, seconds: float, connections: int):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def user(offset: int):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    response = await client.get(ENDPOINTS[i % len(ENDPOINTS)])
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+                i += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user(n) for n in range(connections)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], errors
+
+
+def main():
+    materials = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    connections = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, materials)
+        print(f"⚙️  {materials} materiais, {connections} conexões, {seconds:.0f} s por cenário, {os.cpu_count()} CPU(s)")
+        for workers in (1, 2, 4):
+            port = free_port()
+            proc = start_server(db_path, workers, port)
+            try:
+                asyncio.run(load(port, 2, connections))  # aquecimento
+                rps, p50, p99, errors = asyncio.run(load(port, seconds, connections))
+            finally:
+                stop_server(proc)
+            print(f"  {workers} worker(s)  {rps:8.1f} req/s  p50 {p50 * 1000:7.1f} ms  "
+                  f"p99 {p99 * 1000:7.1f} ms  erros={errors}")
+
+
+if __name__ == "__main__":
+    main()
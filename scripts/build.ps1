@@ -19,6 +19,7 @@ if (Test-Path (Join-Path $PSScriptRoot "..\build")) { Remove-Item -Recurse -Forc
 $root = Resolve-Path (Join-Path $PSScriptRoot "..")
 $templates = Join-Path $root "templates"; if (-Not (Test-Path $templates)) { New-Item -ItemType Directory -Path $templates | Out-Null }
 $static = Join-Path $root "static"; if (-Not (Test-Path $static)) { New-Item -ItemType Directory -Path $static | Out-Null }
+$vendorProfiles = Join-Path $root "app\services\vendor_profiles"
 
 # Detecta ou gera ícone (app.ico) se possível
 $iconPath = $null
@@ -65,6 +66,16 @@ print("ICO written:", ico_path)
   }
 }
 
+# Gera static/asset-manifest.json (hash de cada estático) para o executável não recalcular na inicialização
+Write-Host "==> Gerando manifesto de estáticos"
+Push-Location $root
+try {
+  & .\.venv\Scripts\python.exe -m app.services.static_manifest $static
+  if ($LASTEXITCODE -ne 0) { Write-Warning "Falha ao gerar o manifesto; o executável calculará os hashes ao iniciar." }
+} finally {
+  Pop-Location
+}
+
 # Monta argumentos do PyInstaller
 $pyArgs = @(
   "pyinstaller",
@@ -80,7 +91,8 @@ $pyArgs = @(
   "--hidden-import=starlette",
   "--hidden-import=main",
   "--add-data", "`"$templates;templates`"",
-  "--add-data", "`"$static;static`""
+  "--add-data", "`"$static;static`"",
+  "--add-data", "`"$vendorProfiles;app/services/vendor_profiles`""
 )
 
 if ($iconPath) {
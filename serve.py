@@ -0,0 +1,202 @@
+"""
+Servidor de produção do MTDL-PCM com vários workers.
+
+- gunicorn com UvicornWorker quando instalado (Linux/containers); senão o
+  supervisor de processos do próprio uvicorn (Windows, instalação desktop)
+- migrações, semeadura e reconciliação preventiva executadas uma vez por
+  inicialização (app/services/startup_lock.py), não uma vez por worker
+- keep-alive, tempo limite por requisição e encerramento gracioso
+  configuráveis por variáveis de ambiente
+
+Variáveis:
+    HOST, PORT                 endereço (0.0.0.0:8000)
+    WEB_CONCURRENCY            número de workers (padrão: núcleos, máx. 4); com mais de
+                               um, RATE_LIMIT_STORE passa a sqlite (limites e bloqueios
+                               de login compartilhados entre os workers)
+    SERVER                     auto | gunicorn | uvicorn
+    KEEPALIVE_SECONDS          keep-alive HTTP (5)
+    REQUEST_TIMEOUT            segundos até o início da resposta; 504 depois (60; 0 desliga)
+    GRACEFUL_TIMEOUT           segundos para drenar requisições ao encerrar (30)
+    MAX_REQUESTS               reciclar o worker após N requisições (0 desliga)
+    LOG_LEVEL, ACCESS_LOG      nível do log e log de acesso (info, 1)
+
+Uso: python serve.py
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from app.services.startup_lock import STARTUP_GENERATION_ENV
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def load_settings() -> dict:
+    workers = _env_int("WEB_CONCURRENCY", min(os.cpu_count() or 1, 4))
+    return {
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": _env_int("PORT", 8000),
+        "workers": max(workers, 1),
+        "server": os.getenv("SERVER", "auto").lower(),
+        "keepalive": _env_int("KEEPALIVE_SECONDS", 5),
+        "request_timeout": _env_int("REQUEST_TIMEOUT", 60),
+        "graceful_timeout": _env_int("GRACEFUL_TIMEOUT", 30),
+        "max_requests": _env_int("MAX_REQUESTS", 0),
+        "log_level": os.getenv("LOG_LEVEL", "info").lower(),
+        "access_log": os.getenv("ACCESS_LOG", "1").lower() not in ("0", "false", "no"),
+    }
+
+
+class RequestTimeoutMiddleware:
+    """Responde 504 quando o app não inicia a resposta dentro do prazo.
+
+    O prazo vale só até o início da resposta: downloads longos e streams SSE
+    (/api/dashboard/events) continuam depois que os cabeçalhos foram enviados.
+    """
+
+    def __init__(self, app, timeout: float):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.timeout:
+            await self.app(scope, receive, send)
+            return
+
+        started = asyncio.Event()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                started.set()
+            await send(message)
+
+        task = asyncio.ensure_future(self.app(scope, receive, send_wrapper))
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            done, _ = await asyncio.wait({task, waiter}, timeout=self.timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            waiter.cancel()
+
+        if not done:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            if not started.is_set():
+                body = json.dumps({"detail": "Tempo limite da requisição excedido"}).encode()
+                await send({"type": "http.response.start", "status": 504,
+                            "headers": [(b"content-type", b"application/json"),
+                                        (b"content-length", str(len(body)).encode())]})
+                await send({"type": "http.response.body", "body": body})
+            return
+        await task
+
+
+def create_app():
+    """Fábrica chamada em cada worker."""
+    from main import app
+    timeout = _env_int("REQUEST_TIMEOUT", 60)
+    return RequestTimeoutMiddleware(app, timeout) if timeout > 0 else app
+
+
+def share_worker_state(workers: int) -> None:
+    """Mais de um worker: limites de requisição e de login no SQLite compartilhado
+    (RATE_LIMIT_STORE=sqlite), senão cada worker teria a própria cota e os próprios bloqueios."""
+    if workers <= 1:
+        return
+    os.environ.setdefault("RATE_LIMIT_STORE", "sqlite")
+    if os.environ["RATE_LIMIT_STORE"].lower() != "sqlite":
+        print(f"⚠️ RATE_LIMIT_STORE={os.environ['RATE_LIMIT_STORE']} com {workers} workers: "
+              "limites e bloqueios de login valem por worker")
+
+
+def _gunicorn_available() -> bool:
+    try:
+        import gunicorn  # noqa: F401
+        import uvicorn.workers  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def run_gunicorn(settings: dict) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        "bind": f"{settings['host']}:{settings['port']}",
+        "workers": settings["workers"],
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "keepalive": settings["keepalive"],
+        # Heartbeat do worker: só mata o processo travado depois do 504 da requisição
+        "timeout": settings["request_timeout"] + settings["graceful_timeout"] if settings["request_timeout"] else 0,
+        "graceful_timeout": settings["graceful_timeout"],
+        "max_requests": settings["max_requests"],
+        "max_requests_jitter": settings["max_requests"] // 10,
+        "loglevel": settings["log_level"],
+        "accesslog": "-" if settings["access_log"] else None,
+        "preload_app": False,
+    }
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return create_app()
+
+    Application().run()
+
+
+def run_uvicorn(settings: dict) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "serve:create_app",
+        factory=True,
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host=settings["host"],
+        port=settings["port"],
+        workers=settings["workers"],
+        timeout_keep_alive=settings["keepalive"],
+        timeout_graceful_shutdown=settings["graceful_timeout"],
+        limit_max_requests=settings["max_requests"] or None,
+        limit_max_requests_jitter=settings["max_requests"] // 10,
+        log_level=settings["log_level"],
+        access_log=settings["access_log"],
+    )
+
+
+def main() -> None:
+    settings = load_settings()
+    os.makedirs("data", exist_ok=True)
+    # Nova geração a cada inicialização: o primeiro worker executa as migrações
+    os.environ[STARTUP_GENERATION_ENV] = f"{os.getpid()}-{time.time_ns()}"
+    share_worker_state(settings["workers"])
+
+    use_gunicorn = settings["server"] == "gunicorn" or (settings["server"] == "auto" and _gunicorn_available())
+    server = "gunicorn" if use_gunicorn else "uvicorn"
+    print(f"🚀 MTDL-PCM em {settings['host']}:{settings['port']} com {settings['workers']} worker(s) ({server})")
+    if use_gunicorn:
+        run_gunicorn(settings)
+    else:
+        run_uvicorn(settings)
+
+
+if __name__ == "__main__":
+    # Necessário no executável (PyInstaller) para os processos de worker
+    import multiprocessing
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,79 @@
+// Feed ao vivo (SSE) com fallback para polling
+// Uso: LiveFeed.subscribe(['work_orders', 'preventive_alerts'], recarregar, { fallbackInterval: 30000 })
+(function() {
+  const URL_EVENTS = '/api/dashboard/events';
+  const MAX_ERRORS = 3;
+  const subscribers = [];
+  let source = null;
+  let errors = 0;
+  let polling = false;
+
+  function notify(topics) {
+    subscribers.forEach(sub => {
+      const hit = !topics || sub.topics.length === 0 || sub.topics.some(t => topics[t]);
+      if (hit) {
+        try { sub.handler(topics); } catch (e) { console.warn('LiveFeed: falha no assinante', e); }
+      }
+    });
+  }
+
+  function startPolling() {
+    if (polling) return;
+    polling = true;
+    subscribers.forEach(sub => {
+      if (!sub.timer) sub.timer = setInterval(() => sub.handler(null), sub.fallbackInterval);
+    });
+  }
+
+  function stopPolling() {
+    polling = false;
+    subscribers.forEach(sub => {
+      if (sub.timer) { clearInterval(sub.timer); sub.timer = null; }
+    });
+  }
+
+  function connect() {
+    if (source || typeof EventSource === 'undefined') {
+      if (!source) startPolling();
+      return;
+    }
+    source = new EventSource(URL_EVENTS);
+    source.onopen = () => { errors = 0; stopPolling(); };
+    source.addEventListener('delta', e => {
+      try { notify(JSON.parse(e.data).topics || {}); } catch (err) { notify(null); }
+    });
+    // Histórico perdido ou fila estourada: recarregar tudo
+    source.addEventListener('resync', () => notify(null));
+    source.onerror = () => {
+      errors += 1;
+      if (errors >= MAX_ERRORS || source.readyState === EventSource.CLOSED) {
+        // Servidor sem SSE (ou proxy bloqueando): voltar ao polling e tentar de novo mais tarde
+        source.close();
+        source = null;
+        startPolling();
+        setTimeout(() => { errors = 0; connect(); }, 60000);
+      }
+    };
+  }
+
+  function subscribe(topics, handler, options) {
+    const sub = {
+      topics: topics || [],
+      handler: handler,
+      fallbackInterval: (options && options.fallbackInterval) || 30000,
+      timer: null
+    };
+    subscribers.push(sub);
+    if (polling) sub.timer = setInterval(() => sub.handler(null), sub.fallbackInterval);
+    connect();
+    return () => {
+      if (sub.timer) clearInterval(sub.timer);
+      const idx = subscribers.indexOf(sub);
+      if (idx >= 0) subscribers.splice(idx, 1);
+    };
+  }
+
+  window.addEventListener('beforeunload', () => { if (source) source.close(); });
+
+  window.LiveFeed = { subscribe };
+})();
@@ -5,7 +5,7 @@
   - Estratégias simples para /static e /api GET
 */
 
-const VERSION = 'v2';
+const VERSION = 'v3';
 const STATIC_CACHE = `mtdl-static-${VERSION}`;
 const DYNAMIC_CACHE = `mtdl-dynamic-${VERSION}`;
 
@@ -69,20 +69,30 @@ self.addEventListener('fetch', event => {
     return;
   }
 
-  // API GET: stale-while-revalidate simples
+  // Feed SSE (streaming): nunca passar pelo cache
+  if (request.headers.get('Accept') === 'text/event-stream') return;
+
+  // API GET: revalidação condicional (If-None-Match) com fallback ao cache offline
   if (url.origin === self.location.origin && url.pathname.startsWith('/api/') && request.method === 'GET') {
-    event.respondWith(
-      caches.match(request).then(cached => {
-        const fetchPromise = fetch(request)
-          .then(response => {
-            const copy = response.clone();
-            caches.open(DYNAMIC_CACHE).then(cache => cache.put(request, copy)).catch(() => {});
-            return response;
-          })
-          .catch(() => cached);
-        return cached ? Promise.resolve(cached).then(() => fetchPromise) : fetchPromise;
-      })
-    );
+    event.respondWith(revalidate(request));
     return;
   }
-});
\ No newline at end of file
+});
+
+// Enviar o ETag da cópia em cache; 304 reaproveita a cópia sem baixar o corpo de novo
+async function revalidate(request) {
+  const cache = await caches.open(DYNAMIC_CACHE);
+  const cached = await cache.match(request);
+  const headers = new Headers(request.headers);
+  const etag = cached && cached.headers.get('ETag');
+  if (etag) headers.set('If-None-Match', etag);
+  try {
+    const response = await fetch(request.url, { headers, credentials: request.credentials, cache: 'no-store' });
+    if (response.status === 304 && cached) return cached;
+    if (response.ok) cache.put(request, response.clone()).catch(() => {});
+    return response;
+  } catch (err) {
+    if (cached) return cached;
+    throw err;
+  }
+}
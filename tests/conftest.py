@@ -0,0 +1,36 @@
+"""
+Fixtures do banco de teste: engine da sessão de testes e sessão por teste.
+
+Cada módulo monta só o próprio mini-app (routers + dependency_overrides) com
+TestingSessionLocal e override_get_db de tests/db.py; quem precisa do engine
+pede a fixture db_engine.
+"""
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.database import Base
+import app.models  # noqa: F401  (registra todos os modelos no metadata)
+from tests.db import TestingSessionLocal
+
+
+@pytest.fixture(scope="session", autouse=True)
+def db_engine(tmp_path_factory):
+    """Engine do banco de teste (arquivo temporário da sessão), ligado a TestingSessionLocal"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    TestingSessionLocal.configure(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def db_session(db_engine):
+    """Fixture para sessão do banco de dados de teste"""
+    Base.metadata.create_all(bind=db_engine)
+    session = TestingSessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=db_engine)
@@ -0,0 +1,21 @@
+"""
+Banco de teste compartilhado: fábrica de sessões e override de get_db.
+
+A fábrica nasce sem engine; a fixture db_engine (tests/conftest.py) a liga ao
+SQLite temporário da sessão de testes. Arquivo (e não :memory: com
+StaticPool): tarefas de fundo e consultas em thread abrem conexões próprias,
+como em produção.
+"""
+
+from sqlalchemy.orm import sessionmaker
+
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def override_get_db():
+    """Override da função get_db para usar banco de teste"""
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
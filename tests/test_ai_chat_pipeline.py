@@ -0,0 +1,195 @@
+"""
+Testes do pipeline do chat de IA (fontes em paralelo, memo por requisição, prazo, streaming SSE)
+"""
+
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import get_db
+from app.models.equipment import Equipment
+from app.models.maintenance import WorkOrder
+from app.routers import reports
+from app.services import llm_provider
+from app.services.chat_pipeline import ChatSource, RequestMemo, gather_sources, memoized
+from app.services.rate_limit import rate_limiter
+from tests.db import override_get_db
+
+reports_app = FastAPI()
+reports_app.include_router(reports.router, prefix="/api/reports")
+reports_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(reports_app)
+
+@pytest.fixture(scope="function")
+def db_session(db_session, monkeypatch):
+    """Sessão de teste com equipamentos e OS fechadas"""
+    monkeypatch.setattr(rate_limiter, "enabled", False)
+    monkeypatch.delenv("AI_PROVIDER", raising=False)
+    session = db_session
+    now = datetime.now()
+    for i in range(3):
+        eq = Equipment(prefix=f"EQ{i}", name=f"Escavadeira {i}", category="Escavadeira", model="PC200")
+        session.add(eq)
+        session.flush()
+        for j in range(2):
+            session.add(WorkOrder(number=f"{i}{j}", title="Troca de filtro", equipment_id=eq.id,
+                                  type="Corretiva", status="Fechada", cost=100.0 * (i + 1),
+                                  started_at=now - timedelta(days=10 * j + 2),
+                                  completed_at=now - timedelta(days=10 * j + 1)))
+    session.commit()
+    return session
+
+
+@pytest.fixture(scope="function")
+def statements(db_session, db_engine):
+    """SQL executado no banco de teste depois da semeadura"""
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    event.listen(db_engine, "before_cursor_execute", record)
+    yield recorded
+    event.remove(db_engine, "before_cursor_execute", record)
+
+
+class TestRequestMemo:
+    """Subconsulta comum calculada uma vez, mesmo com threads simultâneas"""
+
+    def test_concurrent_callers_share_result(self):
+        memo = RequestMemo()
+        calls = []
+        barrier = threading.Barrier(4)
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return "cadastro"
+
+        def worker(out):
+            barrier.wait()
+            out.append(memo.get("equipamentos", compute))
+
+        out = []
+        threads = [threading.Thread(target=worker, args=(out,)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert out == ["cadastro"] * 4
+        assert len(calls) == 1 and memo.hits == 3
+
+    def test_outside_pipeline_just_computes(self):
+        assert memoized("x", lambda: 42) == 42
+
+
+class TestGatherSources:
+    """Fontes em paralelo, falhas isoladas e resposta parcial no prazo"""
+
+    def test_deadline_and_failures(self, db_session):
+        def slow(db):
+            time.sleep(0.5)
+            return "lento"
+
+        def broken(db):
+            raise RuntimeError("falha simulada")
+
+        plan = [
+            ("count", ChatSource("", lambda db: db.query(Equipment).count(), None)),
+            ("slow", ChatSource("", slow, None)),
+            ("broken", ChatSource("", broken, None)),
+        ]
+
+        async def web():
+            return ["resultado"]
+
+        async def run():
+            started = time.monotonic()
+            gathered = await gather_sources(db_session, plan, started + 0.2, {"web": web()})
+            return gathered, time.monotonic() - started
+
+        (results, missing, _), elapsed = asyncio.run(run())
+        assert elapsed < 0.45  # não espera a fonte lenta
+        assert results == {"count": 3, "web": ["resultado"]}
+        assert missing == ["slow", "broken"]
+
+
+class TestAIChat:
+    """Intenção 'overview': todas as fontes numa só resposta, cadastro lido uma vez"""
+
+    def test_overview_gathers_all_sources(self, db_session, statements):
+        response = client.post("/api/reports/maintenance/ai-chat",
+                               json={"messages": [{"role": "user", "content": "Como está a frota?"}]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["intent"] == "overview" and data["partial"] is False
+        for phrase in ("Disponibilidade média", "Utilização média", "MTTR médio: 24.00 h", "MTBF médio",
+                       "Custos por equipamento (top 3): EQ2 (R$ 600.00)", "Backlog atual (OS abertas): 0",
+                       "Consumo médio de combustível"):
+            assert phrase in data["reply"]
+        assert len(data["sources"]) == 7
+
+        # MTTR, MTBF, combustível e disponibilidade usam o cadastro: uma consulta só
+        equipment_reads = [s for s in statements if s.startswith("SELECT equipments.id AS equipments_id, equipments.prefix")]
+        assert len(equipment_reads) == 1
+
+    def test_deadline_gives_partial_answer(self, db_session, monkeypatch):
+        monkeypatch.setattr(reports, "AI_CHAT_DEADLINE", 0)
+        data = client.post("/api/reports/maintenance/ai-chat",
+                           json={"messages": [{"role": "user", "content": "qual o mttr?"}]}).json()
+        assert data["partial"] is True and data["missing"] == ["mttr"]
+        assert "Dados não obtidos a tempo: MTTR." in data["reply"]
+
+
+def _sse_events(body):
+    """[(evento, dados)] de um corpo text/event-stream"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestAIChatStream:
+    """/maintenance/ai-chat/stream: meta, trechos do texto e done com a resposta completa"""
+
+    def test_stream_without_provider_sends_draft(self, db_session):
+        with client.stream("POST", "/api/reports/maintenance/ai-chat/stream",
+                           json={"messages": [{"role": "user", "content": "qual o mttr?"}]}) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = _sse_events(response.read().decode())
+        names = [name for name, _ in events]
+        assert names[0] == "meta" and names[-1] == "done" and names.count("token") > 1
+        assert events[0][1]["intent"] == "mttr"
+        done = events[-1][1]
+        assert "".join(data["text"] for name, data in events if name == "token") == done["reply"]
+        assert "MTTR médio: 24.00 h" in done["reply"]
+        assert done["refined"] is False and done["ttft_ms"] >= 0
+        same = client.post("/api/reports/maintenance/ai-chat",
+                           json={"messages": [{"role": "user", "content": "qual o mttr?"}]}).json()
+        assert same["reply"] == done["reply"]
+
+    def test_local_provider(self, db_session, monkeypatch):
+        monkeypatch.setenv("AI_PROVIDER", "local")
+        llm_provider.latency.clear()
+        body = {"messages": [{"role": "user", "content": "qual o mttr?"}]}
+        reply = client.post("/api/reports/maintenance/ai-chat", json=body).json()["reply"]
+        assert reply.startswith('Sobre "qual o mttr?", com base nos dados internos:')
+        assert "MTTR médio: 24.00 h" in reply
+
+        with client.stream("POST", "/api/reports/maintenance/ai-chat/stream", json=body) as response:
+            events = _sse_events(response.read().decode())
+        done = events[-1][1]
+        assert done["refined"] is True and done["reply"] == reply
+        assert "".join(data["text"] for name, data in events if name == "token") == reply
+        snapshot = llm_provider.latency.snapshot()
+        assert snapshot["local"]["first_chunk"]["count"] == 2
+        assert snapshot["ai_chat_stream"]["first_chunk"]["count"] == 1
@@ -0,0 +1,109 @@
+"""
+Testes do pipeline ASGI (cabeçalhos de segurança, exceções, idempotência)
+"""
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.models.idempotency import IdempotencyRecord
+from app.services.asgi_pipeline import ASGIPipeline, IdempotencyMiddleware
+from tests.db import TestingSessionLocal
+
+errors = []
+calls = {"create": 0}
+
+inner_app = FastAPI()
+
+
+@inner_app.get("/page")
+async def page():
+    return JSONResponse({"ok": True}, headers={"X-Frame-Options": "SAMEORIGIN"})
+
+
+@inner_app.get("/boom")
+async def boom():
+    raise RuntimeError("falha simulada")
+
+
+@inner_app.get("/stream")
+async def stream():
+    async def chunks():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield f"{i}\n"
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+@inner_app.post("/api/orders")
+async def create_order(payload: dict):
+    calls["create"] += 1
+    return {"id": calls["create"], "item": payload.get("item")}
+
+
+pipeline = ASGIPipeline(
+    inner_app,
+    hooks=[lambda app: IdempotencyMiddleware(app, session_factory=TestingSessionLocal)],
+    on_error=lambda scope, exc: errors.append((scope["path"], type(exc).__name__)),
+    server_timing=True,
+)
+client = TestClient(pipeline, raise_server_exceptions=False)
+
+
+class TestPipeline:
+    """Cabeçalhos de segurança, Server-Timing, exceções e streaming"""
+
+    def test_security_headers_and_timing(self):
+        response = client.get("/page")
+        assert response.headers["x-frame-options"] == "DENY"
+        assert response.headers["x-content-type-options"] == "nosniff"
+        assert "frame-ancestors 'none'" in response.headers["content-security-policy"]
+        assert response.headers["server-timing"].startswith("app;dur=")
+        assert client.get("/inexistente").headers["x-frame-options"] == "DENY"
+
+    def test_unhandled_exception_is_reported(self):
+        errors.clear()
+        assert client.get("/boom").status_code == 500
+        assert errors == [("/boom", "RuntimeError")]
+
+    def test_streaming_is_not_buffered(self):
+        messages = []
+
+        async def run():
+            scope = {"type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream",
+                     "query_string": b"", "headers": [], "root_path": "", "scheme": "http",
+                     "server": ("test", 80), "client": ("127.0.0.1", 1), "http_version": "1.1"}
+
+            async def receive():
+                await asyncio.sleep(10)
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                messages.append(message)
+
+            await pipeline(scope, receive, send)
+
+        asyncio.run(run())
+        bodies = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+        assert bodies == [b"0\n", b"1\n", b"2\n"]
+
+
+class TestIdempotency:
+    """Mesma chave e mesmo payload devolvem a resposta gravada"""
+
+    def test_replays_stored_response(self, db_session):
+        calls["create"] = 0
+        headers = {"X-Idempotency-Key": "abc-1"}
+        first = client.post("/api/orders", json={"item": "filtro"}, headers=headers)
+        again = client.post("/api/orders", json={"item": "filtro"}, headers=headers)
+        assert first.json() == again.json() == {"id": 1, "item": "filtro"}
+        assert again.headers["x-frame-options"] == "DENY"
+        assert calls["create"] == 1
+        assert db_session.query(IdempotencyRecord).count() == 1
+
+        # Payload diferente com a mesma chave executa de novo
+        other = client.post("/api/orders", json={"item": "correia"}, headers=headers)
+        assert other.json() == {"id": 2, "item": "correia"}
+        assert calls["create"] == 2
@@ -0,0 +1,139 @@
+"""
+Testes do motor de disponibilidade (álgebra de intervalos e calendário de operação)
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.availability import (
+    merge_intervals,
+    clip_intervals,
+    intersect_intervals,
+    interval_hours,
+    period_buckets,
+    compute_availability,
+    OperatingCalendar,
+)
+
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, strategies as st  # noqa: E402
+
+intervals_strategy = st.lists(
+    st.tuples(st.integers(0, 200), st.integers(0, 200)),
+    max_size=30,
+)
+
+
+def _points(intervals):
+    """Modelo de referência: conjunto dos pontos inteiros cobertos por [s, e)."""
+    return {p for s, e in intervals for p in range(s, e)}
+
+
+class TestIntervalAlgebra:
+    """Propriedades da união, recorte e interseção"""
+
+    @given(intervals_strategy)
+    def test_merge_preserves_coverage(self, intervals):
+        merged = merge_intervals(intervals)
+        assert _points(merged) == _points(intervals)
+
+    @given(intervals_strategy)
+    def test_merge_is_sorted_disjoint_and_idempotent(self, intervals):
+        merged = merge_intervals(intervals)
+        for (s1, e1), (s2, e2) in zip(merged, merged[1:]):
+            assert s1 < e1 < s2 < e2
+        assert merge_intervals(merged) == merged
+
+    @given(intervals_strategy, st.integers(0, 200), st.integers(0, 200))
+    def test_clip_stays_inside_window(self, intervals, a, b):
+        start, end = min(a, b), max(a, b)
+        clipped = clip_intervals(merge_intervals(intervals), start, end)
+        assert _points(clipped) == _points(intervals) & set(range(start, end))
+
+    @given(intervals_strategy, intervals_strategy)
+    def test_intersection_matches_set_model(self, a, b):
+        ma, mb = merge_intervals(a), merge_intervals(b)
+        result = intersect_intervals(ma, mb)
+        assert _points(result) == _points(a) & _points(b)
+        assert intersect_intervals(mb, ma) == result
+
+    @given(intervals_strategy)
+    def test_measure_never_exceeds_sum(self, intervals):
+        merged = merge_intervals(intervals)
+        assert sum(e - s for s, e in merged) <= sum(max(0, e - s) for s, e in intervals)
+
+
+class TestOperatingCalendar:
+    """Calendário de operação (turnos e dias trabalhados)"""
+
+    def test_continuous_calendar(self):
+        start, end = datetime(2025, 3, 3), datetime(2025, 3, 10)
+        assert interval_hours(OperatingCalendar().operating_intervals(start, end)) == 168.0
+
+    def test_shift_windows_and_working_days(self):
+        """Turno 07:00-17:00 de segunda a sexta"""
+        cal = OperatingCalendar([(7 * 60, 17 * 60)], working_days=[0, 1, 2, 3, 4])
+        start, end = datetime(2025, 3, 3), datetime(2025, 3, 10)
+        assert interval_hours(cal.operating_intervals(start, end)) == 50.0
+
+    def test_overnight_shift(self):
+        """Turno 22:00-06:00 atravessa a meia-noite"""
+        cal = OperatingCalendar([(22 * 60, 30 * 60)])
+        start, end = datetime(2025, 3, 3), datetime(2025, 3, 4)
+        intervals = cal.operating_intervals(start, end)
+        assert intervals == [
+            (datetime(2025, 3, 3, 0, 0), datetime(2025, 3, 3, 6, 0)),
+            (datetime(2025, 3, 3, 22, 0), datetime(2025, 3, 4, 0, 0)),
+        ]
+
+
+class TestComputeAvailability:
+    """Cálculo de disponibilidade por equipamento e série temporal"""
+
+    start = datetime(2025, 1, 1)
+    end = datetime(2025, 1, 11)  # 240 h
+
+    def test_overlapping_orders_count_once(self):
+        rows = [
+            (1, datetime(2025, 1, 2, 8), datetime(2025, 1, 2, 20)),
+            (1, datetime(2025, 1, 2, 10), datetime(2025, 1, 2, 14)),
+            (1, datetime(2024, 12, 31, 12), datetime(2025, 1, 1, 12)),  # recortada na janela
+        ]
+        result = compute_availability(rows, [1, 2], self.start, self.end)
+        assert result["equipments"][1]["downtime_hours"] == 24.0
+        assert result["equipments"][1]["availability_percent"] == pytest.approx(90.0)
+        assert result["equipments"][2]["availability_percent"] == 100.0
+
+    def test_open_order_until_cutoff(self):
+        rows = [(1, datetime(2025, 1, 10), None)]
+        result = compute_availability(rows, [1], self.start, self.end, open_until=datetime(2025, 1, 10, 12))
+        assert result["equipments"][1]["downtime_hours"] == 12.0
+
+    def test_downtime_outside_shift_is_ignored(self):
+        cal = OperatingCalendar([(8 * 60, 18 * 60)])
+        rows = [(1, datetime(2025, 1, 2, 0), datetime(2025, 1, 2, 12))]
+        result = compute_availability(rows, [1], self.start, self.end, calendar=cal)
+        assert result["operating_hours"] == 100.0
+        assert result["equipments"][1]["downtime_hours"] == 4.0
+        assert result["equipments"][1]["availability_percent"] == pytest.approx(96.0)
+
+    def test_series_by_day_and_month(self):
+        rows = [(1, datetime(2025, 1, 31, 12), datetime(2025, 2, 1, 12))]
+        start, end = datetime(2025, 1, 30), datetime(2025, 2, 3)
+        result = compute_availability(rows, [1, 2], start, end, granularity="day")
+        assert [p["period"] for p in result["series"]] == ["2025-01-30", "2025-01-31", "2025-02-01", "2025-02-02"]
+        assert [p["downtime_hours"] for p in result["series"]] == [0.0, 12.0, 12.0, 0.0]
+        assert result["series"][1]["availability_percent"] == 75.0
+
+        monthly = compute_availability(rows, [1, 2], start, end, granularity="month")
+        assert [(p["period"], p["operating_hours"], p["downtime_hours"]) for p in monthly["series"]] == [
+            ("2025-01-01", 96.0, 12.0),
+            ("2025-02-01", 96.0, 12.0),
+        ]
+
+    def test_week_buckets_are_clipped(self):
+        buckets = period_buckets(datetime(2025, 1, 1), datetime(2025, 1, 15), "week")
+        assert [b[0] for b in buckets] == ["2024-12-30", "2025-01-06", "2025-01-13"]
+        assert buckets[0][1] == datetime(2025, 1, 1) and buckets[-1][2] == datetime(2025, 1, 15)
+        assert sum((b[2] - b[1] for b in buckets), timedelta()) == timedelta(days=14)
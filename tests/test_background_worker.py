@@ -0,0 +1,88 @@
+"""
+Testes da base das tarefas de fundo (passo, aviso, falhas e parada)
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.background_worker import BackgroundWorker
+
+
+class Counter(BackgroundWorker):
+    """Conta os passos; falha no passo indicado"""
+
+    error_message = "Falha no contador"
+
+    def __init__(self, seconds: float = 60, fail_on: int = -1):
+        super().__init__()
+        self.seconds = seconds
+        self.fail_on = fail_on
+        self.steps = 0
+
+    def interval(self) -> float:
+        return self.seconds
+
+    async def step(self) -> None:
+        self.steps += 1
+        if self.steps == self.fail_on:
+            raise RuntimeError("passo com defeito")
+
+
+class TestBackgroundWorker:
+    """Ciclo passo/espera, notify e stop"""
+
+    def test_notify_runs_next_step_without_waiting(self):
+        async def scenario():
+            worker = Counter(seconds=60)
+            worker.start()
+            await asyncio.sleep(0.01)
+            worker.notify()
+            await asyncio.sleep(0.01)
+            await worker.stop()
+            return worker
+
+        worker = asyncio.run(scenario())
+        assert worker.steps == 2 and not worker.running
+
+    def test_failing_step_keeps_loop_alive(self, capsys):
+        async def scenario():
+            worker = Counter(seconds=0.01, fail_on=1)
+            worker.start()
+            await asyncio.sleep(0.05)
+            await worker.stop()
+            return worker.steps
+
+        assert asyncio.run(scenario()) > 1
+        assert "Falha no contador: passo com defeito" in capsys.readouterr().out
+
+    def test_cancel_right_after_wake(self):
+        """A tarefa termina mesmo quando o cancelamento chega junto do aviso"""
+        async def scenario(delay):
+            worker = Counter(seconds=0.05)
+            worker.start()
+            loop = asyncio.get_running_loop()
+            await asyncio.sleep(0)
+            worker.notify()
+
+            def cancel_after(n):
+                if n:
+                    loop.call_soon(cancel_after, n - 1)
+                else:
+                    worker.cancel()
+
+            task = worker._task
+            cancel_after(delay)
+            await asyncio.sleep(0.2)
+            return task.done()
+
+        for delay in range(5):
+            assert asyncio.run(scenario(delay)), delay
+
+    def test_subclass_must_define_step_and_interval(self):
+        class NoStep(BackgroundWorker):
+            def interval(self) -> float:
+                return 1
+
+        with pytest.raises(TypeError):
+            NoStep()
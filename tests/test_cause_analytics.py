@@ -0,0 +1,221 @@
+"""
+Testes da análise de causas de falha (tokenização, estatísticas incrementais, ranking TF-IDF)
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.database import get_db
+from app.models.cause_stats import CauseTermStat, WorkOrderTerms
+from app.models.equipment import Equipment
+from app.models.maintenance import WorkOrder
+from app.routers import reports
+from app.services import cause_analytics
+from app.services.cause_analytics import order_terms, stem, tokenize
+from app.services.rate_limit import rate_limiter
+from tests.db import override_get_db
+
+reports_app = FastAPI()
+reports_app.include_router(reports.router, prefix="/api/reports")
+reports_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(reports_app)
+
+
+def _equipment(db, prefix, category):
+    eq = Equipment(prefix=prefix, name=f"{category} {prefix}", category=category)
+    db.add(eq)
+    db.flush()
+    return eq
+
+
+def _work_order(db, eq, number, title, description=None, status="Fechada", type="Corretiva",
+                days_ago=5, cost=0.0):
+    wo = WorkOrder(number=str(number), title=title, description=description, type=type, cost=cost,
+                   equipment_id=eq.id, status=status,
+                   completed_at=datetime.now() - timedelta(days=days_ago) if status == "Fechada" else None)
+    db.add(wo)
+    return wo
+
+
+def _stats(db):
+    """{(categoria, termo): (OS, custo)} somando os meses"""
+    totals = {}
+    for row in db.execute(select(CauseTermStat)).scalars():
+        orders, cost = totals.get((row.category, row.term), (0, 0.0))
+        totals[(row.category, row.term)] = (orders + row.orders, round(cost + row.cost, 2))
+    return totals
+
+
+def _recount(db):
+    """Estatísticas recalculadas do zero a partir das OS (referência)"""
+    expected = {}
+    for wo in db.query(WorkOrder).filter(WorkOrder.status == "Fechada", WorkOrder.type == "Corretiva"):
+        category = wo.equipment.category or cause_analytics.NO_CATEGORY
+        for term in [cause_analytics.TOTAL] + order_terms(wo.title, wo.description, wo.notes, wo.maintenance_cause):
+            orders, cost = expected.get((category, term), (0, 0.0))
+            expected[(category, term)] = (orders + 1, round(cost + (wo.cost or 0.0), 2))
+    return expected
+
+
+@pytest.fixture(scope="function")
+def seeded(db_session):
+    """Escavadeiras com problemas hidráulicos, caminhões com superaquecimento"""
+    db = db_session
+    esc = _equipment(db, "ESC-01", "Escavadeira")
+    cam = _equipment(db, "CAM-01", "Caminhão")
+    for n in range(6):
+        _work_order(db, esc, 1000 + n, "Vazamento na bomba hidráulica", "Vedação substituída", cost=500)
+    for n in range(2):
+        _work_order(db, esc, 1100 + n, "Radiador entupido", "Limpeza do radiador", cost=200)
+    for n in range(8):
+        _work_order(db, cam, 1200 + n, "Superaquecimento do motor", "Radiador obstruído, ventoinha quebrada", cost=300)
+    _work_order(db, cam, 1300, "Vazamento no cilindro hidráulico", cost=100)
+    _work_order(db, esc, 1400, "Bomba hidráulica antiga", days_ago=500, cost=1000)
+    _work_order(db, esc, 1401, "Bomba hidráulica em aberto", status="Aberta")
+    _work_order(db, esc, 1402, "Troca preventiva da bomba hidráulica", type="Preventiva")
+    db.commit()
+    return db
+
+
+class TestTokenize:
+    """Normalização em português: acentos, palavras vazias e radical aproximado"""
+
+    def test_inflections_share_stem(self):
+        assert stem("vazamentos") == stem("vazamento")
+        assert stem("hidraulica") == stem("hidraulico")
+        assert stem("injecoes") == stem("injecao")
+        assert stem("radiadores") == stem("radiador")
+        assert stem("bombas") == stem("bomba") == "bomba"
+
+    def test_accents_stopwords_and_numbers(self):
+        assert tokenize("Vazamento HIDRÁULICO na bomba da 320D, OS 100234") == {
+            stem("vazamento"), stem("hidraulico"), "bomba", "320d"}
+
+    def test_causes_are_terms(self):
+        terms = order_terms("Superaquecimento", "radiador obstruído")
+        assert "causa:superaquecimento" in terms
+
+
+class TestIncrementalStats:
+    """Estatísticas atualizadas no flush: só OS corretivas fechadas, desfazendo a contribuição anterior"""
+
+    def test_only_closed_corrective_orders(self, seeded):
+        stats = _stats(seeded)
+        assert stats[("Escavadeira", "")] == (9, 4400.0)
+        assert stats[("Caminhão", "")] == (9, 2500.0)
+        assert stats[("Escavadeira", "causa:hidraulico")] == (7, 4000.0)
+        assert stats == _recount(seeded)
+
+    def test_close_edit_reopen_and_delete(self, seeded):
+        esc = seeded.query(Equipment).filter(Equipment.prefix == "ESC-01").one()
+        wo = _work_order(seeded, esc, 2000, "Esteira frouxa", status="Aberta")
+        seeded.commit()
+        assert ("Escavadeira", stem("esteira")) not in _stats(seeded)
+
+        wo.status, wo.completed_at, wo.cost = "Fechada", datetime.now(), 150.0
+        seeded.commit()
+        assert _stats(seeded)[("Escavadeira", stem("esteira"))] == (1, 150.0)
+
+        wo.title = "Corrente da esteira"
+        wo.cost = 180.0
+        seeded.commit()
+        assert _stats(seeded)[("Escavadeira", stem("corrente"))] == (1, 180.0)
+        assert _stats(seeded)[("Escavadeira", "")] == (10, 4580.0)
+        assert ("Escavadeira", stem("frouxa")) not in _stats(seeded)
+
+        wo.status, wo.completed_at = "Aberta", None
+        seeded.commit()
+        assert ("Escavadeira", stem("esteira")) not in _stats(seeded)
+        assert seeded.get(WorkOrderTerms, wo.id) is None
+
+        wo.status, wo.completed_at = "Fechada", datetime.now()
+        seeded.commit()
+        seeded.delete(wo)
+        seeded.commit()
+        assert _stats(seeded) == _recount(seeded)
+
+    def test_rollback_discards(self, seeded):
+        before = _stats(seeded)
+        esc = seeded.query(Equipment).filter(Equipment.prefix == "ESC-01").one()
+        _work_order(seeded, esc, 2001, "Trinca na caçamba")
+        seeded.flush()
+        seeded.rollback()
+        assert _stats(seeded) == before
+
+    def test_category_change_and_bulk_writes(self, seeded):
+        cam = seeded.query(Equipment).filter(Equipment.prefix == "CAM-01").one()
+        cam.category = "Caminhão Basculante"
+        seeded.commit()
+        assert ("Caminhão", "") not in _stats(seeded)
+        assert _stats(seeded)[("Caminhão Basculante", "")] == (9, 2500.0)
+
+        seeded.query(WorkOrder).filter(WorkOrder.title == "Radiador entupido").update({"cost": 250.0})
+        seeded.query(WorkOrder).filter(WorkOrder.title.like("Superaquecimento%")).delete(synchronize_session=False)
+        seeded.commit()
+        assert _stats(seeded) == _recount(seeded)
+        assert _stats(seeded)[("Caminhão Basculante", "")] == (1, 100.0)
+
+    def test_backfill_processes_missing_orders(self, seeded, db_engine):
+        seeded.execute(WorkOrderTerms.__table__.delete())
+        seeded.execute(CauseTermStat.__table__.delete())
+        seeded.commit()
+        assert cause_analytics.backfill(db_engine) == 18
+        assert _stats(seeded) == _recount(seeded)
+        assert cause_analytics.backfill(db_engine) == 0
+
+
+class TestRanking:
+    """Ranking por categoria e período: TF-IDF, lift, contagens e custos"""
+
+    def test_category_specific_causes_rank_first(self, seeded):
+        now = datetime.now()
+        esc = cause_analytics.rank_causes(seeded, "Escavadeira", now - timedelta(days=365), now)
+        assert esc["orders"] == 8
+        assert esc["causes"][0]["cause"] == "hidraulico"
+        assert esc["causes"][0]["orders"] == 6 and esc["causes"][0]["cost"] == 3000.0
+        assert esc["causes"][0]["lift"] > 1
+        assert esc["terms"][0]["term"] in (stem("vazamento"), "bomba", stem("hidraulica"), stem("vedacao"))
+
+        cam = cause_analytics.rank_causes(seeded, "Caminhão", now - timedelta(days=365), now)
+        assert cam["causes"][0]["cause"] == "superaquecimento"
+        radiator = {t["term"]: t for t in cam["terms"]}[stem("radiador")]
+        assert radiator["orders"] == 8 and radiator["lift"] > 1
+
+    def test_period_and_min_orders(self, seeded):
+        old = datetime.now() - timedelta(days=500)
+        ranking = cause_analytics.rank_causes(seeded, "Escavadeira", old, old, min_orders=1)
+        assert ranking["orders"] == 1
+        assert ranking["period"]["start"] == date(old.year, old.month, 1).isoformat()
+        assert {t["term"] for t in ranking["terms"]} == {"bomba", stem("hidraulica"), stem("antiga")}
+        assert cause_analytics.rank_causes(seeded, "Guindaste", old, old)["causes"] == []
+
+    def test_chat_ranking_includes_all_causes(self, seeded):
+        ranked = reports._rank_causes_by_internal_data(seeded, "Caminhão")
+        assert ranked[0]["key"] == "superaquecimento"
+        assert ranked[0]["orders"] == 8
+        assert {item["key"] for item in ranked} == set(cause_analytics.CAUSE_KEYWORDS)
+        assert next(item for item in ranked if item["key"] == "pos_tratamento")["score"] == 0
+
+
+class TestFailureCausesEndpoint:
+    """GET /kpis/failure-causes"""
+
+    def test_endpoint(self, seeded, monkeypatch):
+        monkeypatch.setattr(rate_limiter, "enabled", False)
+        response = client.get("/api/reports/kpis/failure-causes", params={"category": "Caminhão", "limit": 3})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["category"] == "Caminhão"
+        assert data["orders"] == 9
+        assert data["causes"][0]["cause"] == "superaquecimento"
+        assert len(data["terms"]) <= 3
+
+    def test_invalid_period(self, seeded, monkeypatch):
+        monkeypatch.setattr(rate_limiter, "enabled", False)
+        response = client.get("/api/reports/kpis/failure-causes",
+                              params={"start_date": "2025-06-01", "end_date": "2025-01-01"})
+        assert response.status_code == 400
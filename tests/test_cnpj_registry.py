@@ -0,0 +1,189 @@
+"""
+Testes da validação de CNPJ offline (dígitos verificadores, cache, atualização em segundo plano)
+com um servidor HTTP local no lugar da BrasilAPI
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.cnpj_cache import CnpjCache
+from app.models.warehouse import Supplier
+from app.routers import maintenance, warehouse
+from app.services import cnpj_registry
+from app.services.cnpj_registry import CnpjRefresher, RemoteLookup
+from app.services.rate_limit import rate_limiter
+from tests.db import TestingSessionLocal, override_get_db
+
+cnpj_app = FastAPI()
+cnpj_app.include_router(maintenance.router, prefix="/api/maintenance")
+cnpj_app.include_router(warehouse.router, prefix="/api/warehouse")
+cnpj_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(cnpj_app)
+
+URL = "/api/maintenance/equipment/validate-cnpj"
+BULK_URL = "/api/warehouse/api/suppliers/validate-cnpj"
+
+ACME, PETRO, BANCO, OUTRO = "11222333000181", "33000167000101", "00000000000191", "60746948000112"
+
+registry = {ACME: {"razao_social": "ACME PECAS LTDA", "uf": "MG"},
+            PETRO: {"razao_social": "PETROLEO BRASILEIRO S A PETROBRAS"}}
+requests_seen = []
+
+
+class StubBrasilAPI(BaseHTTPRequestHandler):
+    """GET /api/cnpj/v1/{cnpj}: 200 com o cadastro, 404 fora dele"""
+
+    def do_GET(self):
+        digits = self.path.rsplit("/", 1)[-1]
+        requests_seen.append(digits)
+        data = registry.get(digits)
+        body = json.dumps(data if data else {"message": "CNPJ não encontrado"}).encode()
+        self.send_response(200 if data else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    """Servidor HTTP local (porta livre) no lugar da BrasilAPI"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBrasilAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/cnpj/v1/{{cnpj}}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="function")
+def db_session(db_session, monkeypatch, stub_server):
+    """Sessão de teste com a consulta externa apontada para o servidor local"""
+    monkeypatch.setattr(rate_limiter, "enabled", False)
+    monkeypatch.setenv("CNPJ_LOOKUP_ENABLED", "1")
+    monkeypatch.setattr(cnpj_registry, "LOOKUP_URL", stub_server)
+    monkeypatch.setattr(cnpj_registry, "remote", RemoteLookup())
+    monkeypatch.setattr(cnpj_registry, "refresher", CnpjRefresher(session_factory=TestingSessionLocal))
+    requests_seen.clear()
+    cnpj_registry.stats.clear()
+    return db_session
+
+
+def _go_offline(monkeypatch):
+    """Porta sem servidor: conexão recusada"""
+    monkeypatch.setattr(cnpj_registry, "LOOKUP_URL", "http://127.0.0.1:9/api/cnpj/v1/{cnpj}")
+
+
+class TestCheckDigits:
+    """Dígitos verificadores conferidos sem I/O"""
+
+    def test_valid_and_invalid(self):
+        assert all(cnpj_registry.is_valid_cnpj(d) for d in (ACME, PETRO, BANCO, OUTRO))
+        assert not cnpj_registry.is_valid_cnpj("11222333000182")
+        assert not cnpj_registry.is_valid_cnpj("11111111111111")
+        assert not cnpj_registry.is_valid_cnpj("1122233300018")
+        assert cnpj_registry.only_digits("11.222.333/0001-81") == ACME
+        assert cnpj_registry.format_cnpj(ACME) == "11.222.333/0001-81"
+
+    def test_malformed_rejected_without_lookup(self, db_session):
+        data = client.get(URL, params={"cnpj": "11.222.333/0001-82"}).json()
+        assert data["valid"] is False and data["status"] == "invalid"
+        assert requests_seen == []
+        assert client.get(URL, params={"cnpj": "123"}).status_code == 400
+
+
+class TestValidateEndpoint:
+    """Cache: acerto, ausência (consulta externa), vencido e sem rede"""
+
+    def test_miss_then_hit(self, db_session):
+        data = client.get(URL, params={"cnpj": "11.222.333/0001-81"}).json()
+        assert data["valid"] is True and data["source"] == "remote"
+        assert data["company_name"] == "ACME PECAS LTDA" and data["raw"]["uf"] == "MG"
+        again = client.get(URL, params={"cnpj": ACME}).json()
+        assert again["source"] == "cache" and again["verified"] is True and again["stale"] is False
+        assert again["company_name"] == "ACME PECAS LTDA"
+        assert requests_seen == [ACME]
+
+        # "Não encontrado" também fica no cache
+        assert client.get(URL, params={"cnpj": OUTRO}).json()["error"] == "CNPJ não encontrado"
+        cached = client.get(URL, params={"cnpj": OUTRO}).json()
+        assert (cached["valid"], cached["source"]) == (False, "cache")
+        assert requests_seen == [ACME, OUTRO]
+
+    def test_stale_served_and_refreshed_in_background(self, db_session):
+        db_session.add(CnpjCache(cnpj=PETRO, company_name="PETROBRAS (antigo)", status="active",
+                                 source="brasilapi", expires_at=datetime.utcnow() - timedelta(days=1)))
+        db_session.commit()
+        data = client.get(URL, params={"cnpj": PETRO}).json()
+        assert data["stale"] is True and data["company_name"] == "PETROBRAS (antigo)"
+        assert requests_seen == []
+        assert cnpj_registry.refresher.pending == {PETRO}
+
+        assert cnpj_registry.refresher.refresh_batch() == {"checked": 1, "refreshed": 1}
+        fresh = client.get(URL, params={"cnpj": PETRO}).json()
+        assert fresh["stale"] is False and fresh["company_name"] == "PETROLEO BRASILEIRO S A PETROBRAS"
+        assert requests_seen == [PETRO]
+
+    def test_offline_returns_unverified(self, db_session, monkeypatch):
+        _go_offline(monkeypatch)
+        data = client.get(URL, params={"cnpj": ACME}).json()
+        assert data["valid"] is True and data["verified"] is False and data["source"] == "offline"
+        assert cnpj_registry.stats["offline"] == 1
+        # Enquanto desligada, nem tenta a rede
+        client.get(URL, params={"cnpj": PETRO})
+        assert cnpj_registry.stats["remote_calls"] == 1
+        assert cnpj_registry.refresher.refresh_batch() == {"checked": 0, "refreshed": 0}
+        assert cnpj_registry.refresher.pending == {ACME, PETRO}
+
+    def test_disabled_never_calls_remote(self, db_session, monkeypatch):
+        monkeypatch.setenv("CNPJ_LOOKUP_ENABLED", "0")
+        data = client.get(URL, params={"cnpj": ACME}).json()
+        assert data["status"] == "unverified"
+        assert requests_seen == [] and cnpj_registry.refresher.pending == set()
+
+
+class TestSuppliers:
+    """Semeadura pelos fornecedores e validação em lote da importação"""
+
+    def test_seed_and_bulk_validation(self, db_session, monkeypatch, stub_server):
+        db_session.add_all([Supplier(name="Acme Peças", cnpj="11.222.333/0001-81"),
+                            Supplier(name="Sem CNPJ válido", cnpj="123")])
+        db_session.commit()
+        assert cnpj_registry.seed_from_suppliers(db_session) == 1
+        db_session.commit()
+        assert cnpj_registry.seed_from_suppliers(db_session) == 0
+
+        _go_offline(monkeypatch)
+        response = client.post(BULK_URL, json={"cnpjs": ["11.222.333/0001-81", PETRO, "11222333000182", PETRO]})
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["input"] for r in data["results"]] == ["11.222.333/0001-81", PETRO, "11222333000182", PETRO]
+        assert data["results"][0]["company_name"] == "Acme Peças" and data["results"][0]["status"] == "local"
+        assert data["summary"] == {"valid": 0, "invalid": 1, "not_found": 0, "unverified": 3}
+        assert requests_seen == []
+        assert cnpj_registry.refresher.pending == {ACME, PETRO}
+
+        assert client.post(BULK_URL, json={"cnpjs": []}).status_code == 400
+
+        # Com a rede de volta, a atualização confirma os dois
+        monkeypatch.setattr(cnpj_registry, "LOOKUP_URL", stub_server)
+        assert cnpj_registry.refresher.refresh_batch() == {"checked": 2, "refreshed": 2}
+        results = client.post(BULK_URL, json={"cnpjs": [ACME, PETRO]}).json()["results"]
+        assert [r["company_name"] for r in results] == ["ACME PECAS LTDA", "PETROLEO BRASILEIRO S A PETROBRAS"]
+
+    def test_create_supplier_fills_cache(self, db_session):
+        response = client.post("/api/warehouse/api/suppliers", json={"name": "Petrobras", "cnpj": "33.000.167/0001-01"})
+        assert response.status_code == 200
+        data = client.get(URL, params={"cnpj": PETRO}).json()
+        assert data["company_name"] == "Petrobras" and data["source"] == "cache"
+        assert requests_seen == []
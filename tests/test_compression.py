@@ -0,0 +1,109 @@
+"""
+Testes do middleware de compressão gzip/brotli
+"""
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.services import compression
+from app.services.compression import CompressionMiddleware, choose_encoding
+
+ROWS = [{"code": str(100000 + i), "name": f"Material {i}", "unit": "UN", "current_stock": i % 50} for i in range(300)]
+
+compress_app = FastAPI()
+compress_app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+
+@compress_app.get("/materials")
+async def materials():
+    return JSONResponse(ROWS, headers={"ETag": '"abc"'})
+
+
+@compress_app.get("/small")
+async def small():
+    return {"ok": True}
+
+
+@compress_app.get("/page")
+async def page():
+    return HTMLResponse("<html><body>" + "<p>Ordem de serviço</p>" * 200 + "</body></html>")
+
+
+@compress_app.get("/pdf")
+async def pdf():
+    return Response(b"%PDF-1.4 " + b"0" * 5000, media_type="application/pdf")
+
+
+@compress_app.get("/export.csv")
+async def export_csv():
+    def rows():
+        yield "codigo;nome\n"
+        for row in ROWS:
+            yield f"{row['code']};{row['name']}\n"
+    return StreamingResponse(rows(), media_type="text/csv")
+
+
+@compress_app.get("/events")
+async def events():
+    def stream():
+        yield "data: " + "x" * 4000 + "\n\n"
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+client = TestClient(compress_app)
+
+
+def _get(path, encoding):
+    return client.get(path, headers={"Accept-Encoding": encoding})
+
+
+class TestEncodingNegotiation:
+    """Escolha da codificação pelo Accept-Encoding"""
+
+    def test_choose_encoding(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", object())
+        assert choose_encoding("gzip, deflate, br") == "br"
+        assert choose_encoding("br;q=0, gzip") == "gzip"
+        assert choose_encoding("identity") is None
+        monkeypatch.setattr(compression, "brotli", None)
+        assert choose_encoding("br, gzip;q=0.5") == "gzip"
+        assert choose_encoding("br") is None
+
+
+class TestCompressionMiddleware:
+    """Limiar de tamanho, tipos permitidos e streaming"""
+
+    def test_json_is_gzipped(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        response = _get("/materials", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert response.headers["etag"] == 'W/"abc"'
+        assert response.json() == ROWS
+        assert int(response.headers["content-length"]) < len(json.dumps(ROWS)) / 4
+
+    @pytest.mark.skipif(compression.brotli is None, reason="brotli não instalado")
+    def test_brotli_when_available(self):
+        response = _get("/page", "gzip, br")
+        assert response.headers["content-encoding"] == "br"
+        assert "Ordem de serviço" in response.text
+
+    def test_small_and_unlisted_types_pass_through(self):
+        assert "content-encoding" not in _get("/small", "gzip").headers
+        pdf = _get("/pdf", "gzip")
+        assert "content-encoding" not in pdf.headers
+        assert pdf.content.startswith(b"%PDF")
+        assert "content-encoding" not in _get("/events", "gzip").headers
+        assert "content-encoding" not in _get("/materials", "identity").headers
+
+    def test_streaming_response(self, monkeypatch):
+        monkeypatch.setattr(compression, "brotli", None)
+        response = _get("/export.csv", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        lines = response.text.splitlines()
+        assert lines[0] == "codigo;nome" and len(lines) == len(ROWS) + 1
@@ -0,0 +1,198 @@
+"""
+Testes da caixa de saída de e-mails contra um servidor SMTP local (socket, sem rede)
+"""
+
+import json
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.admin import AuditLog, ErrorLog
+from app.models.email_outbox import EmailOutbox
+from app.routers import admin
+from app.services.email_outbox import EmailSender, backoff_seconds, enqueue_email
+from tests.db import TestingSessionLocal, override_get_db
+
+admin_app = FastAPI()
+admin_app.include_router(admin.router, prefix="/api/admin")
+admin_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(admin_app)
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Diálogo SMTP mínimo: EHLO com AUTH, MAIL, RCPT (com rejeição configurável) e DATA."""
+
+    def _reply(self, text):
+        self.wfile.write(text.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self._reply("220 stub ESMTP")
+        rcpts = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self._reply("250-stub\r\n250 AUTH PLAIN LOGIN")
+            elif verb == "HELO":
+                self._reply("250 stub")
+            elif verb == "AUTH":
+                self._reply("235 autenticado")
+            elif verb == "MAIL":
+                rcpts = []
+                self._reply("250 ok")
+            elif verb == "RCPT":
+                address = command[command.index("<") + 1:command.index(">")]
+                if address in server.reject:
+                    self._reply("550 usuario inexistente")
+                else:
+                    rcpts.append(address)
+                    self._reply("250 ok")
+            elif verb == "DATA":
+                self._reply("354 envie")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data.append(chunk.decode())
+                server.messages.append((rcpts, "".join(data)))
+                self._reply("250 aceito")
+            elif verb == "QUIT":
+                self._reply("221 tchau")
+                return
+            else:
+                self._reply("250 ok")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, reject=()):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.reject = set(reject)
+
+    def config(self):
+        return {"server": "127.0.0.1", "port": self.server_address[1], "username": "u", "password": "p",
+                "from": "pcm@example.com", "starttls": False}
+
+
+@pytest.fixture
+def smtp_stub():
+    stub = SMTPStub(reject={"ninguem@example.com"})
+    thread = threading.Thread(target=stub.serve_forever, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.server_close()
+
+
+def _credentials(db, to, username="operador"):
+    return enqueue_email(db, to=to, subject="Credenciais", template="temp_credentials.txt",
+                         context={"username": username, "password": "mtdl123456", "link": "/admin/login"})
+
+
+class TestRequestPath:
+    """A requisição apenas enfileira"""
+
+    def test_register_enqueues_without_smtp(self, db_session, smtp_stub):
+        response = client.post("/api/admin/auth/register", json={"username": "novo", "email": "novo@example.com"})
+        assert response.status_code == 200
+        item = db_session.query(EmailOutbox).one()
+        assert (item.status, item.to_address, item.template) == ("pending", "novo@example.com", "temp_credentials.txt")
+        assert json.loads(item.context)["password"] == response.json()["temp_password"]
+        assert smtp_stub.connections == 0
+
+    def test_without_recipient_nothing_is_queued(self, db_session):
+        assert enqueue_email(db_session, to=None, subject="x", body="y") is None
+        assert db_session.query(EmailOutbox).count() == 0
+
+
+class TestSender:
+    """Lote numa conexão, templates, rejeições, backoff e mensagens mortas"""
+
+    def test_batch_uses_one_connection_and_renders_template_once(self, db_session, smtp_stub, monkeypatch):
+        for i in range(3):
+            _credentials(db_session, f"op{i}@example.com", username=f"op{i}")
+        enqueue_email(db_session, to="chefe@example.com", subject="Aviso", body="Texto livre")
+        sender = EmailSender(session_factory=TestingSessionLocal, config_provider=smtp_stub.config)
+        loads = []
+        original = sender.template_env.get_template
+        monkeypatch.setattr(sender.template_env, "get_template", lambda name: loads.append(name) or original(name))
+
+        assert sender.send_batch() == {"claimed": 4, "sent": 4, "failed": 0}
+        assert smtp_stub.connections == 1
+        assert loads == ["temp_credentials.txt"]
+        bodies = {rcpts[0]: data for rcpts, data in smtp_stub.messages}
+        assert "Login: op1" in bodies["op1@example.com"] and "Texto livre" in bodies["chefe@example.com"]
+
+        db_session.expire_all()
+        items = db_session.query(EmailOutbox).all()
+        assert {i.status for i in items} == {"sent"}
+        assert all(i.context is None for i in items)
+        assert db_session.query(AuditLog).filter(AuditLog.action == "email_sent").count() == 4
+
+    def test_templates_found_outside_project_dir(self, db_session, smtp_stub, tmp_path, monkeypatch):
+        # Executável (PyInstaller) roda de qualquer pasta: templates vêm de TEMPLATES_DIR
+        _credentials(db_session, "op@example.com")
+        monkeypatch.chdir(tmp_path)
+        sender = EmailSender(session_factory=TestingSessionLocal, config_provider=smtp_stub.config)
+        assert sender.send_batch()["sent"] == 1
+        assert "Login: operador" in smtp_stub.messages[0][1]
+
+    def test_rejected_recipient_is_dead_letter(self, db_session, smtp_stub):
+        _credentials(db_session, "ninguem@example.com")
+        _credentials(db_session, "ok@example.com")
+        sender = EmailSender(session_factory=TestingSessionLocal, config_provider=smtp_stub.config)
+        assert sender.send_batch()["sent"] == 1
+        db_session.expire_all()
+        dead = db_session.query(EmailOutbox).filter(EmailOutbox.to_address == "ninguem@example.com").one()
+        assert dead.status == "dead" and dead.context is None
+        assert db_session.query(ErrorLog).filter(ErrorLog.error_type == "email_send_failure").count() == 1
+
+    def test_unreachable_server_retries_with_backoff(self, db_session, smtp_stub):
+        config = dict(smtp_stub.config(), port=1)  # porta fechada: conexão recusada
+        now = datetime(2025, 1, 6, 8, 0)
+        clock = {"now": now}
+        sender = EmailSender(session_factory=TestingSessionLocal, config_provider=lambda: config,
+                             clock=lambda: clock["now"], max_attempts=3, retry_seconds=60)
+        item = _credentials(db_session, "op@example.com")
+        item.next_attempt_at = now
+        db_session.commit()
+
+        assert sender.send_batch()["failed"] == 1
+        db_session.expire_all()
+        item = db_session.query(EmailOutbox).one()
+        assert (item.status, item.attempts, item.next_attempt_at) == ("pending", 1, now + timedelta(seconds=60))
+
+        # Antes do horário agendado nada é reservado
+        assert sender.send_batch()["claimed"] == 0
+        clock["now"] = now + timedelta(seconds=60)
+        sender.send_batch()
+        db_session.expire_all()
+        assert db_session.query(EmailOutbox).one().next_attempt_at == clock["now"] + timedelta(seconds=120)
+
+        clock["now"] += timedelta(seconds=120)
+        sender.send_batch()
+        db_session.expire_all()
+        assert db_session.query(EmailOutbox).one().status == "dead"
+        assert [backoff_seconds(n, 60) for n in (1, 2, 3)] == [60, 120, 240]
+
+    def test_without_config_sends_stub_and_audits(self, db_session):
+        _credentials(db_session, "op@example.com")
+        sender = EmailSender(session_factory=TestingSessionLocal, config_provider=lambda: None)
+        assert sender.drain() == 1
+        audit = db_session.query(AuditLog).one()
+        assert "Login: operador" in audit.changes
@@ -0,0 +1,143 @@
+"""
+Testes do feed SSE (caixa de saída de eventos e fluxo por cliente)
+"""
+
+import asyncio
+import json
+
+from app.models.event_outbox import OutboxEvent
+from app.models.equipment import Equipment
+from app.models.maintenance import WorkOrder
+from app.services.event_bus import EventBus, event_stream, coalesce, parse_last_event_id
+from tests.db import TestingSessionLocal
+
+
+def _work_order(db, number="OS-001"):
+    eq = db.query(Equipment).first()
+    if not eq:
+        eq = Equipment(prefix="EQ001", name="Equipamento")
+        db.add(eq)
+        db.commit()
+    wo = WorkOrder(number=number, title="Troca de filtro", type="Corretiva", equipment_id=eq.id)
+    db.add(wo)
+    db.commit()
+    return wo
+
+
+def _parse(chunks):
+    """Converter blocos SSE em (evento, id, dados)."""
+    parsed = []
+    for chunk in chunks:
+        fields = dict(line.split(": ", 1) for line in chunk.strip().split("\n") if ": " in line and not line.startswith(":"))
+        if "data" in fields:
+            parsed.append((fields.get("event"), int(fields["id"]) if "id" in fields else None, json.loads(fields["data"])))
+    return parsed
+
+
+async def _collect(gen, count):
+    chunks = []
+    async for chunk in gen:
+        chunks.append(chunk)
+        if len(chunks) >= count:
+            break
+    await gen.aclose()
+    return chunks
+
+
+class TestOutbox:
+    """Publicação na caixa de saída junto com a transação"""
+
+    def test_commit_writes_events(self, db_session):
+        wo = _work_order(db_session)
+        wo.status = "Em andamento"
+        db_session.commit()
+        rows = db_session.query(OutboxEvent).order_by(OutboxEvent.id).all()
+        assert [(r.topic, r.action, r.entity_id) for r in rows] == [
+            ("work_orders", "created", wo.id),
+            ("work_orders", "updated", wo.id),
+        ]
+
+    def test_rollback_discards_events(self, db_session):
+        eq = Equipment(prefix="EQ001", name="Equipamento")
+        db_session.add(eq)
+        db_session.commit()
+        db_session.add(WorkOrder(number="OS-001", title="X", type="Corretiva", equipment_id=eq.id))
+        db_session.flush()
+        db_session.rollback()
+        assert db_session.query(OutboxEvent).count() == 0
+
+    def test_unpublished_entities_are_ignored(self, db_session):
+        db_session.add(Equipment(prefix="EQ001", name="Equipamento"))
+        db_session.commit()
+        assert db_session.query(OutboxEvent).count() == 0
+
+
+class TestCoalesce:
+    def test_groups_by_topic_and_action(self):
+        events = [
+            {"id": 1, "topic": "work_orders", "action": "created", "entity_id": 5},
+            {"id": 2, "topic": "work_orders", "action": "updated", "entity_id": 5},
+            {"id": 3, "topic": "work_orders", "action": "updated", "entity_id": 5},
+            {"id": 4, "topic": "fuelings", "action": "created", "entity_id": 9},
+        ]
+        assert coalesce(events) == {
+            "topics": {"work_orders": {"created": [5], "updated": [5]}, "fuelings": {"created": [9]}},
+            "last_event_id": 4,
+        }
+
+    def test_parse_last_event_id(self):
+        assert parse_last_event_id("42") == 42
+        assert parse_last_event_id("") is None
+        assert parse_last_event_id("abc") is None
+
+
+class TestEventStream:
+    """Fluxo SSE: deltas agrupados, heartbeat e retomada"""
+
+    def test_live_delta_is_coalesced(self, db_session):
+        bus = EventBus(session_factory=TestingSessionLocal, poll_seconds=0.01)
+
+        async def scenario():
+            gen = event_stream(bus, coalesce_seconds=0.1, heartbeat_seconds=60)
+            chunks = [await gen.__anext__(), await gen.__anext__()]  # retry + ready
+            _work_order(db_session, "OS-001")
+            _work_order(db_session, "OS-002")
+            chunks.append(await gen.__anext__())
+            await gen.aclose()
+            return chunks
+
+        chunks = asyncio.run(scenario())
+        assert chunks[0].startswith("retry: ")
+        (ready, ready_id, _), (name, last_id, data) = _parse(chunks)
+        assert ready == "ready" and ready_id == 0
+        assert name == "delta"
+        assert data["topics"]["work_orders"]["created"] == [1, 2]
+        assert last_id == db_session.query(OutboxEvent.id).order_by(OutboxEvent.id.desc()).first()[0]
+        assert bus.subscribers == []
+
+    def test_resume_from_last_event_id(self, db_session):
+        first = _work_order(db_session, "OS-001")
+        _work_order(db_session, "OS-002")
+        first.status = "Fechada"
+        db_session.commit()
+        bus = EventBus(session_factory=TestingSessionLocal, poll_seconds=0.01)
+
+        chunks = asyncio.run(_collect(event_stream(bus, last_event_id=1, coalesce_seconds=0.05, heartbeat_seconds=60), 2))
+        [(name, last_id, data)] = _parse(chunks)
+        assert name == "delta" and last_id == 3
+        assert data["topics"]["work_orders"] == {"created": [2], "updated": [1]}
+
+    def test_resync_when_history_is_too_old(self, db_session, monkeypatch):
+        for i in range(3):
+            _work_order(db_session, f"OS-{i}")
+        monkeypatch.setattr("app.services.event_bus.REPLAY_LIMIT", 2)
+        bus = EventBus(session_factory=TestingSessionLocal, poll_seconds=0.01)
+
+        chunks = asyncio.run(_collect(event_stream(bus, last_event_id=0, coalesce_seconds=0.05, heartbeat_seconds=60), 2))
+        [(name, last_id, _)] = _parse(chunks)
+        assert name == "resync" and last_id == 3
+
+    def test_heartbeat_when_idle(self, db_session):
+        bus = EventBus(session_factory=TestingSessionLocal, poll_seconds=0.01)
+        chunks = asyncio.run(_collect(event_stream(bus, coalesce_seconds=0.01, heartbeat_seconds=0.03), 3))
+        assert chunks[2] == ": heartbeat\n\n"
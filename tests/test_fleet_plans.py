@@ -0,0 +1,153 @@
+"""
+Testes da geração de planos em lote para a frota (agrupamento por modelo, prévia e inserção em lote)
+"""
+
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select
+
+from app.database import get_db
+from app.models.equipment import Equipment, EquipmentTechnicalProfile
+from app.models.maintenance import MaintenancePlan, MaintenancePlanAction, MaintenancePlanMaterial
+from app.models.warehouse import Material
+from app.routers import maintenance
+from app.services import fleet_plans, knowledge_index, manual_storage
+from app.services.http_cache import current_versions
+from app.services.knowledge_index import KnowledgeIndex
+from tests.db import override_get_db
+
+maintenance_app = FastAPI()
+maintenance_app.include_router(maintenance.router, prefix="/api/maintenance")
+maintenance_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(maintenance_app)
+
+URL = "/api/maintenance/equipment/plans/generate-batch"
+
+MANUAL = ('<manual><maintenance interval="250h">'
+          "<material><name>Filtro de óleo</name><reference>FO-1</reference><quantity>2</quantity></material>"
+          "<material><name>Graxa EP2</name><reference>GR-9</reference><unit>kg</unit></material>"
+          "</maintenance></manual>")
+
+
+@pytest.fixture
+def fleet(db_session):
+    """4 escavadeiras Caterpillar 320 (grafias variadas) e 2 caminhões Volvo FMX"""
+    rows = [("ESC-01", "Caterpillar", "320", "Escavadeira"), ("ESC-02", "caterpillar ", "320", "Escavadeira"),
+            ("ESC-03", "Caterpillar", " 320", "escavadeira"), ("ESC-04", "Caterpillar", "320", "Escavadeira"),
+            ("CB-01", "Volvo", "FMX", "Caminhão Basculante"), ("CB-02", "Volvo", "FMX", "Caminhão Basculante")]
+    equipments = [Equipment(prefix=p, name=f"{c.strip()} {p}", manufacturer=m, model=mo, category=c)
+                  for p, m, mo, c in rows]
+    db_session.add_all(equipments)
+    db_session.commit()
+    return equipments
+
+
+def _count(db, model):
+    return db.execute(select(func.count()).select_from(model)).scalar()
+
+
+class TestGrouping:
+    """Agrupamento por fabricante, modelo e categoria"""
+
+    def test_groups_ignore_case_and_spacing(self, db_session, fleet):
+        groups, not_found = fleet_plans.load_groups(db_session, [eq.id for eq in fleet] + [999])
+        assert sorted(len(g.members) for g in groups) == [2, 4]
+        assert not_found == [999]
+
+
+class TestBatchEndpoint:
+    """Prévia (dry-run) e inserção em lote numa transação"""
+
+    def test_dry_run_writes_nothing(self, db_session, fleet):
+        response = client.post(URL, json={"equipment_ids": [eq.id for eq in fleet], "mode": "internet",
+                                          "dry_run": True})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["dry_run"] is True
+        assert len(data["groups"]) == 2
+        assert data["totals"]["plans"] == 12
+        assert data["totals"]["technical_profiles"] == 6
+        first = data["equipments"][0]
+        assert [p["interval_value"] for p in first["create"]] == [250, 500]
+        assert first["create"][0]["name"].endswith("(ESC-01)")
+        db_session.expire_all()
+        assert _count(db_session, MaintenancePlan) == 0
+        assert _count(db_session, EquipmentTechnicalProfile) == 0
+
+    def test_apply_inserts_per_member_and_is_repeatable(self, db_session, fleet):
+        before = current_versions(db_session, ["maintenance_plans"])["maintenance_plans"]
+        response = client.post(URL, json={"equipment_ids": [eq.id for eq in fleet], "mode": "internet"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["plans_created"] == 12
+        db_session.expire_all()
+        plans = db_session.query(MaintenancePlan).order_by(MaintenancePlan.id).all()
+        assert len(plans) == 12
+        by_equipment = {eq.id: eq.prefix for eq in fleet}
+        assert all(p.name.endswith(f"({by_equipment[p.equipment_id]})") for p in plans)
+        assert data["equipments"][0]["plan_ids"] == [plans[0].id, plans[1].id]
+        assert _count(db_session, MaintenancePlanAction) == 12 * 4
+        assert _count(db_session, EquipmentTechnicalProfile) == 6
+        # Inserção em lote também invalida o ETag de /plans
+        assert current_versions(db_session, ["maintenance_plans"])["maintenance_plans"] > before
+
+        again = client.post(URL, json={"equipment_ids": [eq.id for eq in fleet], "mode": "internet"}).json()
+        assert again["plans_created"] == 0
+        assert again["totals"]["existing_plans"] == 12
+        assert all(e["technical_profile"] == "existing" for e in again["equipments"])
+
+    def test_apply_reaches_knowledge_index(self, db_session, db_engine, fleet, tmp_path):
+        index = knowledge_index.attach(db_engine, KnowledgeIndex(str(tmp_path / "knowledge_index.db")))
+        try:
+            response = client.post(URL, json={"equipment_ids": [fleet[0].id], "mode": "internet"})
+            assert response.status_code == 200
+            action_ids = db_session.execute(select(MaintenancePlanAction.id)).scalars().all()
+            hits = index.search("ESC-01", kinds=["plan_action"], limit=50)
+            assert sorted(int(h.ref) for h in hits) == sorted(action_ids)
+        finally:
+            knowledge_index.detach(db_engine)
+
+    def test_manual_mode_one_template_per_group(self, db_session, db_engine, fleet, tmp_path, monkeypatch):
+        monkeypatch.setattr(manual_storage, "MANUALS_DIR", str(tmp_path))
+        manual_dir = tmp_path / str(fleet[2].id)
+        manual_dir.mkdir()
+        (manual_dir / "manual_320.xml").write_text(MANUAL, encoding="utf-8")
+        db_session.add(Material(code="100000", name="Filtro de óleo 320", reference="FO-1", unit="un",
+                                minimum_stock=0, maximum_stock=10))
+        db_session.commit()
+
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db_engine, "before_cursor_execute", _record)
+        try:
+            data = client.post(URL, json={"equipment_ids": [eq.id for eq in fleet], "mode": "manual"}).json()
+        finally:
+            event.remove(db_engine, "before_cursor_execute", _record)
+
+        excavators, trucks = sorted(data["groups"], key=lambda g: -len(g["equipment_ids"]))
+        assert excavators["manual"] == "manual_320.xml"
+        assert trucks["error"] and trucks["plans"] == []
+        assert data["plans_created"] == 8
+        missing = {m["reference"]: m["plans"] for m in data["missing_materials"]}
+        assert missing["GR-9"] == 4
+        assert "FO-1" not in missing
+        # Materiais de todos os planos resolvidos numa única consulta
+        assert sum(1 for s in statements if s.lstrip().upper().startswith("SELECT") and "FROM materials" in s) == 1
+
+        db_session.expire_all()
+        links = db_session.query(MaintenancePlanMaterial).all()
+        assert len(links) == 4
+        assert {(link.quantity, link.unit) for link in links} == {(2.0, "un")}
+        truck_ids = {eq.id for eq in fleet[4:]}
+        assert not db_session.query(MaintenancePlan).filter(MaintenancePlan.equipment_id.in_(truck_ids)).count()
+
+    def test_validation(self, db_session, fleet):
+        assert client.post(URL, json={"equipment_ids": [fleet[0].id], "mode": "x"}).status_code == 400
+        assert client.post(URL, json={"equipment_ids": [], "mode": "internet"}).status_code == 400
+        assert client.post(URL, json={"equipment_ids": ["a"], "mode": "internet"}).status_code == 400
+        assert client.post(URL, json={"equipment_ids": [999], "mode": "internet"}).status_code == 404
@@ -0,0 +1,127 @@
+"""
+Testes de ETag / GET condicional (contadores por tabela, helper e middleware)
+"""
+
+from datetime import datetime
+
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.warehouse import Material, Supplier
+from app.models.admin import SessionToken
+from app.routers import warehouse
+from app.services.http_cache import current_versions, etag_matches, etag_guard, ALL_TABLES
+from main import ConditionalGetMiddleware
+from tests.db import override_get_db
+
+cache_app = FastAPI()
+cache_app.add_middleware(ConditionalGetMiddleware)
+cache_app.include_router(warehouse.router, prefix="/api/warehouse")
+cache_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(cache_app)
+
+
+def _material(db, code="100000", **kwargs):
+    material = Material(code=code, name="Filtro", unit="UN", minimum_stock=1, maximum_stock=10, current_stock=5, **kwargs)
+    db.add(material)
+    db.commit()
+    return material
+
+
+class TestTableVersions:
+    """Contadores incrementados pelos eventos de flush"""
+
+    def test_flush_bumps_table_and_global(self, db_session):
+        before = current_versions(db_session, ["materials", ALL_TABLES])
+        material = _material(db_session)
+        material.current_stock = 7
+        db_session.commit()
+        after = current_versions(db_session, ["materials", "suppliers", ALL_TABLES])
+        assert after["materials"] == before["materials"] + 2
+        assert after[ALL_TABLES] == before[ALL_TABLES] + 2
+        assert after["suppliers"] == 0
+
+    def test_bulk_update_bumps(self, db_session):
+        _material(db_session)
+        before = current_versions(db_session, ["materials"])["materials"]
+        db_session.query(Material).update({Material.current_stock: 0})
+        db_session.commit()
+        assert current_versions(db_session, ["materials"])["materials"] == before + 1
+
+    def test_rollback_and_ignored_tables(self, db_session):
+        _material(db_session)
+        before = current_versions(db_session, ["materials", ALL_TABLES])
+        material = db_session.query(Material).first()
+        material.current_stock = 1
+        db_session.flush()
+        db_session.rollback()
+        db_session.add(SessionToken(user_id=1, token_hash="abc", expires_at=datetime(2030, 1, 1)))
+        db_session.commit()
+        assert current_versions(db_session, ["materials", ALL_TABLES]) == before
+
+    def test_etag_matches(self):
+        assert etag_matches('W/"abc"', 'W/"abc"')
+        assert etag_matches('"x", W/"abc"', 'W/"abc"')
+        assert etag_matches("*", 'W/"abc"')
+        assert not etag_matches('W/"abd"', 'W/"abc"')
+        assert not etag_matches(None, 'W/"abc"')
+
+
+class TestConditionalGet:
+    """Respostas 304 do helper por endpoint e do middleware"""
+
+    def test_guarded_endpoint_returns_304(self, db_session):
+        _material(db_session)
+        first = client.get("/api/warehouse/materials/all")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        assert etag.startswith('W/"')
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        cached = client.get("/api/warehouse/materials/all", headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["etag"] == etag
+
+        # Alteração em tabela não lida pelo endpoint não invalida
+        db_session.add(Supplier(name="Fornecedor"))
+        db_session.commit()
+        assert client.get("/api/warehouse/materials/all", headers={"If-None-Match": etag}).status_code == 304
+
+        # Alteração em materials invalida
+        _material(db_session, code="100001")
+        changed = client.get("/api/warehouse/materials/all", headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert len(changed.json()) == 2
+
+    def test_handler_not_executed_on_304(self, db_session):
+        calls = []
+        mini = FastAPI()
+
+        @mini.get("/count", dependencies=[Depends(etag_guard("materials"))])
+        async def count():
+            calls.append(1)
+            return {"calls": len(calls)}
+
+        mini.dependency_overrides[get_db] = override_get_db
+        mini_client = TestClient(mini)
+        etag = mini_client.get("/count").headers["etag"]
+        assert mini_client.get("/count", headers={"If-None-Match": etag}).status_code == 304
+        assert calls == [1]
+
+    def test_query_string_is_part_of_etag(self, db_session):
+        _material(db_session)
+        a = client.get("/api/warehouse/materials", headers={"Accept": "application/json"})
+        b = client.get("/api/warehouse/materials?limit=5", headers={"Accept": "application/json"})
+        assert a.headers["etag"] != b.headers["etag"]
+
+    def test_middleware_body_hash_fallback(self, db_session):
+        _material(db_session)
+        first = client.get("/api/warehouse/materials/search?code=100000")
+        assert first.status_code == 200
+        etag = first.headers["etag"]
+        again = client.get("/api/warehouse/materials/search?code=100000", headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.content == b""
@@ -0,0 +1,227 @@
+"""
+Testes do índice de busca local do chat (FTS5, atualização incremental, relevância)
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.equipment import Equipment
+from app.models.maintenance import WorkOrder, MaintenancePlan, MaintenancePlanAction
+from app.models.manual_file import ManualFile
+from app.routers import reports
+from app.services import knowledge_index, manual_storage
+from app.services.knowledge_index import KnowledgeIndex, query_terms
+from app.services.rate_limit import rate_limiter
+from tests.db import override_get_db
+
+reports_app = FastAPI()
+reports_app.include_router(reports.router, prefix="/api/reports")
+reports_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(reports_app)
+
+
+@pytest.fixture(scope="function")
+def index(tmp_path, db_engine):
+    """Índice novo (arquivo temporário) anexado ao engine de teste"""
+    idx = knowledge_index.attach(db_engine, KnowledgeIndex(str(tmp_path / "knowledge_index.db")))
+    yield idx
+    knowledge_index.detach(db_engine)
+
+
+@pytest.fixture(scope="function")
+def db_session(index, db_session):
+    """Sessão de teste com o índice já anexado ao engine"""
+    return db_session
+
+
+def _equipment(db, prefix="ESC-01", category="Escavadeira"):
+    eq = Equipment(prefix=prefix, name=f"{category} {prefix}", category=category)
+    db.add(eq)
+    db.flush()
+    return eq
+
+
+def _work_order(db, eq, number, title, description=None, status="Fechada", days_ago=5, notes=None):
+    wo = WorkOrder(number=str(number), title=title, description=description, notes=notes, type="Corretiva",
+                   equipment_id=eq.id, status=status,
+                   completed_at=datetime.now() - timedelta(days=days_ago) if status == "Fechada" else None)
+    db.add(wo)
+    return wo
+
+
+def _titles(hits):
+    return [hit.title for hit in hits]
+
+
+@pytest.fixture(scope="function")
+def seeded(db_session):
+    """Base com OS, plano com ações e checklist de temas variados"""
+    db = db_session
+    esc = _equipment(db, "ESC-01", "Escavadeira")
+    cam = _equipment(db, "CAM-01", "Caminhão")
+    _work_order(db, esc, 100001, "Vazamento na bomba hidráulica",
+                "Vedação da bomba hidráulica principal substituída; óleo completado")
+    _work_order(db, esc, 100002, "Troca do alternador", "Alternador sem carga, substituído")
+    _work_order(db, cam, 100003, "Superaquecimento do motor", "Radiador obstruído, limpeza e troca do termostato")
+    _work_order(db, cam, 100004, "Perda de potência", "Filtro de combustível saturado; ar no sistema",
+                notes="Operador relatou fumaça preta em subida")
+    _work_order(db, esc, 100005, "Lubrificação geral", "Pinos e buchas lubrificados")
+    for n in range(20):
+        _work_order(db, cam, 100100 + n, f"Revisão preventiva {n}", "Inspeção geral conforme plano")
+    plan = MaintenancePlan(name="Preventiva 250h ESC-01", equipment_id=esc.id, type="Preventiva",
+                           interval_type="Horímetro", interval_value=250,
+                           checklist_template={"items": ["Verificar nível do óleo hidráulico",
+                                                         "Inspecionar mangueiras do braço"]})
+    db.add(plan)
+    db.flush()
+    db.add(MaintenancePlanAction(plan_id=plan.id, action_type="Troca",
+                                 description="Trocar filtro de retorno do sistema hidráulico",
+                                 safety_notes="Aliviar a pressão antes de abrir o circuito"))
+    db.commit()
+    return db
+
+
+class TestQueryTerms:
+    """Normalização da pergunta: acentos, palavras vazias e prefixos"""
+
+    def test_accents_stopwords_and_prefixes(self):
+        terms = query_terms("Qual a causa do vazamento hidráulico na 320D?")
+        assert [t.expression() for t in terms] == ['"causa"*', '"vazamen"*', '"hidrauli"*', '"320d"']
+
+    def test_empty_question(self, index):
+        assert query_terms("a de o que?") == []
+        assert index.search("a de o que?") == []
+
+
+class TestRelevance:
+    """Ranking em dados semeados"""
+
+    def test_top_hit_matches_question(self, seeded, index):
+        assert _titles(index.search("vazamento hidráulico na bomba", limit=3))[0] == "OS 100001 - Vazamento na bomba hidráulica"
+        assert _titles(index.search("alternador não carrega", limit=3))[0] == "OS 100002 - Troca do alternador"
+        assert _titles(index.search("motor esquentando, radiador", limit=3))[0] == "OS 100003 - Superaquecimento do motor"
+
+    def test_accent_and_inflection_insensitive(self, seeded, index):
+        titles = _titles(index.search("HIDRAULICA", limit=10))
+        assert "OS 100001 - Vazamento na bomba hidráulica" in titles
+        assert "Checklist - Preventiva 250h ESC-01" in titles
+        assert "Preventiva 250h ESC-01 - Troca" in titles
+
+    def test_notes_are_indexed(self, seeded, index):
+        assert _titles(index.search("fumaça preta", limit=1)) == ["OS 100004 - Perda de potência"]
+
+    def test_unknown_words_do_not_hide_results(self, seeded, index):
+        # "xyzzy" não está no índice: ignorado; "termostato" decide
+        assert _titles(index.search("xyzzy termostato", limit=1)) == ["OS 100003 - Superaquecimento do motor"]
+
+    def test_all_terms_ranked_before_partial_matches(self, seeded, index):
+        hits = index.search("filtro hidráulico", limit=5)
+        # a ação do plano cita os dois termos; as demais, só um
+        assert hits[0].title == "Preventiva 250h ESC-01 - Troca"
+        assert len(hits) > 1
+
+    def test_kind_and_equipment_filters(self, seeded, index):
+        esc = seeded.query(Equipment).filter(Equipment.prefix == "ESC-01").one()
+        hits = index.search("hidráulico", kinds=("work_order",))
+        assert {hit.kind for hit in hits} == {"work_order"}
+        assert index.search("radiador", equipment_ids=[esc.id]) == []
+
+
+class TestIncrementalUpdates:
+    """Hooks da sessão: commit atualiza, rollback descarta, bulk delete remove"""
+
+    def test_commit_update_and_delete(self, db_session, index):
+        eq = _equipment(db_session)
+        wo = _work_order(db_session, eq, 200001, "Ruído no comando final")
+        db_session.commit()
+        assert _titles(index.search("comando final")) == ["OS 200001 - Ruído no comando final"]
+
+        wo.title = "Trinca na caçamba"
+        db_session.commit()
+        assert index.search("comando final") == []
+        assert _titles(index.search("caçamba trincada")) == ["OS 200001 - Trinca na caçamba"]
+
+        db_session.delete(wo)
+        db_session.commit()
+        assert index.search("caçamba") == []
+        assert index.document_count("work_order") == 0
+
+    def test_rollback_is_not_indexed(self, db_session, index):
+        eq = _equipment(db_session)
+        db_session.commit()
+        _work_order(db_session, eq, 200002, "Esteira frouxa")
+        db_session.flush()
+        db_session.rollback()
+        assert index.search("esteira") == []
+
+    def test_bulk_delete_and_plan_rename(self, seeded, index):
+        plan = seeded.query(MaintenancePlan).one()
+        plan.name = "Preventiva 500h ESC-01"
+        seeded.commit()
+        assert "Preventiva 500h ESC-01 - Troca" in _titles(index.search("filtro retorno"))
+        assert "Checklist - Preventiva 500h ESC-01" in _titles(index.search("mangueiras braço"))
+
+        seeded.query(MaintenancePlanAction).filter(MaintenancePlanAction.plan_id == plan.id).delete()
+        seeded.commit()
+        assert index.document_count("plan_action") == 0
+
+    def test_rebuild_restores_and_prunes(self, seeded, index, db_engine):
+        index.delete([("work_order", "1")])
+        index.upsert([knowledge_index.Document("work_order", "999", None, None, "OS órfã", "sem linha no banco")])
+        counts = knowledge_index.rebuild(index, db_engine)
+        assert counts["work_order"] == 25
+        assert index.search("órfã") == []
+        assert index.is_built()
+
+
+class TestManualIndexing:
+    """Texto do manual indexado por página, uma vez por arquivo"""
+
+    def test_uploaded_manual_indexed_after_commit(self, db_session, index, tmp_path, monkeypatch):
+        monkeypatch.setattr(manual_storage, "MANUALS_DIR", str(tmp_path / "manuals"))
+        content = "Capítulo 1\nTorque das porcas da roda: 550 Nm\fCapítulo 2\nÓleo do diferencial 85W-140".encode("utf-8")
+        sha = hashlib.sha256(content).hexdigest()
+        path = manual_storage.blob_path(sha, ".txt")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(content)
+
+        eq = _equipment(db_session)
+        db_session.add(ManualFile(equipment_id=eq.id, sha256=sha, extension=".txt", filename="manual.txt",
+                                  size_bytes=len(content), uploaded_at=datetime.utcnow()))
+        db_session.commit()
+        for _ in range(100):  # extração numa thread à parte
+            if index.has_manual(sha):
+                break
+            time.sleep(0.05)
+        assert _titles(index.search("torque porca roda")) == ["manual.txt - p. 1"]
+        assert _titles(index.search("diferencial")) == ["manual.txt - p. 2"]
+        assert knowledge_index.index_manual(index, sha, ".txt", "manual.txt") == 0  # já indexado
+
+
+class TestChatUsesIndex:
+    """O chat responde com a base interna, sem consultar a web"""
+
+    def test_parts_lookup_from_internal_data(self, seeded, monkeypatch):
+        monkeypatch.setattr(rate_limiter, "enabled", False)
+        monkeypatch.delenv("AI_PROVIDER", raising=False)
+
+        def no_network(*args, **kwargs):
+            raise AssertionError("busca na web não deveria ser chamada")
+
+        monkeypatch.setattr(reports.httpx, "AsyncClient", no_network)
+        response = client.post("/api/reports/maintenance/ai-chat",
+                               json={"messages": [{"role": "user", "content": "peça do alternador"}]})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["intent"] == "parts_lookup"
+        assert "Na base interna" in data["reply"]
+        assert "OS 100002 - Troca do alternador" in data["sources"]
+        assert data["partial"] is False
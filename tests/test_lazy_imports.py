@@ -0,0 +1,71 @@
+"""
+Testes da importação sob demanda e do orçamento de inicialização
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.services.lazy_imports import LazyModule, lazy_module, warmup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bibliotecas que não podem ser carregadas só por importar o app
+HEAVY_MODULES = ("reportlab", "httpx", "weasyprint", "PyPDF2", "app.services.plan_generator")
+
+# Orçamentos folgados (-X importtime acrescenta overhead); ajustáveis no CI
+IMPORT_BUDGET_MS = int(os.getenv("IMPORT_BUDGET_MS", "5000"))
+RSS_BUDGET_MB = int(os.getenv("RSS_BUDGET_MB", "150"))
+
+PROBE = (
+    "import sys, resource\n"
+    "import main\n"
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "print(rss // 1024 if sys.platform != 'darwin' else rss // (1024 * 1024))\n"
+)
+
+
+class TestLazyModule:
+    """Substituto de módulo e pré-carregamento"""
+
+    def test_imports_on_first_attribute(self, monkeypatch):
+        monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+        proxy = lazy_module("colorsys")
+        assert isinstance(proxy, LazyModule)
+        assert "colorsys" not in sys.modules
+        assert proxy.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+        assert "colorsys" in sys.modules
+        # Já importado: devolve o próprio módulo
+        assert lazy_module("colorsys") is sys.modules["colorsys"]
+
+    def test_warmup_skips_missing(self):
+        assert warmup(["json", "modulo_que_nao_existe"]) == ["json"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="usa o módulo resource")
+class TestStartupBudget:
+    """python -X importtime: módulos pesados fora da inicialização, tempo e memória"""
+
+    def test_import_main_budget(self, tmp_path):
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'budget.db'}")
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr[-2000:]
+
+        imported, main_us = set(), None
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            name = name.strip()
+            imported.add(name)
+            if name == "main":
+                main_us = int(cumulative)
+
+        eager = sorted(n for n in imported if n.split(".")[0] in HEAVY_MODULES or n in HEAVY_MODULES)
+        assert not eager, f"importados na inicialização: {eager}"
+        assert main_us is not None
+        assert main_us / 1000 < IMPORT_BUDGET_MS
+        assert int(result.stdout.strip().splitlines()[-1]) < RSS_BUDGET_MB
@@ -0,0 +1,273 @@
+"""
+Testes do cliente LLM (pool, cache, coalescência, retentativas, disjuntor, streaming
+e provedor local) com um provedor simulado local (ASGI), sem rede
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services import llm_provider
+from app.services.llm_provider import CircuitBreaker, LatencyTracker, ResponseCache, llm_generate, llm_stream
+
+provider = {"calls": 0, "fail": 0, "status": 503, "delay": 0.0}
+mock_app = FastAPI()
+
+
+@mock_app.post("/v1/chat/completions")
+async def completions(request: Request):
+    provider["calls"] += 1
+    if provider["delay"]:
+        await asyncio.sleep(provider["delay"])
+    if provider["fail"]:
+        provider["fail"] -= 1
+        return JSONResponse({"error": "indisponível"}, status_code=provider["status"], headers={"Retry-After": "0"})
+    payload = await request.json()
+    last = payload["messages"][-1]["content"]
+    if payload.get("stream"):
+        return StreamingResponse(_sse_chunks(["resposta: ", last, f" @ {payload['temperature']}"]),
+                                 media_type="text/event-stream")
+    return {"choices": [{"message": {"content": f"resposta: {last} @ {payload['temperature']}"}}]}
+
+
+async def _sse_chunks(texts):
+    """Formato do chat/completions com stream: um delta por evento e [DONE] no fim."""
+    for text in texts:
+        yield f"data: {json.dumps({'choices': [{'delta': {'content': text}}]})}\n\n"
+        await asyncio.sleep(0)
+    yield "data: [DONE]\n\n"
+
+
+@pytest.fixture(autouse=True)
+def mock_provider(monkeypatch):
+    """Provedor OpenAI apontado para o app simulado; estado do módulo zerado."""
+    monkeypatch.setenv("AI_PROVIDER", "openai")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-teste")
+    monkeypatch.setattr(llm_provider, "BACKOFF_BASE", 0.001)
+    provider.update(calls=0, fail=0, status=503, delay=0.0)
+    llm_provider.set_transport(httpx.ASGITransport(app=mock_app))
+    llm_provider.response_cache.clear()
+    llm_provider.breakers.clear()
+    llm_provider.stats.clear()
+    llm_provider.latency.clear()
+    yield
+    llm_provider.set_transport(None)
+
+
+def ask(text, **kwargs):
+    return llm_generate([{"role": "user", "content": text}], **kwargs)
+
+
+def collect(text, **kwargs):
+    async def run():
+        chunks = [chunk async for chunk in llm_stream([{"role": "user", "content": text}], **kwargs)]
+        await llm_provider.aclose_client()
+        return chunks
+
+    return asyncio.run(run())
+
+
+CONTEXT = ("Pergunta: qual o mttr?\n"
+           "Período: 01/09/2026 a 30/09/2026\n"
+           "Dados:\n- MTTR médio: 24.00 h.\n- Maior MTTR: EQ2 (30.00 h).\n"
+           "Fontes: /api/reports/maintenance/mttr")
+
+
+class TestPooledClient:
+    """Cliente único e cache de respostas"""
+
+    def test_reuses_client_and_caches(self, monkeypatch):
+        async def run():
+            first = await ask("Quantas OS abertas?")
+            client = llm_provider.get_client()
+            again = await ask("  Quantas   OS abertas? ")
+            other = await ask("MTBF do mês?")
+            assert llm_provider.get_client() is client
+            monkeypatch.setenv("AI_TEMPERATURE", "0.7")
+            warmer = await ask("Quantas OS abertas?")
+            await llm_provider.aclose_client()
+            return first, again, other, warmer
+
+        first, again, other, warmer = asyncio.run(run())
+        assert first == again == "resposta: Quantas OS abertas? @ 0.2"
+        assert other == "resposta: MTBF do mês? @ 0.2"
+        assert warmer.endswith("@ 0.7")
+        assert provider["calls"] == 3
+        assert llm_provider.stats["cache_hits"] == 1
+
+    def test_cache_ttl_and_size(self):
+        now = [0.0]
+        cache = ResponseCache(max_size=2, ttl=10, clock=lambda: now[0])
+        cache.set("a", "1")
+        cache.set("b", "2")
+        assert cache.get("a") == "1"
+        cache.set("c", "3")  # "b" é o menos usado
+        assert (cache.get("b"), len(cache)) == (None, 2)
+        now[0] = 10
+        assert cache.get("a") is None
+
+    def test_not_configured_returns_none(self, monkeypatch):
+        monkeypatch.delenv("OPENAI_API_KEY")
+        assert asyncio.run(ask("oi")) is None
+        assert provider["calls"] == 0
+
+
+class TestCoalescing:
+    """Perguntas idênticas simultâneas compartilham uma requisição"""
+
+    def test_identical_prompts_in_flight(self):
+        provider["delay"] = 0.05
+
+        async def run():
+            replies = await asyncio.gather(*(ask("Custo de manutenção?") for _ in range(5)), ask("Outra"))
+            await llm_provider.aclose_client()
+            return replies
+
+        replies = asyncio.run(run())
+        assert len(set(replies[:5])) == 1
+        assert provider["calls"] == 2
+        assert llm_provider.stats["coalesced"] == 4
+        assert llm_provider._inflight == {}
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        provider["delay"] = 0.05
+
+        async def run():
+            impatient = asyncio.ensure_future(ask("Pergunta lenta"))
+            patient = asyncio.ensure_future(ask("Pergunta lenta"))
+            await asyncio.sleep(0.01)
+            impatient.cancel()
+            result = await patient
+            await llm_provider.aclose_client()
+            return result
+
+        assert asyncio.run(run()) == "resposta: Pergunta lenta @ 0.2"
+        assert provider["calls"] == 1
+
+
+class TestResilience:
+    """Retentativas em 5xx/429 e disjuntor por provedor"""
+
+    def test_retries_transient_errors(self):
+        provider["fail"] = 2
+        assert asyncio.run(ask("Estoque crítico?")) == "resposta: Estoque crítico? @ 0.2"
+        assert provider["calls"] == 3
+        assert llm_provider.stats["retries"] == 2
+
+    def test_client_errors_are_not_retried(self):
+        provider.update(fail=1, status=401)
+        assert asyncio.run(ask("Sem chave")) is None
+        assert provider["calls"] == 1
+        assert llm_provider.breakers["openai"].state == "closed"
+
+    def test_breaker_opens_and_recovers(self, monkeypatch):
+        now = [0.0]
+        llm_provider.breakers["openai"] = CircuitBreaker(threshold=2, cooldown=30, clock=lambda: now[0])
+        monkeypatch.setattr(llm_provider, "MAX_RETRIES", 0)
+        provider["fail"] = 100
+
+        async def run(texts):
+            return [await ask(t) for t in texts]
+
+        assert asyncio.run(run(["a", "b", "c", "d"])) == [None] * 4
+        assert provider["calls"] == 2  # aberto depois de 2 falhas seguidas
+        assert llm_provider.stats["short_circuited"] == 2
+
+        # Depois do resfriamento, uma chamada de teste; sucesso fecha o disjuntor
+        now[0] = 31
+        provider["fail"] = 0
+        assert asyncio.run(run(["e"])) == ["resposta: e @ 0.2"]
+        assert llm_provider.breakers["openai"].state == "closed"
+
+
+class TestStreaming:
+    """llm_stream: trechos na ordem em que o provedor envia, cache e falhas antes do 1º trecho"""
+
+    def test_chunks_then_cache_replay(self):
+        chunks = collect("Quantas OS abertas?")
+        assert chunks == ["resposta: ", "Quantas OS abertas?", " @ 0.2"]
+        # A resposta completa fica no cache e é reaproveitada por llm_generate e por um novo stream
+        assert asyncio.run(ask("Quantas OS abertas?")) == "".join(chunks)
+        assert "".join(collect("Quantas OS abertas?")) == "".join(chunks)
+        assert provider["calls"] == 1
+        assert llm_provider.stats["streamed"] == 1
+        assert llm_provider.latency.snapshot()["openai"]["first_chunk"]["count"] == 3
+
+    def test_retries_before_first_chunk(self):
+        provider["fail"] = 1
+        assert "".join(collect("Backlog?")) == "resposta: Backlog? @ 0.2"
+        assert provider["calls"] == 2
+        assert llm_provider.stats["retries"] == 1
+
+    def test_failure_yields_nothing(self, monkeypatch):
+        monkeypatch.setattr(llm_provider, "MAX_RETRIES", 0)
+        provider["fail"] = 1
+        assert collect("Backlog?") == []
+        assert llm_provider.stats["failures"] == 1
+        assert "openai" not in llm_provider.latency.snapshot()
+
+
+class TestLocalProvider:
+    """AI_PROVIDER=local: resposta determinística a partir dos dados do contexto, sem rede"""
+
+    def test_reply_from_context(self, monkeypatch):
+        monkeypatch.setenv("AI_PROVIDER", "local")
+        reply = asyncio.run(ask(CONTEXT, system_prompt="Seja direto."))
+        assert reply == ("Sobre \"qual o mttr?\", com base nos dados internos:\n"
+                         "MTTR médio: 24.00 h.\nMaior MTTR: EQ2 (30.00 h).\n"
+                         "Fontes: /api/reports/maintenance/mttr.\n"
+                         "Período: 01/09/2026 a 30/09/2026.")
+        assert asyncio.run(ask(CONTEXT)) == reply
+        assert "".join(collect(CONTEXT)) == reply
+        assert provider["calls"] == 0
+        assert llm_provider.stats["local"] == 3
+
+    def test_without_data(self, monkeypatch):
+        monkeypatch.setenv("AI_PROVIDER", "local")
+        assert asyncio.run(ask("Pergunta: e o clima?\nDados:\n- \nFontes: —")) == \
+            "Não há dados do sistema para responder: e o clima?"
+
+
+class TestLatency:
+    """Percentis por provedor sobre a janela das últimas chamadas"""
+
+    def test_snapshot_window(self):
+        tracker = LatencyTracker(window=10)
+        for ms in range(1, 21):
+            tracker.record("openai", "first_chunk", ms / 1000)
+        snap = tracker.snapshot()["openai"]["first_chunk"]
+        assert snap == {"count": 20, "p50_ms": 15.0, "p95_ms": 20.0, "max_ms": 20.0}
+
+
+class TestStreamBreaker:
+    """Chamada de teste do disjuntor abandonada antes do 1º trecho (prazo do chat, cliente desconectado)"""
+
+    def test_abandoned_trial_is_released(self):
+        now = [0.0]
+        breaker = llm_provider.breakers["openai"] = CircuitBreaker(threshold=1, cooldown=30, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 31
+        provider["delay"] = 0.2
+
+        async def impatient():
+            stream = llm_stream([{"role": "user", "content": "Demorada"}])
+            try:
+                await asyncio.wait_for(stream.__anext__(), timeout=0.01)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                await stream.aclose()
+            await llm_provider.aclose_client()
+
+        asyncio.run(impatient())
+        assert breaker.state == "half_open"
+        assert llm_provider.stats["abandoned"] == 1
+
+        # A próxima chamada ainda pode testar o provedor, e o sucesso fecha o disjuntor
+        provider["delay"] = 0.0
+        assert asyncio.run(ask("Rápida")) == "resposta: Rápida @ 0.2"
+        assert breaker.state == "closed"
@@ -0,0 +1,98 @@
+"""
+Testes do gravador em lote de ErrorLog e AuditLog
+"""
+
+import asyncio
+
+from app.models.admin import AuditLog, ErrorLog
+from app.routers.admin import log_audit
+from app.services.log_writer import LogWriter, dedupe_errors
+from tests.db import TestingSessionLocal
+
+
+def _run_with_writer(writer, body):
+    """Executar body() com o gravador ativo e esvaziar a fila no final (como o lifespan)."""
+    async def scenario():
+        writer.start()
+        try:
+            return await body()
+        finally:
+            await writer.stop()
+    return asyncio.run(scenario())
+
+
+class TestDedupe:
+    """Agrupamento de erros idênticos"""
+
+    def test_identical_errors_are_counted(self):
+        rows = [
+            {"module": "api", "error_type": "ValueError", "message": "x", "stack": "s"},
+            {"module": "api", "error_type": "ValueError", "message": "x", "stack": "s"},
+            {"module": "api", "error_type": "KeyError", "message": "x", "stack": "s"},
+        ]
+        merged = dedupe_errors(rows)
+        assert [(r["error_type"], r["occurrences"]) for r in merged] == [("ValueError", 2), ("KeyError", 1)]
+
+
+class TestLogWriter:
+    """Fila, gravação em lote, descarte e fallback síncrono"""
+
+    def test_not_running_rejects_entries(self):
+        writer = LogWriter(session_factory=TestingSessionLocal)
+        assert writer.log_error("api", "ValueError", "x") is False
+        assert writer.pending() == 0
+
+    def test_error_burst_becomes_one_row(self, db_session):
+        writer = LogWriter(session_factory=TestingSessionLocal, flush_seconds=0.01, batch_size=1000)
+
+        async def body():
+            for _ in range(300):
+                assert writer.log_error("api", "ValueError", "falha", stack="tb")
+            writer.log_audit(1, "update_user", entity="users", entity_id=1)
+            await asyncio.sleep(0.1)
+
+        _run_with_writer(writer, body)
+        errors = db_session.query(ErrorLog).all()
+        assert [(e.error_type, e.occurrences, e.status) for e in errors] == [("ValueError", 300, "open")]
+        assert db_session.query(AuditLog).one().action == "update_user"
+
+    def test_batches_respect_size(self, db_session):
+        writer = LogWriter(session_factory=TestingSessionLocal, flush_seconds=60, batch_size=10)
+
+        async def body():
+            for i in range(25):
+                writer.log_error("api", "ValueError", f"falha {i}")
+            await asyncio.sleep(0.2)  # lote cheio acorda a tarefa sem esperar o intervalo
+            return db_session.query(ErrorLog).count()
+
+        written_before_stop = _run_with_writer(writer, body)
+        assert written_before_stop >= 10
+        assert db_session.query(ErrorLog).count() == 25
+
+    def test_full_queue_drops_errors_and_flags(self, db_session):
+        writer = LogWriter(session_factory=TestingSessionLocal, flush_seconds=60, batch_size=100, max_queue=5)
+
+        async def body():
+            for i in range(8):
+                assert writer.log_error("api", "ValueError", f"falha {i}")
+            # Auditoria não é descartada: o chamador grava por conta própria
+            assert writer.log_audit(1, "delete_user") is False
+
+        _run_with_writer(writer, body)
+        types = sorted(e.error_type for e in db_session.query(ErrorLog).all())
+        assert types == ["ValueError"] * 5 + ["log_queue_overflow"]
+        overflow = db_session.query(ErrorLog).filter(ErrorLog.error_type == "log_queue_overflow").one()
+        assert overflow.message.startswith("3 ")
+
+    def test_log_audit_falls_back_to_request_session(self, db_session, monkeypatch):
+        writer = LogWriter(session_factory=TestingSessionLocal, flush_seconds=60)
+        monkeypatch.setattr("app.routers.admin.log_writer", writer)
+        log_audit(db_session, 1, "create_user", entity="users", entity_id=1)
+        assert db_session.query(AuditLog).count() == 1
+
+        async def body():
+            log_audit(db_session, 1, "change_password", entity="users", entity_id=1)
+            return writer.pending()
+
+        assert _run_with_writer(writer, body) == 1
+        assert db_session.query(AuditLog).count() == 2
@@ -0,0 +1,217 @@
+"""
+Testes da extração de materiais dos manuais (XML em streaming, texto, perfis de fabricante)
+"""
+
+import json
+import os
+import tracemalloc
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import manual_profiles
+from app.services.plan_generator import extract_materials_from_document, generate_plans_from_manual
+
+NOISE = ("<procedure><step>Posicione a máquina em local plano e abaixe o implemento.</step>"
+         "<step>Desligue o motor e aguarde o resfriamento antes de abrir o reservatório.</step>"
+         "<warning>Fluido quente sob pressão pode causar queimaduras graves.</warning></procedure>")
+
+LAYOUTS = {
+    # fabricante: (bloco de intervalo, item)
+    "generic": ('<maintenance interval="{hours}h">', "</maintenance>",
+                "<material><name>Filtro de óleo {n}</name><reference>FO-{n}</reference>"
+                "<unit>un</unit><quantity>1</quantity></material>"),
+    "caterpillar": ('<MaintenanceInterval SMU="{hours}">', "</MaintenanceInterval>",
+                    '<PartItem><PartNumber>1R-{n:04d}</PartNumber><PartName>Engine Oil Filter {n}</PartName>'
+                    "<Qty>2</Qty><UOM>un</UOM></PartItem>"),
+    "komatsu": ("<ServiceInterval><Every>{hours} hours</Every>", "</ServiceInterval>",
+                '<ReplacementPart PartNo="600-211-{n:04d}" PartName="Cartucho do filtro {n}" Qty="1"/>'),
+    "volvo": ('<v:ServiceInterval value="{hours}" unit="h">', "</v:ServiceInterval>",
+              "<v:SparePart><v:PartNo>{voe}</v:PartNo><v:Designation>Oil filter {n}</v:Designation>"
+              "<v:Qty>1,5</v:Qty><v:UOM>l</v:UOM></v:SparePart>"),
+}
+
+
+def write_xml_manual(path, vendor="generic", sections=(250, 500), items=2, noise=0):
+    """Manual XML no layout do fabricante: `items` materiais por intervalo e `noise` procedimentos entre eles."""
+    open_tag, close_tag, item = LAYOUTS[vendor]
+    brand = "" if vendor == "generic" else f' brand="{vendor.capitalize()}"'
+    root = f'<Manual xmlns:v="urn:volvo:prosis"{brand}>' if vendor == "volvo" else f"<Manual{brand}>"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f'<?xml version="1.0" encoding="utf-8"?>\n{root}\n')
+        for hours in sections:
+            f.write(open_tag.format(hours=hours) + "\n")
+            for n in range(items):
+                f.write(NOISE * noise)
+                f.write(item.format(n=n, voe=14500000 + n) + "\n")
+            f.write(close_tag + "\n")
+        f.write("</Manual>\n")
+    return str(path)
+
+
+def write_text_manual(path, sections=(("Manutenção 250 horas", 250), ("Manutenção 500 horas", 500)), items=2, noise=0):
+    """Manual em texto: cabeçalho por intervalo, linhas de material e parágrafos sem materiais."""
+    with open(path, "w", encoding="utf-8") as f:
+        for header, hours in sections:
+            f.write(header + "\n")
+            for n in range(items):
+                f.write("Verifique o aperto das conexões e a ausência de vazamentos.\n" * noise)
+                f.write(f"- Filtro de óleo do motor P/N: 600-211-{n:04d} 1 un\n")
+    return str(path)
+
+
+@pytest.fixture
+def large_xml(tmp_path):
+    """Manual XML grande (~7 MB): 3 intervalos x 1.000 materiais com procedimentos entre eles"""
+    return write_xml_manual(tmp_path / "grande.xml", "generic", sections=(250, 500, 1000), items=1000, noise=8)
+
+
+@pytest.fixture
+def large_text(tmp_path):
+    """Manual em texto grande (~8 MB): 2 intervalos x 1.000 materiais entre parágrafos"""
+    return write_text_manual(tmp_path / "grande.txt", items=1000, noise=60)
+
+
+def _peak_bytes(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestProfiles:
+    """Registro de perfis: arquivos JSON, escolha por fabricante ou pelo documento"""
+
+    def test_builtin_profiles(self):
+        registry = manual_profiles.load_profiles(extra_dir="")
+        assert {"generic", "caterpillar", "komatsu", "volvo"} <= set(registry)
+        assert manual_profiles.select_profile("KOMATSU").name == "komatsu"
+        assert manual_profiles.select_profile("Caterpillar Inc.").name == "caterpillar"
+        assert manual_profiles.select_profile("Hitachi").name == "generic"
+        assert manual_profiles.select_profile(None, "Volvo Construction Equipment - PROSIS").name == "volvo"
+
+    def test_vendor_inherits_generic_lists(self):
+        cat = manual_profiles.profiles()["caterpillar"]
+        assert {"partitem", "material"} <= cat.item_tags
+        assert cat.classify("every 250 service hours") == ("interval", 250)
+        assert cat.classify("manutencao 500h") == ("interval", 500)
+        assert cat.classify("engine oil filter") == ("material", None)
+        assert cat.classify("inspect the boom") == (None, None)
+        assert cat.reference("Engine Oil Filter 1R-0750 (2)") == "1R-0750"
+
+    def test_extra_directory_adds_and_skips_invalid(self, tmp_path):
+        (tmp_path / "hitachi.json").write_text(json.dumps({
+            "name": "hitachi", "manufacturers": ["hitachi"], "markers": ["zaxis"],
+            "text": {"interval_headers": ["\\bintervalo\\s+(\\d{2,5})\\b"], "reference_patterns": ["\\b(4\\d{6})\\b"]},
+        }), encoding="utf-8")
+        (tmp_path / "quebrado.json").write_text("{", encoding="utf-8")
+        try:
+            manual_profiles.load_profiles(extra_dir=str(tmp_path))
+            hitachi = manual_profiles.select_profile("Hitachi")
+            assert hitachi.name == "hitachi"
+            assert hitachi.classify("intervalo 750") == ("interval", 750)
+            assert hitachi.reference("Filtro 4630525") == "4630525"
+        finally:
+            manual_profiles.load_profiles(extra_dir="")
+
+
+class TestXmlExtraction:
+    """iterparse: intervalo herdado do bloco, layouts de fabricante, memória constante"""
+
+    @pytest.mark.parametrize("vendor", ["generic", "caterpillar", "komatsu", "volvo"])
+    def test_vendor_layouts(self, tmp_path, vendor):
+        path = write_xml_manual(tmp_path / f"{vendor}.xml", vendor)
+        materials = extract_materials_from_document(path)
+        assert sorted(materials) == [250, 500]
+        assert len(materials[250]) == len(materials[500]) == 2
+        first = materials[250][0]
+        assert first["name"] and first["reference"]
+        assert isinstance(first["quantity"], float)
+
+    def test_volvo_fields(self, tmp_path):
+        path = write_xml_manual(tmp_path / "volvo.xml", "volvo", items=1)
+        item = extract_materials_from_document(path, manufacturer="Volvo")[500][0]
+        assert item == {"name": "Oil filter 0", "reference": "14500000", "unit": "l", "quantity": 1.5,
+                        "category": "", "description": ""}
+
+    def test_item_level_interval_and_name_fallback(self, tmp_path):
+        path = tmp_path / "itens.xml"
+        path.write_text(
+            "<manual><parts>"
+            '<part name="Graxa EP2" reference="GR-1" interval="250h" quantity="0.5" unit="kg"/>'
+            "<item><name>Filtro hidráulico</name><reference>FH-2</reference><hours>500</hours></item>"
+            "<item><name>Kit revisão 250 horas</name><reference>KR-3</reference></item>"
+            "<item><name>Sem intervalo</name></item>"
+            "</parts></manual>", encoding="utf-8")
+        materials = extract_materials_from_document(str(path))
+        assert [m["reference"] for m in materials[250]] == ["GR-1", "KR-3"]
+        assert [m["reference"] for m in materials[500]] == ["FH-2"]
+        assert materials[250][0]["quantity"] == 0.5
+
+    def test_interval_child_applies_to_following_items(self, tmp_path):
+        path = tmp_path / "bloco.xml"
+        path.write_text(
+            "<manual><service><hours>1000</hours>"
+            "<material><name>Óleo da transmissão</name><reference>OT-1</reference></material>"
+            "</service></manual>", encoding="utf-8")
+        assert [m["reference"] for m in extract_materials_from_document(str(path))[1000]] == ["OT-1"]
+
+    def test_malformed_xml_keeps_what_was_read(self, tmp_path):
+        path = tmp_path / "truncado.xml"
+        path.write_text('<manual><maintenance interval="250h"><material><name>Filtro</name>'
+                        "<reference>F-1</reference></material><material><name>Ól", encoding="utf-8")
+        assert [m["reference"] for m in extract_materials_from_document(str(path))[250]] == ["F-1"]
+
+    def test_large_manual_streams(self, large_xml):
+        size = os.path.getsize(large_xml)
+        materials, peak = _peak_bytes(lambda: extract_materials_from_document(large_xml))
+        assert {iv: len(items) for iv, items in materials.items()} == {250: 1000, 500: 1000, 1000: 1000}
+        # Só os materiais extraídos ficam em memória, não a árvore do documento
+        assert peak < size / 2
+
+
+class TestTextExtraction:
+    """Regex combinada por linha: cabeçalhos de intervalo e linhas de material"""
+
+    def test_caterpillar_layout(self, tmp_path):
+        path = tmp_path / "cat.txt"
+        path.write_text("Caterpillar 320D Operation and Maintenance Manual (SEBU8000)\n"
+                        "Every 250 Service Hours\n"
+                        "Engine Oil Filter 1R-0750 - replace\n"
+                        "Inspect the boom linkage\n"
+                        "Every 500 Service Hours\n"
+                        "Fuel System Primary Filter 326-1644 2 un\n", encoding="utf-8")
+        materials = extract_materials_from_document(str(path))
+        assert [m["reference"] for m in materials[250]] == ["1R-0750"]
+        assert [(m["reference"], m["quantity"]) for m in materials[500]] == [("326-1644", 2.0)]
+
+    def test_komatsu_layout_by_manufacturer(self, tmp_path):
+        path = tmp_path / "pc200.txt"
+        path.write_text("EVERY 500 HOURS SERVICE\n"
+                        "Replace fuel filter cartridge 600-311-8293\n"
+                        "Engine oil 24 l\n", encoding="utf-8")
+        materials = extract_materials_from_document(str(path), manufacturer="Komatsu")
+        assert [(m["reference"], m["unit"]) for m in materials[500]] == [("600-311-8293", "un"), (None, "l")]
+
+    def test_large_text_manual_streams(self, large_text):
+        size = os.path.getsize(large_text)
+        materials, peak = _peak_bytes(lambda: extract_materials_from_document(large_text))
+        assert len(materials[250]) == len(materials[500]) == 1000
+        assert materials[500][-1]["reference"] == "600-211-0999"
+        assert materials[500][-1]["name"] == "Filtro de óleo do motor P/N: 600-211-0999 1 un"
+        assert peak < size / 2
+
+
+class TestPlanGeneration:
+    """Planos 250h/500h usam os materiais extraídos com o perfil do fabricante do equipamento"""
+
+    def test_plans_use_manufacturer_profile(self, tmp_path):
+        path = write_xml_manual(tmp_path / "cat.xml", "caterpillar", items=3)
+        equipment = SimpleNamespace(id=1, name="Escavadeira 320D", prefix="ESC-01", manufacturer="Caterpillar",
+                                    category="Escavadeira")
+        plans = generate_plans_from_manual(equipment, path)
+        assert [p["interval_value"] for p in plans] == [250, 500]
+        assert [m["reference"] for m in plans[0]["materials"]] == ["1R-0000", "1R-0001", "1R-0002"]
+        assert "Materiais extraídos do documento" in plans[1]["description"]
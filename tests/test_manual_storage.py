@@ -0,0 +1,169 @@
+"""
+Testes do upload de manuais em blocos, armazenado por conteúdo (SHA-256)
+"""
+
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.equipment import Equipment
+from app.models.manual_file import ManualFile
+from app.routers import maintenance
+from app.services import manual_storage
+from tests.db import override_get_db
+
+maintenance_app = FastAPI()
+maintenance_app.include_router(maintenance.router, prefix="/api/maintenance")
+maintenance_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(maintenance_app)
+
+PDF = b"%PDF-1.4\n" + b"conteudo do manual " * 2000
+
+
+@pytest.fixture
+def manuals_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(manual_storage, "MANUALS_DIR", str(tmp_path / "manuals"))
+    return tmp_path / "manuals"
+
+
+def _equipment(db, prefix):
+    equipment = Equipment(prefix=prefix, name="Escavadeira", model="PC200", manufacturer="Komatsu")
+    db.add(equipment)
+    db.commit()
+    return equipment
+
+
+def _upload(equipment_id, name="manual.pdf", content=PDF, field="files"):
+    return client.post(f"/api/maintenance/equipment/{equipment_id}/manual/upload",
+                       files=[(field, (name, content, "application/pdf"))])
+
+
+def _multipart(parts, boundary=b"limite-do-teste"):
+    """Corpo multipart/form-data: parts = [(campo, nome do arquivo, conteúdo)]."""
+    body = b""
+    for field, filename, content in parts:
+        body += (b"--" + boundary + b"\r\nContent-Disposition: form-data; name=\"" + field.encode()
+                 + b"\"; filename=\"" + filename.encode() + b"\"\r\nContent-Type: application/pdf\r\n\r\n"
+                 + content + b"\r\n")
+    return body + b"--" + boundary + b"--\r\n", f"multipart/form-data; boundary={boundary.decode()}"
+
+
+def _chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _blobs(manuals_dir):
+    return sorted(p.name for p in (manuals_dir / "blobs").rglob("*") if p.is_file())
+
+
+class TestManualUpload:
+    """Mesmo manual em vários equipamentos, tipos e limites"""
+
+    def test_same_manual_is_stored_once(self, db_session, manuals_dir):
+        first, second = _equipment(db_session, "EQ001"), _equipment(db_session, "EQ002")
+
+        a = _upload(first.id)
+        b = _upload(second.id, name="PC200 - manual.pdf", field="file")
+        assert a.status_code == b.status_code == 200
+        fa, fb = a.json()["files"][0], b.json()["files"][0]
+        assert fa["sha256"] == fb["sha256"] and fa["size"] == len(PDF)
+        assert (fa["deduplicated"], fb["deduplicated"]) == (False, True)
+        assert _blobs(manuals_dir) == [f"{fa['sha256']}.pdf"]
+
+        links = db_session.query(ManualFile).order_by(ManualFile.equipment_id).all()
+        assert [(m.equipment_id, m.filename) for m in links] == [(first.id, "manual.pdf"),
+                                                                  (second.id, "PC200 - manual.pdf")]
+        assert manual_storage.latest_manual_path(db_session, second.id) == fa["path"]
+
+        # Reenviar o mesmo arquivo não cria outro vínculo
+        assert _upload(first.id).status_code == 200
+        assert db_session.query(ManualFile).count() == 2
+
+    def test_rejects_unsupported_type_and_fake_content(self, db_session, manuals_dir):
+        equipment = _equipment(db_session, "EQ001")
+        assert _upload(equipment.id, name="virus.exe").status_code == 415
+        assert _upload(equipment.id, name="manual.pdf", content=b"MZ\x90\x00 nao e pdf").status_code == 415
+        assert _blobs(manuals_dir) == []
+        assert db_session.query(ManualFile).count() == 0
+
+    def test_size_limits(self, db_session, manuals_dir, monkeypatch):
+        equipment = _equipment(db_session, "EQ001")
+        monkeypatch.setattr(manual_storage, "MAX_MANUAL_BYTES", 1024)
+        assert _upload(equipment.id).status_code == 413
+        assert _blobs(manuals_dir) == []
+
+        # Content-Length acima do limite do envio: recusado antes de ler o corpo
+        monkeypatch.setattr(manual_storage, "MAX_UPLOAD_BYTES", 1024)
+        response = _upload(equipment.id)
+        assert response.status_code == 413
+        assert "Envio excede" in response.json()["detail"]
+
+    def test_chunked_upload_counts_received_bytes(self, db_session, manuals_dir, monkeypatch):
+        """Sem Content-Length (chunked) o limite vale para os bytes recebidos"""
+        equipment = _equipment(db_session, "EQ001")
+        body, content_type = _multipart([("files", "manual.pdf", PDF)])
+        url = f"/api/maintenance/equipment/{equipment.id}/manual/upload"
+
+        # Blocos de 7 bytes: a assinatura %PDF- chega partida entre dois blocos
+        response = client.post(url, content=_chunks(body, 7), headers={"Content-Type": content_type})
+        assert response.status_code == 200
+        assert response.json()["files"][0]["size"] == len(PDF)
+
+        monkeypatch.setattr(manual_storage, "MAX_UPLOAD_BYTES", len(body) // 2)
+        response = client.post(url, content=_chunks(body, 1024), headers={"Content-Type": content_type})
+        assert response.status_code == 413
+        assert "Envio excede" in response.json()["detail"]
+        assert not list((manuals_dir / "blobs" / "tmp").iterdir())
+
+    def test_invalid_forms(self, db_session, manuals_dir):
+        equipment = _equipment(db_session, "EQ001")
+        url = f"/api/maintenance/equipment/{equipment.id}/manual/upload"
+        assert client.post(url, data={"files": "texto"}).status_code == 400
+
+        # Corpo interrompido no meio do arquivo: nada gravado
+        body, content_type = _multipart([("files", "manual.pdf", PDF)])
+        response = client.post(url, content=body[:len(body) // 2], headers={"Content-Type": content_type})
+        assert response.status_code == 400
+        assert _blobs(manuals_dir) == []
+
+    def test_legacy_directory_fallback(self, db_session, manuals_dir):
+        legacy = manuals_dir / "7"
+        legacy.mkdir(parents=True)
+        (legacy / "antigo.pdf").write_bytes(PDF)
+        assert manual_storage.latest_manual_path(db_session, 7) == str(legacy / "antigo.pdf")
+        assert manual_storage.latest_manual_path(db_session, 8) is None
+
+
+class TestMemoryBound:
+    """Arquivo grande gravado direto do fluxo: pico de memória ~ alguns blocos"""
+
+    def test_large_upload_memory_is_bounded(self, manuals_dir):
+        block = os.urandom(1024 * 1024)
+        size = 48 * len(block)
+        head, content_type = _multipart([("files", "grande.pdf", b"")])
+        head, tail = head[:head.index(b"\r\n--limite")], head[head.index(b"\r\n--limite"):]
+
+        async def stream():
+            yield head + b"%PDF-1.7\n"
+            for _ in range(48):
+                for start in range(0, len(block), 64 * 1024):
+                    yield block[start:start + 64 * 1024]
+            yield tail
+
+        tracemalloc.start()
+        try:
+            uploads = asyncio.run(manual_storage.store_multipart(content_type, stream()))
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        stored = uploads[0].stored
+        assert stored.size_bytes == size + len(b"%PDF-1.7\n")
+        assert peak < 4 * 1024 * 1024
+        assert os.path.getsize(stored.path) == stored.size_bytes
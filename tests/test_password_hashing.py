@@ -0,0 +1,173 @@
+"""
+Testes do hash de senhas fora do event loop e da limitação de tentativas de login
+"""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.admin import User
+from app.routers import admin
+from app.services import password_hashing
+from app.services.password_hashing import (
+    hash_password_sync,
+    verify_password_sync,
+    parse_hash,
+    needs_rehash,
+    generate_salt,
+    LEGACY_ITERATIONS,
+)
+from app.services.login_throttle import LoginThrottle, SQLiteThrottleStore, ThrottlePolicy, login_throttle
+from tests.db import override_get_db
+
+admin_app = FastAPI()
+admin_app.include_router(admin.router, prefix="/api/admin")
+admin_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(admin_app)
+
+
+@pytest.fixture(scope="function")
+def db_session(db_session):
+    """Sessão de teste com o limitador de login zerado"""
+    login_throttle.reset()
+    return db_session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _legacy_hash(password, salt):
+    """Formato anterior: só o hex do PBKDF2 com 130 mil iterações."""
+    import hashlib
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), LEGACY_ITERATIONS).hex()
+
+
+class TestHashEncoding:
+    """Formato com parâmetros embutidos e compatibilidade com hashes antigos"""
+
+    def test_roundtrip_and_parameters(self):
+        salt = generate_salt()
+        stored = hash_password_sync("Senha@123", salt, iterations=1000)
+        assert stored.startswith("pbkdf2_sha256$1000$")
+        assert parse_hash(stored)[0] == 1000
+        assert verify_password_sync("Senha@123", salt, stored)
+        assert not verify_password_sync("senha@123", salt, stored)
+
+    def test_legacy_hash_still_verifies_and_needs_rehash(self):
+        salt = generate_salt()
+        legacy = _legacy_hash("Senha@123", salt)
+        assert parse_hash(legacy) == (LEGACY_ITERATIONS, legacy)
+        assert verify_password_sync("Senha@123", salt, legacy)
+        assert needs_rehash(legacy)
+        assert not needs_rehash(hash_password_sync("Senha@123", salt))
+
+    def test_raised_iterations_need_rehash(self, monkeypatch):
+        stored = hash_password_sync("x", generate_salt(), iterations=1000)
+        monkeypatch.setattr(password_hashing, "HASH_ITERATIONS", 2000)
+        assert needs_rehash(stored)
+
+    def test_pool_matches_sync(self):
+        salt = generate_salt()
+
+        async def scenario():
+            stored = await password_hashing.hash_password("Senha@123", salt, 1000)
+            ok = await password_hashing.verify_password("Senha@123", salt, stored)
+            return stored, ok
+
+        try:
+            stored, ok = asyncio.run(scenario())
+        finally:
+            password_hashing.shutdown_executor()
+        assert ok and stored == hash_password_sync("Senha@123", salt, 1000)
+
+
+class TestLoginThrottle:
+    """Token bucket e bloqueio exponencial com relógio falso"""
+
+    def _throttle(self, clock):
+        user = ThrottlePolicy(capacity=3, refill_per_second=1 / 10, max_failures=3, lockout_seconds=30, max_lockout_seconds=120)
+        ip = ThrottlePolicy(capacity=100, refill_per_second=10, max_failures=100, lockout_seconds=30, max_lockout_seconds=120)
+        return LoginThrottle(user, ip, clock=clock)
+
+    def test_bucket_refills(self):
+        clock = FakeClock()
+        throttle = self._throttle(clock)
+        assert [throttle.acquire("ana", "1.1.1.1") for _ in range(3)] == [0, 0, 0]
+        assert throttle.acquire("ana", "1.1.1.1") == pytest.approx(10.0)
+        # Outro usuário no mesmo IP não é afetado
+        assert throttle.acquire("bia", "1.1.1.1") == 0
+        clock.now += 10
+        assert throttle.acquire("ANA ", "1.1.1.1") == 0
+
+    def test_exponential_lockout_and_reset(self):
+        clock = FakeClock()
+        throttle = self._throttle(clock)
+        waits = []
+        for _ in range(5):
+            clock.now += 100  # balde sempre cheio: só o bloqueio conta
+            assert throttle.acquire("ana", "1.1.1.1") == 0
+            throttle.record_failure("ana", "1.1.1.1")
+            waits.append(throttle.acquire("ana", "1.1.1.1"))
+        assert waits == [0, 0, 30, 60, 120]
+        clock.now += 200
+        throttle.record_success("ana", "1.1.1.1")
+        throttle.record_failure("ana", "1.1.1.1")
+        assert throttle.acquire("ana", "1.1.1.1") == 0
+
+    def test_workers_share_budget_and_lockout(self, tmp_path):
+        """Dois workers (instâncias) no mesmo arquivo: uma cota de falhas e um bloqueio só"""
+        clock = FakeClock()
+        path = str(tmp_path / "rate_limits.db")
+        user = ThrottlePolicy(capacity=10, refill_per_second=1, max_failures=3, lockout_seconds=30, max_lockout_seconds=120)
+        ip = ThrottlePolicy(capacity=100, refill_per_second=10, max_failures=100, lockout_seconds=30, max_lockout_seconds=120)
+        workers = [LoginThrottle(user, ip, clock=clock, store=SQLiteThrottleStore(path)) for _ in range(2)]
+        for i in range(3):
+            assert workers[i % 2].acquire("ana", "1.1.1.1") == 0
+            workers[i % 2].record_failure("ana", "1.1.1.1")
+        assert [w.acquire("ana", "1.1.1.1") for w in workers] == [30, 30]
+        clock.now += 30
+        workers[1].record_success("ana", "1.1.1.1")
+        assert workers[0].acquire("ana", "1.1.1.1") == 0
+
+
+class TestLoginEndpoint:
+    """Login com regravação do hash e resposta 429"""
+
+    def _user(self, db, password_hash, salt):
+        user = User(username="operador", password_hash=password_hash, password_salt=salt, is_active=True)
+        db.add(user)
+        db.commit()
+        return user
+
+    def test_rehash_on_login(self, db_session):
+        salt = generate_salt()
+        self._user(db_session, _legacy_hash("Senha@123", salt), salt)
+        response = client.post("/api/admin/auth/login", json={"username": "operador", "password": "Senha@123"})
+        assert response.status_code == 200
+        db_session.expire_all()
+        user = db_session.query(User).one()
+        assert user.password_hash.startswith("pbkdf2_sha256$")
+        assert not needs_rehash(user.password_hash)
+        again = client.post("/api/admin/auth/login", json={"username": "operador", "password": "Senha@123"})
+        assert again.status_code == 200
+
+    def test_repeated_failures_are_throttled(self, db_session):
+        salt = generate_salt()
+        self._user(db_session, hash_password_sync("Senha@123", salt, iterations=1000), salt)
+        statuses = [
+            client.post("/api/admin/auth/login", json={"username": "operador", "password": "errada"}).status_code
+            for _ in range(6)
+        ]
+        assert statuses[:5] == [401] * 5
+        assert statuses[5] == 429
+        blocked = client.post("/api/admin/auth/login", json={"username": "operador", "password": "Senha@123"})
+        assert blocked.status_code == 429
+        assert int(blocked.headers["retry-after"]) > 0
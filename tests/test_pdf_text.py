@@ -0,0 +1,120 @@
+"""
+Testes da extração de texto de PDF por página (cache, pool)
+"""
+
+import pytest
+
+from app.services import pdf_text
+from app.services.plan_generator import extract_materials_from_document
+
+INTRO = ["Manual do operador - página %d" % i for i in range(3)]
+SECTIONS = [
+    "Manutenção preventiva 250h",
+    "Filtro de óleo do motor P/N: 600-211-1340 1 un",
+    "Revisão 500 horas\nÓleo hidráulico 20 l",
+    "Filtro hidráulico Ref. 07063-01100",
+]
+APPENDIX = ["Apêndice %d - diagramas elétricos" % i for i in range(200)]
+
+
+def _simulate_pdf(tmp_path, monkeypatch, pages):
+    reads = []
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(b"%PDF-1.4 simulado")
+
+    def read_pages(_path, numbers):
+        reads.extend(numbers)
+        return [(n, pages[n]) for n in numbers]
+
+    monkeypatch.setattr(pdf_text, "CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(pdf_text, "WORKERS", 1)
+    monkeypatch.setattr(pdf_text, "_page_count", lambda _path: len(pages))
+    monkeypatch.setattr(pdf_text, "_read_pages", read_pages)
+    return str(path), pages, reads
+
+
+@pytest.fixture
+def fake_pdf(tmp_path, monkeypatch):
+    """PDF simulado: conta as páginas lidas pelo extrator."""
+    return _simulate_pdf(tmp_path, monkeypatch, INTRO + SECTIONS + APPENDIX)
+
+
+class TestExtraction:
+    """Ordem das páginas e reaproveitamento do cache"""
+
+    def test_reads_every_page_in_order(self, fake_pdf):
+        path, pages, reads = fake_pdf
+        assert pdf_text.extract_pdf_text(path) == "\n".join(pages)
+        assert reads == list(range(len(pages)))
+
+    def test_cache_avoids_rereading(self, fake_pdf, monkeypatch):
+        path, pages, reads = fake_pdf
+        first = pdf_text.extract_pdf_text(path)
+        reads.clear()
+        assert pdf_text.extract_pdf_text(path) == first
+        assert reads == []
+
+        # Nova versão do extrator invalida o cache
+        monkeypatch.setattr(pdf_text, "EXTRACTOR_VERSION", "teste-2")
+        assert pdf_text.extract_pdf_text(path) == first
+        assert reads == list(range(len(pages)))
+
+    def test_plan_generator_uses_extracted_text(self, fake_pdf):
+        path, _, _ = fake_pdf
+        materials = extract_materials_from_document(path)
+        assert [m["reference"] for m in materials[250]] == ["600-211-1340"]
+        assert [m["reference"] for m in materials[500]] == [None, "07063-01100"]
+
+    def test_contents_page_does_not_hide_sections(self, tmp_path, monkeypatch):
+        pages = ["Sumário\nManutenção 250h ........ 2\nManutenção 500h ........ 4",
+                 "Manutenção 250h\nFiltro de óleo Ref. FO-1 1 un",
+                 "Diagrama elétrico da cabine",
+                 "Manutenção 500h\nFiltro de combustível Ref. FC-2 1 un"]
+        path, _, _ = _simulate_pdf(tmp_path, monkeypatch, pages)
+        materials = extract_materials_from_document(path)
+        assert [m["reference"] for m in materials[250]] == ["FO-1"]
+        assert [m["reference"] for m in materials[500]] == ["FC-2"]
+
+    def test_materials_use_vendor_profile(self, tmp_path, monkeypatch):
+        pages = ["Caterpillar 320D Operation and Maintenance Manual",
+                 "Every 500 Service Hours\nEngine Oil Filter 1R-0751 - replace",
+                 "Fuel System Primary Filter 1R-0762 1 un",
+                 "Every 250 Service Hours\nHydraulic Oil Filter 1R-0770 1 un",
+                 "Inspect the boom linkage",
+                 "Wiring diagram"]
+        path, _, _ = _simulate_pdf(tmp_path, monkeypatch, pages)
+        materials = extract_materials_from_document(path, "Caterpillar")
+        assert [m["reference"] for m in materials[500]] == ["1R-0751", "1R-0762"]
+        assert [m["reference"] for m in materials[250]] == ["1R-0770"]
+
+    def test_content_addressed_name_is_the_hash(self, tmp_path):
+        digest = "ab" * 32
+        assert pdf_text.file_sha256(str(tmp_path / f"{digest}.pdf")) == digest
+        other = tmp_path / "manual.pdf"
+        other.write_bytes(b"abc")
+        assert pdf_text.file_sha256(str(other)) == (
+            "ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad"
+        )
+
+
+class TestRealPdf:
+    """PDF gerado com ReportLab, lido pelo pool de processos"""
+
+    def test_process_pool_extraction(self, tmp_path, monkeypatch):
+        pytest.importorskip("PyPDF2")
+        canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+        path = str(tmp_path / "manual.pdf")
+        c = canvas.Canvas(path)
+        for i in range(40):
+            c.drawString(72, 720, f"Pagina {i}")
+            c.showPage()
+        c.save()
+
+        monkeypatch.setattr(pdf_text, "CACHE_PATH", str(tmp_path / "cache.db"))
+        monkeypatch.setattr(pdf_text, "WORKERS", 2)
+        try:
+            text = pdf_text.extract_pdf_text(path)
+        finally:
+            pdf_text.shutdown_executor()
+        assert [f"Pagina {i}" in text for i in range(40)] == [True] * 40
+        assert pdf_text.get_cache().load(pdf_text.file_sha256(path), pdf_text.EXTRACTOR_VERSION)[0] == 40
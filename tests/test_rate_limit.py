@@ -0,0 +1,144 @@
+"""
+Testes do limite de requisições (GCRA, lojas em memória e SQLite, dependência 429)
+"""
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.admin import User
+from app.services.rate_limit import (
+    MemoryStore,
+    RateLimiter,
+    RatePolicy,
+    SQLiteStore,
+    _policy_from_env,
+    rate_limit,
+)
+from app.services.session_tokens import issue_token
+from tests.db import override_get_db
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+clock = FakeClock()
+limiter = RateLimiter(clock=clock)
+limiter.register(RatePolicy("demo", limit=6, period=60, burst=2))
+
+
+limited_app = FastAPI()
+limited_app.dependency_overrides[get_db] = override_get_db
+
+
+@limited_app.get("/caro", dependencies=[Depends(rate_limit("demo", limiter))])
+async def expensive():
+    return {"ok": True}
+
+
+client = TestClient(limited_app)
+
+
+class TestGCRA:
+    """Rajada, bloqueio com Retry-After e reposição no ritmo da política"""
+
+    def test_burst_then_refill(self):
+        rl = RateLimiter(clock=FakeClock())
+        policy = rl.register(RatePolicy("p", limit=60, period=60, burst=3))
+        t = 100.0
+
+        decisions = [rl.hit(policy, "ip:1", now=t) for _ in range(4)]
+        assert [d.allowed for d in decisions] == [True, True, True, False]
+        assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+        assert decisions[3].retry_after == pytest.approx(1.0)
+
+        # Bloqueadas não consomem: 1 s depois libera exatamente uma
+        assert rl.hit(policy, "ip:1", now=t + 0.5).allowed is False
+        assert rl.hit(policy, "ip:1", now=t + 1.0).allowed is True
+        assert rl.hit(policy, "ip:1", now=t + 1.0).allowed is False
+
+        # Outra identidade tem a própria cota
+        assert rl.hit(policy, "ip:2", now=t).allowed is True
+        # Ociosa por tempo suficiente, a rajada volta inteira
+        assert [rl.hit(policy, "ip:1", now=t + 60).allowed for _ in range(4)] == [True, True, True, False]
+        assert rl.metrics[("p", "limited")] == 4
+
+    def test_memory_sweep_drops_idle_keys(self):
+        store = MemoryStore()
+        rl = RateLimiter(store=store)
+        policy = rl.register(RatePolicy("p", limit=10, period=10))
+        rl.hit(policy, "a", now=0)
+        rl.hit(policy, "b", now=50)
+        assert store.sweep(now=10) == 1
+        assert list(store._tats) == ["p:b"]
+
+    def test_policy_from_env(self, monkeypatch):
+        monkeypatch.setenv("RATE_LIMIT_DEMO_ENV", "5/10/2")
+        policy = _policy_from_env("demo_env", 100, 60, 10)
+        assert (policy.limit, policy.period, policy.burst) == (5, 10, 2)
+        monkeypatch.setenv("RATE_LIMIT_DEMO_ENV", "abc")
+        assert _policy_from_env("demo_env", 100, 60, 10).to_dict() == {"limit": 100, "period": 60, "burst": 10}
+
+
+class TestSQLiteStore:
+    """Arquivo compartilhado: dois limitadores (workers) somam a mesma cota"""
+
+    def test_shared_between_limiters(self, tmp_path):
+        path = str(tmp_path / "rl" / "rate_limits.db")
+        policy = RatePolicy("p", limit=2, period=60, burst=2)
+        worker_a = RateLimiter(store=SQLiteStore(path))
+        worker_b = RateLimiter(store=SQLiteStore(path))
+
+        assert worker_a.hit(policy, "user:1", now=10).allowed
+        assert worker_b.hit(policy, "user:1", now=10).allowed
+        blocked = worker_a.hit(policy, "user:1", now=10)
+        assert not blocked.allowed
+        assert blocked.retry_after == pytest.approx(30.0)
+        assert worker_b.hit(policy, "user:1", now=40).allowed
+        assert worker_a.store.sweep(now=1000) == 1
+
+
+class TestRateLimitDependency:
+    """429 com Retry-After; chave por usuário autenticado ou IP"""
+
+    def test_returns_429_with_retry_after(self, db_session):
+        clock.now += 3600
+        assert client.get("/caro").status_code == 200
+        assert client.get("/caro").status_code == 200
+        response = client.get("/caro")
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "10"
+
+        clock.now += 10
+        assert client.get("/caro").status_code == 200
+
+    def test_authenticated_user_has_own_bucket(self, db_session):
+        clock.now += 3600
+        user = User(username="operador", password_hash="x", password_salt="00", is_active=True)
+        db_session.add(user)
+        db_session.commit()
+        _, token = issue_token(db_session, user.id, ttl_hours=1)
+
+        # Esgota a cota do IP; o usuário autenticado (mesmo IP) não é afetado
+        for _ in range(2):
+            client.get("/caro")
+        assert client.get("/caro").status_code == 429
+        headers = {"Authorization": f"Bearer {token}"}
+        assert client.get("/caro", headers=headers).status_code == 200
+        assert client.get("/caro", headers=headers).status_code == 200
+        assert client.get("/caro", headers=headers).status_code == 429
+        assert limiter.snapshot()["demo"]["limited"] >= 2
+
+    def test_disabled_limiter_allows_everything(self, db_session):
+        clock.now += 3600
+        limiter.enabled = False
+        try:
+            assert all(client.get("/caro").status_code == 200 for _ in range(5))
+        finally:
+            limiter.enabled = True
@@ -0,0 +1,113 @@
+"""
+Testes do perfil de produção: execução única da inicialização e tempo limite
+"""
+
+import asyncio
+import multiprocessing
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.services.startup_lock import startup_once
+from serve import RequestTimeoutMiddleware, share_worker_state
+
+
+def _worker_startup(lock_path, counter_path, generation):
+    with startup_once(generation, lock_path) as first:
+        if first:
+            with open(counter_path, "a") as fh:
+                fh.write("x")
+
+
+class TestStartupOnce:
+    """Lock de arquivo por geração de inicialização"""
+
+    def test_runs_once_per_generation(self, tmp_path):
+        lock = str(tmp_path / "startup.lock")
+        with startup_once("g1", lock) as first:
+            assert first
+        with startup_once("g1", lock) as first:
+            assert not first
+        with startup_once("g2", lock) as first:
+            assert first
+
+    def test_failure_lets_next_worker_retry(self, tmp_path):
+        lock = str(tmp_path / "startup.lock")
+        with pytest.raises(RuntimeError):
+            with startup_once("g1", lock) as first:
+                assert first
+                raise RuntimeError("migração falhou")
+        with startup_once("g1", lock) as first:
+            assert first
+
+    def test_without_generation_always_runs(self, tmp_path, monkeypatch):
+        monkeypatch.delenv("MTDL_STARTUP_GENERATION", raising=False)
+        lock = str(tmp_path / "startup.lock")
+        for _ in range(2):
+            with startup_once(lock_path=lock) as first:
+                assert first
+
+    def test_concurrent_workers(self, tmp_path):
+        lock, counter = str(tmp_path / "startup.lock"), tmp_path / "count.txt"
+        ctx = multiprocessing.get_context("spawn")
+        procs = [ctx.Process(target=_worker_startup, args=(lock, str(counter), "g1")) for _ in range(4)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join(30)
+        assert counter.read_text() == "x"
+
+
+timeout_app = FastAPI()
+
+
+@timeout_app.get("/slow")
+async def slow():
+    await asyncio.sleep(5)
+    return {"ok": True}
+
+
+@timeout_app.get("/fast")
+async def fast():
+    return {"ok": True}
+
+
+@timeout_app.get("/stream")
+async def stream():
+    async def chunks():
+        for i in range(3):
+            await asyncio.sleep(0.1)
+            yield f"{i}\n"
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+class TestRequestTimeout:
+    """504 apenas quando a resposta não começa dentro do prazo"""
+
+    def test_timeout_and_streaming(self):
+        client = TestClient(RequestTimeoutMiddleware(timeout_app, 0.15))
+        slow_response = client.get("/slow")
+        assert slow_response.status_code == 504
+        assert client.get("/fast").json() == {"ok": True}
+        # O stream passa do prazo no total, mas começou antes dele
+        assert client.get("/stream").text == "0\n1\n2\n"
+
+
+class TestSharedState:
+    """Vários workers: limites e bloqueios de login no SQLite compartilhado"""
+
+    def test_multiple_workers_switch_to_sqlite(self, monkeypatch):
+        monkeypatch.delenv("RATE_LIMIT_STORE", raising=False)
+        share_worker_state(1)
+        assert "RATE_LIMIT_STORE" not in os.environ
+        share_worker_state(4)
+        assert os.environ["RATE_LIMIT_STORE"] == "sqlite"
+
+    def test_explicit_store_is_kept(self, monkeypatch, capsys):
+        monkeypatch.setenv("RATE_LIMIT_STORE", "memory")
+        share_worker_state(4)
+        assert os.environ["RATE_LIMIT_STORE"] == "memory"
+        assert "valem por worker" in capsys.readouterr().out
@@ -0,0 +1,134 @@
+"""
+Testes dos tokens de sessão com hash, expiração deslizante e limpeza
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.models.admin import SessionToken, User
+from app.routers import admin
+from app.services import session_tokens
+from app.services.session_tokens import SessionSweeper, hash_token, issue_token, resolve_token, sweep_expired
+from tests.db import TestingSessionLocal, override_get_db
+
+admin_app = FastAPI()
+admin_app.include_router(admin.router, prefix="/api/admin")
+admin_app.dependency_overrides[get_db] = override_get_db
+client = TestClient(admin_app)
+
+
+def _user(db, username="operador", is_admin=False):
+    user = User(username=username, password_hash="x", password_salt="00", is_active=True, is_admin=is_admin)
+    db.add(user)
+    db.commit()
+    return user
+
+
+class TestTokenStore:
+    """Hash do token, renovação limitada e revogação"""
+
+    def test_only_digest_is_stored(self, db_session):
+        user = _user(db_session)
+        session, raw = issue_token(db_session, user.id, ttl_hours=8)
+        assert session.token_hash == hash_token(raw) != raw
+        assert resolve_token(db_session, raw).id == session.id
+        assert resolve_token(db_session, session.token_hash) is None
+        assert resolve_token(db_session, None) is None
+
+    def test_sliding_refresh_writes_at_most_once_per_interval(self, db_session, monkeypatch):
+        monkeypatch.setattr(session_tokens, "REFRESH_MINUTES", 10)
+        user = _user(db_session)
+        session, raw = issue_token(db_session, user.id, ttl_hours=8)
+        issued_expiry, issued_at = session.expires_at, session.last_used_at
+
+        soon = issued_at + timedelta(minutes=5)
+        assert resolve_token(db_session, raw, now=soon).expires_at == issued_expiry
+
+        later = issued_at + timedelta(minutes=30)
+        refreshed = resolve_token(db_session, raw, now=later)
+        assert refreshed.last_used_at == later
+        assert refreshed.expires_at == later + timedelta(hours=8)
+
+        # Dentro do novo intervalo nada muda
+        db_session.expire_all()
+        again = resolve_token(db_session, raw, now=later + timedelta(minutes=1))
+        assert again.last_used_at == later
+
+    def test_expired_and_revoked_are_rejected(self, db_session):
+        user = _user(db_session)
+        session, raw = issue_token(db_session, user.id, ttl_hours=1)
+        assert resolve_token(db_session, raw, now=session.expires_at + timedelta(seconds=1)) is None
+        other, raw_other = issue_token(db_session, user.id, ttl_hours=1)
+        assert session_tokens.revoke_user_sessions(db_session, user.id, except_id=other.id) == 1
+        assert resolve_token(db_session, raw) is None
+        assert resolve_token(db_session, raw_other) is not None
+
+
+class TestSweep:
+    """Limpeza em lotes de tokens expirados e revogados"""
+
+    def test_sweep_removes_in_batches(self, db_session):
+        user = _user(db_session)
+        now = datetime.utcnow()
+        db_session.add_all(
+            SessionToken(user_id=user.id, token_hash=f"old{i}", expires_at=now - timedelta(days=1)) for i in range(25)
+        )
+        db_session.add(SessionToken(user_id=user.id, token_hash="revoked", expires_at=now + timedelta(days=1), is_revoked=True))
+        db_session.add(SessionToken(user_id=user.id, token_hash="active", expires_at=now + timedelta(days=1)))
+        db_session.commit()
+        assert sweep_expired(db_session, batch_size=10, now=now) == 26
+        assert [t.token_hash for t in db_session.query(SessionToken).all()] == ["active"]
+
+    def test_sweeper_runs_on_start_and_stops(self, db_session):
+        user = _user(db_session)
+        db_session.add(SessionToken(user_id=user.id, token_hash="old", expires_at=datetime.utcnow() - timedelta(days=1)))
+        db_session.commit()
+
+        async def scenario():
+            sweeper = SessionSweeper(session_factory=TestingSessionLocal)
+            assert sweeper.interval() == session_tokens.SWEEP_MINUTES * 60
+            sweeper.start()
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if not db_session.query(SessionToken).count():
+                    break
+                db_session.rollback()
+            await sweeper.stop()
+            return sweeper.running
+
+        assert asyncio.run(scenario()) is False
+        assert db_session.query(SessionToken).count() == 0
+
+
+class TestSessionEndpoints:
+    """Login, listagem e revogação de sessões pelo Admin"""
+
+    def test_list_and_revoke(self, db_session):
+        admin_user = _user(db_session, "admin", is_admin=True)
+        operator = _user(db_session)
+        _, admin_raw = issue_token(db_session, admin_user.id, ttl_hours=8)
+        first, first_raw = issue_token(db_session, operator.id, ttl_hours=8)
+        issue_token(db_session, operator.id, ttl_hours=8)
+        headers = {"Authorization": f"Bearer {admin_raw}"}
+
+        listed = client.get(f"/api/admin/users/{operator.id}/sessions", headers=headers).json()
+        assert listed["total"] == 2
+        assert all("token_hash" not in item for item in listed["items"])
+
+        one = client.post(f"/api/admin/users/{operator.id}/sessions/revoke", headers=headers, json={"session_id": first.id})
+        assert one.json()["revoked"] == 1
+        assert client.get("/api/admin/auth/me", headers={"Authorization": f"Bearer {first_raw}"}).status_code == 401
+
+        rest = client.post(f"/api/admin/users/{operator.id}/sessions/revoke", headers=headers)
+        assert rest.json()["revoked"] == 1
+        assert client.get(f"/api/admin/users/{operator.id}/sessions", headers=headers).json()["total"] == 0
+
+    def test_non_admin_is_forbidden(self, db_session):
+        operator = _user(db_session)
+        _, raw = issue_token(db_session, operator.id, ttl_hours=8)
+        response = client.get(f"/api/admin/users/{operator.id}/sessions", headers={"Authorization": f"Bearer {raw}"})
+        assert response.status_code == 403
@@ -0,0 +1,79 @@
+"""
+Testes do manifesto de hashes dos arquivos estáticos
+"""
+
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services.static_manifest import (
+    IMMUTABLE_CACHE_CONTROL,
+    MANIFEST_NAME,
+    FingerprintedStaticFiles,
+    StaticManifest,
+    build_manifest,
+    file_hash,
+    write_manifest,
+)
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "style.css").write_text("body { color: #123; }")
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_text("console.log('v1');")
+    return tmp_path
+
+
+class TestManifest:
+    """Montagem, URLs e atualização do manifesto"""
+
+    def test_urls_use_content_hash(self, static_dir):
+        manifest = StaticManifest(str(static_dir), frozen=False, watch=False)
+        css_hash = file_hash(str(static_dir / "css" / "style.css"))
+        assert manifest.url("css/style.css") == f"/static/css/style.css?v={css_hash}"
+        assert manifest.url("img/inexistente.svg") == "/static/img/inexistente.svg"
+        assert set(build_manifest(str(static_dir))) == {"css/style.css", "js/app.js"}
+
+    def test_refresh_picks_up_changes(self, static_dir):
+        manifest = StaticManifest(str(static_dir), frozen=False, watch=False)
+        manifest.load()
+        manifest._mtimes = manifest._scan_mtimes()
+        before = manifest.get("js/app.js")
+        path = static_dir / "js" / "app.js"
+        path.write_text("console.log('v2');")
+        os.utime(path, (1, 1))
+        (static_dir / "css" / "style.css").unlink()
+        assert manifest.refresh_changed() == 2
+        assert manifest.get("js/app.js") != before
+        assert manifest.get("css/style.css") is None
+
+    def test_frozen_build_uses_prebuilt_file(self, static_dir):
+        out = write_manifest(str(static_dir), {"css/style.css": "abc123"})
+        assert os.path.basename(out) == MANIFEST_NAME
+        manifest = StaticManifest(str(static_dir), frozen=True, watch=False)
+        assert manifest.url("css/style.css") == "/static/css/style.css?v=abc123"
+        assert json.loads((static_dir / MANIFEST_NAME).read_text()) == {"css/style.css": "abc123"}
+
+
+class TestFingerprintedStaticFiles:
+    """Cache-Control immutable apenas para a versão atual"""
+
+    def test_immutable_only_for_current_hash(self, static_dir):
+        manifest = StaticManifest(str(static_dir), frozen=False, watch=False)
+        static_app = FastAPI()
+        static_app.mount("/static", FingerprintedStaticFiles(directory=str(static_dir), manifest=manifest), name="static")
+        client = TestClient(static_app)
+
+        current = client.get(manifest.url("css/style.css"))
+        assert current.status_code == 200
+        assert current.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+        stale = client.get("/static/css/style.css?v=000000000000")
+        assert stale.status_code == 200
+        assert "immutable" not in stale.headers.get("cache-control", "")
+        assert "immutable" not in client.get("/static/js/app.js").headers.get("cache-control", "")
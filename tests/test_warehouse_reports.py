@@ -0,0 +1,277 @@
+"""
+Testes de paridade dos relatórios agregados de almoxarifado
+
+As funções legacy_* reproduzem a implementação anterior (laços em Python
+com uma consulta de Material por linha) e servem de referência para as
+consultas SQL de app/services/warehouse_reports.py.
+"""
+
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database import Base
+from app.models.warehouse import (
+    Material, StockMovement, Supplier, PurchaseRequest, PurchaseRequestItem, PurchaseOrder
+)
+from app.services import warehouse_reports
+from tests.db import TestingSessionLocal
+
+START = "2025-01-01T00:00:00"
+END = "2025-06-30T23:59:59"
+CATEGORIES = ["Filtros", "Lubrificantes", "Elétrica", "", None]
+COST_CENTERS = ["CC-100", "CC-200", None]
+
+
+@pytest.fixture(scope="module")
+def db_session(db_engine):
+    """Banco de teste com dados aleatórios (semente fixa), um por módulo"""
+    Base.metadata.create_all(bind=db_engine)
+    session = TestingSessionLocal()
+    rnd = random.Random(42)
+
+    materials = []
+    for i in range(120):
+        m = Material(
+            code=str(100000 + i),
+            name=f"Material {i}",
+            category=rnd.choice(CATEGORIES),
+            unit="UN",
+            current_stock=rnd.choice([0.0, 0.0, rnd.uniform(1, 500)]),
+            minimum_stock=1.0,
+            maximum_stock=1000.0,
+            average_cost=rnd.uniform(1, 300),
+            is_active=rnd.random() > 0.1,
+        )
+        materials.append(m)
+    session.add_all(materials)
+    session.flush()
+
+    base = datetime(2024, 11, 1)
+    for _ in range(3000):
+        m = rnd.choice(materials)
+        session.add(StockMovement(
+            material_id=m.id,
+            type=rnd.choice(["Saída", "Saída", "Entrada", "Ajuste"]),
+            quantity=float(rnd.randint(1, 40)),
+            previous_stock=0.0,
+            new_stock=0.0,
+            date=base + timedelta(hours=rnd.randint(0, 24 * 300)),
+            cost_center=rnd.choice(COST_CENTERS),
+        ))
+
+    supplier = Supplier(name="Fornecedor Teste")
+    session.add(supplier)
+    session.flush()
+    for i in range(80):
+        pr = PurchaseRequest(
+            number=f"RC{i:05d}",
+            requester="Teste",
+            status=rnd.choice(["Pendente", "Aprovada", "Rejeitada"]),
+            cost_center=rnd.choice(COST_CENTERS),
+            requested_date=base + timedelta(days=rnd.randint(0, 300)),
+        )
+        session.add(pr)
+        session.flush()
+        for _ in range(rnd.randint(0, 4)):
+            session.add(PurchaseRequestItem(
+                purchase_request_id=pr.id,
+                material_id=rnd.choice(materials).id,
+                quantity=1.0,
+            ))
+        for _ in range(rnd.randint(0, 2)):
+            session.add(PurchaseOrder(
+                number=f"PC{i:05d}{rnd.randint(0, 9999):04d}",
+                purchase_request_id=pr.id,
+                supplier_id=supplier.id,
+                status=rnd.choice(["Pendente", "Entregue"]),
+                total_value=10.0,
+                created_by="Teste",
+            ))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=db_engine)
+
+
+# -------------------------
+# Implementação anterior (referência)
+# -------------------------
+
+def legacy_abc(db, a=80, b=95):
+    material_values = []
+    for material in db.query(Material).filter(Material.is_active == True).all():
+        material_values.append({
+            "id": material.id,
+            "stock_value": material.current_stock * material.average_cost,
+        })
+    material_values.sort(key=lambda x: x["stock_value"], reverse=True)
+    total_value = sum(item["stock_value"] for item in material_values)
+    accumulated_percentage = 0
+    for item in material_values:
+        percentage = (item["stock_value"] / total_value * 100) if total_value > 0 else 0
+        accumulated_percentage += percentage
+        if accumulated_percentage <= a:
+            classification = "A"
+        elif accumulated_percentage <= b:
+            classification = "B"
+        else:
+            classification = "C"
+        item["percentage"] = round(percentage, 2)
+        item["accumulated_percentage"] = round(accumulated_percentage, 2)
+        item["classification"] = classification
+    return {"total_value": total_value, "materials": material_values}
+
+
+def _legacy_consumption(db, start_dt, end_dt):
+    consumption = {}
+    for mv in db.query(StockMovement).filter(
+        StockMovement.type == "Saída",
+        StockMovement.date >= start_dt,
+        StockMovement.date <= end_dt,
+    ).all():
+        consumption[mv.material_id] = consumption.get(mv.material_id, 0.0) + (mv.quantity or 0.0)
+    return consumption
+
+
+def legacy_turnover_grouped(db, start, end):
+    per_material = []
+    for mid, cons in _legacy_consumption(db, datetime.fromisoformat(start), datetime.fromisoformat(end)).items():
+        m = db.query(Material).filter(Material.id == mid).first()
+        if not m or (m.current_stock or 0.0) <= 0:
+            continue
+        per_material.append({
+            "category": m.category or "Sem categoria",
+            "label": f"{m.code} - {m.name}",
+            "turnover": round(cons / m.current_stock, 2),
+        })
+    grouped = defaultdict(list)
+    for row in per_material:
+        grouped[row["category"]].append(row["turnover"])
+    return per_material, {k: round(sum(v) / len(v), 2) for k, v in grouped.items()}
+
+
+def legacy_coverage(db, start, end):
+    start_dt, end_dt = datetime.fromisoformat(start), datetime.fromisoformat(end)
+    days = max(1, (end_dt - start_dt).days)
+    per_material = []
+    for mid, cons in _legacy_consumption(db, start_dt, end_dt).items():
+        m = db.query(Material).filter(Material.id == mid).first()
+        daily = cons / days
+        if daily <= 0:
+            continue
+        per_material.append({
+            "category": m.category or "Sem categoria",
+            "label": f"{m.code} - {m.name}",
+            "coverage_days": round(min((m.current_stock or 0.0) / daily, 365.0), 2),
+        })
+    grouped = defaultdict(list)
+    for row in per_material:
+        grouped[row["category"]].append(row["coverage_days"])
+    return per_material, {k: round(sum(v) / len(v), 2) for k, v in grouped.items()}
+
+
+def legacy_stockout(db, start, end):
+    prs = db.query(PurchaseRequest).filter(
+        PurchaseRequest.requested_date >= datetime.fromisoformat(start),
+        PurchaseRequest.requested_date <= datetime.fromisoformat(end),
+    ).all()
+    totals = defaultdict(int)
+    not_attended = defaultdict(int)
+    for pr in prs:
+        cats = set()
+        for it in db.query(PurchaseRequestItem).filter(PurchaseRequestItem.purchase_request_id == pr.id).all():
+            mat = db.query(Material).filter(Material.id == it.material_id).first()
+            cats.add(mat.category if mat and mat.category else "Sem categoria")
+        cats = cats or {"Sem categoria"}
+        delivered = any(
+            (po.status or "").lower() == "entregue"
+            for po in db.query(PurchaseOrder).filter(PurchaseOrder.purchase_request_id == pr.id).all()
+        )
+        for c in cats:
+            totals[c] += 1
+            if not delivered or (pr.status or "").lower() in ["rejeitada"]:
+                not_attended[c] += 1
+    return {c: (tot, not_attended.get(c, 0)) for c, tot in totals.items()}
+
+
+def _by_label(rows, key):
+    return {r["label"]: r[key] for r in rows}
+
+
+class TestAbcAnalysisParity:
+    """Paridade da análise ABC"""
+
+    @pytest.mark.parametrize("window", [True, False])
+    def test_matches_legacy(self, db_session, monkeypatch, window):
+        """Mesmos valores e classes com e sem funções de janela"""
+        monkeypatch.setattr(warehouse_reports, "supports_window_functions", lambda db: window)
+        expected = legacy_abc(db_session)
+        result = warehouse_reports.abc_analysis(db_session)
+
+        assert result["total_value"] == pytest.approx(expected["total_value"])
+        assert [m["id"] for m in result["materials"]] == [m["id"] for m in expected["materials"]]
+        for got, exp in zip(result["materials"], expected["materials"]):
+            assert got["percentage"] == pytest.approx(exp["percentage"], abs=0.011)
+            assert got["accumulated_percentage"] == pytest.approx(exp["accumulated_percentage"], abs=0.011)
+            assert got["classification"] == exp["classification"]
+
+    def test_custom_thresholds(self, db_session):
+        """Limites A/B configuráveis"""
+        expected = legacy_abc(db_session, a=50, b=70)
+        result = warehouse_reports.abc_analysis(db_session, a_threshold=50, b_threshold=70)
+        assert [m["classification"] for m in result["materials"]] == [m["classification"] for m in expected["materials"]]
+
+    def test_consumption_basis(self, db_session):
+        """Base de consumo: somente materiais ativos com saídas no período"""
+        result = warehouse_reports.abc_analysis(db_session, basis="consumption", start_date=START, end_date=END)
+        consumption = _legacy_consumption(db_session, datetime.fromisoformat(START), datetime.fromisoformat(END))
+        active = {m.id: m for m in db_session.query(Material).filter(Material.is_active == True).all()}
+        expected = {mid: qty * active[mid].average_cost for mid, qty in consumption.items() if mid in active}
+        assert {m["id"]: m["stock_value"] for m in result["materials"]} == pytest.approx(expected)
+        assert result["materials"][-1]["accumulated_percentage"] == pytest.approx(100.0)
+
+
+class TestStockReportsParity:
+    """Paridade de giro, cobertura e ruptura"""
+
+    def test_stock_turnover_grouped(self, db_session):
+        per_material, grouped = legacy_turnover_grouped(db_session, START, END)
+        result = warehouse_reports.stock_turnover_grouped(db_session, START, END)
+        assert sorted(result["materials"], key=lambda r: r["label"]) == sorted(per_material, key=lambda r: r["label"])
+        assert _by_label(result["grouped"], "turnover") == pytest.approx(grouped, abs=0.011)
+
+    def test_stock_turnover(self, db_session):
+        per_material, _ = legacy_turnover_grouped(db_session, START, END)
+        result = warehouse_reports.stock_turnover(db_session, START, END)
+        assert {f"{r['material_code']} - {r['material_name']}": r["turnover"] for r in result["materials"]} == \
+            {r["label"]: r["turnover"] for r in per_material}
+        turnovers = [r["turnover"] for r in result["materials"]]
+        assert turnovers == sorted(turnovers, reverse=True)
+
+    def test_stock_coverage(self, db_session):
+        per_material, grouped = legacy_coverage(db_session, START, END)
+        result = warehouse_reports.stock_coverage(db_session, START, END)
+        assert sorted(result["materials"], key=lambda r: r["label"]) == sorted(per_material, key=lambda r: r["label"])
+        assert _by_label(result["grouped"], "coverage_days") == pytest.approx(grouped, abs=0.011)
+
+    def test_stockout_rate(self, db_session):
+        expected = legacy_stockout(db_session, START, END)
+        result = warehouse_reports.stockout_rate(db_session, START, END)
+        assert {r["label"]: (r["total"], r["not_attended"]) for r in result["grouped"]} == expected
+
+    def test_group_by_cost_center(self, db_session):
+        """Agrupamento por centro de custo das saídas"""
+        result = warehouse_reports.stock_turnover_grouped(db_session, START, END, group_by="cost_center")
+        labels = {r["label"] for r in result["grouped"]}
+        assert labels <= {"CC-100", "CC-200", warehouse_reports.NO_COST_CENTER}
+        assert warehouse_reports.NO_COST_CENTER in labels
+
+        stockout = warehouse_reports.stockout_rate(db_session, START, END, group_by="cost_center")
+        prs = db_session.query(PurchaseRequest).filter(
+            PurchaseRequest.requested_date >= datetime.fromisoformat(START),
+            PurchaseRequest.requested_date <= datetime.fromisoformat(END),
+        ).count()
+        assert sum(r["total"] for r in stockout["grouped"]) == prs
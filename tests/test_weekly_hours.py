@@ -0,0 +1,107 @@
+"""
+Testes do calendário de horas semanais e dos relatórios de utilização/franquia
+"""
+
+import asyncio
+from datetime import date
+
+from app.models.equipment import Equipment, WeeklyHours, WeeklyHoursDay
+from app.routers.maintenance import save_weekly_hours, get_weekly_hours
+from app.routers.reports import get_utilization, get_exceeded_quota
+from app.services.weekly_hours import iso_week_bounds, backfill_weekly_hours_calendar
+
+FULL_WEEK = {d: 10.0 for d in ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]}
+
+
+def _equipment(db, prefix="EQ001", quota=60.0, category="Escavadeira Hidráulica"):
+    eq = Equipment(prefix=prefix, name="Equipamento", category=category, equipment_class="Linha Amarela", monthly_quota=quota)
+    db.add(eq)
+    db.commit()
+    return eq
+
+
+def _save(db, equipment_id, week, **hours):
+    payload = {"equipment_id": equipment_id, "week": week, **FULL_WEEK, **hours}
+    return asyncio.run(save_weekly_hours(payload, db=db))
+
+
+class TestWeeklyHoursCalendar:
+    """Normalização da semana ISO em datas"""
+
+    def test_iso_week_bounds(self):
+        assert iso_week_bounds("2025-W05") == (date(2025, 1, 27), date(2025, 2, 2))
+        assert iso_week_bounds("2024-W01") == (date(2024, 1, 1), date(2024, 1, 7))
+        assert iso_week_bounds("2024-W99") is None
+        assert iso_week_bounds("invalida") is None
+
+    def test_save_keeps_json_shape(self, db_session):
+        """POST/GET mantêm o mesmo formato e o POST gera as linhas diárias"""
+        eq = _equipment(db_session)
+        result = _save(db_session, eq.id, "2025-W05", sunday=0.0)
+        assert set(result["weekly_hours"]) == {
+            "id", "equipment_id", "week", "monday", "tuesday", "wednesday", "thursday",
+            "friday", "saturday", "sunday", "total_hours", "created_at", "updated_at",
+        }
+        assert result["weekly_hours"]["total_hours"] == 60.0
+
+        stored = db_session.query(WeeklyHours).one()
+        assert (stored.week_start, stored.week_end) == (date(2025, 1, 27), date(2025, 2, 2))
+        assert db_session.query(WeeklyHoursDay).count() == 6
+
+        # Atualização regera o calendário
+        _save(db_session, eq.id, "2025-W05", monday=0.0)
+        assert db_session.query(WeeklyHoursDay).count() == 6
+        assert date(2025, 1, 27) not in {d.day for d in db_session.query(WeeklyHoursDay).all()}
+
+        data = asyncio.run(get_weekly_hours(eq.id, "2025-W05", db=db_session))
+        assert data["monday"] == 0.0 and data["total_hours"] == 60.0
+
+    def test_backfill_existing_rows(self, db_session):
+        """Registros antigos (sem week_start) são migrados"""
+        eq = _equipment(db_session)
+        db_session.add(WeeklyHours(equipment_id=eq.id, week="2025-W10", total_hours=70.0, **FULL_WEEK))
+        db_session.add(WeeklyHours(equipment_id=eq.id, week="lixo", total_hours=0.0))
+        db_session.commit()
+
+        assert backfill_weekly_hours_calendar(db_session, batch_size=1) == 1
+        assert db_session.query(WeeklyHoursDay).count() == 7
+        assert backfill_weekly_hours_calendar(db_session) == 0
+
+
+class TestUtilizationReports:
+    """Relatórios que somam horas por intervalo de datas"""
+
+    def test_week_split_across_months(self, db_session):
+        """2025-W05 tem 5 dias em janeiro e 2 em fevereiro"""
+        eq = _equipment(db_session, quota=100.0)
+        _save(db_session, eq.id, "2025-W05")
+
+        jan = asyncio.run(get_utilization(year=2025, month=1, db=db_session))
+        feb = asyncio.run(get_utilization(year=2025, month=2, db=db_session))
+        assert jan["overall"] == 50.0
+        assert feb["overall"] == 20.0
+        assert jan["has_data"] and feb["has_data"]
+
+        march = asyncio.run(get_utilization(year=2025, month=3, db=db_session))
+        assert march["overall"] == 0 and not march["has_data"]
+
+        week = asyncio.run(get_utilization(week="2025-W05", db=db_session))
+        assert week["overall"] == 100.0
+        assert asyncio.run(get_utilization(week="2025-W77", db=db_session))["has_data"] is False
+
+    def test_exceeded_quota(self, db_session):
+        over = _equipment(db_session, prefix="EQ001", quota=100.0)
+        under = _equipment(db_session, prefix="EQ002", quota=200.0, category="Motoniveladora")
+        for w in ("2025-W01", "2025-W02", "2025-W03"):
+            _save(db_session, over.id, w)
+            _save(db_session, under.id, w)
+
+        result = asyncio.run(get_exceeded_quota(year=2025, month=1, db=db_session))
+        assert [item["equipment"] for item in result["list"]] == ["EQ001 - Equipamento"]
+        # W01 começa em 30/12/2024: somente 5 dias contam em janeiro
+        assert result["list"][0]["used_hours"] == 190.0
+        assert result["list"][0]["exceeded_hours"] == 90.0
+        assert result["by_category"] == [{"label": "Esc. Hid.", "count": 1}]
+
+        filtered = asyncio.run(get_exceeded_quota(year=2025, month=1, category="Motoniveladora", db=db_session))
+        assert filtered["list"] == []